@@ -15,7 +15,7 @@ from modules.MagnitudeParser import isIdentifier, isValueExpression
 from modules.quantity import Q
 from modules.enum import enum
 from .AWGSegmentModel import nodeTypes
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 class AWGWaveform(object):
     """waveform object for AWG channels. Responsible for parsing and evaluating waveforms.
@@ -29,6 +29,8 @@ class AWGWaveform(object):
        value is a numpy array of samples, e.g. {(0, 2): numpay.array([1,2,31]), (12, 15): numpy.array([6,16,23,5])}
        """
     expression = Expression()
+    compiledFunctions = OrderedDict()  # (equation string, symbol) -> numpy function of the equation, shared by all channels
+    compiledFunctionsDepth = 256
     def __init__(self, channel, settings, waveformCache):
         self.settings = settings
         self.channel = channel
@@ -106,29 +108,86 @@ class AWGWaveform(object):
 
     def evaluateSegments(self, nodeList, startStep=0):
         """Evaluate the list of nodes in nodeList.
+
+        The segments are first laid out, giving the start steps of every repetition of every segment. The samples
+        are then written into one preallocated array, all repetitions of a segment are computed in one call.
         Args:
             nodeList: list of nodes to evaluate
             startStep: the step number at which evaluation starts
         Returns:
             startStep, sampleList: The step at which the next waveform begins, together with a list of samples
         """
-        sampleList = numpy.array([])
+        runs, length = self.layoutSegments(nodeList)
+        numSamples = max(0, min(length, self.maxSamples-startStep)) #the last sample must not exceed maxSamples
+        sampleList = numpy.zeros(numSamples)
+        tVar = sympy.Symbol('t')
+        for sympyExpr, starts, segmentSamples in runs:
+            starts = starts[starts < numSamples]
+            if len(starts) == 1:
+                stopStep = min(starts[0]+segmentSamples, numSamples)
+                sampleList[starts[0]:stopStep] = self.evaluateEquation(sympyExpr, tVar, startStep+starts[0], startStep+stopStep-1)
+            elif len(starts) > 1:
+                steps = starts[:, numpy.newaxis] + numpy.arange(min(segmentSamples, numSamples)) #one row per repetition
+                steps = steps[steps < numSamples]
+                sampleList[steps] = self.computeSamples(sympyExpr, tVar, steps+startStep)
+        return startStep+numSamples, sampleList
+
+    def layoutSegments(self, nodeList):
+        """Lay out the enabled segments in nodeList.
+        Args:
+            nodeList: list of nodes to lay out
+        Returns:
+            runs, length: list of (sympyExpr, starts, numSamples) tuples with the start steps of all repetitions of
+            a segment relative to the start of nodeList, and the total number of steps of nodeList
+        """
+        runs = list()
+        length = 0
         for node in nodeList:
             if node.enabled:
                 if node.nodeType==nodeTypes.segment:
                     duration = self.settings.varDict[node.duration]['value'] if isIdentifier(node.duration) else self.expression.evaluateAsMagnitude(node.duration)
-                    startStep, newSamples = self.evaluateEquation(node, duration, startStep)
-                    sampleList = numpy.append(sampleList, newSamples)
+                    sympyExpr = self.parseEquation(node)
+                    numSamples = self.numSamples(duration)
+                    if sympyExpr is not None and numSamples > 0:
+                        runs.append((sympyExpr, numpy.array([length]), numSamples))
+                        length += numSamples
                 elif node.nodeType==nodeTypes.segmentSet:
                     repMag = self.settings.varDict[node.repetitions]['value'] if isIdentifier(node.repetitions) else self.expression.evaluateAsMagnitude(node.repetitions)
                     repetitions = int(repMag.to_base_units().magnitude) #convert to float, then to integer
-                    for n in range(repetitions):
-                        startStep, newSamples = self.evaluateSegments(node.children, startStep) #recursive
-                        sampleList = numpy.append(sampleList, newSamples)
-        return startStep, sampleList
+                    childRuns, childLength = self.layoutSegments(node.children) #recursive
+                    if repetitions > 0 and childLength > 0:
+                        offsets = length + childLength*numpy.arange(repetitions)
+                        runs.extend((sympyExpr, (offsets[:, numpy.newaxis] + starts).ravel(), numSamples) for sympyExpr, starts, numSamples in childRuns)
+                        length += repetitions*childLength
+        return runs, length
+
+    def numSamples(self, duration):
+        """number of samples of a segment with the given duration"""
+        if duration:
+            numSamples = duration*self.sampleRate
+            numSamples = numSamples.to_base_units()
+            return max(0, int(round(numSamples))) #convert to float, then to integer
+        return 0
+
+    def parseEquation(self, node):
+        """Parse the equation of node with all variables except 't' replaced by their values.
+        Returns:
+            sympyExpr: the parsed equation, None if it is not dimensionless
+        """
+        # first test expression with dummy variable to see if units match up, so user is warned otherwise
+        try:
+            node.expression.variabledict = {varName:varValueTextDict['value'] for varName, varValueTextDict in self.settings.varDict.items()}
+            node.expression.variabledict.update({'t':Q(1, 'us')})
+            node.expression.evaluate(node.equation, variabledict=node.expression.variabledict)
+        except ValueError:
+            logging.getLogger(__name__).warning("Must be dimensionless!")
+            return None
+        varValueDict = {varName:varValueTextDict['value'].to_base_units().magnitude for varName, varValueTextDict in self.settings.varDict.items()}
+        varValueDict['t'] = sympy.Symbol('t')
+        return parse_expr(node.equation, varValueDict) #parse the equation
 
-    def evaluateEquation(self, node, duration, startStep):
-        """Evaluate the waveform of the specified node's equation.
+    def evaluateEquation(self, sympyExpr, tVar, startStep, stopStep):
+        """Evaluate the waveform of an equation from startStep to stopStep.
 
         The waveform caching works as follows: if self.settings.cacheDepth is greater than zero, waveform values are saved
         to self.waveformCache as they are calculated, to speed up future waveform computations. self.waveformCache is an OrderedDict,
@@ -145,82 +204,69 @@ class AWGWaveform(object):
         A cacheDepth value less than zero indicates an unbounded cache.
 
         Args:
-            node: The node whose equation is to be evaluated
-            duration: the length of time for which to evaluate the equation
+            sympyExpr: The parsed equation to evaluate
+            tVar (Symbol): sympy symbol for 't'
             startStep: the step at which to start evaluation
+            stopStep: the last step to evaluate
 
         Returns:
             sampleList: list of values to program to the AWG.
         """
-        #calculate number of samples
-        if duration:
-            numSamples = duration*self.sampleRate
-            numSamples = numSamples.to_base_units()
-            numSamples = int(round(numSamples)) #convert to float, then to integer
-        else:
-            numSamples = Q(0)
-        numSamples = max(0, min(numSamples, self.maxSamples-startStep)) #cap at maxSamples-startStep, so that the last sample does not exceed maxSamples
-        stopStep = numSamples + startStep - 1
-        nextSegmentStartStep = stopStep + 1
-        # first test expression with dummy variable to see if units match up, so user is warned otherwise
-        try:
-            node.expression.variabledict = {varName:varValueTextDict['value'] for varName, varValueTextDict in self.settings.varDict.items()}
-            node.expression.variabledict.update({'t':Q(1, 'us')})
-            node.expression.evaluate(node.equation, variabledict=node.expression.variabledict)
-            error = False
-        except ValueError:
-            logging.getLogger(__name__).warning("Must be dimensionless!")
-            error = True
-            nextSegmentStartStep = startStep
-            sampleList = numpy.array([])
-        if not error:
-            varValueDict = {varName:varValueTextDict['value'].to_base_units().magnitude for varName, varValueTextDict in self.settings.varDict.items()}
-            varValueDict['t'] = sympy.Symbol('t')
-            sympyExpr = parse_expr(node.equation, varValueDict) #parse the equation
-            key = str(sympyExpr)
-
-            if self.settings.cacheDepth != 0: #meaning, use the cache
-                if key in self.waveformCache:
-                    self.waveformCache[key] = self.waveformCache.pop(key) #move key to the most recent position in cache
-                    for (sampleStartStep, sampleStopStep), samples in self.waveformCache[key].items():
-                        if startStep >= sampleStartStep and stopStep <= sampleStopStep: #this means the required waveform is contained within the cached waveform
-                            sliceStart = startStep - sampleStartStep
-                            sliceStop  = stopStep  - sampleStartStep + 1
-                            sampleList = samples[sliceStart:sliceStop]
-                            break
-                        elif max(startStep, sampleStartStep) > min(stopStep, sampleStopStep): #this means there is no overlap
-                            continue
-                        else: #This means there is some overlap, but not an exact match
-                            if startStep < sampleStartStep: #compute the first part of the sampleList
-                                sampleListStart = self.computeFunction(sympyExpr, varValueDict['t'], startStep, sampleStartStep-1)
-                                if stopStep <= sampleStopStep: #use the cached part for the rest
-                                    sliceStop = stopStep - sampleStartStep + 1
-                                    sampleList = numpy.append(sampleListStart, samples[:sliceStop])
-                                    self.waveformCache[key].pop((sampleStartStep, sampleStopStep)) #update cache entry with new samples
-                                    self.waveformCache[key][(startStep, sampleStopStep)] = numpy.append(sampleListStart, samples)
-                                else: #compute the end of the sampleList, then use the cached part for the middle
-                                    sampleListEnd = self.computeFunction(sympyExpr, varValueDict['t'], sampleStopStep+1, stopStep)
-                                    sampleList = numpy.append(numpy.append(sampleListStart, samples), sampleListEnd)
-                                    self.waveformCache[key].pop((sampleStartStep, sampleStopStep))
-                                    self.waveformCache[key][(startStep, stopStep)] = sampleList
-                            else: #compute the end of the sampleList, and use the cached part for the beginning
-                                sampleListEnd = self.computeFunction(sympyExpr, varValueDict['t'], sampleStopStep+1, stopStep)
-                                sliceStart = startStep - sampleStartStep
-                                sampleList = numpy.append(samples[sliceStart:], sampleListEnd)
+        key = str(sympyExpr)
+        if self.settings.cacheDepth != 0: #meaning, use the cache
+            if key in self.waveformCache:
+                self.waveformCache[key] = self.waveformCache.pop(key) #move key to the most recent position in cache
+                for (sampleStartStep, sampleStopStep), samples in self.waveformCache[key].items():
+                    if startStep >= sampleStartStep and stopStep <= sampleStopStep: #this means the required waveform is contained within the cached waveform
+                        sliceStart = startStep - sampleStartStep
+                        sliceStop  = stopStep  - sampleStartStep + 1
+                        sampleList = samples[sliceStart:sliceStop]
+                        break
+                    elif max(startStep, sampleStartStep) > min(stopStep, sampleStopStep): #this means there is no overlap
+                        continue
+                    else: #This means there is some overlap, but not an exact match
+                        if startStep < sampleStartStep: #compute the first part of the sampleList
+                            sampleListStart = self.computeFunction(sympyExpr, tVar, startStep, sampleStartStep-1)
+                            if stopStep <= sampleStopStep: #use the cached part for the rest
+                                sliceStop = stopStep - sampleStartStep + 1
+                                sampleList = numpy.append(sampleListStart, samples[:sliceStop])
+                                self.waveformCache[key].pop((sampleStartStep, sampleStopStep)) #update cache entry with new samples
+                                self.waveformCache[key][(startStep, sampleStopStep)] = numpy.append(sampleListStart, samples)
+                            else: #compute the end of the sampleList, then use the cached part for the middle
+                                sampleListEnd = self.computeFunction(sympyExpr, tVar, sampleStopStep+1, stopStep)
+                                sampleList = numpy.concatenate((sampleListStart, samples, sampleListEnd))
                                 self.waveformCache[key].pop((sampleStartStep, sampleStopStep))
-                                self.waveformCache[key][(sampleStartStep, stopStep)] = numpy.append(samples, sampleListEnd)
-                            break
-                    else: #This is an else on the for loop, it executes if there is no break (i.e. if there are no computed samples with overlap)
-                        sampleList = self.computeFunction(sympyExpr, varValueDict['t'], startStep, stopStep)
-                        self.waveformCache[key][(startStep, stopStep)] = sampleList
-                else: #if the waveform is not in the cache
-                    sampleList = self.computeFunction(sympyExpr, varValueDict['t'], startStep, stopStep)
-                    self.waveformCache[key] = {(startStep, stopStep): sampleList}
-                    if self.settings.cacheDepth > 0 and len(self.waveformCache) > self.settings.cacheDepth:
-                        self.waveformCache.popitem(last=False) #remove the least recently used cache item
-            else: #if we're not using the cache at all
-                sampleList = self.computeFunction(sympyExpr, varValueDict['t'], startStep, stopStep)
-        return nextSegmentStartStep, sampleList
+                                self.waveformCache[key][(startStep, stopStep)] = sampleList
+                        else: #compute the end of the sampleList, and use the cached part for the beginning
+                            sampleListEnd = self.computeFunction(sympyExpr, tVar, sampleStopStep+1, stopStep)
+                            sliceStart = startStep - sampleStartStep
+                            sampleList = numpy.append(samples[sliceStart:], sampleListEnd)
+                            self.waveformCache[key].pop((sampleStartStep, sampleStopStep))
+                            self.waveformCache[key][(sampleStartStep, stopStep)] = numpy.append(samples, sampleListEnd)
+                        break
+                else: #This is an else on the for loop, it executes if there is no break (i.e. if there are no computed samples with overlap)
+                    sampleList = self.computeFunction(sympyExpr, tVar, startStep, stopStep)
+                    self.waveformCache[key][(startStep, stopStep)] = sampleList
+            else: #if the waveform is not in the cache
+                sampleList = self.computeFunction(sympyExpr, tVar, startStep, stopStep)
+                self.waveformCache[key] = {(startStep, stopStep): sampleList}
+                if self.settings.cacheDepth > 0 and len(self.waveformCache) > self.settings.cacheDepth:
+                    self.waveformCache.popitem(last=False) #remove the least recently used cache item
+        else: #if we're not using the cache at all
+            sampleList = self.computeFunction(sympyExpr, tVar, startStep, stopStep)
+        return sampleList
+
+    @classmethod
+    def compiledFunction(cls, sympyExpr, tVar):
+        """Return the numpy function of sympyExpr, lambdify is only called once for every equation and symbol set"""
+        key = (str(sympyExpr), str(tVar))
+        func = cls.compiledFunctions.pop(key, None)
+        if func is None:
+            func = sympy.lambdify(tVar, sympyExpr, "numpy") #turn string into a python function
+            if len(cls.compiledFunctions) >= cls.compiledFunctionsDepth:
+                cls.compiledFunctions.popitem(last=False) #remove the least recently used function
+        cls.compiledFunctions[key] = func
+        return func
 
     def computeFunction(self, sympyExpr, tVar, startStep, stopStep):
         """Compute the value of a function over a specified range.
@@ -234,14 +280,23 @@ class AWGWaveform(object):
         """
         numSamples = stopStep-startStep+1
         if numSamples <= 0:
-            sampleList = numpy.array([])
-        else:
-            func = sympy.lambdify(tVar, sympyExpr, "numpy") #turn string into a python function
-            clippedFunc = lambda t: max(self.minAmplitude, min(self.maxAmplitude, func(t))) #clip at min and max amplitude
-            vectorFunc = numpy.vectorize(clippedFunc, otypes=[numpy.float64]) #vectorize the function
-            step = self.stepsize.m_as('s')
-            sampleList = vectorFunc( (numpy.arange(numSamples)+startStep)*step ) #apply the function to each time step value
-        return sampleList
+            return numpy.array([])
+        return self.computeSamples(sympyExpr, tVar, numpy.arange(numSamples)+startStep)
+
+    def computeSamples(self, sympyExpr, tVar, steps):
+        """Compute the value of a function at the given steps, clipped at min and max amplitude.
+        Args:
+            sympyExpr (str): A string containing a function of 't' (e.g. '7*sin(3*t)')
+            tVar (Symbol): sympy symbol for 't'
+            steps (numpy.array): integer time steps
+        Returns:
+            sampleList (numpy.array): list of function values
+        """
+        func = self.compiledFunction(sympyExpr, tVar)
+        t = steps*self.stepsize.m_as('s')
+        sampleList = numpy.array(numpy.broadcast_to(func(t), t.shape), dtype=numpy.float64) #constant functions return a scalar
+        sampleList[numpy.isnan(sampleList)] = self.maxAmplitude #same as clipping a nan with min and max
+        return numpy.clip(sampleList, self.minAmplitude, self.maxAmplitude, out=sampleList)
 
     def compliantSampleList(self, sampleList):
         """Make the sample list compliant with the capabilities of the AWG
@@ -261,7 +316,8 @@ class AWGWaveform(object):
             extraNumSamples = self.sampleChunkSize - (numSamples % self.sampleChunkSize)
         else:
             extraNumSamples = 0
-        sampleList = numpy.append(sampleList, [self.padValue]*extraNumSamples)
+        if extraNumSamples:
+            sampleList = numpy.append(sampleList, [self.padValue]*extraNumSamples)
         return sampleList
 
 if __name__ == '__main__':
@@ -27,6 +27,7 @@ from dedicatedCounters.DedicatedCounters import DedicatedCounters
 from externalParameter import ExternalParameterSelection
 from externalParameter import ExternalParameterUi
 from externalParameter.InstrumentLoggingDisplay import InstrumentLoggingDisplay
+from externalParameter.persistence import DBPersist
 from logicAnalyzer.LogicAnalyzer import LogicAnalyzer
 from modules import DataDirectory, MyException
 from modules.DataChanged import DataChanged
@@ -786,6 +787,7 @@ class ExperimentUi(WidgetContainerBase,WidgetContainerForm):
         for p in self.auxiliaryPulsers:
             p.shutdown()
         self.dac.shutdown()
+        DBPersist.shutdown()
 
     def saveConfig(self):
         self.config['MainWindow.State'] = self.parent.saveState()
@@ -73,6 +73,7 @@ class DedicatedCounters(DedicatedCountersForm, DedicatedCountersBase ):
         self.area = None
         self.enableDataPlotting = False
         self.enableTimeseries = False
+        self.timeseries = None
         self.enableDataTaking = False
 #        [
 #            AnalogInputCalibration.PowerDetectorCalibration(),
@@ -221,6 +222,8 @@ class DedicatedCounters(DedicatedCountersForm, DedicatedCountersBase ):
 
     def onClose(self):
         self.autoLoad.onClose()
+        if self.timeseries is not None:
+            self.timeseries.shutdown()
 
     def closeEvent(self, e):
         self.onClose()
@@ -350,14 +353,14 @@ class DedicatedCounters(DedicatedCountersForm, DedicatedCountersBase ):
         fields = {'count{}'.format(index): float(value) for index, value in enumerate(data.data[:16]) if value is not None}
         fields.update({'analog{}'.format(index): float(self.analogValue(index+16, value)) for index, value in enumerate(data.analogValues) if value is not None})
         fields['integrationtime'] = float(self.dataIntegrationTime.m_as('ms'))
-        TimeseriesPersist.store.write_points([{
+        self.timeseries.write({
             "measurement": "dedicated",
             "tags": {
                 "project": self.timeseries.projectName,
             },
             "fields": fields,
             "time": data.timestamp if data.timestamp > 1000000000000000000 else int(data.timestamp * 1000000000)
-        }])
+        })
 
     def replot(self):
         for name, plotwin in self.curvesDict.items():
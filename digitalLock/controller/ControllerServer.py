@@ -5,15 +5,14 @@
 # *****************************************************************
 import logging
 from multiprocessing import Process
-import struct
 
 import ok
 
+from digitalLock.controller.LockDataDecoder import LockDataDecoder, StreamData, ScopeData
 from mylogging.ServerLogging import configureServerLogging
 from modules import enum
 from modules.quantity import Q
 from pulser.bitfileHeader import BitfileInfo
-from pulser.PulserHardwareServer import sliceview, sliceview_remainder
 
 ModelStrings = {
         0: 'Unknown',
@@ -78,45 +77,13 @@ def check(number, command):
     if number is not None and number<0:
         raise FPGAException("OpalKelly exception '{0}' in command {1}".format(ErrorMessages.get(number, number), command))
 
-def twos_comp(val, bits):
-    """compute the 2's compliment of int value val"""
-    if( (val&(1<<(bits-1))) != 0 ):
-        val -= 1 << bits
-    return val
-
 class PulserHardwareException(Exception):
     pass
 
-class StreamDataItem:
-    def __init__(self):
-        self.samples = 0
-        self.errorSigSum = 0
-        self.errorSigMin = 0
-        self.errorSigMax = 0
-        self.errorSigSumSq = 0;
-        self.freqSum = 0
-        self.freqMin = 0
-        self.freqMax = 0
-
-class StreamData(list):
-    def __init__(self):
-        super(StreamData, self).__init__(self)
-        self.overrun = False   
-
-class ScopeData:
-    def __init__(self):
-        self.errorSig = list()
-        self.frequency = list()
-        
 class FinishException(Exception):
     pass
 
-class AlignmentException( Exception):
-    def __init__(self, length):
-        super(AlignmentException, self).__init__()
-        self.length = length
-
-class DigitalLockControllerServer(Process):
+class DigitalLockControllerServer(Process, LockDataDecoder):
     timestep = Q(5, 'ns')
     def __init__(self, dataQueue, commandPipe, loggingQueue):
         super(DigitalLockControllerServer, self).__init__()
@@ -167,55 +134,15 @@ class DigitalLockControllerServer(Process):
 
     analyzingState = enum.enum('normal', 'scanparameter')
     def readDataFifo(self):
-        logger = logging.getLogger(__name__)
         if (self.scopeEnabled):
             scopeData, _ = self.readScopeData(8)
             if scopeData is not None:
-                for s in sliceview(scopeData, 8):
-                    (code, ) = struct.unpack('Q', s)
-                    if code==0xffffffffffffffff:
-                        self.dataQueue.put( self.scopeData )
-                        logger.debug("sent data {0}".format(len(self.scopeData.errorSig)))
-                        self.scopeData = ScopeData()
-                        self.scopeEnabled = False
-                    else:
-                        self.scopeData.errorSig.append( twos_comp(code >> 48, 16) )
-                        self.scopeData.frequency.append( twos_comp(code & 0x7fffffffffff, 47) )
-                   
+                self.decodeScopeData(scopeData)
+
         data, self.streamData.overrun = self.readStreamData(48)
         if data:
-            self.streamBuffer.extend( data )
-            while len(self.streamBuffer)>=64:
-                try:
-                    for itembuffer in sliceview(self.streamBuffer, 64):
-                        self.unpackStreamRecord(itembuffer)
-                    if len(self.streamData)>0:
-                        self.dataQueue.put( self.streamData )
-                        self.streamData = StreamData()     
+            self.decodeStreamData(data)
 
-                    self.streamBuffer = bytearray( sliceview_remainder(self.streamBuffer, 64) )           
-                except AlignmentException as e:
-                    logger.info("data not aligned skipping 2 bytes")
-                    self.streamBuffer = bytearray( self.streamBuffer[e.length*48+2:] )  # e.length holds the number of successfully read records
-     
-    def unpackStreamRecord(self, itembuffer ):
-        item = StreamDataItem()
-        (errorsig, item.errorSigMax, item.errorSigMin, item.samples, freq0, freq1, freq2, item.errorSigSumSq, 
-         item.externalMax, item.externalMin, item.externalCount, externalSum) = struct.unpack('QhhIQQQQHHIQ', itembuffer)
-        item.lockStatus = (externalSum >> 46) & 0x3
-        item.externalMax &= 0xffff
-        item.externalMin &= 0xffff
-        if errorsig & 0xffff000000000000 != 0xfefe000000000000 or freq2 &  0xffff000000000000 != 0xefef000000000000:
-            raise AlignmentException(len(self.streamData))
-        if item.samples>0:
-            item.errorSigSum = twos_comp( (errorsig&0xffffffffffff), 48) 
-            item.freqMin = twos_comp( freq1 & 0xffffffffffff, 48 )
-            item.freqMax = twos_comp( freq2 & 0xffffffffffff, 48 )
-            item.freqSum = twos_comp( (freq0 <<8) | (freq1 >> 56), 72 ) 
-            item.externalSum = externalSum & 0xfffffffffff
-            self.streamData.append(item)
-            
-     
     def __getattr__(self, name):
         """delegate not available procedures to xem"""
         if name.startswith('__') and name.endswith('__'):
@@ -0,0 +1,227 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Decoding of the digital lock controller scope and stream pipes.
+
+The scope pipe delivers 64 bit words
+    0xffffffffffffffff end of trace marker
+    0xssss?fffffffffff error signal s (signed 16 bit), frequency f (signed 47 bit)
+
+The stream pipe delivers records of 64 bytes with the layout 'QhhIQQQQHHIQ'
+    errorsig       0xfefe in the upper 16 bits, signed 48 bit error signal sum
+    errorSigMax, errorSigMin, samples
+    freq0, freq1   signed 72 bit frequency sum in freq0 and the upper 8 bits of freq1, signed 48 bit freqMin
+    freq2          0xefef in the upper 16 bits, signed 48 bit freqMax
+    errorSigSumSq, externalMax, externalMin, externalCount
+    externalSum    lock status in bits 46 and 47, 44 bit external sum
+Records without the two markers are misaligned, the decoder then drops 2 bytes and tries again.
+
+:meth:`LockDataDecoder.decodeScopeDataScalar` and :meth:`LockDataDecoder.decodeStreamDataScalar` are the original
+word by word decoders using struct.unpack and twos_comp. :meth:`LockDataDecoder.decodeScopeData` and
+:meth:`LockDataDecoder.decodeStreamData` produce identical results, they read the whole buffer as an array,
+stream records with the structured dtype streamRecordDtype, and sign extend with shifts. decodeStreamData leaves
+the records as they are in StreamData, the StreamDataItems are created from their columns when it is unpickled.
+"""
+import logging
+import struct
+
+import numpy
+
+from pulser.DataFifoDecoder import sliceview, sliceview_remainder
+
+
+def twos_comp(val, bits):
+    """compute the 2's compliment of int value val"""
+    if( (val&(1<<(bits-1))) != 0 ):
+        val -= 1 << bits
+    return val
+
+
+def signExtend(values, bits):
+    """interpret the lower bits of the uint64 values as 2's complement, returns int64"""
+    shift = 64 - bits
+    return (values << numpy.uint64(shift)).view(numpy.int64) >> numpy.int64(shift)
+
+
+class StreamDataItem:
+    def __init__(self):
+        self.samples = 0
+        self.errorSigSum = 0
+        self.errorSigMin = 0
+        self.errorSigMax = 0
+        self.errorSigSumSq = 0;
+        self.freqSum = 0
+        self.freqMin = 0
+        self.freqMax = 0
+
+
+class StreamData(list):
+    """StreamDataItems decoded from the stream pipe.
+
+    decodeStreamData only collects the aligned records with samples in records. They are pickled as they are and
+    turned into StreamDataItems in the process receiving them, the controller process does not create any items.
+    """
+    def __init__(self):
+        super(StreamData, self).__init__(self)
+        self.overrun = False
+        self.records = None
+
+    def addRecords(self, records):
+        self.records = records if self.records is None else numpy.concatenate((self.records, records))
+
+    def unpackRecords(self):
+        """append the StreamDataItems of the collected records"""
+        if self.records is not None:
+            self.extend(streamItems(self.records))
+            self.records = None
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('records', None)
+        self.unpackRecords()
+
+
+class ScopeData:
+    def __init__(self):
+        self.errorSig = list()
+        self.frequency = list()
+
+
+class AlignmentException( Exception):
+    def __init__(self, length):
+        super(AlignmentException, self).__init__()
+        self.length = length
+
+
+streamRecordDtype = numpy.dtype([('errorsig', numpy.uint64), ('errorSigMax', numpy.int16), ('errorSigMin', numpy.int16),
+                                 ('samples', numpy.uint32), ('freq0', numpy.uint64), ('freq1', numpy.uint64),
+                                 ('freq2', numpy.uint64), ('errorSigSumSq', numpy.uint64), ('externalMax', numpy.uint16),
+                                 ('externalMin', numpy.uint16), ('externalCount', numpy.uint32), ('externalSum', numpy.uint64)])
+streamRecordSize = streamRecordDtype.itemsize
+
+_scopeEnd = numpy.uint64(0xffffffffffffffff)
+_56 = numpy.uint64(56)
+_48 = numpy.uint64(48)
+_46 = numpy.uint64(46)
+_mask2 = numpy.uint64(0x3)
+_mask44 = numpy.uint64(0xfffffffffff)
+
+
+class LockDataDecoder(object):
+    """Mixin decoding the scope and stream pipes.
+
+    The class using it has to provide scopeData, scopeEnabled, streamData, streamBuffer and dataQueue.
+    """
+    def queueScopeData(self):
+        self.dataQueue.put( self.scopeData )
+        logging.getLogger(__name__).debug("sent data {0}".format(len(self.scopeData.errorSig)))
+        self.scopeData = ScopeData()
+        self.scopeEnabled = False
+
+    def decodeScopeDataScalar(self, data):
+        """decode the scope words one by one"""
+        for s in sliceview(data, 8):
+            (code, ) = struct.unpack('Q', s)
+            if code==0xffffffffffffffff:
+                self.queueScopeData()
+            else:
+                self.scopeData.errorSig.append( twos_comp(code >> 48, 16) )
+                self.scopeData.frequency.append( twos_comp(code & 0x7fffffffffff, 47) )
+
+    def decodeScopeData(self, data):
+        """decode the scope words in bulk, equivalent to decodeScopeDataScalar"""
+        words = numpy.frombuffer(data, dtype=numpy.uint64, count=len(data) // 8)
+        errorSig = signExtend(words >> _48, 16)
+        frequency = signExtend(words, 47)
+        position = 0
+        ends = numpy.flatnonzero(words == _scopeEnd).tolist()
+        for end in ends + [len(words)]:
+            self.scopeData.errorSig.extend(errorSig[position:end].tolist())
+            self.scopeData.frequency.extend(frequency[position:end].tolist())
+            if end < len(words):
+                self.queueScopeData()
+            position = end + 1
+
+    def queueStreamData(self):
+        if len(self.streamData)>0 or self.streamData.records is not None:
+            self.dataQueue.put( self.streamData )
+            self.streamData = StreamData()
+
+    def decodeStreamDataScalar(self, data):
+        """decode the stream records one by one"""
+        logger = logging.getLogger(__name__)
+        self.streamBuffer.extend( data )
+        while len(self.streamBuffer)>=streamRecordSize:
+            try:
+                for index, itembuffer in enumerate(sliceview(self.streamBuffer, streamRecordSize)):
+                    self.unpackStreamRecord(itembuffer, index)
+                self.queueStreamData()
+                self.streamBuffer = bytearray( sliceview_remainder(self.streamBuffer, streamRecordSize) )
+            except AlignmentException as e:
+                logger.info("data not aligned skipping 2 bytes")
+                self.streamBuffer = bytearray( self.streamBuffer[e.length*streamRecordSize+2:] )  # e.length holds the number of successfully read records
+
+    def unpackStreamRecord(self, itembuffer, index=0):
+        item = StreamDataItem()
+        (errorsig, item.errorSigMax, item.errorSigMin, item.samples, freq0, freq1, freq2, item.errorSigSumSq,
+         item.externalMax, item.externalMin, item.externalCount, externalSum) = struct.unpack('QhhIQQQQHHIQ', itembuffer)
+        item.lockStatus = (externalSum >> 46) & 0x3
+        item.externalMax &= 0xffff
+        item.externalMin &= 0xffff
+        if errorsig & 0xffff000000000000 != 0xfefe000000000000 or freq2 &  0xffff000000000000 != 0xefef000000000000:
+            raise AlignmentException(index)
+        if item.samples>0:
+            item.errorSigSum = twos_comp( (errorsig&0xffffffffffff), 48)
+            item.freqMin = twos_comp( freq1 & 0xffffffffffff, 48 )
+            item.freqMax = twos_comp( freq2 & 0xffffffffffff, 48 )
+            item.freqSum = twos_comp( (freq0 <<8) | (freq1 >> 56), 72 )
+            item.externalSum = externalSum & 0xfffffffffff
+            self.streamData.append(item)
+
+    def decodeStreamData(self, data):
+        """decode the stream records in bulk, equivalent to decodeStreamDataScalar"""
+        logger = logging.getLogger(__name__)
+        self.streamBuffer.extend( data )
+        while len(self.streamBuffer)>=streamRecordSize:
+            count = len(self.streamBuffer) // streamRecordSize
+            records = numpy.frombuffer(bytes(self.streamBuffer[:count * streamRecordSize]), dtype=streamRecordDtype)
+            aligned = ((records['errorsig'] >> _48) == 0xfefe) & ((records['freq2'] >> _48) == 0xefef)
+            length = int(numpy.argmin(aligned)) if not aligned.all() else count
+            self.appendStreamRecords(records[:length])
+            if length < count:
+                logger.info("data not aligned skipping 2 bytes")
+                self.streamBuffer = bytearray( self.streamBuffer[length*streamRecordSize+2:] )
+            else:
+                self.queueStreamData()
+                self.streamBuffer = bytearray( sliceview_remainder(self.streamBuffer, streamRecordSize) )
+
+    def appendStreamRecords(self, records):
+        """collect the aligned records with samples"""
+        records = records[records['samples'] > 0]
+        if len(records) > 0:
+            self.streamData.addRecords(records)
+
+
+def streamItems(records):
+    """StreamDataItems of the aligned stream records, equivalent to unpackStreamRecord"""
+    freqSumHigh = records['freq0'].view(numpy.int64)
+    freqSumLow = (records['freq1'] >> _56).astype(numpy.int64)
+    if ((freqSumHigh >= -(1 << 55)) & (freqSumHigh < (1 << 55))).all():
+        freqSum = ((freqSumHigh << numpy.int64(8)) | freqSumLow).tolist()
+    else:  # the 72 bit sum does not fit into int64
+        freqSum = [high << 8 | low for high, low in zip(freqSumHigh.tolist(), freqSumLow.tolist())]
+    externalSum = records['externalSum']
+    columns = dict(samples=records['samples'], errorSigMax=records['errorSigMax'], errorSigMin=records['errorSigMin'],
+                   errorSigSum=signExtend(records['errorsig'], 48), errorSigSumSq=records['errorSigSumSq'],
+                   freqMin=signExtend(records['freq1'], 48), freqMax=signExtend(records['freq2'], 48),
+                   externalMax=records['externalMax'], externalMin=records['externalMin'],
+                   externalCount=records['externalCount'], externalSum=externalSum & _mask44,
+                   lockStatus=(externalSum >> _46) & _mask2)
+    names = list(columns.keys()) + ['freqSum']
+    items = [StreamDataItem() for _ in range(len(records))]
+    for item, values in zip(items, zip(*([column.tolist() for column in columns.values()] + [freqSum]))):
+        item.__dict__.update(zip(names, values))
+    return items
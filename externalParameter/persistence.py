@@ -46,6 +46,14 @@ class DBPersist:
     def paramDef(self):
         return []
 
+    @staticmethod
+    def shutdown():
+        """store all values still waiting in the persistence engines"""
+        for e in DBPersist.engines or []:
+            shutdown = getattr(e, 'shutdown', None)     # not every engine buffers values
+            if shutdown is not None:
+                shutdown()
+
     def sourceDict(self):
         d = dict()
         for e in DBPersist.engines:
@@ -69,7 +77,7 @@ class SQLDBPersist:
     def initDB(self):
         dbConnection = getProject().dbConnection
         if SQLDBPersist.store is None:
-            SQLDBPersist.store = ValueHistoryStore(dbConnection)
+            SQLDBPersist.store = ValueHistoryStore(dbConnection, writeBehind=True)
             SQLDBPersist.store.open_session()
         self.initialized = True
         
@@ -87,6 +95,10 @@ class SQLDBPersist:
     def paramDef(self):
         return []
 
+    def shutdown(self):
+        if SQLDBPersist.store is not None:
+            SQLDBPersist.store.close_session()
+
     def sourceDict(self):
         if not self.initialized:
             self.initDB()
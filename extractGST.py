@@ -70,7 +70,7 @@ def fix_timestamps(qubit_data, offset, scaling=5):
         for key, value in v.items():
             if key.endswith("_ts") and value:
                 if isinstance(value[0], int):
-                    value[:] = [t * scaling + offset for t in value]
+                    value = v[key] = [t * scaling + offset for t in value]
                     min_ts = min(min_ts, min(value))
                     max_ts = max(max_ts, max(value))
                 else:
@@ -4,10 +4,12 @@
 # in the file "license.txt" in the top-level IonControl directory
 # *****************************************************************
 import logging
+from itertools import chain
+
+import numpy
 
 from modules.Expression import Expression
 from modules.quantity import Q, is_Q
-from itertools import zip_longest
 
 
 class GateSequenceCompilerException(Exception):
@@ -15,53 +17,108 @@ class GateSequenceCompilerException(Exception):
 
 
 class GateSequenceCompiler(object):
+    """Compile gate sequences into the data written to the pulser RAM
+
+    The compiled gates are kept in one array gateTable, gate i occupying gateLength[i] words starting at
+    gateOffset[i]. Sequences are encoded as arrays of gate indices, the RAM data of all sequences is gathered
+    from the gate table and packed in bulk. The last result is memoized for unchanged gates, sequence list and
+    pack width. Sequence lists are expected to be replaced, not modified in place, when they change.
+    """
     expression = Expression()
     def __init__(self, pulseProgram ):
         self.pulseProgram = pulseProgram
         self.compiledGates = dict()
+        self.gateIndex = dict()
+        self.gateTable = numpy.zeros(0, dtype=numpy.uint64)
+        self.gateOffset = numpy.zeros(0, dtype=numpy.int64)
+        self.gateLength = numpy.zeros(0, dtype=numpy.int64)
+        self.pulseListLength = 1
+        self._encoded = (None, None, None, None)        # sequence list, gate index, gate indices, sequence lengths
+        self._memo = (None, None, None, None)           # sequence list, gate table key, addresses, data
 
     """Compile all gate sequences into binary representation
         returns tuple of start address list and bytearray data"""
 
     def gateSequencesCompile(self, gatesets, packDataWidth):
         logger = logging.getLogger(__name__)
-        logger.info("compiling {0} gateSequences.".format(len(gatesets.sequenceList)))
+        sequenceList = gatesets.sequenceList
         self.gateCompile(gatesets.gateDefinition)
-        addresses = list()
-        data = list()
-        index = 0
-        for gatestring in gatesets.sequenceList:
-            gatestringdata = self.gateSequenceCompile(gatestring, packDataWidth)
-            addresses.append(index)
-            data.extend(gatestringdata)
-            index += len(gatestringdata) * 8
-        return addresses, data
+        key = (self.gateTable.tobytes(), tuple(self.gateLength), self.pulseListLength, packDataWidth)
+        memoList, memoKey, addresses, data = self._memo
+        if memoList is sequenceList and memoKey == key:
+            logger.info("using compiled {0} gateSequences.".format(len(sequenceList)))
+        else:
+            logger.info("compiling {0} gateSequences.".format(len(sequenceList)))
+            encodedList, encodedIndex, indices, sequenceLength = self._encoded
+            if encodedList is not sequenceList or encodedIndex != self.gateIndex:
+                indices, sequenceLength = self.encodeSequences(sequenceList)
+                self._encoded = (sequenceList, self.gateIndex, indices, sequenceLength)
+            addresses, data = self.compileEncoded(indices, sequenceLength, packDataWidth)
+            self._memo = (sequenceList, key, addresses, data)
+        return addresses.tolist(), data.tolist()
+
+    def encodeSequences(self, sequenceList):
+        """gate indices of all sequences concatenated and the number of gates in each sequence"""
+        try:
+            indices = numpy.fromiter(map(self.gateIndex.__getitem__, chain.from_iterable(sequenceList)), dtype=numpy.int64)
+        except KeyError as e:
+            raise GateSequenceCompilerException("Gate {0} is not defined".format(e))
+        sequenceLength = numpy.fromiter(map(len, sequenceList), dtype=numpy.int64, count=len(sequenceList))
+        return indices, sequenceLength
+
+    def compileEncoded(self, indices, sequenceLength, packWidth):
+        """start addresses and data, each sequence is stored as its length followed by its packed words"""
+        wordLength = self.gateLength[indices]
+        wordBoundary = numpy.concatenate(([0], numpy.cumsum(wordLength)))
+        # words of all gates gathered from the gate table
+        data = self.gateTable[numpy.arange(wordBoundary[-1]) + numpy.repeat(self.gateOffset[indices] - wordBoundary[:-1], wordLength)]
+        gateEnd = numpy.cumsum(sequenceLength)
+        sequenceWords = wordBoundary[gateEnd] - wordBoundary[gateEnd - sequenceLength]
+        packedLength = -(-sequenceWords // self.chunkSize(packWidth))
+        packed = self.packArray(data, packWidth, sequenceWords, packedLength)
+        # interleave the length of each sequence with its packed data
+        outputStart = numpy.cumsum(packedLength + 1) - packedLength - 1
+        packedStart = numpy.cumsum(packedLength) - packedLength
+        output = numpy.zeros(len(packed) + len(sequenceLength), dtype=numpy.uint64)
+        output[outputStart] = sequenceWords // self.pulseListLength
+        output[numpy.arange(len(packed)) + numpy.repeat(outputStart + 1 - packedStart, packedLength)] = packed
+        return outputStart * 8, output
 
     @staticmethod
-    def packData(data, width):
+    def chunkSize(width):
         if width == 0 or width == 64:
-            return data
+            return 1
         if 64 % width != 0:
             raise AttributeError("width must be factor of 64")
-        chunk_size = 64 // width
-        packed_data = list()
-        args = [iter(data)] * chunk_size
-        for chunk in zip_longest(*args, fillvalue=0):
-            p = 0
-            for i, value in enumerate(chunk):
-                p |= value << (i * width)
-            packed_data.append(p)
-        return packed_data
+        return 64 // width
+
+    @staticmethod
+    def packArray(data, width, sequenceWords=None, packedLength=None):
+        """pack width bit values of data into 64 bit words, every sequence starts a new word"""
+        chunkSize = GateSequenceCompiler.chunkSize(width)
+        if chunkSize == 1:
+            return data
+        if sequenceWords is None:
+            sequenceWords = numpy.array([len(data)])
+            packedLength = -(-sequenceWords // chunkSize)
+        paddedStart = numpy.cumsum(packedLength * chunkSize) - packedLength * chunkSize
+        wordStart = numpy.cumsum(sequenceWords) - sequenceWords
+        padded = numpy.zeros(int(packedLength.sum()) * chunkSize, dtype=numpy.uint64)
+        padded[numpy.arange(len(data)) + numpy.repeat(paddedStart - wordStart, sequenceWords)] = data
+        shifts = numpy.arange(chunkSize, dtype=numpy.uint64) * numpy.uint64(width)
+        return numpy.bitwise_or.reduce(padded.reshape(-1, chunkSize) << shifts, axis=1)
+
+    @staticmethod
+    def packData(data, width):
+        if width == 0 or width == 64:
+            return data
+        return GateSequenceCompiler.packArray(numpy.array(data, dtype=numpy.uint64), width).tolist()
 
     """Compile one gateset into its binary representation"""
     def gateSequenceCompile(self, gate_string, packWidth):
-        data = list()
-        length = 0
-        for gate in gate_string:
-            thisCompiledGate = self.compiledGates[gate]
-            data.extend(thisCompiledGate)
-            length += len(thisCompiledGate) // self.pulseListLength
-        return [length] + self.packData(data, packWidth)
+        indices, sequenceLength = self.encodeSequences([gate_string])
+        _, data = self.compileEncoded(indices, sequenceLength, packWidth)
+        return data.tolist()
 
     """Compile each gate definition into its binary representation"""
     def gateCompile(self, gateDefinition ):
@@ -69,6 +126,7 @@ class GateSequenceCompiler(object):
         variables = self.pulseProgram.variables()
         pulseList = list(gateDefinition.PulseDefinition.values())
         self.pulseListLength = len(pulseList)
+        compiledGates = dict()
         for gatename, gate in gateDefinition.Gates.items():  # for all defined gates
             data = list()
             gateLength = 0
@@ -81,8 +139,13 @@ class GateSequenceCompiler(object):
                 gateLength += 1
             if gateLength % self.pulseListLength != 0:
                 raise GateSequenceCompilerException("In gate {0} number of entries ({1}) is not a multiple of the pulse definition length ({2})".format(gatename, gateLength, self.pulseListLength))
-            self.compiledGates[gatename] = data
+            compiledGates[gatename] = data
             logger.info( "compiled {0} to {1}".format(gatename, data) )
+        self.compiledGates = compiledGates
+        self.gateIndex = dict((name, index) for index, name in enumerate(compiledGates))
+        self.gateLength = numpy.array([len(data) for data in compiledGates.values()], dtype=numpy.int64)
+        self.gateOffset = numpy.cumsum(self.gateLength) - self.gateLength
+        self.gateTable = numpy.array([value for data in compiledGates.values() for value in data], dtype=numpy.uint64)
 
 
 if __name__=="__main__":
@@ -290,6 +290,8 @@ class MeasurementLogUi(Form, Base ):
         ysource, yspace, yname = yDataDef
         selectedRows = set(unique([ i.row() for i in self.measurementTableView.selectedIndexes() ]))
         selectedRows = None if len(selectedRows)<2 else selectedRows
+        if not selectedRows:
+            self.container.fetchAll()   # plot all measurements in the time range, not only the loaded pages
         for index, measurement in enumerate(self.measurementModel.measurements):
             if not selectedRows or index in selectedRows:
                 xData, _, _ = self.sourceLookup[xsource](measurement, xspace, xname)
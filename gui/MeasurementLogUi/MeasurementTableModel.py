@@ -170,6 +170,13 @@ class MeasurementTableModel(QtCore.QAbstractTableModel):
         
     def rowCount(self, parent=QtCore.QModelIndex()): 
         return len(self.measurements) 
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return self.container is not None and self.container.canFetchMore()
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        """the view asks for the next page when scrolled to the end, the rows are inserted by the container"""
+        self.container.fetchMore()
         
     def columnCount(self, parent=QtCore.QModelIndex()): 
         return self.coreColumnCount + len(self.extraColumns)
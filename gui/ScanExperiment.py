@@ -47,8 +47,10 @@ from trace.PlottedStructure import PlottedStructure
 from .AverageViewTable import AverageViewTable
 from . import MainWindowWidget
 from trace import RawData
+from pulser.RawDataFile import RawDataWriter
 from scan.ScanControl import ScanControl
 from scan.EvaluationControl import EvaluationControl
+from scan.EvaluationWorker import EvaluationWorker
 from .ScanProgress import ScanProgress
 from fit.FitUi import FitUi
 from modules import DataDirectory
@@ -59,7 +61,7 @@ from trace.TraceCollection import TraceCollection
 from uiModules.CoordinatePlotWidget import CoordinatePlotWidget
 from modules import WeakMethod
 from modules.SceneToPrint import SceneToPrint
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from gui.ScanMethods import ScanMethodsDict, ScanException, ExternalScanMethod
 from gui.ScanGenerators import GeneratorList
 from modules.quantity import is_Q, Q
@@ -86,7 +88,8 @@ class ScanExperimentContext(object):
     It is used in order to implement the ability to stash and resumea ScanExperiment"""
     def __init__(self):
         self.plottedTraceList = list()
-        self.currentIndex = 0
+        self.currentIndex = 0      # index of the next point delivered by the evaluation worker
+        self.submitIndex = 0       # index of the next point handed to the evaluation worker
         self.histogramCurveList = list()
         self.currentTimestampTrace = None
         self.histogramList = list()
@@ -121,6 +124,10 @@ class ScanExperimentContext(object):
     def __str__(self):
         return "{0} ({1}/{2}) started {3}".format(self.scan.settingsName, self.currentIndex, len(self.scan.list), datetime.fromtimestamp(self.startTime))
 
+
+PointEvaluation = namedtuple('PointEvaluation', 'evaluated qubitResults detailResults histograms timestampHistogram')
+
+
 class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
     StatusMessage = QtCore.pyqtSignal( str )
     ClearStatusMessage = QtCore.pyqtSignal()
@@ -173,6 +180,7 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
         if self.interlock:
             self.interlock.subscribe(self.onInterlock, "Scan")
         self.interlockPaused = False
+        self.evaluationWorker = EvaluationWorker(parent=self)
 
     def onInterlock(self, context, status):
         if status == LockStatus.Locked:
@@ -372,6 +380,9 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
     def onStart(self, globalOverrides=list()):
         logging.getLogger(__name__).debug("globalOverrides: {0}".format(globalOverrides))
         self.interlockPaused = False
+        if self.context.scanMethod is not None:
+            self.context.scanMethod.releasePendingData()
+        self.evaluationWorker.clear()
         self.context.globalOverrides = globalOverrides
         self.context.analysisName = self.analysisControlWidget.currentAnalysisName
         self.context.overrideGlobals(self.globalVariables)
@@ -392,7 +403,7 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
         else:
             self.callWhenDoneAdjusting(self.startScan)
         if self.context.scan.saveRawData and self.context.scan.rawFilename:
-            self.context.rawDataFile = open(DataDirectory.DataDirectory().sequencefile(self.context.scan.rawFilename)[0], 'w')
+            self.context.rawDataFile = RawDataWriter(DataDirectory.DataDirectory().sequencefile(self.context.scan.rawFilename)[0])
         self.context.dataFinalized = False
 
     def startScan(self):
@@ -453,6 +464,8 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
     def onPause(self):
         logger = logging.getLogger(__name__)
         if self.progressUi.state in [self.OpStates.paused, self.OpStates.interrupted]:
+            self.evaluationWorker.flush()
+            self.context.submitIndex = self.context.currentIndex
             self.pulserHardware.ppFlushData()
             self.pulserHardware.ppClearWriteFifo()
             self.pulserHardware.ppWriteDataBuffered(self.context.generator.restartCode(self.context.currentIndex))
@@ -499,6 +512,7 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
 
     def resumeBottomHalf(self):
         logger = logging.getLogger(__name__)
+        self.context.submitIndex = self.context.currentIndex
         self.pulserHardware.ppFlushData()
         self.pulserHardware.ppClearWriteFifo()
         self.pulserHardware.ppWriteDataBuffered(self.context.generator.restartCode(self.context.currentIndex))
@@ -565,11 +579,13 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
             if data.final:
                 if data.exitcode == 0x100000000000:  # interrupt
                     self.processData(data, 0)
+                    self.evaluationWorker.flush()
                     self.onStashBottomHalf()
                 elif data.exitcode not in [0, 0xffff]:
                     self.onInterrupt(self.pulseProgramUi.exitcode(data.exitcode))
                 else:
                     self.processData(data, 0)
+                    self.evaluationWorker.flush()
             else:
                 self.processData(data, queue_size)
         else:
@@ -581,43 +597,63 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
             logger.debug("onData {0} {1} {2} {3}".format(self.context.currentIndex,
                                                         dict((i, len(data.count[i])) for i in sorted(data.count.keys())),
                                                         data.scanvalue, queue_size))
-        x = self.context.generator.xValue(self.context.currentIndex, data)
+        index = self.context.submitIndex   # currentIndex lags behind while points are evaluated
+        self.context.submitIndex += 1
+        x = self.context.generator.xValue(index, data)
+        gateSequence = self.context.generator.xKey(index)
         if self.context.rawDataFile is not None:
-            self.context.rawDataFile.write(data.dataString())
-            self.context.rawDataFile.write('\n')
-            self.context.rawDataFile.flush()
-        self.context.scanMethod.onData(data, queue_size, x)
+            self.context.rawDataFile.record(data)
+        self.pulserHardware.retainData(data)   # released by the evaluation worker once the point is displayed
+        self.context.scanMethod.onData(data, queue_size, x, gateSequence)
 
-    def dataMiddlePart(self, data, queue_size, x):
+    def dataMiddlePart(self, data, queue_size, x, gateSequence):
+        """Evaluate the point in the evaluation worker, the results are displayed in scan order by dataEvaluatedPart.
+        x and gateSequence belong to the point, they are determined when it is submitted."""
         if is_Q(x):
             x = x.m_as(self.context.scan.xUnit)
-        logger = logging.getLogger(__name__)
-        evaluated = list()
         replacementDict = dict(iter(list(self.pulseProgramUi.currentContext.parameters.valueView.items())))
-        for evaluation, algo in zip(self.context.evaluation.evalList, self.context.evaluation.evalAlgorithmList):
-            evaluated.append(algo.evaluate(data, evaluation, ppDict=replacementDict,
+        threaded = self.evaluationWorker.threadSafe(self.context.evaluation.evalAlgorithmList)
+        self.evaluationWorker.submit(functools.partial(self.evaluatePoint, data, self.context.evaluation, replacementDict),
+                                     functools.partial(self.dataEvaluatedPart, data, queue_size, x, gateSequence),
+                                     threaded=threaded, finalize=functools.partial(self.pulserHardware.releaseData, data))
+
+    def evaluatePoint(self, data, evaluation, replacementDict):
+        """run all evaluations, qubit evaluations and histograms of one point, does not touch the gui"""
+        evaluated = list()
+        qubitResults = list()
+        detailResults = list()
+        histograms = list()
+        for ev, algo in zip(evaluation.evalList, evaluation.evalAlgorithmList):
+            evaluated.append(algo.evaluate(data, ev, ppDict=replacementDict,
                                            globalDict=self.globalVariables))  # returns mean, error, raw
         # qubit evaluation
-        gateSequence = self.context.generator.xKey(self.context.currentIndex)
-        for evaluation, algo in zip(self.context.evaluation.evalList, self.context.evaluation.evalAlgorithmList):
+        for ev, algo in zip(evaluation.evalList, evaluation.evalAlgorithmList):
             if hasattr(algo, 'qubitEvaluate'):
-                self.context.qubitData.extend(gateSequence,
-                                              evaluation.name, evaluation.settings['color_box_plot'],
-                                              *algo.qubitEvaluate(data, evaluation, ppDict=replacementDict,
-                                                                  globalDict=self.globalVariables))
+                qubitResults.append((ev, algo.qubitEvaluate(data, ev, ppDict=replacementDict, globalDict=self.globalVariables)))
             if hasattr(algo, 'detailEvaluate'):
-                self.context.qubitData.extendEnv(gateSequence, evaluation.name,
-                                                 *algo.detailEvaluate(data, evaluation, ppDict=replacementDict,
-                                                                      globalDict=self.globalVariables))
+                detailResults.append((ev, algo.detailEvaluate(data, ev, ppDict=replacementDict, globalDict=self.globalVariables)))
+        if len(evaluated) > 0:
+            histograms = self.evaluateHistograms(data, evaluation.evalList, evaluation.evalAlgorithmList, evaluation.histogramBins)
+        timestampHistogram = self.timestampHistogram(data, evaluation) if evaluation.enableTimestamps and self.timestampsEnabled else None
+        return PointEvaluation(evaluated, qubitResults, detailResults, histograms, timestampHistogram)
+
+    def dataEvaluatedPart(self, data, queue_size, x, gateSequence, pointEvaluation):
+        logger = logging.getLogger(__name__)
+        evaluated = pointEvaluation.evaluated
+        for evaluation, result in pointEvaluation.qubitResults:
+            self.context.qubitData.extend(gateSequence, evaluation.name, evaluation.settings['color_box_plot'], *result)
+        for evaluation, result in pointEvaluation.detailResults:
+            self.context.qubitData.extendEnv(gateSequence, evaluation.name, *result)
         if len(evaluated) > 0:
             self.displayUi.add([e.value for e in evaluated])
             self.updateMainGraph(x, evaluated, data.timeinterval, queue_size)
-            self.showHistogram(data, self.context.evaluation.evalList, self.context.evaluation.evalAlgorithmList)
+            self.showHistogram(data, self.context.evaluation.evalList, self.context.evaluation.evalAlgorithmList,
+                               histograms=pointEvaluation.histograms)
         if data.other:
             logger.info("Other: {0}".format(data.other))
         self.context.currentIndex += 1
-        if self.context.evaluation.enableTimestamps and self.timestampsEnabled:
-            self.showTimestamps(data)
+        if pointEvaluation.timestampHistogram is not None:
+            self.showTimestamps(data, histogram=pointEvaluation.timestampHistogram)
         self.context.scanMethod.prepareNextPoint(data)
         names = [self.context.evaluation.ev.name for self.context.evaluation.ev in self.context.evaluation.evalList]
         results = [(x, res.value) for res in evaluated]
@@ -711,8 +747,10 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
                 for plottedTrace in self.context.plottedTraceList:
                     plottedTrace.replot()
                 self.last_plot_time = time.time()
+        self.context.plottedTraceList[0].traceCollection.appendSave()
 
     def finalizeData(self, reason='end of scan'):
+        self.evaluationWorker.flush()
         if not self.context.dataFinalized:  # is not yet finalized
             logger = logging.getLogger(__name__)
             logger.info( "finalize Data reason: {0}".format(reason) )
@@ -744,14 +782,17 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
         return self.analysisControlWidget.analyze(dict(((evaluation.name, plottedTrace) for evaluation, plottedTrace in zip(self.context.evaluation.evalList, self.context.plottedTraceList))))
                 
             
-    def showTimestamps(self, data):
-        bins = int(self.context.evaluation.roiWidth / self.context.evaluation.binwidth)
+    def timestampHistogram(self, data, evaluation):
+        bins = int(evaluation.roiWidth / evaluation.binwidth)
         multiplier = self.pulserHardware.timestep.m_as('ms')
-        myrange = (self.context.evaluation.roiStart.m_as('ms')/multiplier, (self.context.evaluation.roiStart+self.context.evaluation.roiWidth).m_as('ms')/multiplier)
-        y, x = numpy.histogram(list(itertools.chain(*data.timestamp[self.context.evaluation.timestampsKey])),
+        myrange = (evaluation.roiStart.m_as('ms')/multiplier, (evaluation.roiStart+evaluation.roiWidth).m_as('ms')/multiplier)
+        y, x = numpy.histogram(data.timestamp[evaluation.timestampsKey].values,
                                range=myrange,
                                bins=bins)
-        x = x[0:-1] * multiplier
+        return y, x[0:-1] * multiplier
+
+    def showTimestamps(self, data, histogram=None):
+        y, x = histogram if histogram is not None else self.timestampHistogram(data, self.context.evaluation)
                                 
         if self.context.currentTimestampTrace and numpy.array_equal(self.context.currentTimestampTrace.x, x) and (
             self.context.evaluation.integrateTimestamps == self.evaluationControlWidget.integrationMode.IntegrateAll or
@@ -777,11 +818,20 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
             # self.plottedTimestampTrace.trace.header = '\n'.join((pulseProgramHeader, scanHeader))
         self.timestampsNewRun = False                       
         
-    def showHistogram(self, data, evalList, evalAlgoList ):
+    @staticmethod
+    def evaluateHistograms(data, evalList, evalAlgoList, histogramBins):
+        """histograms (y, x, function) of all evaluations that show a histogram"""
+        return [algo.histogram(data, evaluation, histogramBins)
+                for evaluation, algo in zip(evalList, evalAlgoList) if evaluation.showHistogram]
+
+    def showHistogram(self, data, evalList, evalAlgoList, histograms=None):
+        if histograms is None:
+            histograms = self.evaluateHistograms(data, evalList, evalAlgoList, self.context.evaluation.histogramBins)
+        histograms = iter(histograms)
         index = 0
-        for evaluation, algo in zip(evalList, evalAlgoList):
+        for evaluation in evalList:
             if evaluation.showHistogram:
-                y, x, function = algo.histogram( data, evaluation, self.context.evaluation.histogramBins )
+                y, x, function = next(histograms)
                 if self.context.evaluation.integrateHistogram and len(self.context.histogramList)>index:
                     self.context.histogramList[index] = (self.context.histogramList[index][0] + y, self.context.histogramList[index][1], evaluation.name, None )
                 elif len(self.context.histogramList)>index:
@@ -954,6 +1004,7 @@ class ScanExperiment(ScanExperimentForm, MainWindowWidget.MainWindowWidget):
         self.analysisControlWidget.saveConfig()
         
     def onClose(self):
+        self.evaluationWorker.shutdown()
         self.traceui.exitSignal.emit()
         self.namedTraceui.exitSignal.emit()
         self.namedTraceui.onClose()
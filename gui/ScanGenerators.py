@@ -141,15 +141,20 @@ class StepInPlaceGenerator(ScanGeneratorBase):
                     if error is not None:
                         trace.bottom.append(error[0])
                         trace.top.append(error[1])
-            else:
-                traceList[0].x = traceList[0].x[-steps+1:].append(x)
+            else:   # new columns, the reduced traces are rebuilt from the last steps points
+                traceList[0].x = traceList[0].x[-steps+1:]
+                traceList[0].x.append(x)
                 traceList[0].timeintervalAppend(timeinterval, steps)
                 for trace, (y, error, raw, valid) in zip(traceList, evaluated):
-                    trace.y = trace.y[-steps+1:].append(y)
-                    trace.raw = trace.raw[-steps+1:].append(raw)
+                    trace.y = trace.y[-steps+1:]
+                    trace.y.append(y)
+                    trace.raw = trace.raw[-steps+1:]
+                    trace.raw.append(raw)
                     if error is not None:
-                        trace.bottom = trace.bottom[-steps+1:].append(error[0])
-                        trace.top = trace.top[-steps+1:].append(error[1])
+                        trace.bottom = trace.bottom[-steps+1:]
+                        trace.bottom.append(error[0])
+                        trace.top = trace.top[-steps+1:]
+                        trace.top.append(error[1])
 
 
 class FreerunningGenerator(ScanGeneratorBase):
@@ -32,13 +32,18 @@ class InternalScanMethod(object):
         logger.info( "Starting" )
         self.experiment.pulserHardware.ppStart()
         self.experiment.context.currentIndex = 0
+        self.experiment.context.submitIndex = 0
         logger.info( "elapsed time {0}".format( time.time()-self.experiment.context.startTime ) )
 
     def onStop(self):
         self.experiment.finalizeStop()
 
-    def onData(self, data, queuesize, x ):
-        self.experiment.dataMiddlePart( data, queuesize, x )
+    def onData(self, data, queuesize, x, gateSequence ):
+        self.experiment.dataMiddlePart( data, queuesize, x, gateSequence )
+
+    def releasePendingData(self):
+        """release the retained data of points that were not handed to the evaluation"""
+        pass
 
     def onStash(self):
         self.experiment.pulserHardware.ppInterrupt()
@@ -75,6 +80,7 @@ class ExternalScanMethod(InternalScanMethod):
         self.maxUpdatesToWrite = 1
         self.parameter = None
         self.interrupt = False
+        self.awaitingData = list()   # retained data of points waiting for the external value
     
     def startScan(self):
         self.interrupt = False
@@ -97,6 +103,7 @@ class ExternalScanMethod(InternalScanMethod):
                 """We are done adjusting"""
                 self.experiment.pulserHardware.ppStart()
                 self.experiment.context.currentIndex = 0
+                self.experiment.context.submitIndex = 0
                 self.experiment.context.timestampsNewRun = True
                 logger.info("elapsed time {}, repeats {}".format(time.time() - self.experiment.context.startTime,
                                                                  self.experiment.context.scan.repeats))
@@ -110,6 +117,7 @@ class ExternalScanMethod(InternalScanMethod):
         self.interrupt = True
 
     def onStop(self):
+        self.releasePendingData()
         self.experiment.progressUi.setStopping()
         self.stopBottomHalf()
 
@@ -131,15 +139,29 @@ class ExternalScanMethod(InternalScanMethod):
                 self.experiment.finalizeStop()
                 logger.info( "Status -> Idle" )
              
-    def onData(self, data, queuesize, x ):
+    def onData(self, data, queuesize, x, gateSequence ):
         if not self.parameter.useExternalValue:
             x = self.experiment.context.generator.xValue(self.index, data)
-            self.experiment.dataMiddlePart(data, queuesize, x)
+            self.experiment.dataMiddlePart(data, queuesize, x, gateSequence)
         else:
-            self.parameter.asyncCurrentExternalValue( partial( self.experiment.dataMiddlePart, data, queuesize) )
+            self.awaitingData.append(data)
+            self.parameter.asyncCurrentExternalValue( partial( self.onExternalValue, data, queuesize, gateSequence) )
         if self.interrupt:
             self.stashMiddlePart()
 
+    def onExternalValue(self, data, queuesize, gateSequence, x):
+        """evaluate the point once its external value is known, unless its data was released in the meantime"""
+        for index, awaiting in enumerate(self.awaitingData):
+            if awaiting is data:
+                del self.awaitingData[index]
+                self.experiment.dataMiddlePart(data, queuesize, x, gateSequence)
+                return
+
+    def releasePendingData(self):
+        awaitingData, self.awaitingData = self.awaitingData, list()
+        for data in awaitingData:
+            self.experiment.pulserHardware.releaseData(data)
+
     def stashMiddlePart(self):
         logger = logging.getLogger(__name__)
         if self.experiment.progressUi.is_stashing:
@@ -7,6 +7,7 @@ import logging
 import os
 from _functools import partial
 
+import numpy
 import PyQt5.uic
 from PyQt5 import QtCore, QtWidgets
 from pyqtgraph.graphicsItems.PlotCurveItem import PlotCurveItem
@@ -18,7 +19,7 @@ from logicAnalyzer.LogicAnalyzerTraceTableModel import LogicAnalyzerTraceTableMo
 from modules import dictutil
 from modules.AttributeComparisonEquality import AttributeComparisonEquality
 from modules.GuiAppearance import restoreGuiState, saveGuiState
-from modules.Utility import flatten, unique
+from modules.Utility import unique
 from modules.concatenate_iter import concatenate_iter
 from modules.enum import enum
 from trace.pens import penList
@@ -45,7 +46,22 @@ def bitEvaluate(numChannels, thisval, lastval=None, channelOffset=0, trigger=Fal
     if lastval is None:
         return [(bit+channelOffset, 1 if thisval&(1<<bit) else offValue) for bit in range(numChannels)]
     return [(bit+channelOffset, 0 if thisval&(1<<bit)==lastval&(1<<bit) else 1 if thisval&(1<<bit) else offValue) for bit in range(numChannels)]
-   
+
+
+def bitMatrix(patterns, numChannels):
+    """bits of the patterns, one row per pattern and one column per channel"""
+    shifts = numpy.arange(numChannels, dtype=numpy.uint64)
+    return ((numpy.asarray(patterns, dtype=numpy.uint64)[:, numpy.newaxis] >> shifts) & numpy.uint64(1)).astype(numpy.int8)
+
+
+def bitEvaluateArray(numChannels, patterns, trigger=False):
+    """bitEvaluate for consecutive patterns, the first one is compared to nothing, all others to their predecessor"""
+    bits = bitMatrix(patterns, numChannels)
+    levels = numpy.where(bits == 1, 1, 0 if trigger else -1)
+    changed = numpy.ones(bits.shape, dtype=bool)
+    changed[1:] = bits[1:] != bits[:-1]
+    return numpy.where(changed, levels, 0)
+
 
 class LogicAnalyzer(Form, Base ):
     OpStates = enum('stopped', 'running', 'single', 'idle') #added idle in response to exception
@@ -115,88 +131,70 @@ class LogicAnalyzer(Form, Base ):
                 self.signalTableModel.setData( self.signalTableModel.createIndex(row, 0), QtCore.Qt.Checked if show else QtCore.Qt.Unchecked, QtCore.Qt.CheckStateRole )
             self.signalTableModel.dataChanged.emit( self.signalTableModel.createIndex(rows[0], 0), self.signalTableModel.createIndex(rows[-1], 0))
         
+    def channelBundle(self, patterns, numChannels, channelOffset, offset):
+        """step curves of the enabled channels, None for disabled channels"""
+        bits = bitMatrix(patterns, numChannels)
+        bundle = list()
+        for i in range(numChannels):
+            if self.signalTableModel.enabledList[channelOffset+i]:
+                bundle.append(offset + self.settings.height * bits[:, i])
+                offset += 1
+            else:
+                bundle.append(None)
+        return bundle, offset
+
     def onData(self, logicData):
         logger = logging.getLogger(__name__)
         logger.debug( str(logicData) )
         logger.debug( "Wordcount: {0}".format(logicData.wordcount))
         self.logicData = logicData
         offset = 0
-        if logicData.data:
-            self.xData, self.yData = list(zip( *logicData.data ))
-            self.xData = [ x * self.settings.scaling for x in self.xData ]  # convert tuple to list
-            self.xData.append( logicData.stopMarker * self.settings.scaling )
-            self.yDataBundle = [list() for _ in range(self.settings.numChannels)]
-            for i in range(self.settings.numChannels):
-                if self.signalTableModel.enabledList[i]:
-                    for value in self.yData:
-                        self.yDataBundle[i].append(offset+self.settings.height if value&(1<<i) else offset )
-                    offset += 1
+        stop = logicData.stopMarker * self.settings.scaling
+        if len(logicData.data):
+            self.xData = numpy.append(logicData.data['time'] * self.settings.scaling, stop)
+            self.yData = logicData.data['pattern']
+            self.yDataBundle, offset = self.channelBundle(self.yData, self.settings.numChannels, 0, offset)
         nextChannel = self.settings.numChannels
-        if logicData.auxData:
-            self.xAuxData, self.yAuxData = list(zip( *logicData.auxData ))
-            self.xAuxData = [ x * self.settings.scaling for x in self.xAuxData ]  # convert tuple to list
-            self.xAuxData.append( logicData.stopMarker * self.settings.scaling )
-            self.yAuxDataBundle = [list() for _ in range(self.settings.numAuxChannels)]
-            for i in range(self.settings.numAuxChannels):
-                if self.signalTableModel.enabledList[nextChannel+i]:
-                    for value in self.yAuxData:
-                        self.yAuxDataBundle[i].append(offset+self.settings.height if value&(1<<i) else offset )
-                    offset += 1
+        if len(logicData.auxData):
+            self.xAuxData = numpy.append(logicData.auxData['time'] * self.settings.scaling, stop)
+            self.yAuxData = logicData.auxData['pattern']
+            self.yAuxDataBundle, offset = self.channelBundle(self.yAuxData, self.settings.numAuxChannels, nextChannel, offset)
         nextChannel += self.settings.numAuxChannels
-        if logicData.trigger:
-            self.xTrigger, self.yTrigger = list(zip( *logicData.trigger ))
-            self.xTrigger = list(flatten([ (x* self.settings.scaling, x* self.settings.scaling+self.settings.triggerWidth)  for x in self.xTrigger ]))  # convert tuple to list
-            self.yTrigger = list(flatten([ (y, 0) for y in self.yTrigger ]))
-            self.xTrigger.append( logicData.stopMarker * self.settings.scaling )
-            self.yTriggerBundle = [list() for _ in range(self.settings.numTriggerChannels)]
-            for i in range(self.settings.numTriggerChannels):
-                if self.signalTableModel.enabledList[nextChannel+i]:
-                    for value in self.yTrigger:
-                        self.yTriggerBundle[i].append(offset+self.settings.height if value&(1<<i) else offset )
-                    offset += 1
+        if len(logicData.trigger):
+            triggerTime = logicData.trigger['time'] * self.settings.scaling
+            self.xTrigger = numpy.append(numpy.column_stack((triggerTime, triggerTime+self.settings.triggerWidth)).ravel(), stop)
+            self.yTrigger = numpy.column_stack((logicData.trigger['pattern'], numpy.zeros_like(logicData.trigger['pattern']))).ravel()
+            self.yTriggerBundle, offset = self.channelBundle(self.yTrigger, self.settings.numTriggerChannels, nextChannel, offset)
         nextChannel += self.settings.numTriggerChannels
-        if logicData.gateData:
-            self.xGateData, self.yGateData = list(zip( *logicData.gateData ))
-            self.xGateData = [ x * self.settings.scaling for x in self.xGateData ]  # convert tuple to list
-            self.xGateData.append( logicData.stopMarker * self.settings.scaling )
-            self.yGateDataBundle = [list() for _ in range(self.settings.numGateChannels)]
-            for i in range(self.settings.numGateChannels):
-                if self.signalTableModel.enabledList[nextChannel+i]:
-                    for value in self.yGateData:
-                        self.yGateDataBundle[i].append(offset+self.settings.height if value&(1<<i) else offset )
-                    offset += 1
+        if len(logicData.gateData):
+            self.xGateData = numpy.append(logicData.gateData['time'] * self.settings.scaling, stop)
+            self.yGateData = logicData.gateData['pattern']
+            self.yGateDataBundle, offset = self.channelBundle(self.yGateData, self.settings.numGateChannels, nextChannel, offset)
         self.plotData()
         if self.state==self.OpStates.single:
             self.setStatusStopped()
         self.evaluateData(logicData)
             
-            
+    def evaluateRecords(self, records, numChannels, channelOffset, trigger=False):
+        channels = list(range(channelOffset, channelOffset+numChannels))
+        times = (records['time'] * self.settings.scaling).tolist()
+        for time, values in zip(times, bitEvaluateArray(numChannels, records['pattern'], trigger).tolist()):
+            dictutil.getOrInsert(self.pulseData, time, dict()).update( zip(channels, values) )
+
     def evaluateData(self, logicData):
         self.pulseData = dict()
-        if logicData.data:
-            lastval = None
-            for clockcycle, value in logicData.data:
-                dictutil.getOrInsert(self.pulseData, clockcycle * self.settings.scaling, dict()).update( bitEvaluate(self.settings.numChannels, value, lastval) )
-                lastval = value
+        if len(logicData.data):
+            self.evaluateRecords(logicData.data, self.settings.numChannels, 0)
             self.pulseData[logicData.stopMarker * self.settings.scaling] = dict()
         inext = self.settings.numChannels
-        if logicData.auxData:
-            lastval = None
-            for clockcycle, value in logicData.auxData:
-                dictutil.getOrInsert(self.pulseData, clockcycle * self.settings.scaling, dict()).update( bitEvaluate(self.settings.numAuxChannels, value, lastval, inext)  )
-                lastval = value
+        if len(logicData.auxData):
+            self.evaluateRecords(logicData.auxData, self.settings.numAuxChannels, inext)
         inext += self.settings.numAuxChannels
-        if logicData.trigger:
-            lastval = None
-            for clockcycle, value in logicData.trigger:
-                dictutil.getOrInsert(self.pulseData, clockcycle * self.settings.scaling, dict()).update( bitEvaluate(self.settings.numTriggerChannels, value, lastval, inext, trigger=True) )
-                lastval = value
+        if len(logicData.trigger):
+            self.evaluateRecords(logicData.trigger, self.settings.numTriggerChannels, inext, trigger=True)
         inext += self.settings.numTriggerChannels
-        if logicData.gateData:
-            lastval = None
-            for clockcycle, value in logicData.gateData:
-                dictutil.getOrInsert(self.pulseData, clockcycle * self.settings.scaling, dict()).update( bitEvaluate(self.settings.numGateChannels, value, lastval, inext)  )
-                lastval = value
+        if len(logicData.gateData):
+            self.evaluateRecords(logicData.gateData, self.settings.numGateChannels, inext)
         self.traceTableModel.setPulseData(self.pulseData)
         self.traceTableView.resizeColumnsToContents()
            
@@ -219,7 +217,7 @@ class LogicAnalyzer(Form, Base ):
             if self.curveBundle is None:
                 self.curveBundle = list()
                 for i, yData in enumerate(self.yDataBundle):
-                    if yData:
+                    if yData is not None:
                         curve = PlotCurveItem(self.xData, yData, stepMode=True, fillLevel=offset, brush=penList[1][4], pen=penList[1][0]) 
                         self._graphicsView.addItem( curve )
                         self.curveBundle.append( curve )
@@ -232,7 +230,7 @@ class LogicAnalyzer(Form, Base ):
                         self.curveBundle.append( None )
             else:
                 for curve, yData in zip(self.curveBundle, self.yDataBundle):
-                    if yData:
+                    if yData is not None:
                         if curve:
                             curve.setData(x=self.xData, y=yData)
                             
@@ -241,7 +239,7 @@ class LogicAnalyzer(Form, Base ):
             if self.curveAuxBundle is None:
                 self.curveAuxBundle = list()
                 for i, yAuxData in enumerate(self.yAuxDataBundle):
-                    if yAuxData:
+                    if yAuxData is not None:
                         curve = PlotCurveItem(self.xAuxData, yAuxData, stepMode=True, fillLevel=offset, brush=penList[2][4], pen=penList[2][0])
                         self._graphicsView.addItem( curve )
                         self.curveAuxBundle.append( curve )
@@ -255,7 +253,7 @@ class LogicAnalyzer(Form, Base ):
                         
             else:
                 for curve, yAuxData in zip(self.curveAuxBundle, self.yAuxDataBundle):
-                    if yAuxData:
+                    if yAuxData is not None:
                         if curve:
                             curve.setData(x=self.xAuxData, y=yAuxData)
         nextChannel += self.settings.numAuxChannels
@@ -263,7 +261,7 @@ class LogicAnalyzer(Form, Base ):
             if self.curveTriggerBundle is None:
                 self.curveTriggerBundle = list()
                 for i, yTrigger in enumerate(self.yTriggerBundle):
-                    if yTrigger:
+                    if yTrigger is not None:
                         curve = PlotCurveItem(self.xTrigger, yTrigger, stepMode=True, fillLevel=offset, brush=penList[3][4], pen=penList[3][0]) 
                         self._graphicsView.addItem( curve )
                         self.curveTriggerBundle.append( curve )
@@ -277,7 +275,7 @@ class LogicAnalyzer(Form, Base ):
                         
             else:
                 for curve, yTrigger in zip(self.curveTriggerBundle, self.yTriggerBundle):
-                    if yTrigger:
+                    if yTrigger is not None:
                         if curve:
                             curve.setData(x=self.xTrigger, y=yTrigger)
         nextChannel = self.settings.numTriggerChannels
@@ -285,7 +283,7 @@ class LogicAnalyzer(Form, Base ):
             if self.curveGateBundle is None:
                 self.curveGateBundle = list()
                 for i, yGateData in enumerate(self.yGateDataBundle):
-                    if yGateData:
+                    if yGateData is not None:
                         curve = PlotCurveItem(self.xGateData, yGateData, stepMode=True, fillLevel=offset, brush=penList[2][4], pen=penList[2][0])
                         self._graphicsView.addItem( curve )
                         self.curveGateBundle.append( curve )
@@ -299,7 +297,7 @@ class LogicAnalyzer(Form, Base ):
                         
             else:
                 for curve, yGateData in zip(self.curveGateBundle, self.yGateDataBundle):
-                    if yGateData:
+                    if yGateData is not None:
                         if curve:
                             curve.setData(x=self.xGateData, y=yGateData)
         self.lastEnabledChannels = list( self.signalTableModel.enabledList )
@@ -0,0 +1,142 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Directed acyclic graph that keeps a topological order of its nodes while edges are added.
+
+Adding an edge first -> second only has work to do if second currently comes before first. Then only
+the nodes between the two positions are searched: forward from second for a path to first (a cycle)
+and backward from first, and the orders of the nodes found are exchanged (Pearce and Kelly, 2006).
+Removing edges keeps the order valid. The dependents of a set of nodes are returned in topological
+order, so each of them is recalculated once, after everything it depends on.
+"""
+from itertools import count
+
+
+class CyclicDependencyException(Exception):
+    pass
+
+
+class DependencyGraph(object):
+    def __init__(self):
+        self.children = dict()      # node -> set of nodes depending on node
+        self.parents = dict()       # node -> set of nodes node depends on
+        self.order = dict()         # node -> position in topological order
+        self._counter = count()
+
+    def copy(self):
+        new = DependencyGraph()
+        new.children = dict((node, set(children)) for node, children in self.children.items())
+        new.parents = dict((node, set(parents)) for node, parents in self.parents.items())
+        new.order = dict(self.order)
+        new._counter = count(max(self.order.values(), default=-1) + 1)
+        return new
+
+    def __contains__(self, node):
+        return node in self.order
+
+    def __len__(self):
+        return len(self.order)
+
+    def has_node(self, node):
+        return node in self.order
+
+    def add_node(self, node):
+        if node not in self.order:
+            self.order[node] = next(self._counter)
+            self.children[node] = set()
+            self.parents[node] = set()
+
+    def edges(self):
+        return [(first, second) for first, children in self.children.items() for second in children]
+
+    def add_edge(self, first, second):
+        """add the dependency of second on first, raise CyclicDependencyException if first depends on second"""
+        self.add_node(first)
+        self.add_node(second)
+        if second in self.children[first]:
+            return
+        lower, upper = self.order[second], self.order[first]
+        if first == second:
+            raise CyclicDependencyException([first])
+        if lower < upper:
+            forward = self._search(second, self.children, lambda node: self.order[node] <= upper, target=first)
+            backward = self._search(first, self.parents, lambda node: self.order[node] >= lower)
+            self._reorder(backward, forward)
+        self.children[first].add(second)
+        self.parents[second].add(first)
+
+    def remove_edge(self, first, second):
+        self.children[first].discard(second)
+        self.parents[second].discard(first)
+
+    def setDependencies(self, node, dependencies):
+        """replace the dependencies of node, the graph is unchanged if the new dependencies form a cycle"""
+        self.add_node(node)
+        old = set(self.parents[node])
+        for parent in old:
+            self.remove_edge(parent, node)
+        added = list()
+        try:
+            for parent in dependencies:
+                if parent not in self.parents[node]:
+                    self.add_edge(parent, node)
+                    added.append(parent)
+        except CyclicDependencyException:
+            for parent in added:
+                self.remove_edge(parent, node)
+            for parent in old:
+                self.add_edge(parent, node)
+            raise
+
+    def _search(self, start, adjacency, inRange, target=None):
+        visited = {start}
+        stack = [start]
+        while stack:
+            for node in adjacency[stack.pop()]:
+                if node == target:
+                    raise CyclicDependencyException(self._path(target, start))
+                if node not in visited and inRange(node):
+                    visited.add(node)
+                    stack.append(node)
+        return visited
+
+    def _path(self, first, second):
+        """path of existing edges from second to first, closing the cycle of the new edge first -> second"""
+        previous = {second: None}
+        stack = [second]
+        while stack:
+            node = stack.pop()
+            if node == first:
+                break
+            for child in self.children[node]:
+                if child not in previous:
+                    previous[child] = node
+                    stack.append(child)
+        path = [first]
+        while path[-1] != second:
+            path.append(previous[path[-1]])
+        return path[::-1]
+
+    def _reorder(self, backward, forward):
+        """move the nodes reaching first before the nodes reachable from second, reusing their positions"""
+        nodes = sorted(backward, key=self.order.get) + sorted(forward, key=self.order.get)
+        positions = sorted(self.order[node] for node in nodes)
+        for node, position in zip(nodes, positions):
+            self.order[node] = position
+
+    def descendants(self, nodes):
+        """all nodes depending directly or indirectly on any of nodes, in topological order"""
+        found = set()
+        stack = [node for node in nodes if node in self.order]
+        while stack:
+            for child in self.children[stack.pop()]:
+                if child not in found:
+                    found.add(child)
+                    stack.append(child)
+        return sorted(found, key=self.order.get)
+
+    def topologicalOrder(self):
+        return sorted(self.order, key=self.order.get)
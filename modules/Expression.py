@@ -11,7 +11,9 @@
 
 import inspect
 import math
+import operator
 from collections import ChainMap
+from threading import Lock
 
 import numpy
 import ply.lex as lex
@@ -19,6 +21,7 @@ import ply.yacc as yacc
 import logging
 import expressionFunctions.UserFunctions as UserFunctions
 from expressionFunctions.ExprFuncDecorator import ExpressionFunctions, userfunc, UserFuncCls
+from modules.LRUCache import LRUCache
 from modules.quantity import Q, is_Q
 
 
@@ -27,9 +30,11 @@ class ExpressionError(Exception):
 
 
 class Parser:
+    cacheSize = 10000       # number of compiled expressions kept
     def __init__(self, variabledict=dict(), functiondict=dict()):
-        self.dependencies = set()
-        self.val = 0
+        self.names = set()
+        self.cache = LRUCache(self.cacheSize)
+        self.lock = Lock()
         self.lexer = lex.lex(module=self)
         self.parser = yacc.yacc(module=self, debug=False,  picklefile='parsetab_expression.pkl')
 
@@ -65,8 +70,6 @@ class Parser:
                                }
         self.defaultVarCM = ChainMap(variabledict, self.constLookup)
         self.defaultFuncCM = ChainMap(ExpressionFunctions, self.localFunctions, functiondict)
-        self.variableCM = self.defaultVarCM
-        self.functionCM = self.defaultFuncCM
 
     def nounitgen(self, fun):
         def retfun(x):
@@ -149,10 +152,15 @@ class Parser:
         ('left', 'GT', 'GTE', 'LT', 'LTE', 'EQ', 'NEQ')
     )
 
+    binaryOperators = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+                       '^': operator.pow, '%': operator.mod, '>': operator.gt, '>=': operator.ge,
+                       '<': operator.lt, '<=': operator.le, '==': operator.eq, '!=': operator.ne}
+
+    # The parsing rules build closures f(env) evaluating the expression in an Environment,
+    # an expression is parsed once and its CompiledExpression is kept in the cache.
     def p_statement_expr(self, p):
         'statement : expression'
-        self.val = p[1]
-        return p[1]
+        p[0] = p[1]
 
     def p_expression_binop(self, p):
         '''expression : expression PLUS expression
@@ -167,88 +175,94 @@ class Parser:
                       | expression LTE expression
                       | expression EQ expression
                       | expression NEQ expression'''
-        if p[2] == '+'  : p[0] = p[1] + p[3]
-        elif p[2] == '-': p[0] = p[1] - p[3]
-        elif p[2] == '*': p[0] = p[1] * p[3]
-        elif p[2] == '/': p[0] = p[1] / p[3]
-        elif p[2] == '^': p[0] = p[1] ** p[3]
-        elif p[2] == '%': p[0] = p[1] % p[3]
-        elif p[2] == '>': p[0] = p[1] > p[3]
-        elif p[2] == '>=': p[0] = p[1] >= p[3]
-        elif p[2] == '<' : p[0] = p[1] < p[3]
-        elif p[2] == '<=': p[0] = p[1] <= p[3]
-        elif p[2] == '==': p[0] = p[1] == p[3]
-        elif p[2] == '!=': p[0] = p[1] != p[3]
+        op, left, right = self.binaryOperators[p[2]], p[1], p[3]
+        p[0] = lambda env: op(left(env), right(env))
 
     def p_expression_uminus(self, p):
         'expression : MINUS expression %prec UMINUS'
-        p[0] = -p[2]
+        operand = p[2]
+        p[0] = lambda env: -operand(env)
 
     def p_expression_mag(self, t):
         '''expression : FLOAT NAME
                       | INT NAME'''
-        t[0] = Q(t[1], t[2])
+        value, unit = t[1], t[2]
+        t[0] = lambda env: Q(value, unit)
 
     def p_expression_number(self, t):
         '''expression : FLOAT
                       | INT'''
-        t[0] = t[1]
+        value = t[1]
+        t[0] = lambda env: value
 
     def p_expression_string(self, p):
         'expression : STRING'
-        p[0] = p[1]
+        value = p[1]
+        p[0] = lambda env: value
 
     def p_expression_func(self, t):
         '''expression : NAME LPAREN arglist RPAREN
                       | NAME LPAREN kwarglist RPAREN
                       | NAME LPAREN arglist COMMA kwarglist RPAREN'''
         if len(t) == 7:
-            t[0] = self.functionCM[t[1]](*t[3], **t[5])
-            if t[1] in ExpressionFunctions:
-                self.dependencies.add(t[1])
-                self.getNTDeps(t[1], *t[3], **t[5])
-        elif len(t) == 5:
-            if type(t[3]) is dict:
-                t[0] = self.functionCM[t[1]](**t[3])
-                if t[1] in ExpressionFunctions:
-                    self.dependencies.add(t[1])
-                    self.getNTDeps(t[1], **t[3])
-            else:
-                t[0] = self.functionCM[t[1]](*t[3])
-                if t[1] in ExpressionFunctions:
-                    self.dependencies.add(t[1])
-                    self.getNTDeps(t[1], *t[3])
-
-    def getNTDeps(self, key, *args, **kwargs):
-        if isinstance(self.functionCM[key], UserFuncCls):
-            if self.functionCM[key].deps:
-                fn = self.functionCM[key]
+            args, kwargs = t[3], t[5]
+        elif type(t[3]) is dict:
+            args, kwargs = [], t[3]
+        else:
+            args, kwargs = t[3], {}
+        name = t[1]
+        def call(env):
+            argValues = [arg(env) for arg in args]
+            kwargValues = dict((key, arg(env)) for key, arg in kwargs.items())
+            value = env.functions[name](*argValues, **kwargValues)
+            if name in ExpressionFunctions:
+                env.dependencies.add(name)
+                self.getNTDeps(env, name, *argValues, **kwargValues)
+            return value
+        t[0] = call
+
+    def getNTDeps(self, env, key, *args, **kwargs):
+        if isinstance(env.functions[key], UserFuncCls):
+            if env.functions[key].deps:
+                fn = env.functions[key]
                 for d in fn.deps:
                     if d[1] == 'str':
-                        self.dependencies.add('_NT_'+d[2].split('_')[0])
+                        env.dependencies.add('_NT_'+d[2].split('_')[0])
                     elif d[1] == 'arg':
                         boundSig = fn.sig.bind(*args, **kwargs)
                         boundSig.apply_defaults()
-                        self.dependencies.add('_NT_'+boundSig.arguments[d[2]].split('_')[0])
+                        env.dependencies.add('_NT_'+boundSig.arguments[d[2]].split('_')[0])
 
     def p_expression_name(self, t):
         'expression : NAME'
-        t[0] = self.variableCM[t[1]]
-        if t[1] not in self.constLookup:
-            self.dependencies.add(t[1])
+        name = t[1]
+        if name in self.constLookup:
+            t[0] = lambda env: env.variables[name]
+        else:
+            self.names.add(name)
+            def variable(env):
+                value = env.variables[name]
+                env.dependencies.add(name)
+                return value
+            t[0] = variable
 
     def p_expression_namewunit(self, t):
         'expression : NAME NAME'
         logger = logging.getLogger(__name__)
         logger.warning( "Expression format '{0} {1}' is deprecated!".format(t[1], t[2]))
-        var = self.variableCM[t[1]]
-        if is_Q(var) and var.u == '':
-            var = Q(var.m, t[2])
-        else:
-            var = Q(var.m_as(t[2]), t[2])
-        t[0] = var
-        if t[1] not in self.constLookup:
-            self.dependencies.add(t[1])
+        name, unit = t[1], t[2]
+        if name not in self.constLookup:
+            self.names.add(name)
+        def variable(env):
+            var = env.variables[name]
+            if is_Q(var) and var.u == '':
+                var = Q(var.m, unit)
+            else:
+                var = Q(var.m_as(unit), unit)
+            if name not in self.constLookup:
+                env.dependencies.add(name)
+            return var
+        t[0] = variable
 
     def p_arglist(self, t):
         '''arglist : expression
@@ -269,11 +283,13 @@ class Parser:
 
     def p_expression_list(self, t):
         'expression : LBRACK listentry RBRACK'
-        t[0] = t[2]
+        items = t[2]
+        t[0] = lambda env: [item(env) for item in items]
 
     def p_expression_dict(self, t):
         'expression : LBRACE dictentry RBRACE'
-        t[0] = t[2]
+        entries = t[2]
+        t[0] = lambda env: dict((key(env), value(env)) for key, value in entries)
 
     def p_listentry(self, t):
         '''listentry : expression
@@ -287,10 +303,9 @@ class Parser:
         '''dictentry : expression COLON expression
                      | dictentry COMMA expression COLON expression'''
         if len(t) == 4:
-            t[0] = {t[1]: t[3]}
+            t[0] = [(t[1], t[3])]
         else:
-            t[0] = t[1]
-            t[0].update({t[3]: t[5]})
+            t[0] = t[1] + [(t[3], t[5])]
 
     def p_expression_group(self, p):
         'expression : LPAREN expression RPAREN'
@@ -299,33 +314,67 @@ class Parser:
     def p_error(self, p):
         raise ExpressionError("Syntax error at '{0}' in '{1}'".format(p.value, p.lexer.lexdata))
 
+    def compile(self, s, useFloat=False):
+        """Return the CompiledExpression of s, expressions are parsed only the first time they are used"""
+        key = (s, useFloat)
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        with self.lock:
+            self.useFloat = useFloat
+            self.names = set()
+            function = self.parser.parse(s, lexer=self.lexer)
+            compiled = CompiledExpression(s, function, frozenset(self.names), self)
+        self.cache[key] = compiled
+        return compiled
+
     def evaluate(self, s, variabledict=dict(), listDependencies=False, useFloat=False, functiondict=dict()):
-        self.dependencies = set()
-        self.useFloat = useFloat
-        self.variableCM = ChainMap(variabledict, self.defaultVarCM)
-        self.functionCM = ChainMap(functiondict, self.defaultFuncCM)
-        self.parser.parse(s, lexer=self.lexer)
-        if listDependencies:
-            return self.val, self.dependencies
-        return self.val
+        return self.compile(s, useFloat).evaluate(variabledict, listDependencies, functiondict)
 
     def evaluateAsMagnitude(self, s, variabledict=dict(), listDependencies=False, useFloat=False, functiondict=dict()):
+        return self.compile(s, useFloat).evaluateAsMagnitude(variabledict, listDependencies, functiondict)
+
+
+class Environment:
+    """variables, functions and collected dependencies of one evaluation"""
+    __slots__ = ('variables', 'functions', 'dependencies')
+
+    def __init__(self, variables, functions):
+        self.variables = variables
+        self.functions = functions
         self.dependencies = set()
-        self.useFloat = useFloat
-        self.variableCM = ChainMap(variabledict, self.defaultVarCM)
-        self.functionCM = ChainMap(functiondict, self.defaultFuncCM)
-        self.parser.parse(s, lexer=self.lexer)
-        if isinstance(self.val, bool):
-            if self.val:
-                self.val = Q(1)
+
+
+class CompiledExpression:
+    """Parsed expression that can be evaluated repeatedly with different variables.
+    variables holds the names of the variables used in the expression."""
+    def __init__(self, source, function, variables, parser):
+        self.source = source
+        self.function = function
+        self.variables = variables
+        self.parser = parser
+
+    def evaluate(self, variabledict=dict(), listDependencies=False, functiondict=dict()):
+        env = Environment(ChainMap(variabledict, self.parser.defaultVarCM), ChainMap(functiondict, self.parser.defaultFuncCM))
+        val = self.function(env)
+        if listDependencies:
+            return val, env.dependencies
+        return val
+
+    def evaluateAsMagnitude(self, variabledict=dict(), listDependencies=False, functiondict=dict()):
+        val, dependencies = self.evaluate(variabledict, True, functiondict)
+        if isinstance(val, bool):
+            if val:
+                val = Q(1)
             else:
-                self.val = Q(0)
+                val = Q(0)
         else:
-            self.val = Q(self.val)
+            val = Q(val)
 
         if listDependencies:
-            return self.val, self.dependencies
-        return self.val
+            return val, dependencies
+        return val
 
 
 class Expression:
@@ -336,6 +385,9 @@ class Expression:
     def evaluateAsMagnitude(self, s, variabledict=dict(), listDependencies=False, useFloat=False, functiondict=dict()):
         return self.exprParser.evaluateAsMagnitude(s, variabledict, listDependencies, useFloat, functiondict)
 
+    def compile(self, s, useFloat=False):
+        return self.exprParser.compile(s, useFloat)
+
 if __name__ == "__main__":
     from time import time
     start_time = time()
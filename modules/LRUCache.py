@@ -1,6 +1,7 @@
 import collections
+import collections.abc
 
-class LRUCache(collections.MutableMapping):
+class LRUCache(collections.abc.MutableMapping):
     def __init__(self, capacity=128):
         self.capacity = capacity
         self.hits = 0
@@ -1,47 +1,170 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Persistent least recently used cache of pickled objects in a SQLite database.
+
+Every entry stores its pickled size and the time of its last use as a counter. Storing an entry evicts the least
+recently used entries until at most capacity entries and maxBytes bytes remain. The database runs in WAL mode,
+lookups do not write: the new times of use are collected and written in batches of recencyBatch, before any
+eviction and on close. The last memoryCapacity unpickled objects are kept in memory and returned without touching
+the database, callers must therefore not modify the returned objects.
+"""
+import atexit
 import collections
+import collections.abc
+import functools
 import pickle
 import sqlite3
+import weakref
+
+
+def _flushAtExit(cacheRef):
+    cache = cacheRef()
+    if cache is not None:
+        cache.flush()
 
 
-class SQLiteLRUCache(collections.MutableMapping):
-    def __init__(self, capacity, filename):
+class SQLiteLRUCache(collections.abc.MutableMapping):
+    def __init__(self, capacity, filename, maxBytes=None, memoryCapacity=4, recencyBatch=32):
+        self.capacity = capacity
+        self.maxBytes = maxBytes
+        self.memoryCapacity = memoryCapacity
+        self.recencyBatch = recencyBatch
         self.cach_path = filename
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()    # key -> unpickled value, most recently used last
+        self._pendingRecency = dict()               # key -> time of last use not yet written
         self.open_database()
+        self._atexit = functools.partial(_flushAtExit, weakref.ref(self))   # does not keep the cache alive
+        atexit.register(self._atexit)
 
     def open_database(self):
         self.cache_conn = sqlite3.connect(self.cach_path)
         c = self.cache_conn.cursor()
+        c.execute("pragma auto_vacuum=incremental")  # only takes effect for new databases
+        c.execute("pragma journal_mode=wal")
+        c.execute("pragma synchronous=normal")
         c.execute("create table if not exists Store (key text, value bytes)")
+        columns = [row[1] for row in c.execute("pragma table_info(Store)")]
+        if 'used' not in columns:  # database written before entries carried their size and time of use
+            c.execute("alter table Store add column size integer default 0")
+            c.execute("alter table Store add column used integer default 0")
+            c.execute("update Store set size=length(value)")
         c.execute("create unique index if not exists store_index on Store(key)")
+        c.execute("create index if not exists store_used on Store(used)")
         self.cache_conn.commit()
+        self._clock = c.execute("select coalesce(max(used), 0) from Store").fetchone()[0]
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _remember(self, key, value):
+        self._memory.pop(key, None)
+        if self.memoryCapacity > 0:
+            self._memory[key] = value
+            while len(self._memory) > self.memoryCapacity:
+                self._memory.popitem(last=False)
+
+    def _touch(self, key):
+        self._pendingRecency[key] = self._tick()
+        if len(self._pendingRecency) >= self.recencyBatch:
+            self.flush()
+
+    def flush(self):
+        """write the collected times of use"""
+        if self._pendingRecency and self.cache_conn is not None:
+            self._writeRecency(self.cache_conn.cursor())
+            self.cache_conn.commit()
+
+    def _writeRecency(self, c):
+        c.executemany("update Store set used=? where key=?", [(used, key) for key, used in self._pendingRecency.items()])
+        self._pendingRecency.clear()
+
+    def close(self):
+        self.flush()
+        self._memory.clear()
+        if self.cache_conn is not None:
+            self.cache_conn.close()
+            self.cache_conn = None
+        atexit.unregister(self._atexit)
+
+    def __del__(self):
+        if getattr(self, 'cache_conn', None) is not None:
+            self.close()
 
     def __getitem__(self, key):
-        c = self.cache_conn.cursor()
-        c.execute("select * from Store where key=?", (key, ))
-        data = c.fetchone()
-        if data is None:
-            raise KeyError("{} not found".format(key))
-        self.cache_conn.commit()
-        return pickle.loads(data[1])
+        try:
+            value = self._memory.pop(key)
+            self._memory[key] = value
+        except KeyError:
+            c = self.cache_conn.cursor()
+            c.execute("select value from Store where key=?", (key, ))
+            data = c.fetchone()
+            if data is None:
+                self.misses += 1
+                raise KeyError("{} not found".format(key))
+            value = pickle.loads(data[0])
+            self._remember(key, value)
+        self.hits += 1
+        self._touch(key)
+        return value
 
     def __setitem__(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._pendingRecency.pop(key, None)
         c = self.cache_conn.cursor()
-        c.execute("insert or replace into Store (key, value) values (?, ?)", (key, pickle.dumps(value)))
+        self._writeRecency(c)
+        c.execute("insert or replace into Store (key, value, size, used) values (?, ?, ?, ?)",
+                  (key, sqlite3.Binary(data), len(data), self._tick()))
+        self._evict(c)
         self.cache_conn.commit()
+        self._remember(key, value)
+
+    def _evict(self, c):
+        """delete the least recently used entries exceeding capacity or maxBytes"""
+        count, size = c.execute("select count(*), total(size) from Store").fetchone()
+        if count <= self.capacity and (self.maxBytes is None or size <= self.maxBytes):
+            return
+        evicted = list()
+        for key, entrySize in c.execute("select key, size from Store order by used").fetchall():
+            if count <= self.capacity and (self.maxBytes is None or size <= self.maxBytes) or count <= 1:
+                break
+            evicted.append((key, ))
+            count -= 1
+            size -= entrySize
+        c.executemany("delete from Store where key=?", evicted)
+        for key, in evicted:
+            self._memory.pop(key, None)
+        c.execute("pragma incremental_vacuum").fetchall()
 
     def __delitem__(self, key):
+        self._memory.pop(key, None)
+        self._pendingRecency.pop(key, None)
         c = self.cache_conn.cursor()
         c.execute("delete from Store where key=?", (key, ))
         self.cache_conn.commit()
+        if c.rowcount == 0:
+            raise KeyError("{} not found".format(key))
+
+    def __contains__(self, key):
+        if key in self._memory:
+            return True
+        c = self.cache_conn.cursor()
+        c.execute("select 1 from Store where key=?", (key, ))
+        return c.fetchone() is not None
 
     def __iter__(self):
-        raise NotImplementedError()
+        """keys from least to most recently used"""
+        self.flush()
+        c = self.cache_conn.cursor()
+        return iter([row[0] for row in c.execute("select key from Store order by used")])
 
     def __len__(self):
         c = self.cache_conn.cursor()
         c.execute("select count(*) from Store")
-        data = c.fetchone()
-        if data is None:
-            raise KeyError
-        self.cache_conn.commit()
-        return data[0]
\ No newline at end of file
+        return c.fetchone()[0]
@@ -4,9 +4,9 @@
 # in the file "license.txt" in the top-level IonControl directory
 # *****************************************************************
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, Interval, Float, Boolean
-from sqlalchemy.orm import relationship, backref, sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import Column, Integer, String, DateTime, Interval, Float, Boolean, Date
+from sqlalchemy.orm import relationship, backref, sessionmaker, selectinload, joinedload, configure_mappers
+from sqlalchemy import create_engine, func, inspect, event
 from modules.quantity import Q, is_Q
 from sqlalchemy.exc import ProgrammingError, InvalidRequestError, IntegrityError
 import logging
@@ -15,6 +15,9 @@ from modules.Observable import Observable
 import weakref
 from modules.SequenceDict import SequenceDict 
 from datetime import datetime, timedelta, time
+from collections import Counter
+import pytz
+from dateutil.tz import tzlocal
 
 Base = declarative_base()
 
@@ -29,12 +32,12 @@ class Measurement(Base):
     __tablename__ = "measurements"
     id = Column(Integer, primary_key=True)
     scanType = Column(String, nullable=False)
-    scanName = Column(String, nullable=False)
+    scanName = Column(String, nullable=False, index=True)
     scanParameter = Column(String)
     scanTarget = Column(String)
     scanPP = Column(String)
     evaluation = Column(String, nullable=False)
-    startDate = Column(DateTime(timezone=True))
+    startDate = Column(DateTime(timezone=True), index=True)
     duration = Column(Interval)
     filename = Column(String)
     comment = Column(String)
@@ -72,6 +75,30 @@ class Measurement(Base):
             
         
 
+def summaryDay(startDate):
+    """local day of startDate, the day of the naive local times of the range filter.
+    Naive start dates are UTC, like the tz-aware ones read back from SQLite."""
+    if startDate.tzinfo is None:
+        startDate = startDate.replace(tzinfo=pytz.utc)
+    return startDate.astimezone(tzlocal()).date()
+
+
+class ScanNameSummary(Base):
+    """Number of measurements per scan name and local day (see summaryDay), used for the scan name filter list"""
+    __tablename__ = 'scan_name_summary'
+    scanName = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+def uncountDeletedMeasurements(session, flush_context, instances):
+    """decrement the scan name summary for measurements deleted through the ORM"""
+    for measurement in session.deleted:
+        if isinstance(measurement, Measurement) and measurement.startDate is not None:
+            session.query(ScanNameSummary).filter_by(scanName=measurement.scanName, day=summaryDay(measurement.startDate))\
+                .update({ScanNameSummary.count: ScanNameSummary.count - 1}, synchronize_session=False)
+
+
 class Space(Base):
     __tablename__ = 'space'
     id = Column(Integer, primary_key=True)
@@ -86,7 +113,7 @@ class Result(Base):
     _top = Column(Float) 
     unit = Column(String)
     manual = Column(Boolean, default=False)
-    measurement_id = Column(Integer, ForeignKey('measurements.id'))
+    measurement_id = Column(Integer, ForeignKey('measurements.id'), index=True)
     measurement = relationship( "Measurement", backref=backref('results', order_by=id))
     
     def __init__(self, *args, **kwargs):
@@ -150,7 +177,7 @@ class Parameter(Base):
     unit = Column(String)
     definition = Column(String)
     manual = Column(Boolean, default=False)
-    measurement_id = Column(Integer, ForeignKey('measurements.id'))
+    measurement_id = Column(Integer, ForeignKey('measurements.id'), index=True)
     measurement = relationship( "Measurement", backref=backref('parameters', order_by=id)) # , collection_class=attribute_mapped_collection('name')
     space_id = Column(Integer, ForeignKey('space.id'))
     space = relationship( "Space", backref=backref('parameters', order_by=id))
@@ -177,6 +204,7 @@ class Parameter(Base):
             self._value = magValue
         
 class MeasurementContainer(object):
+    pageSize = 200      # number of measurements loaded per page
     def __init__(self, dbConnection):
         self.database_conn_str = dbConnection.connectionString
         self.engine = create_engine(self.database_conn_str, echo=dbConnection.echo)
@@ -192,6 +220,8 @@ class MeasurementContainer(object):
         self.scanNamesChanged = Observable()
         self._scanNames = SequenceDict()
         self._scanNameFilter = None
+        self._queryFilter = None
+        self._allFetched = True
         self.fromTime = datetime(2014, 11, 1, 0, 0)
         self.toTime = datetime.combine((datetime.now()+timedelta(days=1)).date(), time())
         
@@ -202,9 +232,46 @@ class MeasurementContainer(object):
         
     def open(self):
         Base.metadata.create_all(self.engine)
+        inspector = inspect(self.engine)
+        for table in (Measurement.__table__, Result.__table__, Parameter.__table__):
+            existing = set(index['name'] for index in inspector.get_indexes(table.name))
+            for index in table.indexes:     # create_all does not add indexes to existing tables
+                if index.name not in existing:
+                    index.create(self.engine)
+        configure_mappers()
         self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        event.listen(self.Session, 'before_flush', uncountDeletedMeasurements)
         self.session = self.Session()
         self.isOpen = True
+        self.initScanNameSummary()
+
+    def initScanNameSummary(self):
+        """rebuild the scan name summary from the measurements if its total does not match them,
+        measurements may have been added or deleted by clients that do not keep the summary"""
+        try:
+            summaryTotal = self.session.query(func.sum(ScanNameSummary.count)).scalar() or 0
+            measurementTotal = self.session.query(func.count(Measurement.id)).filter(Measurement.startDate.isnot(None)).scalar()
+            if summaryTotal != measurementTotal:
+                self.session.query(ScanNameSummary).delete(synchronize_session=False)
+                counts = Counter((scanName, summaryDay(startDate)) for scanName, startDate in
+                                 self.session.query(Measurement.scanName, Measurement.startDate)
+                                 .filter(Measurement.startDate.isnot(None)).yield_per(1000))
+                self.session.bulk_insert_mappings(ScanNameSummary, [{'scanName': scanName, 'day': day, 'count': count}
+                                                                    for (scanName, day), count in counts.items()])
+                self.session.commit()
+        except (InvalidRequestError, IntegrityError, ProgrammingError) as e:
+            logging.getLogger(__name__).warning( str(e) )
+            self.session.rollback()
+            self.session = self.Session()
+
+    def _countScanName(self, measurement):
+        if measurement.startDate is not None:
+            day = summaryDay(measurement.startDate)
+            summary = self.session.query(ScanNameSummary).filter_by(scanName=measurement.scanName, day=day).first()
+            if summary is None:
+                self.session.add(ScanNameSummary(scanName=measurement.scanName, day=day, count=1))
+            else:
+                summary.count += 1
         
     def close(self):
         self.session.commit()
@@ -221,6 +288,7 @@ class MeasurementContainer(object):
     def addMeasurement(self, measurement):
         try:
             self.session.add( measurement )
+            self._countScanName( measurement )
             self.session.commit()
             self.measurementDict[str(measurement.startDate)] = measurement
             if self._scanNameFilter is None or measurement.scanName in self._scanNameFilter:
@@ -243,19 +311,72 @@ class MeasurementContainer(object):
             self.session.rollback()
             self.session = self.Session()
         
+    def _measurementQuery(self, fromTime, toTime, scanNameFilter=None):
+        query = self.session.query(Measurement).options(selectinload(Measurement.results),
+                                                        selectinload(Measurement.parameters).joinedload(Parameter.space),
+                                                        joinedload(Measurement.study))
+        query = query.filter(Measurement.startDate>=fromTime).filter(Measurement.startDate<=toTime)
+        if scanNameFilter is not None:
+            query = query.filter(Measurement.scanName.in_(scanNameFilter))
+        return query.order_by(Measurement.id.desc())
+
+    def _fetchPage(self, count):
+        query = self._measurementQuery(self.fromTime, self.toTime, self._queryFilter)
+        if self.measurements:
+            query = query.filter(Measurement.id < self.measurements[-1].id)
+        page = query.limit(count).all()
+        self._allFetched = len(page) < count
+        return page
+
+    def canFetchMore(self):
+        return not self._allFetched
+
+    def fetchMore(self, count=None):
+        """load the next page of older measurements, returns the number of measurements added"""
+        if self._allFetched:
+            return 0
+        page = self._fetchPage(count or self.pageSize)
+        if page:
+            self.beginInsertMeasurement.fire(first=len(self.measurements), last=len(self.measurements) + len(page) - 1)
+            self.measurements.extend(page)
+            self.endInsertMeasurement.firebare()
+        return len(page)
+
+    def fetchAll(self):
+        while self.fetchMore():
+            pass
+
+    def _scanNamesOfMeasurements(self, fromTime, toTime):
+        return set(name for name, in self.session.query(Measurement.scanName).filter(Measurement.startDate>=fromTime)
+                   .filter(Measurement.startDate<=toTime).distinct())
+
+    def scanNamesInRange(self, fromTime, toTime):
+        """scan names of the measurements from fromTime to toTime, naive local times. The summary is used for the
+        local days completely in the range, the partial days at the beginning and end are queried from the measurements."""
+        firstDay = fromTime.date() if fromTime.time() == time() else fromTime.date() + timedelta(days=1)
+        lastDay = toTime.date() - timedelta(days=1)
+        if firstDay > lastDay:
+            names = self._scanNamesOfMeasurements(fromTime, toTime)
+        else:
+            names = set(name for name, in self.session.query(ScanNameSummary.scanName).filter(ScanNameSummary.day>=firstDay)
+                        .filter(ScanNameSummary.day<=lastDay).filter(ScanNameSummary.count>0).distinct())
+            names.update(self._scanNamesOfMeasurements(fromTime, datetime.combine(firstDay, time()) - timedelta(microseconds=1)))
+            names.update(self._scanNamesOfMeasurements(datetime.combine(lastDay + timedelta(days=1), time()), toTime))
+        return sorted(names)
+
     def query(self, fromTime, toTime, scanNameFilter=None):
+        """load the first page of the measurements in the time range, the rest is loaded by fetchMore"""
         logging.getLogger(__name__).info("Starting query from {} to {} scannames {}".format(fromTime, toTime, scanNameFilter))
+        self.fromTime, self.toTime, self._queryFilter = fromTime, toTime, scanNameFilter
+        self.measurements = list()
+        self.measurements = self._fetchPage(self.pageSize)
+        scanNames = self.scanNamesInRange(fromTime, toTime)
         if scanNameFilter is None:
-            self.measurements = self.session.query(Measurement).filter(Measurement.startDate>=fromTime).filter(Measurement.startDate<=toTime).order_by(Measurement.id.desc()).all() 
-            self._scanNames = SequenceDict(((m.scanName, self._scanNames.get(m.scanName, True)) for m in self.measurements))
-            self._scanNames.sort()
+            self._scanNames = SequenceDict(((name, self._scanNames.get(name, True)) for name in scanNames))
         else:
-            self.measurements = self.session.query(Measurement).filter(Measurement.startDate>=fromTime).filter(Measurement.startDate<=toTime).filter(Measurement.scanName.in_(scanNameFilter)).order_by(Measurement.id.desc()).all() 
-            scanNames = self.session.query(Measurement.scanName).filter(Measurement.startDate>=fromTime).filter(Measurement.startDate<=toTime).group_by(Measurement.scanName).order_by(Measurement.scanName).all()
-            self._scanNames = SequenceDict(((name, name in scanNameFilter) for name, in scanNames))
+            self._scanNames = SequenceDict(((name, name in scanNameFilter) for name in scanNames))
         self.scanNamesChanged.fire( scanNames=self.scanNames )
         self.measurementsUpdated.fire(measurements=self.measurements)
-        self.fromTime, self.toTime = fromTime, toTime
         logging.getLogger(__name__).info("Query complete.")
     
     def refreshLookups(self):
@@ -1,13 +1,18 @@
-import logging
+import os
 
 from ProjectConfig.Project import getProject
 from externalParameter.persistence import persistenceProviders, persistenceDict
+from persist.TimeseriesSink import TimeseriesSink
 
 try:
     from influxdb import InfluxDBClient
 
     class TimeseriesPersist:
         store = None
+        sink = None
+        journalFile = None
+        batchSize = 5000
+        flushInterval = 1.0
         name = "Timeseries persist"
 
         def __init__(self):
@@ -20,41 +25,48 @@ try:
             self.initialized = False
 
         def initDB(self):
-            self.active = False
+            prj = getProject()
+            self.projectName = prj.name
             if TimeseriesPersist.store is None:
-                prj = getProject()
-                self.projectName = prj.name
                 if 'Timeseries Database' in prj.software:
                     dbs = prj.software['Timeseries Database']
                     if dbs:
                         db = list(dbs.values())[0]
                         TimeseriesPersist.store = InfluxDBClient(host=db.get('host'), port=8086,
                                                                  database=db.get('database'))
-                        self.active = True
+                        TimeseriesPersist.journalFile = db.get('journal') or os.path.join(prj.projectDir, '.timeseries-journal')
+                        TimeseriesPersist.batchSize = db.get('batchSize') or TimeseriesPersist.batchSize
+                        TimeseriesPersist.flushInterval = db.get('flushInterval') or TimeseriesPersist.flushInterval
+            self.active = TimeseriesPersist.store is not None
             self.initialized = True
             return self.active
 
+        def write(self, point):
+            """queue a point in write_points format, it is written in the background"""
+            if TimeseriesPersist.sink is None:
+                TimeseriesPersist.sink = TimeseriesSink(TimeseriesPersist.store, TimeseriesPersist.journalFile,
+                                                        batchSize=TimeseriesPersist.batchSize,
+                                                        flushInterval=TimeseriesPersist.flushInterval)
+            TimeseriesPersist.sink.write(point)
+
         def persist(self, space, source, time, value, minval=None, maxval=None, unit=None):
             if not self.active:
                 return
             if source:
-                try:
-                     TimeseriesPersist.store.write_points([{
-                        "measurement": source,
-                        "tags": {
-                            "space": space,
-                            "project": getProject().name,
-                        },
-                        "fields": {
-                            "valuef": float(value) if value is not None else None,
-                            "minvalf": float(minval) if minval is not None else None,
-                            "maxvalf": float(maxval) if maxval is not None else None,
-                            "unit": unit
-                        },
-                         "time": time if time > 1000000000000000000 else int(time * 1000000000)
-                    }])
-                except ConnectionError as e:
-                    logging.getLogger(__name__).warning("Cannot persist to timeseries database {}".format(e))
+                self.write({
+                    "measurement": source,
+                    "tags": {
+                        "space": space,
+                        "project": self.projectName,
+                    },
+                    "fields": {
+                        "valuef": float(value) if value is not None else None,
+                        "minvalf": float(minval) if minval is not None else None,
+                        "maxvalf": float(maxval) if maxval is not None else None,
+                        "unit": unit
+                    },
+                    "time": time if time > 1000000000000000000 else int(time * 1000000000)
+                })
 
         def rename(self, space, oldsourcename, newsourcename):
             pass
@@ -65,6 +77,12 @@ try:
         def sourceDict(self):
             return {}
 
+        def shutdown(self):
+            """write or journal all queued points"""
+            if TimeseriesPersist.sink is not None:
+                TimeseriesPersist.sink.close()
+                TimeseriesPersist.sink = None
+
     persistenceProviders.append(TimeseriesPersist)
     persistenceDict[TimeseriesPersist.name] = TimeseriesPersist
 
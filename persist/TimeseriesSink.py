@@ -0,0 +1,198 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Batched, non-blocking writing of points to a time series database.
+
+Points are given in the dictionary format of influxdb ``write_points``. write only queues the point, a worker
+thread converts the points to the influx line protocol and writes them in batches of up to batchSize points,
+at the latest flushInterval seconds after the first point of a batch. If a write fails the lines are appended
+to a journal file and the write is retried with exponential backoff, the journal is sent before any newer points
+so the order is kept. The journal survives a restart and is sent once the database is reachable again.
+
+:class:`FileTimeseriesClient` stores the lines in a local file and stands in for the database client
+in tests or without a server.
+"""
+import logging
+import os
+from queue import Queue, Empty
+from threading import Thread, Event
+from time import time
+
+
+def _escape(text, characters):
+    text = str(text)
+    for character in characters:
+        text = text.replace(character, '\\' + character)
+    return text
+
+
+def _fieldValue(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return '{0}i'.format(value)
+    if isinstance(value, float):
+        return repr(value)
+    return '"{0}"'.format(_escape(value, '\\"'))
+
+
+def lineProtocol(point):
+    """influx line protocol line of a point, None if the point has no field values"""
+    fields = ','.join('{0}={1}'.format(_escape(key, ', ='), _fieldValue(value))
+                      for key, value in sorted(point['fields'].items()) if value is not None)
+    if not fields:
+        return None
+    tags = ''.join(',{0}={1}'.format(_escape(key, ', ='), _escape(value, ', ='))
+                   for key, value in sorted(point.get('tags', {}).items()) if value is not None and value != '')
+    line = '{0}{1} {2}'.format(_escape(point['measurement'], ', '), tags, fields)
+    if point.get('time') is not None:
+        line += ' {0}'.format(int(point['time']))
+    return line
+
+
+class FileTimeseriesClient(object):
+    """Stand-in for InfluxDBClient appending the written lines to a file. While available is False
+    writing raises ConnectionError like an unreachable server."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.available = True
+        self.writes = 0
+
+    def write_points(self, points, protocol='json'):
+        if not self.available:
+            raise ConnectionError("{0} is not available".format(self.filename))
+        lines = points if protocol == 'line' else [line for line in map(lineProtocol, points) if line is not None]
+        with open(self.filename, 'a') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        self.writes += 1
+        return True
+
+    def lines(self):
+        if not os.path.exists(self.filename):
+            return []
+        with open(self.filename) as f:
+            return f.read().splitlines()
+
+
+class TimeseriesSink(object):
+    def __init__(self, client, journalFile, batchSize=5000, flushInterval=1.0, retryDelay=1.0, maxRetryDelay=60.0):
+        self.client = client
+        self.journalFile = journalFile
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.retryDelay = retryDelay
+        self.maxRetryDelay = maxRetryDelay
+        self.queue = Queue()
+        self.written = 0            # number of points written to the database
+        self.writes = 0             # number of successful write requests
+        self.failures = 0           # number of failed write requests
+        self.writeLatency = 0       # seconds needed for the last write
+        self.journaled = 0          # number of lines waiting in the journal
+        if os.path.exists(journalFile):
+            with open(journalFile) as f:
+                self.journaled = sum(1 for _ in f)
+        self._delay = retryDelay
+        self._nextAttempt = 0
+        self.thread = Thread(target=self._run, name="TimeseriesSink", daemon=True)
+        self.thread.start()
+
+    @property
+    def queueDepth(self):
+        return self.queue.qsize()
+
+    def write(self, point):
+        self.queue.put(point)
+
+    def flush(self):
+        """returns once all points queued before are written or journaled"""
+        if self.thread is not None:
+            done = Event()
+            self.queue.put(done)
+            done.wait()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        lines = list()
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(0, deadline - time())
+            if self.journaled:   # wake up to retry the journal
+                retry = max(0, self._nextAttempt - time())
+                timeout = retry if timeout is None else min(timeout, retry)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except Empty:
+                item = False
+            if isinstance(item, dict):
+                try:
+                    line = lineProtocol(item)
+                except Exception as e:
+                    logging.getLogger(__name__).warning("Cannot convert point {0} ({1})".format(item, e))
+                    line = None
+                if line is not None:
+                    lines.append(line)
+                    if deadline is None:
+                        deadline = time() + self.flushInterval
+                if len(lines) < self.batchSize:
+                    continue
+            elif item is None:
+                running = False
+            elif item is False and (deadline is None or time() < deadline):   # retry of the journal only
+                self._sendJournal()
+                continue
+            self._send(lines)
+            lines = list()
+            deadline = None
+            if isinstance(item, Event):
+                item.set()
+
+    def _write(self, lines):
+        start = time()
+        try:
+            self.client.write_points(lines, protocol='line')
+        except Exception as e:
+            self.failures += 1
+            self._nextAttempt = time() + self._delay
+            logging.getLogger(__name__).warning("Cannot write {0} points to the timeseries database, retry in {1:.0f} s ({2})".format(
+                len(lines), self._delay, e))
+            self._delay = min(2 * self._delay, self.maxRetryDelay)
+            return False
+        self.writeLatency = time() - start
+        self.written += len(lines)
+        self.writes += 1
+        self._delay = self.retryDelay
+        self._nextAttempt = 0
+        return True
+
+    def _sendJournal(self):
+        """write the journal in batches, the lines not written are kept. Returns True if the journal is empty"""
+        if not self.journaled:
+            return True
+        if time() < self._nextAttempt:
+            return False
+        with open(self.journalFile) as f:
+            journal = f.read().splitlines()
+        for start in range(0, len(journal), self.batchSize):
+            if not self._write(journal[start:start + self.batchSize]):
+                with open(self.journalFile, 'w') as f:
+                    f.write(''.join(line + '\n' for line in journal[start:]))
+                self.journaled = len(journal) - start
+                return False
+        os.remove(self.journalFile)
+        self.journaled = 0
+        return True
+
+    def _send(self, lines):
+        if lines and not (self._sendJournal() and self._write(lines)):
+            with open(self.journalFile, 'a') as f:
+                f.write(''.join(line + '\n' for line in lines))
+            self.journaled += len(lines)
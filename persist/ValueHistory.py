@@ -5,6 +5,9 @@
 # *****************************************************************
 
 import logging
+from queue import Queue, Empty
+from threading import Thread, Event
+from time import time
 
 from sqlalchemy import Column, String, Float, DateTime, Integer, ForeignKey, Index
 from sqlalchemy import create_engine
@@ -49,12 +52,101 @@ class ValueHistoryEntry(Base):
         return "<'{0}.{1}' {2} {3} @ {4}>".format(self.source.space, self.source.name, self.value, self.unit, self.upd_date)
         
     
+class ValueHistoryWriter(object):
+    """Write-behind of history values. add only queues the value, a background thread inserts the queued
+    values in one statement when batchSize values are waiting or flushInterval seconds after the first one.
+    flush returns once all values queued before are stored, close flushes and stops the thread."""
+    def __init__(self, engine, batchSize=1000, flushInterval=2.0):
+        self.engine = engine
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.queue = Queue()
+        self.written = 0            # number of values stored
+        self.failed = 0             # number of values that could not be stored
+        self.batches = 0
+        self.writeLatency = 0       # seconds needed for the last batch
+        self.maxWriteLatency = 0
+        self.thread = Thread(target=self._run, name="ValueHistoryWriter", daemon=True)
+        self.thread.start()
+
+    @property
+    def queueDepth(self):
+        return self.queue.qsize()
+
+    def add(self, sourceId, value, unit, upd_date, bottom=None, top=None):
+        self.queue.put({'source_id': sourceId, 'value': value, 'unit': unit, 'upd_date': upd_date,
+                        'bottom': bottom, 'top': top})
+
+    def flush(self):
+        if self.thread is not None:
+            done = Event()
+            self.queue.put(done)
+            done.wait()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        rows = list()
+        deadline = None
+        running = True
+        while running:
+            try:
+                item = self.queue.get(timeout=None if deadline is None else max(0, deadline - time()))
+            except Empty:
+                item = False      # flushInterval passed
+            if isinstance(item, dict):
+                rows.append(item)
+                if deadline is None:
+                    deadline = time() + self.flushInterval
+                if len(rows) < self.batchSize:
+                    continue
+            elif item is None:
+                running = False
+            self._write(rows)
+            rows = list()
+            deadline = None
+            if isinstance(item, Event):
+                item.set()
+
+    def _write(self, rows):
+        if not rows:
+            return
+        start = time()
+        table = ValueHistoryEntry.__table__
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(table.insert(), rows)
+            self.written += len(rows)
+        except (IntegrityError, OperationalError) as e:
+            logging.getLogger(__name__).warning("Bulk insert of {0} history values failed, inserting one by one ({1})".format(len(rows), e))
+            for row in rows:
+                try:
+                    with self.engine.begin() as connection:
+                        connection.execute(table.insert(), row)
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    logging.getLogger(__name__).error(str(e))
+        except Exception as e:
+            self.failed += len(rows)
+            logging.getLogger(__name__).exception(e)
+        self.batches += 1
+        self.writeLatency = time() - start
+        self.maxWriteLatency = max(self.maxWriteLatency, self.writeLatency)
+
+
 class ValueHistoryStore:
-    def __init__(self, dbConnection):
+    def __init__(self, dbConnection, writeBehind=False):
         self.database_conn_str = dbConnection.connectionString
         self.engine = create_engine(self.database_conn_str, echo=dbConnection.echo)
         self.sourceDict = dict()
         self.databaseAvailable = False
+        self.writeBehind = writeBehind     # values are stored by a ValueHistoryWriter
+        self.writer = None
 
     def rename(self, space, oldsourcename, newsourcename):
         if (space, oldsourcename) not in self.sourceDict:
@@ -84,6 +176,8 @@ class ValueHistoryStore:
         return self.sourceDict    
         
     def getHistory(self, space, source, fromTime, toTime ):
+        if self.writer is not None:
+            self.writer.flush()  # values still queued for write-behind would be missing
         if toTime is not None:
             return self.session.query(ValueHistoryEntry).filter(ValueHistoryEntry.source==self.getSource(space, source)).\
                                                   filter(ValueHistoryEntry.upd_date>fromTime).\
@@ -100,6 +194,9 @@ class ValueHistoryStore:
         self.__enter__()
         
     def close_session(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
         if self.databaseAvailable:
             self.session.commit()        
 
@@ -110,13 +207,23 @@ class ValueHistoryStore:
             self.session = self.Session()
             self.refreshSourceDict()
             self.databaseAvailable = True
+            if self.writeBehind and self.writer is None:
+                self.writer = ValueHistoryWriter(self.engine)
         except OperationalError as e:
             logging.getLogger(__name__).info( str(e))
             self.databaseAvailable = False
         return self
         
     def __exit__(self, exittype, value, tb):
-        self.session.commit()
+        self.close_session()
+
+    def sourceId(self, space, source):
+        """id of the source, a new source is stored right away"""
+        s = self.sourceDict.get((space, source))
+        if s is None:
+            s = self.getSource(space, source)
+            self.commit()
+        return s.id
         
     def add(self, space, source, value, unit, upd_date, bottom=None, top=None):
         if self.databaseAvailable:
@@ -127,7 +234,9 @@ class ValueHistoryStore:
                         bottom = bottom.m_as(unit)
                     if is_Q(top):
                         top = top.m_as(unit)
-                if space is not None and source is not None:
+                if space is not None and source is not None and self.writer is not None:
+                    self.writer.add(self.sourceId(space, source), value, unit, upd_date, bottom, top)
+                elif space is not None and source is not None:
                     paramObj = self.getSource(space, source)
                     if is_Q(value):
                         value, unit = value.m, "{:~}".format(value.units)
@@ -147,6 +256,8 @@ class ValueHistoryStore:
                 
         
     def get(self, space, source ):
+        if self.writer is not None:
+            self.writer.flush()
         return self.session.query(ValueHistoryEntry).filter(ValueHistoryEntry.source==self.getSource(space, source) )
                     
     def open(self):
@@ -156,6 +267,8 @@ class ValueHistoryStore:
         self.isOpen = True
         
     def close(self):
+        if self.writer is not None:
+            self.writer.flush()
         self.session.commit()
         self.isOpen = False
         
@@ -8,6 +8,13 @@
 Wrapper for python shelve module to be able to use it with the with expression.
 It also includes default directory for storing of config files.
 
+Only keys that were written or handed out (and thus possibly mutated in place by the holder) since the last
+commit are committed. commitToDatabase only takes these keys, their values are pickled on the commit worker
+holding the lock and inserted in bulk if the digest differs from the last stored one. A key handed out before
+a commit has to be handed out or written again to be part of a later commit.
+The shelf keeps the digests of the stored values instead of copies. Keys that cannot be pickled or stored stay
+dirty and are tried again with the next commit.
+
 """
 import hashlib
 import multiprocessing
@@ -26,9 +33,8 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.exc import NoResultFound
 import yaml
 import datetime
-import copy
+from concurrent.futures import ThreadPoolExecutor
 from wrapt import synchronized
-from threading import Thread, Event
 
 from modules.hasher import hexdigest
 
@@ -106,12 +112,14 @@ class configshelve:
         self.database_conn_str = dbConnection.connectionString
         self.engine = create_engine(self.database_conn_str, echo=dbConnection.echo)
         self.buffer = dict()
-        self.dbContent = dict()
-        self.dbDigest = dict()
+        self.dbDigest = dict()      # digest of the last stored pickle of each key
+        self.dirty = set()          # keys written since the last commit
+        self.handedOut = set()      # keys whose values were handed out since the last commit
         self.filename = filename
         self.loadFromDate = loadFromDate
         self.filetype = filetype
         self.commit_ready = None
+        self.commitExecutor = ThreadPoolExecutor(max_workers=1)
 
     @synchronized
     def loadFromDatabase(self):
@@ -128,8 +136,7 @@ class configshelve:
             subquery = self.session.query(func.max(PgShelveEntry.id)).group_by(PgShelveEntry.key)
         for record in self.session.query(PgShelveEntry).filter(PgShelveEntry.id.in_(subquery)).filter(PgShelveEntry.active).all():
             try:
-                self.buffer[record.key] = copy.deepcopy(record.value)
-                self.dbContent[record.key] = record.value
+                self.buffer[record.key] = record.value
                 self.dbDigest[record.key] = record.digest
             except Exception as e:
                 logging.getLogger(__name__).exception(e)
@@ -167,32 +174,74 @@ class configshelve:
             for record in session.query(ShelveEntry).all():
                 try:
                     self.buffer[record.key] = record.value
+                    self.dirty.add(record.key)
                 except Exception as e:
                     logging.getLogger(__name__).warning("configuration parameter '{0}' cannot be read from file {1} ({2})".format(record.key, filename, e))
             session.commit()
         elif filetype == 'yaml':
             with open(filename, 'r') as f:
-                self.buffer.update(yaml.load(f))
+                content = yaml.load(f)
+                self.buffer.update(content)
+                self.dirty.update(content)
 
     def commitToDatabase(self):
-        self.commit_ready = Event()
-        t = Thread(target=self._commitToDatabase)
-        t.start()
+        """take the dirty keys and store their values on the commit worker, commit_ready is done once they are stored"""
+        keys = self._takeDirty()
+        self.commit_ready = self.commitExecutor.submit(self._storeKeys, keys)
+        self.commit_ready.add_done_callback(self._commitDone)
+
+    @staticmethod
+    def _commitDone(future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.getLogger(__name__).error("Commit of the configuration failed", exc_info=future.exception())
 
     @synchronized
+    def _takeDirty(self, forcePickle=False):
+        """return the keys written or handed out since the last commit and start tracking anew"""
+        keys = set(self.buffer) if forcePickle else (self.dirty | self.handedOut) & set(self.buffer)
+        self.dirty = set()
+        self.handedOut = set()
+        return keys
+
+    @synchronized
+    def _pickleKeys(self, keys):
+        """return the rows of the values of keys that changed since they were stored"""
+        logger = logging.getLogger(__name__)
+        rows = list()
+        for key in keys:
+            try:
+                pvalue = pickle.dumps(self.buffer[key], 4)
+            except Exception as e:
+                logger.error("Pickling of {0} failed {1}".format(key, str(e)))
+                self.dirty.add(key)
+                continue
+            digest = hexdigest(pvalue, hashlib.sha224).encode()
+            if self.dbDigest.get(key) != digest:
+                rows.append({'key': key, 'pvalue': pvalue, 'digest': digest, 'active': True,
+                             'upd_date': datetime.datetime.now()})
+        return rows
+
+    @synchronized
+    def _storeKeys(self, keys):
+        self._insertEntries(self._pickleKeys(keys))
+
     def _commitToDatabase(self, forcePickle=False):
-        for key, value in self.buffer.items():
-            if self.dbContent.get(key) is None or self.dbContent.get(key) != value or forcePickle:
-                entry = PgShelveEntry(key, value)
-                if self.dbDigest.get(key) != entry.digest:
-                    self.session.add(entry)
-                    self.dbContent[key] = copy.deepcopy(value)
-                    self.dbDigest[key] = entry.digest
-        self.session.commit()
+        self._storeKeys(self._takeDirty(forcePickle))
+
+    @synchronized
+    def _insertEntries(self, rows):
+        try:
+            if rows:
+                self.session.bulk_insert_mappings(PgShelveEntry, rows)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            self.dirty.update(row['key'] for row in rows)
+            raise
         self.session = self.Session()
-        if self.commit_ready:
-            self.commit_ready.set()
-        
+        for row in rows:
+            self.dbDigest[row['key']] = row['digest']
+
     @synchronized
     def saveConfig(self, copyTo=None, yamlfile=None):
         if copyTo:
@@ -223,13 +272,16 @@ class configshelve:
         
     def __exit__(self, exittype, value, tb):
         self.commitToDatabase()
-        if self.commit_ready is not None:
-            self.commit_ready.wait()
-        self.sessionCommit()
+        try:
+            self.commit_ready.result()
+        finally:
+            self.commitExecutor.shutdown()
+            self.sessionCommit()
 
     @synchronized
     def __setitem__(self, key, value):
         self.buffer[key] = value
+        self.dirty.add(key)
 
     @synchronized
     def __delitem__(self, key):
@@ -244,17 +296,22 @@ class configshelve:
 
     @synchronized
     def __getitem__(self, key):
-        return self.buffer[key]
+        value = self.buffer[key]
+        self.handedOut.add(key)     # the value can be changed in place by the caller
+        return value
 
     @synchronized
     def items_startswith(self, key_start):
         start_length = len(key_start)
-        return [(key[start_length:].strip("."), value) for key, value in self.buffer.items() if key.startswith(key_start)]
+        keys = [key for key in self.buffer if key.startswith(key_start)]
+        self.handedOut.update(keys)
+        return [(key[start_length:].strip("."), self.buffer[key]) for key in keys]
 
     @synchronized
     def set_string_dict(self, prefix, string_dict):
         for key, value in string_dict.items():
             self.buffer[prefix + "." + key] = value
+            self.dirty.add(prefix + "." + key)
             
     @synchronized
     def __contains__(self, key):
@@ -262,6 +319,8 @@ class configshelve:
 
     @synchronized
     def get(self, key, default=None):
+        if key in self.buffer:
+            self.handedOut.add(key)
         return self.buffer.get(key, default)
 
     @synchronized
@@ -3,7 +3,7 @@
 # This Software is released under the GPL license detailed
 # in the file "license.txt" in the top-level IonControl directory
 # *****************************************************************
-import copy
+import operator
 import re
 import random
 from modules.quantity import Q
@@ -12,8 +12,94 @@ from collections import deque
 def DDS(amp=0,freq=0,phase=0):
     return {'amp': amp, 'freq': freq, 'phase': phase}
 
+# opcodes of the assembled instructions, an instruction is the tuple (opcode, operand, extra, line)
+(SKIP, DECLARE, LDWR, STWR, STWI, COMPARE, ALU, INCDEC, JMP, JMPCMP, JMPNCMP, JMPZ, JMPNZ, JMPPIPEEMPTY, JMPPIPEAVAIL,
+ JMPPUSH, JMPPOP, PUSH, POP, DDSWRITE, LDCOUNT, RAMREAD, READPIPEINDF, READPIPE, SETRAMADDR, SETREGISTER,
+ WAITDDSWRITEDONE, UPDATE, END, MESSAGE, UNKNOWN) = range(31)
+
+timeUnits = ['s', 'ms', 'us', 'ns']
+
+# the regular expressions are tried in this order, the first match decides
+comparisons = {'CMPLESS': (operator.gt, '<'), 'CMPLE': (operator.ge, '<='), 'CMPGREATER': (operator.lt, '>'),
+               'CMPGE': (operator.le, '>='), 'CMPEQUAL': (operator.eq, '=='), 'CMPNOTEQUAL': (operator.ne, '!=')}
+arithmetic = {'MULTW': (operator.mul, '*='), 'DIVW': (operator.floordiv, '/='), 'ADDW': (operator.add, '+='),
+              'SUBW': (operator.sub, '-='), 'ORW': (operator.or_, '|='), 'ANDW': (operator.and_, '&='),
+              'SHL': (operator.lshift, '<<='), 'SHR': (operator.rshift, '>>=')}
+jumps = {'JMPNCMP': JMPNCMP, 'JMPCMP': JMPCMP, 'JMPZ': JMPZ, 'JMPPIPEEMPTY': JMPPIPEEMPTY,
+         'JMPPIPEAVAIL': JMPPIPEAVAIL, 'JMPNZ': JMPNZ, 'JMP': JMP}
+ddsFields = {'DDSFRQ': ('freq', 'FREQUENCY'), 'DDSPHS': ('phase', 'PHASE'), 'DDSAMP': ('amp', 'AMPLITUDE')}
+symbols = dict(list(comparisons.values()) + list(arithmetic.values()))
+
+instructionPatterns = [(re.compile(r"\s*(LDWR)\s(\S+)"), LDWR),
+                       (re.compile(r"\s*(STWR)\s(\S+)"), STWR),
+                       (re.compile(r"\s*(STWI)"), STWI)]
+instructionPatterns += [(re.compile(r"\s*({0})\s(\S+)".format(name)), COMPARE) for name in
+                        ['CMPLESS', 'CMPLE', 'CMPGREATER', 'CMPGE', 'CMPEQUAL', 'CMPNOTEQUAL']]
+instructionPatterns += [(re.compile(r"\s*({0})\s(\S+)".format(name)), ALU) for name in
+                        ['MULTW', 'DIVW', 'ADDW', 'SUBW', 'ORW', 'ANDW', 'SHL', 'SHR']]
+instructionPatterns += [(re.compile(r"\s*(INC)\s(\S+)"), INCDEC),
+                        (re.compile(r"\s*(DEC)\s(\S+)"), INCDEC)]
+instructionPatterns += [(re.compile(r"\s*({0})\s(\S+)".format(name)), JMP) for name in
+                        ['JMPNCMP', 'JMPCMP', 'JMPZ', 'JMPPIPEEMPTY', 'JMPPIPEAVAIL', 'JMPNZ', 'JMP']]
+instructionPatterns += [(re.compile(r"\s*(JMPPUSH)\s(\S+)"), JMPPUSH),
+                        (re.compile(r"\s*(JMPPOP)"), JMPPOP),
+                        (re.compile(r"\s*(PUSH)\s(\S+)"), PUSH),
+                        (re.compile(r"\s*(POP)"), POP),
+                        (re.compile(r"\s*(NOP)"), MESSAGE),
+                        (re.compile(r"\s*(JMPNINTERRUPT)\s(\S+)"), JMP)]
+instructionPatterns += [(re.compile(r"\s*({0})\s(\S+),\s(\S+)".format(name)), DDSWRITE) for name in
+                        ['DDSFRQ', 'DDSPHS', 'DDSAMP']]
+instructionPatterns += [(re.compile(r"\s*(LDCOUNT)\s(\S+)"), LDCOUNT),
+                        (re.compile(r"\s*(RAMREAD)"), RAMREAD),
+                        (re.compile(r"\s*(READPIPEINDF)"), READPIPEINDF),
+                        (re.compile(r"\s*(READPIPE)"), READPIPE),
+                        (re.compile(r"\s*(WRITEPIPEINDF)"), MESSAGE),
+                        (re.compile(r"\s*(WRITEPIPE)"), MESSAGE),
+                        (re.compile(r"\s*(WRITERESULTTOPIPE)\s(\S+),\s(\S+)"), MESSAGE),
+                        (re.compile(r"\s*(SETRAMADDR)\s+(\S+)"), SETRAMADDR),
+                        (re.compile(r"\s*(COUNTERMASK)\s(\S+)"), SETREGISTER),
+                        (re.compile(r"\s*(SHUTTERMASK)\s(\S+)"), SETREGISTER),
+                        (re.compile(r" *(WAITDDSWRITEDONE)"), WAITDDSWRITEDONE),
+                        (re.compile(r"\s*(UPDATE)\s1, (\S+)"), UPDATE),
+                        (re.compile(r"\s*(UPDATE)\s([a-zA-Z_0-9]+)"), UPDATE),
+                        (re.compile(r"\s*(END)"), END),
+                        (re.compile(r"\s*(WAIT)"), MESSAGE),
+                        (re.compile(r"\s*(ASYNCINVSHUTTER)\s(\S+)"), SETREGISTER),
+                        (re.compile(r"\s*(ASYNCSHUTTER)\s(\S+)"), SETREGISTER),
+                        (re.compile(r"\s*(TRIGGER)\s(\S+)"), SETREGISTER),
+                        (re.compile(r"\s*(SETSYNCTIME)\s(\S+)"), SETREGISTER)]
+
+declarationPatterns = [(re.compile(r"(var)\s(\S+)\s+(\S+), parameter, ([a-zA-Z_]+)"), True),
+                       (re.compile(r"(var)\s(\S+)\s+(\S+),"), False),
+                       (re.compile(r"(var)\s(\S+)\s+(\S+)"), False),
+                       (re.compile(r"(var)\s(\S+)"), False),
+                       (re.compile(r"(const)\s(\S+)\s+(\S+),"), False),
+                       (re.compile(r"(const)\s(\S+)\s+(\S+)"), False),
+                       (re.compile(r"(const)\s(\S+)"), False)]
+skipPattern = re.compile(r"^ *(#|$)")
+
+
+def literal(text):
+    return float(text) if "." in text else int(text, 0)  # 0 allows for hex conversion
+
+
+class Undefined(object):
+    """Value of a variable before its declaration was executed"""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __int__(self):
+        raise KeyError(self.name)
+
+
 class ppVirtualMachine:
-    """A virtual machine that mimics the soft-core processor on the FPGA for bug testing"""
+    """A virtual machine that mimics the soft-core processor on the FPGA for bug testing
+
+    The code is assembled once into a list of instructions with decoded opcodes, variable slots and resolved
+    jump targets. Variables live in a list indexed by slot while the code runs and are copied to varDict at the end.
+    """
     def __init__(self, code):
         random.seed(1)   # this must be set consistently for comparing pulse programs in unittests
         self.mainCode = code
@@ -32,7 +118,8 @@ class ppVirtualMachine:
         self.DDSChannels = 12
         self.DDSs = [DDS() for i in range(self.DDSChannels)]
         self.ddsWriteTimer = 0
-        #self.timer = 0
+        self.timer = 0
+        self.totalsteps = 0
         self.DDSwrites = 0
         self.varDict['DDSs'] = self.DDSs
         self.varDict['DDSwrites'] = self.DDSwrites
@@ -45,6 +132,9 @@ class ppVirtualMachine:
         self.fmtstr = "{0:50}{1:80}{2}"
         self.timestr = "ELAPSED CLOCK CYCLES: {0}"
         self.outputcode = ""
+        self.variableNames = list()
+        self.variableSlots = dict()
+        self.program = self.assemble(self.code)
 
     def printState(self):
         print(self.varDict)
@@ -65,725 +155,268 @@ class ppVirtualMachine:
     def replaceLabel(self, m):
         return m.group(2)
 
+    def slot(self, name):
+        """index of the variable name in the variable list"""
+        if name not in self.variableSlots:
+            self.variableSlots[name] = len(self.variableNames)
+            self.variableNames.append(name)
+        return self.variableSlots[name]
+
+    def assemble(self, code):
+        """Decode every line of code into an instruction (opcode, operand, extra, line)"""
+        program = [self.decode(line) for line in code]
+        # consecutive comments and empty lines are skipped at once, SKIP holds the number of lines left in the block
+        skipped = 0
+        for index in reversed(range(len(program))):
+            if program[index][0] == SKIP:
+                skipped += 1
+                program[index] = (SKIP, skipped, None, program[index][3])
+            else:
+                skipped = 0
+        return program
+
+    def decode(self, line):
+        if skipPattern.match(line):
+            return (SKIP, 1, None, line)
+        for pattern, isParameter in declarationPatterns:
+            m = pattern.match(line)
+            if m:
+                value = None
+                if m.lastindex >= 3:
+                    value = literal(m.group(3))
+                    if isParameter and m.group(4) in timeUnits:
+                        value = round(Q(value, m.group(4)).m_as('ns')/5)
+                return (DECLARE, self.slot(m.group(2)), value, line)
+        for pattern, opcode in instructionPatterns:
+            m = pattern.match(line)
+            if m:
+                return self.decodeInstruction(opcode, m.group(1), m.groups()[1:], line)
+        return (UNKNOWN, None, None, line)
+
+    def decodeInstruction(self, opcode, mnemonic, operands, line):
+        if opcode in (LDWR, STWR, LDCOUNT, SETRAMADDR):
+            return (opcode, self.slot(operands[0]), None, line)
+        if opcode == COMPARE:
+            return (opcode, self.slot(operands[0]), comparisons[mnemonic][0], line)
+        if opcode == ALU:
+            return (opcode, self.slot(operands[0]), arithmetic[mnemonic][0], line)
+        if opcode == INCDEC:
+            return (opcode, self.slot(operands[0]), 1 if mnemonic == 'INC' else -1, line)
+        if opcode in (JMP, JMPPUSH):
+            # JMPNINTERRUPT always jumps in the simulation
+            return (jumps.get(mnemonic, opcode), self.labelDict.get(operands[0]), operands[0], line)
+        if opcode == PUSH:
+            return (opcode, operands[0], None, line)
+        if opcode == DDSWRITE:
+            return (opcode, self.slot(operands[0]), (self.slot(operands[1]),) + ddsFields[mnemonic], line)
+        if opcode == UPDATE:
+            message = " --> PULSED UPDATE FOR {0} CLOCK CYCLES" if "," in line else " --> UPDATE FOR {0} CLOCK CYCLES"
+            return (opcode, self.slot(operands[0]), message, line)
+        if opcode == SETREGISTER:
+            register, value, message = {'COUNTERMASK': ('COUNTER', operands[0], " --> SETTING COUNTER TO {0}"),
+                                        'SHUTTERMASK': ('SHUTTER', operands[0], " --> SETTING COUNTER TO {0}"),
+                                        'ASYNCINVSHUTTER': ('SHUTTER', operands[0] + '_inv', " --> INVERTING {0} SHUTTER"),
+                                        'ASYNCSHUTTER': ('SHUTTER', operands[0], " --> SETTING SHUTTER {0}"),
+                                        'TRIGGER': ('TRIGGER', operands[0], " --> TRIGGER {0}"),
+                                        'SETSYNCTIME': ('SYNCTIME', operands[0], " --> SYNCTIME {0}")}[mnemonic]
+            return (opcode, value, (register, message.format(operands[0])), line)
+        if opcode in (MESSAGE, END):
+            message = {'NOP': " --> NOP", 'WAIT': " --> WAIT", 'END': " --> PROGRAM END"}.get(mnemonic)
+            if mnemonic == 'WRITERESULTTOPIPE':
+                message = " --> WRITING RESULT TO PIPE: {1} => {0}".format(mnemonic, operands[0])
+            return (opcode, None, message, line)
+        return (opcode, None, None, line)
+
     def runCode(self, printAll=False, outfile=None):
         if outfile:
             with outfile.open('a') as f:
-                self.runCodeMain(printAll,f)
+                return self.runCodeMain(printAll,f)
         else:
-            self.runCodeMain(printAll)
+            return self.runCodeMain(printAll)
+
+    def trace(self, line, msg, timer, printAll, outfile):
+        text = self.fmtstr.format(line, msg, self.timestr.format(timer))
+        if printAll:
+            print(text)
+        if outfile is not None:
+            print(text, file=outfile)
 
     def runCodeMain(self, printAll=False, outfile=None):
         """Execute pp code"""
-        if outfile is None:
-            keepoutput = False
-        else:
-            keepoutput = True
+        tracing = printAll or outfile is not None
+        program = self.program
+        names = self.variableNames
+        memory = [self.varDict.get(name, Undefined(name)) for name in names]
+        stack = self.memoryLocationStack
+        stack.clear()
+        R, CMP, INDF = self.R, self.CMP, self.INDF
+        Rref = self.variableSlots.get(self.Rref)
+        DDSs = self.DDSs
+        DDSwrites = self.DDSwrites
         totalsteps = 0
-        i = 0
+        pc = 0
         pipe = 10
         timer = 0
-        self.ddsWriteTimer = 0
-        self.memoryLocationStack.clear()
-        memlocationChanged = False
-        while i<len(self.code):
-            totalsteps += 1
-            line = self.code[i]
-            #if memlocationChanged:
-                #memlocationChanged = False
-            #else:
-            i += 1
-            timer += 1
-            if self.ddsWriteTimer > 0:
-                self.ddsWriteTimer -= 1
-            else:
-                self.ddsWritetimer = 0 # just in case
-            m = re.match(r"^ *#", line, re.MULTILINE)
-            if m:
-                timer -= 1
-                totalsteps -= 1
-                continue
-            m = re.match(r"^ *$", line, re.MULTILINE)
-            if m:
-                timer -= 1
-                totalsteps -= 1
-                continue
-            m = re.match(r"(var)\s(\S+)\s+(\S+), parameter, ([a-zA-Z_]+)",line)
-            if m:
-                if "." in m.group(3):
-                    if m.group(4) in ['s', 'ms', 'us', 'ns']:
-                        numClockCycles = round(Q(float(m.group(3)),m.group(4)).m_as('ns')/5)
-                        self.varDict[m.group(2)] = numClockCycles
-                    else:
-                        self.varDict[m.group(2)] = float(m.group(3))
-                else:
-                    if m.group(4) in ['s', 'ms', 'us', 'ns']:
-                        numClockCycles = round(Q(int(m.group(3),0),m.group(4)).m_as('ns')/5)
-                        self.varDict[m.group(2)] = numClockCycles
-                    else:
-                        self.varDict[m.group(2)] = int(m.group(3),0) #0 allows for hex conversion
-                timer -= 1
-                continue
-            m = re.match(r"(var)\s(\S+)\s+(\S+),",line)
-            if m:
-                if "." in m.group(3):
-                    self.varDict[m.group(2)] = float(m.group(3))
-                else:
-                    self.varDict[m.group(2)] = int(m.group(3),0) #0 allows for hex conversion
-                timer -= 1
-                continue
-            else:
-                m = re.match(r"(var)\s(\S+)\s+(\S+)",line)
-                if m:
-                    if "." in m.group(3):
-                        self.varDict[m.group(2)] = float(m.group(3))
-                    else:
-                        self.varDict[m.group(2)] = int(m.group(3), 0)
+        ddsWriteTimer = 0
+        end = len(program)
+        try:
+            while pc < end:
+                opcode, operand, extra, line = program[pc]
+                pc += 1
+                timer += 1
+                totalsteps += 1
+                if ddsWriteTimer > 0:
+                    ddsWriteTimer -= 1
+                if opcode == SKIP:
                     timer -= 1
-                    continue
-                else:
-                    m = re.match(r"(var)\s(\S+)",line)
-                    if m:
-                        self.varDict[m.group(2)] = None
-                        timer -= 1
-                        continue
-            m = re.match(r"(const)\s(\S+)\s+(\S+),",line)
-            if m:
-                if "." in m.group(3):
-                    self.varDict[m.group(2)] = float(m.group(3))
-                else:
-                    self.varDict[m.group(2)] = int(m.group(3), 0)
-                timer -= 1
-                continue
-            else:
-                m = re.match(r"(const)\s(\S+)\s+(\S+)",line)
-                if m:
-                    if "." in m.group(3):
-                        self.varDict[m.group(2)] = float(m.group(3))
+                    totalsteps -= 1
+                    if operand > 1:
+                        ddsWriteTimer = max(ddsWriteTimer - operand + 1, 0)
+                        pc += operand - 1
+                elif opcode == LDWR:
+                    if Rref == operand:
+                        self.unnecessaryLines.add((pc, line))
                     else:
-                        self.varDict[m.group(2)] = int(m.group(3), 0)
+                        self.necessaryLines.add((pc, line))
+                    Rref = operand
+                    R = int(memory[operand])
+                    if tracing:
+                        self.trace(line, " --> self.R = {0}".format(R), timer, printAll, outfile)
+                elif opcode == STWR:
+                    if Rref == operand and memory[operand] == R:
+                        self.unnecessaryLines.add((pc, line))
+                    else:
+                        self.necessaryLines.add((pc, line))
+                    Rref = operand
+                    memory[operand] = R
+                    if tracing:
+                        self.trace(line, " --> {0} = {1}".format(names[operand], R), timer, printAll, outfile)
+                elif opcode == ALU:
+                    Rref = None
+                    R = extra(R, int(memory[operand]))
+                    if tracing:
+                        self.trace(line, " --> R {0} {1} -> {2}".format(symbols[extra], memory[operand], R), timer, printAll, outfile)
+                elif opcode == COMPARE:
+                    CMP = extra(int(memory[operand]), R)
+                    if tracing:
+                        self.trace(line, " --> CMP = {0} {1} {2} = {3}".format(R, symbols[extra], memory[operand], CMP), timer, printAll, outfile)
+                elif JMP <= opcode <= JMPPIPEAVAIL:
+                    if (opcode == JMP or (opcode == JMPCMP and CMP) or (opcode == JMPNCMP and not CMP) or
+                            (opcode == JMPZ and not R) or (opcode == JMPNZ and R) or
+                            (opcode == JMPPIPEEMPTY and pipe <= 0) or (opcode == JMPPIPEAVAIL and pipe > 0)):
+                        if operand is None:
+                            raise KeyError(extra)
+                        pc = operand
+                        if tracing:
+                            self.trace(line, " --> JUMPING TO LINE {0}".format(pc), timer, printAll, outfile)
+                elif opcode == INCDEC:
+                    Rref = None
+                    R = int(memory[operand]) + extra
+                    if tracing:
+                        self.trace(line, " --> self.R = {0} {1} 1 -> {2}".format(names[operand], '+' if extra > 0 else '-', memory[operand]), timer, printAll, outfile)
+                elif opcode == DECLARE:
                     timer -= 1
-                    continue
-                else:
-                    m = re.match(r"(const)\s(\S+)",line)
-                    if m:
-                        self.varDict[m.group(2)] = None
-                        timer -= 1
-                        continue
-            m = re.match(r"\s*(LDWR)\s(\S+)", line)
-            if m:
-                if self.Rref == m.group(2):
-                    self.unnecessaryLines.add((i, line))
+                    memory[operand] = extra
+                elif opcode == DDSWRITE:
+                    valueSlot, field, description = extra
+                    value = memory[valueSlot]
+                    if value.__class__ is Undefined:
+                        raise KeyError(value.name)
+                    DDSs[int(memory[operand])][field] = value
+                    ddsWriteTimer += 64
+                    DDSwrites += 1
+                    if tracing:
+                        self.trace(line, " --> SETTING {0} TO {1} ON DDS CHANNEL {2}".format(description, names[valueSlot], names[operand]), timer, printAll, outfile)
+                elif opcode == UPDATE:
+                    duration = int(memory[operand])
+                    timer += duration
+                    ddsWriteTimer = 0 if duration > ddsWriteTimer else ddsWriteTimer - duration
+                    if tracing:
+                        self.trace(line, extra.format(memory[operand]), timer, printAll, outfile)
+                elif opcode == WAITDDSWRITEDONE:
+                    timer += ddsWriteTimer
+                    if tracing:
+                        self.trace(line, " --> WAITING {0} CLOCK CYCLES FOR DDS WRITE".format(ddsWriteTimer), timer, printAll, outfile)
+                    ddsWriteTimer = 0
+                elif opcode == JMPPUSH:
+                    stack.append(pc)
+                    if operand is None:
+                        raise KeyError(extra)
+                    pc = operand
+                    if tracing:
+                        self.trace(line, " --> PUSHING CURRENT ADDRESS TO STACK AND JUMPING TO: {0}".format(pc), timer, printAll, outfile)
+                elif opcode == JMPPOP:
+                    pc = stack.pop()
+                    if tracing:
+                        self.trace(line, " --> POP ADDRESS => JUMPING TO LINE {0}".format(pc), timer, printAll, outfile)
+                elif opcode == PUSH:
+                    stack.append(operand)
+                    if tracing:
+                        self.trace(line, " --> PUSHING W TO STACK: {0}".format(R), timer, printAll, outfile)
+                elif opcode == POP:
+                    R = stack.pop()
+                    if tracing:
+                        self.trace(line, " --> POP => W = {0}".format(R), timer, printAll, outfile)
+                elif opcode == LDCOUNT:
+                    Rref = None
+                    R = random.randint(0,30)
+                    if tracing:
+                        self.trace(line, " --> LOADED {0} (RANDOM) COUNTS FROM CHANNEL {1}".format(R, int(memory[operand])), timer, printAll, outfile)
+                elif opcode == RAMREAD:
+                    Rref = None
+                    R = random.randint(0,30)
+                    if tracing:
+                        self.trace(line, " --> READING FROM RAM: {} (RANDOM)".format(R), timer, printAll, outfile)
+                elif opcode == READPIPEINDF:
+                    INDF = random.randint(0,30)
+                    pipe -= 1
+                    if tracing:
+                        self.trace(line, " --> READING PIPE INTO INDF: {} (RANDOM)".format(INDF), timer, printAll, outfile)
+                elif opcode == READPIPE:
+                    Rref = None
+                    R = random.randint(0,30)
+                    pipe -= 1
+                    if tracing:
+                        self.trace(line, " --> READING PIPE INTO W REGISTER: {} (RANDOM)".format(R), timer, printAll, outfile)
+                elif opcode == STWI:
+                    if tracing:
+                        self.trace(line, " --> STORING {0} INTO MEMORY ADDRESS {1}".format(R, INDF), timer, printAll, outfile)
+                elif opcode == SETRAMADDR:
+                    self.RAMADDRESS = int(memory[operand])
+                    if tracing:
+                        self.trace(line, " --> SETTING RAM ADDRESS TO: {}".format(self.RAMADDRESS), timer, printAll, outfile)
+                elif opcode == SETREGISTER:
+                    register, message = extra
+                    setattr(self, register, operand)
+                    if tracing:
+                        self.trace(line, message, timer, printAll, outfile)
+                elif opcode == MESSAGE:
+                    if tracing:
+                        if extra is None:   # the pipe writes
+                            extra = (" --> WRITING INDF INTO PIPE: {} (RANDOM)".format(INDF) if "INDF" in line else
+                                     " --> WRITING W REGISTER INTO PIPE: {} (RANDOM)".format(R))
+                        self.trace(line, extra, timer, printAll, outfile)
+                elif opcode == END:
+                    if tracing:
+                        self.trace(line, extra, timer, printAll, outfile)
+                    break
                 else:
-                    self.necessaryLines.add((i, line))
-                self.Rref = m.group(2)
-                self.R = copy.copy(int(self.varDict[m.group(2)]))
-                if printAll:
-                    msg =  " --> self.R = {0}".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg =  " --> self.R = {0}".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(STWR)\s(\S+)", line)
-            if m:
-                if self.Rref == m.group(2) and self.varDict[m.group(2)] == self.R:
-                    self.unnecessaryLines.add((i, line))
-                else:
-                    self.necessaryLines.add((i, line))
-                self.Rref = m.group(2)
-                self.varDict[m.group(2)] = copy.copy(self.R)
-                if printAll:
-                    msg =  " --> {0} = {1}".format(m.group(2),self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg =  " --> {0} = {1}".format(m.group(2),self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(STWI)", line)
-            if m:
-                if printAll:
-                    msg =  " --> STORING {0} INTO MEMORY ADDRESS {1}".format(self.R,self.INDF)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg =  " --> STORING {0} INTO MEMORY ADDRESS {1}".format(self.R,self.INDF)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(CMPLESS)\s(\S+)", line)
-            if m:
-                self.CMP = int(self.varDict[m.group(2)]) > self.R
-                if printAll:
-                    msg =  " --> CMP = {0} < {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg =  " --> CMP = {0} < {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(CMPLE)\s(\S+)", line)
-            if m:
-                self.CMP = int(self.varDict[m.group(2)]) >= self.R
-                if printAll:
-                    msg =  " --> CMP = {0} <= {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg =  " --> CMP = {0} <= {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(CMPGREATER)\s(\S+)", line)
-            if m:
-                self.CMP = int(self.varDict[m.group(2)]) < self.R
-                if printAll:
-                    msg =  " --> CMP = {0} > {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg =  " --> CMP = {0} > {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(CMPGE)\s(\S+)", line)
-            if m:
-                self.CMP = int(self.varDict[m.group(2)]) <= self.R
-                if printAll:
-                    msg =  " --> CMP = {0} >= {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg =  " --> CMP = {0} >= {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(CMPEQUAL)\s(\S+)", line)
-            if m:
-                self.CMP = int(self.varDict[m.group(2)]) == self.R
-                if printAll:
-                    msg = " --> CMP = {0} == {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> CMP = {0} == {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(CMPNOTEQUAL)\s(\S+)", line)
-            if m:
-                self.CMP = int(self.varDict[m.group(2)]) != self.R
-                if printAll:
-                    msg = " --> CMP = {0} != {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> CMP = {0} != {1} = {2}".format(self.R, self.varDict[m.group(2)], self.CMP)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(MULTW)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R *= int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R *= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R *= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(DIVW)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R //= int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R /= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R /= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(ADDW)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R += int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R += {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R += {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(SUBW)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R -= int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R -= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R -= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(ORW)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R = self.R | int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R |= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R |= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(ANDW)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R = self.R & int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R &= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R &= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(SHL)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R <<= int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R <<= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R <<= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(SHR)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R >>= int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> R >>= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> R >>= {0} -> {1}".format(self.varDict[m.group(2)],self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(INC)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R = int(self.varDict[m.group(2)]) + 1
-                if printAll:
-                    msg = " --> self.R = {0} + 1 -> {1}".format(m.group(2),self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> self.R = {0} + 1 -> {1}".format(m.group(2),self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(DEC)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R = int(self.varDict[m.group(2)]) - 1
-                if printAll:
-                    msg = " --> self.R = {0} - 1 -> {1}".format(m.group(2),self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> self.R = {0} - 1 -> {1}".format(m.group(2),self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMPNCMP)\s(\S+)", line)
-            if m:
-                if not self.CMP:
-                    i = self.labelDict[m.group(2)]
-                    memlocationChanged = True
-                    if printAll:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                    if keepoutput:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMPCMP)\s(\S+)", line)
-            if m:
-                if self.CMP:
-                    i = self.labelDict[m.group(2)]
-                    memlocationChanged = True
-                    if printAll:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                    if keepoutput:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMPZ)\s(\S+)", line)
-            if m:
-                if not self.R:
-                    i = self.labelDict[m.group(2)]
-                    memlocationChanged = True
-                    if printAll:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                    if keepoutput:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMPPIPEEMPTY)\s(\S+)", line)
-            if m:
-                if pipe<=0:
-                    i = self.labelDict[m.group(2)]
-                    memlocationChanged = True
-                    if printAll:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                    if keepoutput:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                #pipe -= 1
-                continue
-            m = re.match(r"\s*(JMPPIPEAVAIL)\s(\S+)", line)
-            if m:
-                if pipe>0:
-                    i = self.labelDict[m.group(2)]
-                    memlocationChanged = True
-                    if printAll:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                    if keepoutput:
-                        msg = " --> JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                #pipe -= 1
-                continue
-            m = re.match(r"\s*(JMPNZ)\s(\S+)", line)
-            if m:
-                if self.R:
-                    i = self.labelDict[m.group(2)]
-                    memlocationChanged = True
-                    if printAll:
-                        msg = " --msg = > JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                    if keepoutput:
-                        msg = " --msg = > JUMPING TO LINE {0}".format(i)
-                        print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMP)\s(\S+)", line)
-            if m:
-                i = self.labelDict[m.group(2)]
-                memlocationChanged = True
-                if printAll:
-                    msg = " --> JUMPING TO LINE {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> JUMPING TO LINE {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMPPUSH)\s(\S+)", line)
-            if m:
-                self.memoryLocationStack.append(i)
-                i = self.labelDict[m.group(2)]
-                memlocationChanged = True
-                if printAll:
-                    msg = " --> PUSHING CURRENT ADDRESS TO STACK AND JUMPING TO: {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> PUSHING CURRENT ADDRESS TO STACK AND JUMPING TO: {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMPPOP)", line)
-            if m:
-                #i = self.labelDict[m.group(2)]
-                i = self.memoryLocationStack.pop()
-                memlocationChanged = True
-                #i += 2
-                if printAll:
-                    msg = " --> POP ADDRESS => JUMPING TO LINE {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> POP ADDRESS => JUMPING TO LINE {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(PUSH)\s(\S+)", line)
-            if m:
-                self.memoryLocationStack.append(m.group(2))
-                #i = self.labelDict[m.group(2)]
-                #memlocationChanged = True
-                if printAll:
-                    msg = " --> PUSHING W TO STACK: {0}".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> PUSHING W TO STACK: {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(POP)", line)
-            if m:
-                #i = self.labelDict[m.group(2)]
-                self.R = self.memoryLocationStack.pop()
-                memlocationChanged = True
-                #i += 2
-                if printAll:
-                    msg = " --> POP => W = {0}".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> POP => W = {0}".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*NOP", line)
-            if m:
-                if printAll:
-                    msg = " --> NOP"
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> NOP"
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(JMPNINTERRUPT)\s(\S+)", line)
-            if m:
-                i = self.labelDict[m.group(2)]
-                memlocationChanged = True
-                if printAll:
-                    msg = " --> JUMPING TO LINE {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> JUMPING TO LINE {0}".format(i)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(DDSFRQ)\s(\S+),\s(\S+)", line)
-            if m:
-                self.DDSs[int(self.varDict[m.group(2)])]['freq'] = self.varDict[m.group(3)]
-                self.ddsWriteTimer += 64
-                self.DDSwrites += 1
-                if printAll:
-                    msg = " --> SETTING FREQUENCY TO {0} ON DDS CHANNEL {1}".format(m.group(3),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SETTING FREQUENCY TO {0} ON DDS CHANNEL {1}".format(m.group(3),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(DDSPHS)\s(\S+),\s(\S+)", line)
-            if m:
-                self.DDSs[int(self.varDict[m.group(2)])]['phase'] = self.varDict[m.group(3)]
-                self.ddsWriteTimer += 64
-                self.DDSwrites += 1
-                if printAll:
-                    msg = " --> SETTING PHASE TO {0} ON DDS CHANNEL {1}".format(m.group(3),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SETTING PHASE TO {0} ON DDS CHANNEL {1}".format(m.group(3),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(DDSAMP)\s(\S+),\s(\S+)", line)
-            if m:
-                self.DDSs[int(self.varDict[m.group(2)])]['amp'] = self.varDict[m.group(3)]
-                self.ddsWriteTimer += 64
-                self.DDSwrites += 1
-                if printAll:
-                    msg = " --> SETTING AMPLITUDE TO {0} ON DDS CHANNEL {1}".format(m.group(3),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SETTING AMPLITUDE TO {0} ON DDS CHANNEL {1}".format(m.group(3),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(LDCOUNT)\s(\S+)", line)
-            if m:
-                self.Rref = None
-                self.R = random.randint(0,30)
-                if printAll:
-                    msg = " --> LOADED {0} (RANDOM) COUNTS FROM CHANNEL {1}".format(self.R,int(self.varDict[m.group(2)]))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> LOADED {0} (RANDOM) COUNTS FROM CHANNEL {1}".format(self.R,int(self.varDict[m.group(2)]))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(RAMREAD)", line)
-            if m:
-                self.Rref = None
-                self.R = random.randint(0,30)
-                if printAll:
-                    msg = " --> READING FROM RAM: {} (RANDOM)".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> READING FROM RAM: {} (RANDOM)".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(READPIPEINDF)", line)
-            if m:
-                #self.Rref = None
-                self.INDF = random.randint(0,30)
-                pipe -= 1
-                if printAll:
-                    msg = " --> READING PIPE INTO INDF: {} (RANDOM)".format(self.INDF)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> READING PIPE INTO INDF: {} (RANDOM)".format(self.INDF)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(READPIPE)", line)
-            if m:
-                self.Rref = None
-                self.R = random.randint(0,30)
-                pipe -= 1
-                if printAll:
-                    msg = " --> READING PIPE INTO W REGISTER: {} (RANDOM)".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> READING PIPE INTO W REGISTER: {} (RANDOM)".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(WRITEPIPEINDF)", line)
-            if m:
-                #self.Rref = None
-                #self.INDF = random.randint(0,30)
-                if printAll:
-                    msg = " --> WRITING INDF INTO PIPE: {} (RANDOM)".format(self.INDF)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> WRITING INDF INTO PIPE: {} (RANDOM)".format(self.INDF)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(WRITEPIPE)", line)
-            if m:
-                #self.Rref = None
-                #self.INDF = random.randint(0,30)
-                if printAll:
-                    msg = " --> WRITING W REGISTER INTO PIPE: {} (RANDOM)".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> WRITING W REGISTER INTO PIPE: {} (RANDOM)".format(self.R)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(WRITERESULTTOPIPE)\s(\S+),\s(\S+)", line)
-            if m:
-                #self.Rref = None
-                #self.INDF = random.randint(0,30)
-                if printAll:
-                    msg = " --> WRITING RESULT TO PIPE: {1} => {0}".format(m.group(1),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> WRITING RESULT TO PIPE: {1} => {0}".format(m.group(1),m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(SETRAMADDR)\s+(\S+)", line)
-            if m:
-                #self.Rref = None
-                #self.INDF = random.randint(0,30)
-                self.RAMADDRESS = int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> SETTING RAM ADDRESS TO: {}".format(self.RAMADDRESS)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SETTING RAM ADDRESS TO: {}".format(self.RAMADDRESS)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(COUNTERMASK)\s(\S+)", line)
-            if m:
-                self.COUNTER = m.group(2)
-                if printAll:
-                    msg = " --> SETTING COUNTER TO {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SETTING COUNTER TO {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(SHUTTERMASK)\s(\S+)", line)
-            if m:
-                self.SHUTTER = m.group(2)
-                if printAll:
-                    msg = " --> SETTING COUNTER TO {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SETTING COUNTER TO {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r" *WAITDDSWRITEDONE", line)
-            if m:
-                timer += self.ddsWriteTimer
-                if printAll:
-                    msg = " --> WAITING {0} CLOCK CYCLES FOR DDS WRITE".format(self.ddsWriteTimer)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> WAITING {0} CLOCK CYCLES FOR DDS WRITE".format(self.ddsWriteTimer)
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                self.ddsWriteTimer = 0
-                continue
-            m = re.match(r"\s*(UPDATE)\s1, (\S+)", line)
-            if m:
-                timer += int(self.varDict[m.group(2)])
-                if int(self.varDict[m.group(2)]) > self.ddsWriteTimer:
-                    self.ddsWriteTimer = 0
-                else:
-                    self.ddsWriteTimer -= int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> PULSED UPDATE FOR {0} CLOCK CYCLES".format(self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> PULSED UPDATE FOR {0} CLOCK CYCLES".format(self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(UPDATE)\s([a-zA-Z_0-9]+)", line)
-            if m:
-                timer += int(self.varDict[m.group(2)])
-                if int(self.varDict[m.group(2)]) > self.ddsWriteTimer:
-                    self.ddsWriteTimer = 0
-                else:
-                    self.ddsWriteTimer -= int(self.varDict[m.group(2)])
-                if printAll:
-                    msg = " --> UPDATE FOR {0} CLOCK CYCLES".format(self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> UPDATE FOR {0} CLOCK CYCLES".format(self.varDict[m.group(2)])
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(END)", line)
-            if m:
-                if printAll:
-                    msg = " --> PROGRAM END"
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> PROGRAM END"
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                break
-            m = re.match(r"\s*(WAIT)", line)
-            if m:
-                if printAll:
-                    msg = " --> WAIT"
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> WAIT"
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(ASYNCINVSHUTTER)\s(\S+)", line)
-            if m:
-                self.SHUTTER = m.group(2)+'_inv'
-                if printAll:
-                    msg = " --> INVERTING {0} SHUTTER".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> INVERTING {0} SHUTTER".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(ASYNCSHUTTER)\s(\S+)", line)
-            if m:
-                self.SHUTTER = m.group(2)
-                if printAll:
-                    msg = " --> SETTING SHUTTER {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SETTING SHUTTER {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(TRIGGER)\s(\S+)", line)
-            if m:
-                self.TRIGGER = m.group(2)
-                if printAll:
-                    msg = " --> TRIGGER {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> TRIGGER {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            m = re.match(r"\s*(SETSYNCTIME)\s(\S+)", line)
-            if m:
-                self.SYNCTIME = m.group(2)
-                if printAll:
-                    msg = " --> SYNCTIME {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)))
-                if keepoutput:
-                    msg = " --> SYNCTIME {0}".format(m.group(2))
-                    print(self.fmtstr.format(line, msg, self.timestr.format(timer)), file=outfile)
-                continue
-            raise Exception("I don't know how to interpret {}", line)
+                    raise Exception("I don't know how to interpret {}", line)
+        finally:
+            self.R, self.CMP, self.INDF = R, CMP, INDF
+            self.Rref = names[Rref] if Rref is not None else None
+            self.DDSwrites = DDSwrites
+            self.ddsWriteTimer = ddsWriteTimer
+            self.timer, self.totalsteps = timer, totalsteps
+            for name, value in zip(names, memory):
+                if value.__class__ is not Undefined:
+                    self.varDict[name] = value
         uselessLines = self.unnecessaryLines-self.necessaryLines
         if uselessLines:
             print("\nUNNECESSARY LINES:")
             for l, line in uselessLines:
                 print("{0:5}: {1}".format(l,line))
-        print("ELAPSED CLOCK CYCLES: ", timer, "TOTAL EXECUTED STEPS: ", totalsteps, "DDS Writes:", self.DDSwrites)
+        print("ELAPSED CLOCK CYCLES: ", timer, "TOTAL EXECUTED STEPS: ", totalsteps, "DDS Writes:", DDSwrites)
         return uselessLines
 
 def compareDicts(d1,d2):
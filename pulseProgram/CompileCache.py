@@ -0,0 +1,90 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+On disk cache of compiled ppp and pulse programs.
+
+Entries are keyed by a hash of everything the compilation depends on: the source of the program and all inserted
+files, the DDS hardware configuration and the compiler version. The compiler version is the hash of the compiler
+source files, editing the compiler therefore invalidates all entries. Failed compilations are not cached.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+
+from modules.SQLiteLRUCache import SQLiteLRUCache
+from pppCompiler.astCompiler import pppCompiler
+
+CacheFormat = 1
+compilerModules = ['pppCompiler/astCompiler.py', 'pppCompiler/astSymbol.py', 'pppCompiler/pppCompiler.py',
+                   'pppCompiler/Symbol.py', 'pulseProgram/PulseProgram.py', 'pulser/Encodings.py']
+
+_compilerVersion = None
+
+
+def compilerVersion():
+    """hash of the compiler source files"""
+    global _compilerVersion
+    if _compilerVersion is None:
+        digest = hashlib.sha1(str(CacheFormat).encode())
+        basedir = os.path.join(os.path.dirname(__file__), '..')
+        for name in compilerModules:
+            filename = os.path.join(basedir, name)
+            if os.path.exists(filename):
+                with open(filename, 'rb') as f:
+                    digest.update(f.read())
+        _compilerVersion = digest.hexdigest()
+    return _compilerVersion
+
+
+class CompileCache(object):
+    def __init__(self, filename, capacity=256):
+        self.filename = filename
+        self.store = SQLiteLRUCache(capacity, filename, memoryCapacity=0)  # compiled programs are modified after loading
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, kind, *parts):
+        digest = hashlib.sha256(compilerVersion().encode())
+        digest.update(kind.encode())
+        for part in parts:
+            data = part if isinstance(part, str) else repr(part)
+            digest.update(b'\0' + data.encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        try:
+            value = self.store[key]
+            self.hits += 1
+            return value
+        except KeyError:
+            pass
+        except Exception as e:   # entries written by other versions may fail to unpickle
+            logging.getLogger(__name__).warning("Discarding unreadable compile cache entry {0}: {1}".format(key, e))
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        try:
+            self.store[key] = value
+        except sqlite3.Error as e:
+            logging.getLogger(__name__).warning("Cannot write compile cache '{0}': {1}".format(self.filename, e))
+
+    def compilePpp(self, source):
+        """return the assembly and the reverse line lookup of the ppp source, compiling it only if not cached"""
+        key = self.key('ppp', source)
+        result = self.get(key)
+        if result is None:
+            compiler = pppCompiler()
+            result = compiler.compileString(source), compiler.reverseLineLookup
+            self.put(key, result)
+        return result
+
+    def pulseProgramKey(self, pulseProgram):
+        """the key of the pulse program as loaded, depending on all source files and the DDS configuration"""
+        boards = [(type(board).__name__, board.channelLimit) for board in pulseProgram.adBoards]
+        return self.key('pp', pulseProgram.pp_filename, list(pulseProgram.source.items()),
+                        list(pulseProgram.adIndexList), boards)
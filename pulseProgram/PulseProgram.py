@@ -267,6 +267,7 @@ class PulseProgram:
         
         self.timestep = timestep
         self.sourcelines = []
+        self.compileCache = None         # optional CompileCache, skips parse and toBytecode for known sources
 
     def setHardware(self, adIndexList, adBoards, timestep ):
         self.adIndexList = adIndexList
@@ -381,21 +382,21 @@ class PulseProgram:
         return '\n'.join(lines)
            
     def writeBinaryCodeForSimulation(self, code, filename):
-        from pulser.PulserHardwareServer import sliceview
+        from pulser.DataFifoDecoder import sliceview
         with open(filename, 'w') as f:
             for v in sliceview( code, 2):
                 (value,) = struct.unpack('H', v)
                 f.write("{0:016b}\n".format(value))
 
     def writeBinaryCodeForReference(self, code, filename):
-        from pulser.PulserHardwareServer import sliceview
+        from pulser.DataFifoDecoder import sliceview
         with open(filename, 'w') as f:
             for v in sliceview( code, 4):
                 (value,) = struct.unpack('I', v)
                 f.write("{0:08x}\n".format(value))
 
     def writeBinaryDataForReference(self, code, filename):
-        from pulser.PulserHardwareServer import sliceview
+        from pulser.DataFifoDecoder import sliceview
         with open(filename, 'w') as f:
             for v in sliceview( code, 8):
                 (value,) = struct.unpack('Q', v)
@@ -653,13 +654,22 @@ class PulseProgram:
             logging.getLogger(__name__).error("Error encoding {0} with '{1}': {2}".format(mag, encoding, str(e)))
             return 0
 
+    compiledAttributes = ('code', 'dataCode', 'variabledict', 'labeldict', 'defines', '_exitcodes', 'bytecode', 'dataBytecode')
+
     def compileCode(self):
+        key = self.compileCache.pulseProgramKey(self) if self.compileCache is not None else None
+        compiled = self.compileCache.get(key) if key is not None else None
+        if compiled is not None:
+            self.__dict__.update(compiled)
+            return
         try:
             self.parse()
             self.toBytecode()
         except Exception as e:
             logging.getLogger(__name__).exception(e)
             raise
+        if key is not None:
+            self.compileCache.put(key, dict((name, getattr(self, name)) for name in self.compiledAttributes))
         
     def exitcode(self, code):
         if code in self._exitcodes:
@@ -23,12 +23,12 @@ from pulseProgram.VariableTableModel import VariableTableModel
 from pulser.Encodings import EncodingDict
 from uiModules.RotatedHeaderView import RotatedHeaderView
 from modules.enum import enum
-from pppCompiler.astCompiler import pppCompiler
 from pppCompiler.CompileException import CompileException
 from pppCompiler.Symbol import SymbolTable
 from modules.PyqtUtility import BlockSignals, updateComboBoxItems
 from pyparsing import ParseException
 import copy
+from .CompileCache import CompileCache
 from .ShutterDictionary import ShutterDictionary
 from .TriggerDictionary import TriggerDictionary
 from .CounterDictionary import CounterDictionary
@@ -147,6 +147,8 @@ class PulseProgramUi(PulseProgramWidget, PulseProgramBase):
         self.pppCompileException = None
         self.globaldict = parameterdict
         self.project = getProject()
+        self.compileCache = CompileCache(os.path.join(self.project.projectDir, '.compile-cache.db'))
+        self.pulseProgram.compileCache = self.compileCache
         self.defaultPPPDir = self.project.configDir+'/PulseProgramsPlus'
         if not os.path.exists(self.defaultPPPDir):
             os.makedirs(self.defaultPPPDir)
@@ -559,10 +561,7 @@ class PulseProgramUi(PulseProgramWidget, PulseProgramBase):
         self.pppSource = self.pppSource.expandtabs(4)
         success = False
         try:
-            compiler = pppCompiler()
-            ppCode = compiler.compileString( self.pppSource )
-            #self.pppReverseLineLookup = dict()#compiler.reverseLineLookup
-            self.pppReverseLineLookup = compiler.reverseLineLookup
+            ppCode, self.pppReverseLineLookup = self.compileCache.compilePpp(self.pppSource)
             self.pppCompileException = None
             with open(savefilename, "w") as f:
                 f.write(ppCode)
@@ -840,18 +839,19 @@ class PulseProgramUi(PulseProgramWidget, PulseProgramBase):
         self.updateSaveStatus()
 
     def setParentData(self, parentContext, var=None):
-        for var in [var] if var is not None else self.currentContext.parameters.values():
-            try:
-                var.hasParent = bool(parentContext)
-                if var.useParentValue and var.hasParent:
-                    rootName = self.findControllingNode(var.name)
-                    self.setParentValue(var.name, rootName)
-                    var.parentObject = self.contextDict[rootName].parameters[var.name]
-                else:
-                    self.currentContext.parameters.setStrValue(var.name, var.strvalue)
-                    var.parentObject = None
-            except KeyError:
-                var.hasParent = False
+        with self.currentContext.parameters.batchUpdate():     # recalculate the dependents once for all variables
+            for var in [var] if var is not None else self.currentContext.parameters.values():
+                try:
+                    var.hasParent = bool(parentContext)
+                    if var.useParentValue and var.hasParent:
+                        rootName = self.findControllingNode(var.name)
+                        self.setParentValue(var.name, rootName)
+                        var.parentObject = self.contextDict[rootName].parameters[var.name]
+                    else:
+                        self.currentContext.parameters.setStrValue(var.name, var.strvalue)
+                        var.parentObject = None
+                except KeyError:
+                    var.hasParent = False
 
     def findControllingNode(self, paramName):
         current, parent = self.currentContextName, self.currentContext.parentContext
@@ -5,24 +5,13 @@
 # *****************************************************************
 
 import logging
+from contextlib import contextmanager
 
-from networkx import DiGraph, simple_cycles, dfs_postorder_nodes, dfs_preorder_nodes
-from networkx import __version__ as nx_version
-
+from modules.DependencyGraph import DependencyGraph
 from modules.Expression import Expression
 from modules.SequenceDict import SequenceDict
 import copy
 
-if float(nx_version) < 2:
-    def nx_indegree_iter(g):
-        return g.in_degree_iter()
-else:
-    def nx_indegree_iter(g):
-        return g.in_degree()
-
-class CyclicDependencyException(Exception):
-    pass
-
 
 class VariableDictionaryView(object):
     """View on VariableDictionary that combines the local dictionary with the global dictionary
@@ -52,20 +41,26 @@ class VariableDictionaryView(object):
  
 class VariableDictionary(SequenceDict):
     """Ordered Dictionary to hold variable values. It maintains a dependency graph
-    to check for cycles and to recalculate the necessary values when one of the fields is updated"""   
+    to check for cycles and to recalculate the necessary values when one of the fields is updated.
+    Within batchUpdate the recalculation of the dependents of several edits is done once at the end."""   
     expression = Expression()
     def __init__(self, *args, **kwargs):
         self.valueView = VariableDictionaryView(self)
-        self.dependencyGraph = DiGraph()
+        self.dependencyGraph = DependencyGraph()
         self.globaldict = dict()
+        self._batchDepth = 0
+        self._batchChanged = set()
         super(VariableDictionary, self).__init__(*args, **kwargs)
 
     def __getstate__(self):
         return dict((key, value) for key, value in self.__dict__ if key not in ['globaldict'])
 
     def __setstate__(self, state):
-        state.pop('dependencyGraph', None)  # Unpickling of networkx 1.x objects into  networkx 2.x objects fails
+        state.pop('dependencyGraph', None)  # older versions stored networkx graphs, the graph is rebuilt by calculateDependencies
         self.__dict__.update(state)
+        self.dependencyGraph = DependencyGraph()
+        self._batchDepth = 0
+        self._batchChanged = set()
 
     def __reduce__(self):
         theclass, theitems, inst_dict = super(VariableDictionary, self).__reduce__()
@@ -77,7 +72,7 @@ class VariableDictionary(SequenceDict):
         self.calculateDependencies()
                 
     def calculateDependencies(self):
-        self.dependencyGraph = DiGraph()   # clear the old dependency graph in case parameters got removed
+        self.dependencyGraph = DependencyGraph()   # clear the old dependency graph in case parameters got removed
         for name, var in self.items():
             if hasattr(var, 'strvalue'):
                 try:
@@ -118,7 +113,7 @@ class VariableDictionary(SequenceDict):
         new = type(self)()
         new.globaldict = self.globaldict
         new.update( (name, copy.deepcopy(value)) for name, value in list(self.items()))
-        new.dependencyGraph = self.dependencyGraph
+        new.dependencyGraph = self.dependencyGraph.copy()
         #calculateDependencies()
         return new
                 
@@ -130,9 +125,23 @@ class VariableDictionary(SequenceDict):
     def addEdgeNoCycle(self, graph, first, second ):
         """add the dependency to the graph, raise CyclicDependencyException in case of cyclic dependencies"""
         graph.add_edge(first, second)
-        cycles = simple_cycles( graph )
-        for cycle in cycles:
-            raise CyclicDependencyException(cycle)
+
+    @contextmanager
+    def batchUpdate(self):
+        """recalculate the dependents of all edits within the block once when leaving the block.
+        The names of the recalculated variables are added to the yielded list."""
+        updated = list()
+        self._batchDepth += 1
+        try:
+            yield updated
+        finally:
+            self._batchDepth -= 1
+            if self._batchDepth == 0:
+                changed, self._batchChanged = self._batchChanged, set()
+                nodelist = self.dependencyGraph.descendants(changed)
+                for node in nodelist:
+                    self.recalculateNode(node)
+                updated.extend(nodelist)
                 
     def setStrValueIndex(self, index, strvalue):
         return self.setStrValue( self.keyAt(index), strvalue)
@@ -142,13 +151,9 @@ class VariableDictionary(SequenceDict):
         var = self[name]
         try:
             result, dependencies = self.expression.evaluate(strvalue, self.valueView, listDependencies=True )
-            graph = self.dependencyGraph.copy()            # make a copy of the graph. In case of cyclic dependencies we do not want o leave any changes
-            for edge in list(graph.in_edges([name])):      # remove all the inedges, dependencies from other variables might be gone
-                graph.remove_edge(*edge)
-            self.addDependencies(graph, dependencies, name) # add all new dependencies
+            self.dependencyGraph.setDependencies(name, dependencies)   # unchanged in case of cyclic dependencies
             var.value = result
             var.strvalue = strvalue
-            self.dependencyGraph = graph
             var.strerror = None
         except KeyError as e:
             var.strerror = str(e)
@@ -162,13 +167,9 @@ class VariableDictionary(SequenceDict):
         var = self[name]
         try:
             result, dependencies = self.expression.evaluate(strvalue, self.valueView, listDependencies=True )
-            graph = self.dependencyGraph.copy()            # make a copy of the graph. In case of cyclic dependencies we do not want o leave any changes
-            for edge in list(graph.in_edges([name])):      # remove all the inedges, dependencies from other variables might be gone
-                graph.remove_edge(*edge)
-            self.addDependencies(graph, dependencies, name) # add all new dependencies
+            self.dependencyGraph.setDependencies(name, dependencies)   # unchanged in case of cyclic dependencies
             var.parentValue = result
             var.parentStrvalue = strvalue
-            self.dependencyGraph = graph
             var.strerror = None
         except KeyError as e:
             var.strerror = str(e)
@@ -209,10 +210,10 @@ class VariableDictionary(SequenceDict):
         self.at(index).enabled = enabled
        
     def recalculateDependent(self, node, returnResult=False):
-        if self.dependencyGraph.has_node(node):
-            generator = dfs_preorder_nodes(self.dependencyGraph, node)
-            next(generator )   # skip the first, that is us
-            nodelist = list(generator)  # make a list, we need it twice 
+        if self._batchDepth:
+            self._batchChanged.add(node)
+        elif self.dependencyGraph.has_node(node):
+            nodelist = self.dependencyGraph.descendants([node])     # in topological order
             result = [ self.recalculateNode(node) for node in nodelist ]                
             return (nodelist, result) if returnResult else nodelist     # return which ones were re-calculated, so gui can be updated 
         return (list(), list()) if returnResult else list()
@@ -236,13 +237,8 @@ class VariableDictionary(SequenceDict):
         return None
             
     def recalculateAll(self):
-        g = self.dependencyGraph.reverse()
-
-        # for node, indegree in g.in_degree():
-        for node, indegree in nx_indegree_iter(g):  # work around the incompatibility between networkx 1 and 2
-            if indegree==0:
-                for calcnode in dfs_postorder_nodes(g, node):
-                    self.recalculateNode(calcnode)
+        for node in self.dependencyGraph.topologicalOrder():
+            self.recalculateNode(node)
                     
     def bareDictionaryCopy(self):
         return SequenceDict( self )
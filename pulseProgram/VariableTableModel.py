@@ -5,7 +5,7 @@
 # *****************************************************************
 import logging
 from PyQt5 import QtCore, QtGui
-from pulseProgram.VariableDictionary import CyclicDependencyException
+from modules.DependencyGraph import CyclicDependencyException
 
 
 class VariableTableModel(QtCore.QAbstractTableModel):
@@ -0,0 +1,431 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Decoding of the pulse programmer result pipe into :class:`pulser.PulserData.Data` objects.
+
+The result pipe delivers a stream of 64 bit tokens
+    0xffffffffffffffff end of experiment marker
+    0xfffexxxxxxxxxxxx exitcode marker
+    0xfffd000000000000 timestamping overflow marker
+    0xfffcxxxxxxxxxxxx scan parameter, followed by scanparameter value
+    0xfffb00000000xxxx timing was not met, xxxx address of update command whose timing could not be met
+    0x01ddnnxxxxxxxxxx count result from channel n id dd
+    0x02ddnnxxxxxxxxxx timestamp result channel n id dd
+    0x03ddnnxxxxxxxxxx timestamp gate start channel n id dd
+    0x04nnxxxxxxxxxxxx other return
+    0x05nnxxxxxxxxxxxx ADC return MSB 16 bits count, LSB 32 bits sum
+    0x06ddxxxxxxxxxxxx clock timestamp
+    0xeennxxxxxxxxxxxx dedicated result
+    0x50nn00000000xxxx result n return Hi 16 bits, only being sent if xxxx is not identical to zero
+    0x51nnxxxxxxxxxxxx result n return Low 48 bits, guaranteed to come first
+
+:meth:`DataFifoDecoder.decodeDataScalar` is the original token by token state machine.
+:meth:`DataFifoDecoder.decodeData` produces identical results, but only walks the rare control tokens
+(0xff.., 0xee.. and scan values) in Python. Everything between two control tokens is decoded in bulk
+with numpy masks.
+
+The logic analyzer pipe delivers header words 0xhh..ppppppppcccccc with a 24 bit clock counter c
+    hh=1 end marker
+    hh=2 overrun of the 24 bit counter
+    hh=3 data, hh=4 trigger, hh=5 aux data, hh=6 gate data, each followed by one 64 bit pattern word
+
+:meth:`DataFifoDecoder.decodeLogicAnalyzer` pairs headers and patterns with array operations and
+accumulates the counter overruns with a cumulative sum. A word can only be a pattern if the word
+before is a header of type 3 to 6, so the header positions alternate within runs of such words and
+restart after every other word.
+"""
+import logging
+import struct
+from collections import defaultdict
+from time import time as time_time
+
+import numpy
+
+from modules import enum
+from pulser.PulserData import Data, GatedTimestamps, intArray, appendArray, LogicAnalyzerData
+
+
+def sliceview(view, length):
+    for i in range(0, len(view) - length + 1, length):
+        yield memoryview(view)[i:i + length]
+
+
+def sliceview_remainder(view, length):
+    l = len(view)
+    full_items = l // length
+    appendix = l - length * full_items
+    return memoryview(view)[l - appendix:]
+
+
+def groupByChannel(channels, *arrays):
+    """yield (channel, subarray, ...) for every distinct channel, preserving the order within each channel"""
+    if len(channels) == 0:
+        return
+    first = channels[0]
+    if (channels == first).all():
+        yield (int(first),) + arrays
+        return
+    order = numpy.argsort(channels, kind='stable')
+    sortedChannels = channels[order]
+    uniqueChannels, starts = numpy.unique(sortedChannels, return_index=True)
+    ends = numpy.append(starts[1:], len(sortedChannels))
+    sortedArrays = [a[order] for a in arrays]
+    for channel, start, end in zip(uniqueChannels.tolist(), starts.tolist(), ends.tolist()):
+        yield (channel,) + tuple(a[start:end] for a in sortedArrays)
+
+
+_56 = numpy.uint64(56)
+_48 = numpy.uint64(48)
+_40 = numpy.uint64(40)
+_28 = numpy.uint64(28)
+_24 = numpy.uint64(24)
+_mask8 = numpy.uint64(0xff)
+_mask12 = numpy.uint64(0xfff)
+_mask16 = numpy.uint64(0xffff)
+_mask24 = numpy.uint64(0xffffff)
+_mask28 = numpy.uint64(0xfffffff)
+_mask40 = numpy.uint64(0xffffffffff)
+_mask48 = numpy.uint64(0xffffffffffff)
+
+
+class DataFifoDecoder(object):
+    """Mixin decoding the result pipe.
+
+    The class using it has to provide data, dedicatedData, dedicatedDataClass, timestampOffset and dataQueue,
+    for the logic analyzer logicAnalyzerData, logicAnalyzerBuffer and logicAnalyzerReadStatus.
+    """
+    analyzingState = enum.enum('normal', 'scanparameter', 'dependentscanparameter')
+    minimumBulkLength = 16     # shorter runs are faster decoded one by one
+    dataRing = None            # SharedRingBuffer the Data arrays are handed over in
+    logicAnalyzerRecordTypes = {3: 'data', 4: 'trigger', 5: 'auxData', 6: 'gateData'}
+    logicAnalyzerTime = 0
+
+    def queueData(self):
+        self.data.post_time = time_time()
+        self.data.checkTimeTick()
+        if self.dataRing is not None:
+            self.data.toShared(self.dataRing)
+        self.dataQueue.put(self.data)
+        self.data = Data()
+
+    def decodeDataScalar(self, data):
+        """decode the tokens in data one by one"""
+        for s in sliceview(data, 8):
+            (token,) = struct.unpack('Q', s)
+            self.decodeToken(token)
+
+    def decodeData(self, data):
+        """decode the tokens in data, equivalent to decodeDataScalar"""
+        words = numpy.frombuffer(data, dtype=numpy.uint64, count=len(data) // 8)
+        if len(words) == 0:
+            return
+        header = words >> _56
+        control = (header == 0xff) | (header == 0xee)
+        # the word following a scan parameter marker is the scan value and is handled by the state machine
+        scanMarker = control & ((words >> _48) == 0xfffc)
+        control[1:] |= scanMarker[:-1]
+        if self.state != self.analyzingState.normal:
+            control[0] = True
+        position = 0
+        for index in numpy.flatnonzero(control).tolist():
+            if index > position:
+                self.decodeBulk(words[position:index], header[position:index])
+            self.decodeToken(int(words[index]))
+            position = index + 1
+        if position < len(words):
+            self.decodeBulk(words[position:], header[position:])
+
+    def decodeToken(self, token):
+        logger = logging.getLogger(__name__)
+        if self.state == self.analyzingState.dependentscanparameter:
+            self.data.dependentValues.append(token)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug( "Dependent value {0} received".format(token) )
+            self.state = self.analyzingState.normal
+        elif self.state == self.analyzingState.scanparameter:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug( "Scan value {0} received".format(token) )
+            if self.data.scanvalue is None:
+                self.data.scanvalue = token
+            else:
+                self.queueData()
+                self.data.scanvalue = token
+            self.state = self.analyzingState.normal
+        elif token & 0xff00000000000000 == 0xee00000000000000: # dedicated results
+            try:
+                channel = (token >>48) & 0xff
+                if self.dedicatedData.data[channel] is not None:
+                    self.dataQueue.put( self.dedicatedData )
+                    self.dedicatedData = self.dedicatedDataClass()
+                if channel==33:
+                    self.dedicatedData.data[channel] = (token & 0xffffffffff) * 5 + self.timestampOffset
+                else:
+                    self.dedicatedData.data[channel] = token & 0xffffffffffff
+            except IndexError:
+                pass
+                #logger.debug("dedicated {0} {1}".format(channel, token & 0xffffffffffff))
+        elif token & 0xff00000000000000 == 0xff00000000000000:
+            if token == 0xffffffffffffffff:    # end of run
+                self.data.final = True
+                self.data.exitcode = 0x0000
+                self.queueData()
+                logger.info( "End of Run marker received" )
+            elif token & 0xffff000000000000 == 0xfffe000000000000:  # exitparameter
+                self.data.final = True
+                self.data.exitcode = token & 0x0000ffffffffffff
+                logger.info( "Exitcode {0:x} received".format(self.data.exitcode) )
+                self.queueData()
+            elif token == 0xfffd000000000000:
+                self.timestampOffset += 5 * (1 << 40)
+            elif token & 0xffff000000000000 == 0xfffc000000000000:  # new scan parameter
+                self.state = self.analyzingState.dependentscanparameter if (token & 0x8000 == 0x8000) else self.analyzingState.scanparameter
+            elif token & 0xffff000000000000 == 0xfffb000000000000:
+                if self.data.timingViolations is None:
+                    self.data.timingViolations = list()
+                self.data.timingViolations.append( token & 0xffff )
+        else:
+            key = token >> 56
+            if key==1:   # count
+                channel = (token >>40) & 0xffff
+                value = token & 0x000000ffffffffff
+                (self.data.count[ channel ]).append(value)
+            elif key==2:  # timestamp
+                channel = (token >>40) & 0xffff
+                value = (token & 0x000000ffffffffff) * 5
+                if self.data.timestamp is None:
+                    self.data.timestamp = defaultdict(GatedTimestamps)
+                try:
+                    self.data.timestamp[channel].append(self.timestampOffset + value - self.data.timestampZero[channel][-1])
+                except (IndexError, TypeError):
+                    logger.error("channel: {}".format(channel))
+                    logger.error("timestampZero: {}".format(self.data.timestampZero))
+                    logger.error("timestamp: {}".format(self.data.timestamp))
+                    raise
+            elif key==3:  # timestamp gate start
+                channel = (token >>40) & 0xffff
+                value = (token & 0x000000ffffffffff) * 5
+                if self.data.timestampZero is None:
+                    self.data.timestampZero = defaultdict(intArray)
+                self.data.timestampZero[channel].append(self.timestampOffset + value)
+                if self.data.timestamp is None:
+                    self.data.timestamp = defaultdict(GatedTimestamps)
+                self.data.timestamp[channel].newGate()
+            elif key==4: # other return value
+                channel = (token >>40) & 0xffff
+                value = token & 0x000000ffffffffff
+                self.data.other.append(value)
+            elif key==5: # ADC return
+                channel = (token >>40) & 0xffff
+                sumvalue = token & 0xfffffff
+                count = (token >> 28) & 0xfff
+                if count>0:
+                    self.data.analogCount(channel + 32).append( sumvalue/float(count)  )
+            elif key==6: # clock timestamp
+                self.data.timeTick[(token>>40) & 0xff].append(self.timestampOffset + (token & 0xffffffffff) * 5)
+            elif key==0x51:
+                channel = (token >>48) & 0xff
+                value = token & 0x0000ffffffffffff
+                if self.data.result is None:
+                    self.data.result = defaultdict(intArray)
+                self.data.result[channel].append( value  )
+            elif key==0x50:
+                channel = (token >>48) & 0xff
+                value = (token & 0x000000000000ffff) << 48 | self.data.result[channel][-1]
+                if value >= 0x8000000000000000:
+                    value -= 0x10000000000000000
+                self.data.result[channel][-1] = value
+            else:
+                self.data.other.append(token)
+
+    def decodeBulk(self, words, header):
+        """decode a run of tokens that does not contain any control tokens"""
+        if len(words) < self.minimumBulkLength:
+            for token in words.tolist():
+                self.decodeToken(token)
+            return
+        channel = (words >> _40) & _mask16
+        value = words & _mask40
+
+        isCount = header == 1
+        isAdc = header == 5
+        if isCount.any() and isAdc.any() and channel[isCount].max() >= 32 and numpy.intersect1d(channel[isCount], channel[isAdc] + 32).size:
+            # counts and ADC values interleave in the same channel, keep their order by decoding one by one
+            for token in words.tolist():
+                self.decodeToken(token)
+            return
+        if isCount.any():
+            for ch, values in groupByChannel(channel[isCount], value[isCount]):
+                appendArray(self.data.count[ch], values)
+
+        isGate = header == 3
+        isTimestamp = header == 2
+        if isGate.any() or isTimestamp.any():
+            self.decodeTimestamps(words, channel, value, isGate, isTimestamp)
+
+        isOther = (header == 4) | ((header > 6) & (header != 0x50) & (header != 0x51)) | (header == 0)
+        if isOther.any():
+            self.data.other.extend(numpy.where(header[isOther] == 4, value[isOther], words[isOther]).tolist())
+
+        if isAdc.any():
+            adcWords = words[isAdc]
+            adcCount = (adcWords >> _28) & _mask12
+            valid = adcCount > 0
+            average = (adcWords[valid] & _mask28).astype(numpy.float64) / adcCount[valid].astype(numpy.float64)
+            for ch, values in groupByChannel(channel[isAdc][valid], average):
+                appendArray(self.data.analogCount(ch + 32), values)
+
+        isTick = header == 6
+        if isTick.any():
+            ticks = value[isTick].astype(numpy.int64) * 5 + self.timestampOffset
+            for ch, values in groupByChannel((words[isTick] >> _40) & _mask8, ticks):
+                appendArray(self.data.timeTick[ch], values)
+
+        isLow = header == 0x51
+        isHigh = header == 0x50
+        if isLow.any() or isHigh.any():
+            self.decodeResults(words, isLow, isHigh)
+
+    def decodeTimestamps(self, words, channel, value, isGate, isTimestamp):
+        logger = logging.getLogger(__name__)
+        if self.data.timestamp is None:
+            self.data.timestamp = defaultdict(GatedTimestamps)
+        if isGate.any() and self.data.timestampZero is None:
+            self.data.timestampZero = defaultdict(intArray)
+        position = numpy.arange(len(words))
+        gates = dict((ch, (pos, val)) for ch, pos, val in groupByChannel(channel[isGate], position[isGate], value[isGate]))
+        stamps = dict((ch, (pos, val)) for ch, pos, val in groupByChannel(channel[isTimestamp], position[isTimestamp], value[isTimestamp]))
+        for ch in sorted(set(gates) | set(stamps)):
+            gatePosition, gateValue = gates.get(ch, (position[:0], value[:0]))
+            stampPosition, stampValue = stamps.get(ch, (position[:0], value[:0]))
+            # index of the gate start each timestamp belongs to, -1 for the gate opened by a previous run
+            gateIndex = numpy.searchsorted(gatePosition, stampPosition) - 1
+            previous = numpy.searchsorted(gateIndex, 0)
+            if previous > 0:
+                channelStamps = self.data.timestamp[ch]
+                try:
+                    zero = self.data.timestampZero[ch][-1]
+                    if not len(channelStamps):
+                        raise IndexError
+                except (IndexError, TypeError):
+                    logger.error("channel: {}".format(ch))
+                    logger.error("timestampZero: {}".format(self.data.timestampZero))
+                    logger.error("timestamp: {}".format(self.data.timestamp))
+                    raise IndexError("timestamp received before gate start on channel {0}".format(ch))
+                offset = self.timestampOffset - zero
+                appendArray(channelStamps.values, stampValue[:previous].astype(numpy.int64) * 5 + offset)
+            if len(gatePosition):
+                channelStamps = self.data.timestamp[ch]
+                relative = (stampValue[previous:].astype(numpy.int64) - gateValue[gateIndex[previous:]].astype(numpy.int64)) * 5
+                bounds = numpy.searchsorted(gateIndex, numpy.arange(len(gatePosition))) - previous
+                appendArray(self.data.timestampZero[ch], gateValue.astype(numpy.int64) * 5 + self.timestampOffset)
+                appendArray(channelStamps.gates, bounds + len(channelStamps.values))
+                appendArray(channelStamps.values, relative)
+
+    def decodeResults(self, words, isLow, isHigh):
+        if self.data.result is None:
+            self.data.result = defaultdict(intArray)
+        channel = (words >> _48) & _mask8
+        position = numpy.arange(len(words))
+        highs = dict((ch, (pos, val)) for ch, pos, val in groupByChannel(channel[isHigh], position[isHigh], words[isHigh] & _mask16))
+        for ch, lowPosition, lowValue in groupByChannel(channel[isLow], position[isLow], words[isLow] & _mask48):
+            results = self.data.result[ch]
+            base = len(results)
+            highPosition, highValue = highs.pop(ch, (position[:0], lowValue[:0]))
+            target = numpy.searchsorted(lowPosition, highPosition) - 1
+            if len(target) and (target[0] < 0 or (numpy.diff(target) == 0).any()):
+                appendArray(results, lowValue)
+                self.combineResults(results, base + target, highValue)
+            else:
+                signed = lowValue.astype(numpy.int64)
+                signed[target] = ((highValue << _48) | lowValue[target]).view(numpy.int64)
+                appendArray(results, signed)
+        for ch, (highPosition, highValue) in highs.items():
+            results = self.data.result[ch]
+            self.combineResults(results, numpy.full(len(highValue), len(results) - 1), highValue)
+
+    @staticmethod
+    def combineResults(results, targets, highValues):
+        for target, high in zip(targets.tolist(), highValues.tolist()):
+            value = high << 48 | results[target]
+            if value >= 0x8000000000000000:
+                value -= 0x10000000000000000
+            results[target] = value
+
+    def queueLogicAnalyzerData(self, stopMarker):
+        self.logicAnalyzerData.stopMarker = stopMarker
+        self.logicAnalyzerData.finalize()
+        self.dataQueue.put(self.logicAnalyzerData)
+        self.logicAnalyzerData = LogicAnalyzerData()
+
+    def decodeLogicAnalyzerScalar(self, data):
+        """decode the logic analyzer words one by one"""
+        logger = logging.getLogger(__name__)
+        self.logicAnalyzerBuffer.extend(data)
+        for s in sliceview(self.logicAnalyzerBuffer, 8):
+            (code, ) = struct.unpack('Q', s)
+            if self.logicAnalyzerReadStatus==0:
+                self.logicAnalyzerData.wordcount += 1
+                self.logicAnalyzerTime = (code & 0xffffff) + self.logicAnalyzerData.countOffset
+                pattern = (code >> 24) & 0xffffffff
+                header = (code >> 56 )
+                if header==2:  # overrun marker
+                    self.logicAnalyzerData.countOffset += 0x1000000   # overrun of 24 bit counter
+                elif header==1:  # end marker
+                    self.queueLogicAnalyzerData(self.logicAnalyzerTime)
+                elif header in self.logicAnalyzerRecordTypes:
+                    self.logicAnalyzerReadStatus = header
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Time {0:x} header {1} pattern {2:x} {3:x} {4:x}".format(self.logicAnalyzerTime, header, pattern, code, self.logicAnalyzerData.countOffset))
+            else:
+                self.logicAnalyzerData.append(self.logicAnalyzerRecordTypes[self.logicAnalyzerReadStatus], self.logicAnalyzerTime, code)
+                self.logicAnalyzerReadStatus = 0
+        self.logicAnalyzerBuffer = bytearray( sliceview_remainder(self.logicAnalyzerBuffer, 8) )
+
+    def decodeLogicAnalyzer(self, data):
+        """decode the logic analyzer words in bulk"""
+        self.logicAnalyzerBuffer.extend(data)
+        length = len(self.logicAnalyzerBuffer) // 8
+        if length:
+            words = numpy.frombuffer(bytes(self.logicAnalyzerBuffer[:8 * length]), dtype=numpy.uint64)
+            header = words >> _56
+            hasPattern = (header >= 3) & (header <= 6)
+            position = numpy.arange(length)
+            # a header is always an even number of words after the last word that is no header with pattern
+            restart = numpy.where(hasPattern, -1, position + 1)
+            start = numpy.maximum.accumulate(numpy.concatenate(([-1 if self.logicAnalyzerReadStatus else 0], restart[:-1])))
+            isHeader = (position - start) % 2 == 0
+            if self.logicAnalyzerReadStatus:
+                self.logicAnalyzerData.append(self.logicAnalyzerRecordTypes[self.logicAnalyzerReadStatus], self.logicAnalyzerTime, words[0])
+                self.logicAnalyzerReadStatus = 0
+            first = 0
+            for end in position[isHeader & (header == 1)].tolist() + [length]:
+                self.decodeLogicAnalyzerRecords(words, header, isHeader, first, end)
+                first = end + 1
+        self.logicAnalyzerBuffer = bytearray( sliceview_remainder(self.logicAnalyzerBuffer, 8) )
+
+    def decodeLogicAnalyzerRecords(self, words, header, isHeader, first, end):
+        """decode words[first:end] that do not contain an end marker, words[end] is the end marker if it exists"""
+        isHeader = isHeader[first:end]
+        header = header[first:end]
+        isOverrun = (isHeader & (header == 2)).astype(numpy.int64)
+        offset = self.logicAnalyzerData.countOffset + 0x1000000 * (numpy.cumsum(isOverrun) - isOverrun)
+        time = (words[first:end] & _mask24).astype(numpy.int64) + offset
+        self.logicAnalyzerData.wordcount += int(isHeader.sum())
+        self.logicAnalyzerData.countOffset += 0x1000000 * int(isOverrun.sum())
+        headerIndex = numpy.flatnonzero(isHeader & (header >= 3) & (header <= 6))
+        if len(headerIndex) and first + headerIndex[-1] + 1 >= len(words):
+            # pattern of the last header is in the next buffer
+            self.logicAnalyzerReadStatus = int(header[headerIndex[-1]])
+            self.logicAnalyzerTime = int(time[headerIndex[-1]])
+            headerIndex = headerIndex[:-1]
+        recordHeader = header[headerIndex]
+        for code, name in self.logicAnalyzerRecordTypes.items():
+            index = headerIndex[recordHeader == code]
+            if len(index):
+                self.logicAnalyzerData.extend(name, time[index], words[first + index + 1])
+        if end < len(words):
+            self.logicAnalyzerData.wordcount += 1
+            self.queueLogicAnalyzerData(int(words[end] & _mask24) + self.logicAnalyzerData.countOffset)
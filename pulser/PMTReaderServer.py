@@ -5,7 +5,8 @@
 # *****************************************************************
 
 
-from .PulserHardwareServer import PulserHardwareServer, sliceview
+from .DataFifoDecoder import sliceview
+from .PulserHardwareServer import PulserHardwareServer
 import struct
 import logging
 
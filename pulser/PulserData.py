@@ -0,0 +1,398 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Data containers filled from the pulse programmer result and logic analyzer pipes
+"""
+import json
+import logging
+import struct
+from array import array
+from collections import defaultdict
+from time import time as time_time
+
+import numpy
+
+
+LastTimetickCheck = 0
+
+
+def intArray():
+    return array('q')
+
+
+def appendArray(target, values):
+    """append the numpy array values to the typed array target"""
+    if len(values):
+        target.frombytes(memoryview(numpy.ascontiguousarray(values, dtype=target.typecode)).cast('B'))
+
+
+class SharedArray(object):
+    """Placeholder for a typed array that was moved into the shared ring buffer"""
+    __slots__ = ('position', 'length', 'typecode')
+
+    def __init__(self, position, length, typecode):
+        self.position = position
+        self.length = length
+        self.typecode = typecode
+
+    def __len__(self):
+        return self.length
+
+
+class GatedTimestamps(object):
+    """Timestamps of one channel. All timestamps are kept in one flat array, gates holds the index of the
+    first timestamp of every gate. Iterating yields the timestamps of one gate after the other."""
+    __slots__ = ('values', 'gates')
+
+    def __init__(self):
+        self.values = intArray()
+        self.gates = intArray()
+
+    def newGate(self):
+        self.gates.append(len(self.values))
+
+    def append(self, value):
+        if not len(self.gates):
+            raise IndexError("timestamp received before gate start")
+        self.values.append(value)
+
+    def __len__(self):
+        return len(self.gates)
+
+    def __getitem__(self, index):
+        gates = len(self.gates)
+        if index < 0:
+            index += gates
+        if not 0 <= index < gates:
+            raise IndexError("gate index out of range")
+        return self.values[self.gates[index]:self.gates[index + 1] if index + 1 < gates else len(self.values)]
+
+    def __iter__(self):
+        for index in range(len(self.gates)):
+            yield self[index]
+
+    def tolist(self):
+        return [gate.tolist() for gate in self]
+
+
+def _toJson(obj):
+    if isinstance(obj, GatedTimestamps):
+        return obj.tolist()
+    if isinstance(obj, (array, numpy.ndarray, numpy.generic)):
+        return obj.tolist()
+    raise TypeError("{0} is not JSON serializable".format(obj.__class__.__name__))
+
+
+def _channelsFromJson(channels):
+    if channels is None:
+        return None
+    return defaultdict(intArray, ((int(channel), numpy.array(values)) for channel, values in channels.items()))
+
+
+def _timestampsFromJson(channels):
+    if channels is None:
+        return None
+    timestamps = defaultdict(GatedTimestamps)
+    for channel, gates in channels.items():
+        stamps = timestamps[int(channel)]
+        for gate in gates:
+            stamps.newGate()
+            stamps.values.extend(gate)
+    return timestamps
+
+
+RecordHeader = struct.Struct('<I')
+
+
+class Data(object):
+    """Results of one scan point.
+
+    Counts, timestamps, clock ticks and results are kept in typed arrays. Before being queued to the client
+    the arrays are moved into the shared ring buffer (toShared), the client accesses them as numpy views (attach).
+    The views are valid until the ring buffer space is released (release), detach copies the arrays out first.
+    toRecord and fromRecord convert a point to and from the binary record of the raw data files.
+    """
+    __slots__ = ('count', 'timestamp', 'timestampZero', 'scanvalue', 'final', 'other', 'overrun', 'exitcode',
+                 'dependentValues', 'evaluated', 'result', 'externalStatus', '_creationTime', 'timeTick',
+                 'timingViolations', 'post_time', 'ringSpan', 'arrayCache')
+    channelContainers = ('count', 'timeTick', 'timestampZero', 'result')
+
+    def __init__(self):
+        self.count = defaultdict(intArray)       # array of counts in the counter channel
+        self.timestamp = None                    # GatedTimestamps for every channel
+        self.timestampZero = None
+        self.scanvalue = None                           # scanvalue
+        self.final = False
+        self.other = list()
+        self.overrun = False
+        self.exitcode = 0
+        self.dependentValues = list()                   # additional scan values
+        self.evaluated = defaultdict(dict)
+        self.result = None                              # data received in the result channels dict with channel number as key
+        self.externalStatus = None
+        self._creationTime = time_time()
+        self.timeTick = defaultdict(intArray)
+        self.timingViolations = None
+        self.post_time = None
+        self.ringSpan = None                     # (start, end) of the arrays in the shared ring buffer
+        self.arrayCache = dict()                 # numpy arrays derived from the counts by the evaluations
+
+    def analogCount(self, channel):
+        """count array of an ADC channel, the values are averages and kept as float"""
+        values = self.count.get(channel)
+        if values is None or values.typecode != 'd':
+            values = self.count[channel] = array('d', values or ())
+        return values
+
+    @property
+    def allTimeTick(self):
+        all = list()
+        for l in self.timeTick.values():
+            all.extend(l)
+        return all
+
+    @property
+    def creationTimeNs(self):
+        return int(self._creationTime * 1e9)
+
+    @property
+    def creationTime(self):
+        return (list(self.timeTick.values())[0]*1e-9) if self.timeTick else self._creationTime
+    
+    @property
+    def timeinterval(self):
+        return (((list(self.timeTick.values())[0][0]*1e-9), (list(self.timeTick.values())[0][-1]*1e-9)) if self.timeTick
+                 else (self._creationTime, self._creationTime))
+        
+    def __str__(self):
+        return str(len(self.count))+" "+" ".join( [str(self.count[i]) for i in range(16) ])
+    
+    def defaultTimestampZero(self):
+        return 0
+    
+    def dataString(self):
+        return repr(self)
+
+    def checkTimeTick(self):
+        global LastTimetickCheck
+        if time_time() - LastTimetickCheck > 60:
+            ct = time_time()
+            for l in self.timeTick.values():
+                if len(l):
+                    LastTimetickCheck = ct
+                    if abs(1e-9 * l[0] - ct) > 60:
+                        logging.getLogger(__name__).warning("Timeticks differ from computer time epoch: {} timestamp: {}", ct, l[0])
+                        break
+
+    def __repr__(self):
+        return json.dumps([self.count, self.timestamp, self.timestampZero, self.scanvalue, self.final, self.other,
+                           self.overrun, self.exitcode, self.dependentValues, self.result, self.externalStatus,
+                           self._creationTime, 0, self.timeTick], default=_toJson)
+        
+    @staticmethod
+    def fromJson(string):
+        data = Data()
+        (count, timestamp, timestampZero, data.scanvalue, data.final, data.other, data.overrun,
+         data.exitcode, data.dependentValues, result, data.externalStatus, data._creationTime, _, timeTick) = json.loads(string)
+        data.count = _channelsFromJson(count)      # json turned the channel numbers into strings
+        data.timeTick = _channelsFromJson(timeTick)
+        data.timestampZero = _channelsFromJson(timestampZero)
+        data.result = _channelsFromJson(result)
+        data.timestamp = _timestampsFromJson(timestamp)
+        return data
+
+    def _recordArrays(self):
+        """yield (container name, channel, timestamp part, array) for all arrays stored in a record"""
+        for name in self.channelContainers:
+            channels = getattr(self, name)
+            if channels:
+                for channel, values in channels.items():
+                    yield name, channel, None, values
+        if self.timestamp:
+            for channel, stamps in self.timestamp.items():
+                yield 'timestamp', channel, 'values', stamps.values
+                yield 'timestamp', channel, 'gates', stamps.gates
+
+    def toRecord(self):
+        """Binary record of the point: the length of a json header with the scalar fields and the array layout,
+        the header padded to 8 bytes and the raw arrays"""
+        layout = list()
+        arrays = list()
+        for name, channel, part, values in self._recordArrays():
+            values = numpy.ascontiguousarray(values)
+            layout.append((name, channel, part, values.dtype.str, len(values)))
+            arrays.append(values.data)
+        header = json.dumps({'fields': [self.scanvalue, self.final, self.other, self.overrun, self.exitcode,
+                                        self.dependentValues, self.externalStatus, self._creationTime],
+                             'containers': [name for name in self.channelContainers + ('timestamp',)
+                                            if getattr(self, name) is not None],
+                             'arrays': layout}, default=_toJson).encode()
+        header += b' ' * (-(RecordHeader.size + len(header)) % 8)
+        return b''.join([RecordHeader.pack(len(header)), header] + arrays)
+
+    @staticmethod
+    def fromRecord(buffer):
+        """Data from a record created by toRecord, the arrays are numpy views into buffer"""
+        headerLength, = RecordHeader.unpack_from(buffer)
+        position = RecordHeader.size + headerLength
+        header = json.loads(bytes(buffer[RecordHeader.size:position]).decode())
+        data = Data()
+        (data.scanvalue, data.final, data.other, data.overrun, data.exitcode, data.dependentValues,
+         data.externalStatus, data._creationTime) = header['fields']
+        for name in header['containers']:
+            setattr(data, name, defaultdict(GatedTimestamps if name == 'timestamp' else intArray))
+        for name, channel, part, dtype, length in header['arrays']:
+            values = numpy.frombuffer(buffer, dtype=dtype, count=length, offset=position) if length else numpy.empty(0, dtype=dtype)
+            position += values.nbytes
+            if part is None:
+                getattr(data, name)[channel] = values
+            else:
+                setattr(getattr(data, name)[channel], part, values)
+        return data
+
+    def _typedArrays(self):
+        """yield (container, key) for all typed arrays, container is a channel dict or a GatedTimestamps"""
+        for channels in (self.count, self.timeTick, self.timestampZero, self.result):
+            if channels:
+                for key in channels:
+                    yield channels, key
+        if self.timestamp:
+            for stamps in self.timestamp.values():
+                yield stamps, 'values'
+                yield stamps, 'gates'
+
+    @staticmethod
+    def _get(container, key):
+        return getattr(container, key) if isinstance(container, GatedTimestamps) else container[key]
+
+    @staticmethod
+    def _set(container, key, value):
+        if isinstance(container, GatedTimestamps):
+            setattr(container, key, value)
+        else:
+            container[key] = value
+
+    def toShared(self, ring):
+        """Copy the typed arrays into the ring buffer and replace them by SharedArray placeholders.
+        Returns False if there is not enough space, the arrays are then pickled as usual."""
+        slots = list(self._typedArrays())
+        length = sum(len(self._get(container, key)) for container, key in slots)
+        span = ring.allocate(length) if length else None
+        if span is None:
+            return False
+        position = span[0]
+        for container, key in slots:
+            values = self._get(container, key)
+            ring.view(position, len(values), values.typecode)[:] = numpy.frombuffer(values, dtype=values.typecode)
+            self._set(container, key, SharedArray(position, len(values), values.typecode))
+            position += len(values)
+        self.ringSpan = span
+        return True
+
+    def attach(self, ring):
+        """Replace all typed arrays by numpy arrays, for arrays in the ring buffer these are views without copy"""
+        for container, key in list(self._typedArrays()):
+            values = self._get(container, key)
+            if isinstance(values, SharedArray):
+                self._set(container, key, ring.view(values.position, values.length, values.typecode))
+            elif isinstance(values, array):
+                self._set(container, key, numpy.frombuffer(values, dtype=values.typecode))
+
+    def release(self, ring):
+        """Release the ring buffer space without copying, the arrays must not be used afterwards"""
+        if self.ringSpan is not None:
+            ring.release(self.ringSpan[1])
+            self.ringSpan = None
+
+    def detach(self, ring):
+        """Copy the arrays out of the ring buffer and release the ring buffer space"""
+        if self.ringSpan is not None:
+            for container, key in list(self._typedArrays()):
+                values = self._get(container, key)
+                if isinstance(values, SharedArray):
+                    values = ring.view(values.position, values.length, values.typecode)
+                self._set(container, key, numpy.array(values))
+            ring.release(self.ringSpan[1])
+            self.ringSpan = None
+            self.arrayCache.clear()
+
+
+class DedicatedData(object):
+    def __init__(self):
+        self.data = [None]*34
+        self.externalStatus = None
+        self._timestamp = time_time()
+        self.maxBytesRead = 0
+        
+    def count(self):
+        return self.data[0:15]
+        
+    def analog(self):
+        return self.data[16:31]
+        
+    def integration(self):
+        return self.data[32]
+    
+    @property
+    def timestamp(self):
+        return self.data[33]*1e-9 if self.data[33] else self._timestamp
+    
+    @timestamp.setter
+    def timestamp(self, ts):
+        self._timestamp = ts
+
+
+logicAnalyzerRecord = numpy.dtype([('time', numpy.int64), ('pattern', numpy.uint64)])
+
+
+class LogicAnalyzerData:
+    """Logic analyzer capture. data, auxData, trigger and gateData are structured arrays of logicAnalyzerRecord.
+    While decoding records are collected in chunks, finalize joins them before the capture is queued."""
+    recordTypes = ('data', 'auxData', 'trigger', 'gateData')
+
+    def __init__(self):
+        self.data = numpy.zeros(0, dtype=logicAnalyzerRecord)
+        self.auxData = numpy.zeros(0, dtype=logicAnalyzerRecord)
+        self.trigger = numpy.zeros(0, dtype=logicAnalyzerRecord)
+        self.gateData = numpy.zeros(0, dtype=logicAnalyzerRecord)
+        self.stopMarker = None
+        self.countOffset = 0
+        self.overrun = False
+        self.wordcount = 0
+        self._chunks = dict((name, list()) for name in self.recordTypes)
+        self._records = dict((name, list()) for name in self.recordTypes)
+
+    def _flush(self, name):
+        if self._records[name]:
+            self._chunks[name].append(numpy.array(self._records[name], dtype=logicAnalyzerRecord))
+            del self._records[name][:]
+
+    def extend(self, name, times, patterns):
+        self._flush(name)
+        records = numpy.empty(len(times), dtype=logicAnalyzerRecord)
+        records['time'] = times
+        records['pattern'] = patterns
+        self._chunks[name].append(records)
+
+    def append(self, name, time, pattern):
+        self._records[name].append((time, pattern))
+
+    def finalize(self):
+        for name, chunks in self._chunks.items():
+            self._flush(name)
+            if chunks:
+                setattr(self, name, numpy.concatenate([getattr(self, name)] + chunks))
+                del chunks[:]
+
+    def dataToStr(self, l):
+        strlist = list()
+        for time, pattern in l.tolist():
+            strlist.append("({0}, {1:x})".format(time, pattern))
+        return "["+", ".join(strlist)+"]"
+                  
+    def __str__(self):
+        return "data: {0} auxdata: {1} trigger: {2} gate: {3} stopMarker: {4} countOffset: {5}".format(self.dataToStr(self.data), self.dataToStr(self.auxData), self.dataToStr(self.trigger), 
+                                                                                                       self.dataToStr(self.gateData), self.stopMarker, self.countOffset)
@@ -25,6 +25,7 @@ from pulser.OKBase import ErrorMessages, FPGAException
 from pulser.PulserHardwareServer import PulserHardwareException
 from .PulserHardwareServer import PulserHardwareServer
 from .ServerProcess import FinishException
+from .SharedRingBuffer import SharedRingBuffer, RingDataHolds
 
 
 def check(number, command):
@@ -41,11 +42,15 @@ class QueueReader(QtCore.QThread):
         self.dataMutex = QtCore.QMutex()           # protects the thread data
         self.dataQueue = dataQueue
         self.condition_var = condition_var
-        self.dataHandler = { 'Data': lambda data, size : self.pulserHardware.dataAvailable.emit(data, size),
+        self.dataHandler = { 'Data': self.onData,
                              'DedicatedData': lambda data, size: self.pulserHardware.dedicatedDataAvailable.emit(data, size),
                              'FinishException': lambda data, size: self.raise_(FinishException()),
                              'LogicAnalyzerData': self.onLogicAnalyzerData}
    
+    def onData(self, data, size):
+        data.attach(self.pulserHardware.dataRing)
+        self.pulserHardware.ringDataAvailable.emit(data, size)
+
     def onLogicAnalyzerData(self, data, size):
         self.pulserHardware.logicAnalyzerDataAvailable.emit(data)
         
@@ -82,6 +87,7 @@ class PulserHardware(QtCore.QObject):
     sleepQueue = Queue()   # used to be able to interrupt the sleeping procedure
 
     dataAvailable = QtCore.pyqtSignal( 'PyQt_PyObject', object )
+    ringDataAvailable = QtCore.pyqtSignal( 'PyQt_PyObject', object )   # from the QueueReader thread to onRingData
     dedicatedDataAvailable = QtCore.pyqtSignal(object, object)
     logicAnalyzerDataAvailable = QtCore.pyqtSignal( 'PyQt_PyObject' )
     shutterChanged = QtCore.pyqtSignal( 'PyQt_PyObject' )
@@ -90,7 +96,7 @@ class PulserHardware(QtCore.QObject):
     
     timestep = Q(5, 'ns')
 
-    sharedMemorySize = 256*1024
+    sharedMemorySize = PulserHardwareServer.sharedMemorySize
     def __init__(self):
         super(PulserHardware, self).__init__()
         self._shutter = 0
@@ -102,7 +108,10 @@ class PulserHardware(QtCore.QObject):
         self.dataQueue = multiprocessing.Queue()
         self.clientPipe, self.serverPipe = multiprocessing.Pipe()
         self.loggingQueue = multiprocessing.Queue()
-        self.sharedMemoryArray = Array( c_longlong, self.sharedMemorySize, lock=True )
+        self.sharedMemoryArray = Array( c_longlong, self.sharedMemorySize + self.serverClass.dataRingSize, lock=True )
+        self.dataRing = SharedRingBuffer(self.sharedMemoryArray, self.sharedMemorySize)
+        self.pendingData = RingDataHolds(self.dataRing)     # only used in the gui thread
+        self.ringDataAvailable.connect(self.onRingData)
                 
         self.serverProcess = self.serverClass(self.dataQueue, self.serverPipe, self.loggingQueue, self.sharedMemoryArray )
         self.serverProcess.start()
@@ -117,6 +126,23 @@ class PulserHardware(QtCore.QObject):
         self.ppActive = False
         self._pulserConfiguration = None
 
+    def onRingData(self, data, size):
+        """hand data to the dataAvailable slots in the gui thread, its ring buffer space is released afterwards
+        unless a slot holds it with retainData"""
+        self.pendingData.add(data)
+        try:
+            self.dataAvailable.emit(data, size)
+        finally:
+            self.pendingData.release(data)
+
+    def retainData(self, data):
+        """keep the arrays of data valid after the dataAvailable slot returned, until releaseData is called"""
+        self.pendingData.retain(data)
+
+    def releaseData(self, data):
+        """the arrays of data are no longer used, the ring buffer space is released in the order Data arrived"""
+        self.pendingData.release(data)
+
     def next_data_notify(self):
         with self.condition_var:
             self.condition_var.notifyAll()
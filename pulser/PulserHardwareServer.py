@@ -6,151 +6,34 @@
 """
 Encapsulation of the Pulse Programmer Hardware 
 """
-import json
 import logging
 import math
 import struct
-from _collections import defaultdict
 from multiprocessing import Process
 from time import time as time_time
 
 import numpy
 
-from modules import enum
 from modules.quantity import Q
 from mylogging.ServerLogging import configureServerLogging
+from pulser.DataFifoDecoder import DataFifoDecoder
 from pulser.OKBase import OKBase, check
+from pulser.PulserData import Data, DedicatedData, LogicAnalyzerData
 from pulser.PulserConfig import getPulserConfiguration
+from pulser.ReplayFrontPanel import ReplayFrontPanel
 from pulser.ServerProcess import ServerProcess
+from pulser.SharedRingBuffer import SharedRingBuffer
 
 
 class PulserHardwareException(Exception):
     pass
 
-LastTimetickCheck = 0
-
-class Data(object):
-    def __init__(self):
-        self.count = defaultdict(list)       # list of counts in the counter channel
-        self.timestamp = None   
-        self.timestampZero = None
-        self.scanvalue = None                           # scanvalue
-        self.final = False
-        self.other = list()
-        self.overrun = False
-        self.exitcode = 0
-        self.dependentValues = list()                   # additional scan values
-        self.evaluated = defaultdict(dict)
-        self.result = None                              # data received in the result channels dict with channel number as key
-        self.externalStatus = None
-        self._creationTime = time_time()
-        self.timeTick = defaultdict(list)
-        self.timingViolations = None
-        self.post_time = None
-
-    @property
-    def allTimeTick(self):
-        all = list()
-        for l in self.timeTick.values():
-            all.extend(l)
-        return all
-
-    @property
-    def creationTimeNs(self):
-        return int(self._creationTime * 1e9)
-
-    @property
-    def creationTime(self):
-        return (list(self.timeTick.values())[0]*1e-9) if self.timeTick else self._creationTime
-    
-    @property
-    def timeinterval(self):
-        return (((list(self.timeTick.values())[0][0]*1e-9), (list(self.timeTick.values())[0][-1]*1e-9)) if self.timeTick
-                 else (self._creationTime, self._creationTime))
-        
-    def __str__(self):
-        return str(len(self.count))+" "+" ".join( [str(self.count[i]) for i in range(16) ])
-    
-    def defaultTimestampZero(self):
-        return 0
-    
-    def dataString(self):
-        return repr(self)
-
-    def checkTimeTick(self):
-        global LastTimetickCheck
-        if time_time() - LastTimetickCheck > 60:
-            ct = time_time()
-            for l in self.timeTick.values():
-                if l:
-                    LastTimetickCheck = ct
-                    if abs(1e-9 * l[0] - ct) > 60:
-                        logging.getLogger(__name__).warning("Timeticks differ from computer time epoch: {} timestamp: {}", ct, l[0])
-                        break
-
-    def __repr__(self):
-        return json.dumps([self.count, self.timestamp, self.timestampZero, self.scanvalue, self.final, self.other,
-                           self.overrun, self.exitcode, self.dependentValues, self.result, self.externalStatus,
-                           self._creationTime, 0, self.timeTick])
-        
-    @staticmethod
-    def fromJson(string):
-        data = Data()
-        (data.count, data.timestamp, data.timestampZero, data.scanvalue, data.final, data.other, data.overrun,
-         data.exitcode, data.dependentValues, data.result, data.externalStatus, data._creationTime, _, data.timeTick) = json.loads(string)
-
-
-class DedicatedData(object):
-    def __init__(self):
-        self.data = [None]*34
-        self.externalStatus = None
-        self._timestamp = time_time()
-        self.maxBytesRead = 0
-        
-    def count(self):
-        return self.data[0:15]
-        
-    def analog(self):
-        return self.data[16:31]
-        
-    def integration(self):
-        return self.data[32]
-    
-    @property
-    def timestamp(self):
-        return self.data[33]*1e-9 if self.data[33] else self._timestamp
-    
-    @timestamp.setter
-    def timestamp(self, ts):
-        self._timestamp = ts
-
-
-class LogicAnalyzerData:
-    def __init__(self):
-        self.data = list()
-        self.auxData = list()
-        self.trigger = list()
-        self.gateData = list()
-        self.stopMarker = None
-        self.countOffset = 0
-        self.overrun = False
-        self.wordcount = 0
-        
-    def dataToStr(self, l):
-        strlist = list()
-        for time, pattern in l:
-            strlist.append("({0}, {1:x})".format(time, pattern))
-        return "["+", ".join(strlist)+"]"
-                  
-    def __str__(self):
-        return "data: {0} auxdata: {1} trigger: {2} gate: {3} stopMarker: {4} countOffset: {5}".format(self.dataToStr(self.data), self.dataToStr(self.auxData), self.dataToStr(self.trigger), 
-                                                                                                       self.dataToStr(self.gateData), self.stopMarker, self.countOffset)
-
-
-class PulserHardwareServer(ServerProcess, OKBase):
+class PulserHardwareServer(ServerProcess, OKBase, DataFifoDecoder):
     timestep = Q(5, 'ns')
     integrationTimestep = Q(20, 'ns')
     dedicatedDataClass = DedicatedData
+    sharedMemorySize = 256*1024          # words used for ram transfers at the start of the shared memory array
+    dataRingSize = 2*1024*1024           # words following it used to hand over the Data arrays
     def __init__(self, dataQueue=None, commandPipe=None, loggingQueue=None, sharedMemoryArray=None):
         ServerProcess.__init__(self, dataQueue, commandPipe, loggingQueue, sharedMemoryArray)
         OKBase.__init__(self)
@@ -175,6 +58,14 @@ class PulserHardwareServer(ServerProcess, OKBase):
         self.logicAnalyzerReadStatus = 0      #
         self._pulserConfiguration = None
         self._data_fifo_buffer = bytearray()
+        self._dataRing = None
+
+    @property
+    def dataRing(self):
+        """ring buffer behind the ram transfer region, None if the shared memory array has no room for it"""
+        if self._dataRing is None and self.sharedMemoryArray is not None and len(self.sharedMemoryArray) > self.sharedMemorySize + 2:
+            self._dataRing = SharedRingBuffer(self.sharedMemoryArray, self.sharedMemorySize)
+        return self._dataRing
         
     def syncTime(self):
         if self.xem:
@@ -184,13 +75,6 @@ class PulserHardwareServer(ServerProcess, OKBase):
             logging.getLogger(__name__).error("No time synchronization because FPGA is not available")
         self.timestampOffset = int(time_time() * 1e9)
 
-    def queueData(self):
-        self.data.post_time = time_time()
-        self.data.checkTimeTick()
-        self.dataQueue.put(self.data)
-        self.data = Data()
-
-    analyzingState = enum.enum('normal', 'scanparameter', 'dependentscanparameter')
     def readDataFifo(self):
         """ run is responsible for reading the data back from the FPGA
             0xffffffffffffffff end of experiment marker
@@ -216,157 +100,14 @@ class PulserHardwareServer(ServerProcess, OKBase):
                 self.logicAnalyzerClearOverrun()
                 self.logicAnalyzerData.overrun = True
             if logicAnalyzerData:
-                self.logicAnalyzerBuffer.extend(logicAnalyzerData)
-            for s in sliceview(self.logicAnalyzerBuffer, 8):
-                if self.logicAnalyzerReadStatus==0:
-                    (code, ) = struct.unpack('Q', s)
-                    self.logicAnalyzerData.wordcount += 1
-                    self.logicAnalyzerTime = (code & 0xffffff) + self.logicAnalyzerData.countOffset
-                    pattern = (code >> 24) & 0xffffffff
-                    header = (code >> 56 )
-                    if header==2:  # overrun marker
-                        self.logicAnalyzerData.countOffset += 0x1000000   # overrun of 24 bit counter
-                    elif header==1:  # end marker
-                        self.logicAnalyzerData.stopMarker = self.logicAnalyzerTime
-                        self.dataQueue.put( self.logicAnalyzerData )
-                        self.logicAnalyzerData = LogicAnalyzerData()
-                    elif header==4: # trigger
-                        self.logicAnalyzerReadStatus = 4
-                    elif header==3: # standard
-                        self.logicAnalyzerReadStatus = 3  
-                    elif header==5: # aux data
-                        self.logicAnalyzerReadStatus = 5
-                    elif header==6:
-                        self.logicAnalyzerReadStatus = 6
-                    if logger.isEnabledFor(logging.DEBUG):
-                        logger.debug("Time {0:x} header {1} pattern {2:x} {3:x} {4:x}".format(self.logicAnalyzerTime, header, pattern, code, self.logicAnalyzerData.countOffset))
-                elif self.logicAnalyzerReadStatus==3:
-                    (pattern, ) = struct.unpack('Q', s) 
-                    self.logicAnalyzerData.data.append( (self.logicAnalyzerTime, pattern) )
-                    self.logicAnalyzerReadStatus = 0
-                elif self.logicAnalyzerReadStatus==4:
-                    (pattern, ) = struct.unpack('Q', s) 
-                    self.logicAnalyzerData.trigger.append( (self.logicAnalyzerTime, pattern) )
-                    self.logicAnalyzerReadStatus = 0
-                elif self.logicAnalyzerReadStatus==5:
-                    (pattern, ) = struct.unpack('Q', s) 
-                    self.logicAnalyzerData.auxData.append( (self.logicAnalyzerTime, pattern))
-                    self.logicAnalyzerReadStatus = 0
-                elif self.logicAnalyzerReadStatus==6:
-                    (pattern, ) = struct.unpack('Q', s) 
-                    self.logicAnalyzerData.gateData.append( (self.logicAnalyzerTime, pattern) )
-                    self.logicAnalyzerReadStatus = 0
-            self.logicAnalyzerBuffer = bytearray( sliceview_remainder(self.logicAnalyzerBuffer, 8) )           
+                self.decodeLogicAnalyzer(logicAnalyzerData)
 
                    
         data, self.data.overrun, self.data.externalStatus = self.ppReadWriteData(8)
         self.dedicatedData.externalStatus = self.data.externalStatus
         self.dedicatedData.maxBytesRead = max(self.dedicatedData.maxBytesRead, len(data) if data else 0)
         if data:
-            for s in sliceview(data, 8):
-                (token,) = struct.unpack('Q', s)
-                #print(hex(token))
-                if self.state == self.analyzingState.dependentscanparameter:
-                    self.data.dependentValues.append(token)
-                    if logger.isEnabledFor(logging.DEBUG):
-                        logger.debug( "Dependent value {0} received".format(token) )
-                    self.state = self.analyzingState.normal
-                elif self.state == self.analyzingState.scanparameter:
-                    if logger.isEnabledFor(logging.DEBUG):
-                        logger.debug( "Scan value {0} received".format(token) )
-                    if self.data.scanvalue is None:
-                        self.data.scanvalue = token
-                    else:
-                        self.queueData()
-                        self.data.scanvalue = token
-                    self.state = self.analyzingState.normal
-                elif token & 0xff00000000000000 == 0xee00000000000000: # dedicated results
-                    try:
-                        channel = (token >>48) & 0xff
-                        if self.dedicatedData.data[channel] is not None:
-                            self.dataQueue.put( self.dedicatedData )
-                            self.dedicatedData = self.dedicatedDataClass()
-                        if channel==33:
-                            self.dedicatedData.data[channel] = (token & 0xffffffffff) * 5 + self.timestampOffset
-                        else:
-                            self.dedicatedData.data[channel] = token & 0xffffffffffff
-                    except IndexError:
-                        pass
-                        #logger.debug("dedicated {0} {1}".format(channel, token & 0xffffffffffff))
-                elif token & 0xff00000000000000 == 0xff00000000000000:
-                    if token == 0xffffffffffffffff:    # end of run
-                        self.data.final = True
-                        self.data.exitcode = 0x0000
-                        self.queueData()
-                        logger.info( "End of Run marker received" )
-                    elif token & 0xffff000000000000 == 0xfffe000000000000:  # exitparameter
-                        self.data.final = True
-                        self.data.exitcode = token & 0x0000ffffffffffff
-                        logger.info( "Exitcode {0:x} received".format(self.data.exitcode) )
-                        self.queueData()
-                    elif token == 0xfffd000000000000:
-                        self.timestampOffset += 5 * (1 << 40)
-                    elif token & 0xffff000000000000 == 0xfffc000000000000:  # new scan parameter
-                        self.state = self.analyzingState.dependentscanparameter if (token & 0x8000 == 0x8000) else self.analyzingState.scanparameter 
-                    elif token & 0xffff000000000000 == 0xfffb000000000000:
-                        if self.data.timingViolations is None:
-                            self.data.timingViolations = list()
-                        self.data.timingViolations.append( token & 0xffff )
-                else:
-                    key = token >> 56 
-                    #print("token", hex(token))
-                    if key==1:   # count
-                        channel = (token >>40) & 0xffff 
-                        value = token & 0x000000ffffffffff
-                        (self.data.count[ channel ]).append(value)
-                    elif key==2:  # timestamp
-                        channel = (token >>40) & 0xffff 
-                        value = (token & 0x000000ffffffffff) * 5
-                        if self.data.timestamp is None:
-                            self.data.timestamp = defaultdict(list)
-                        try:
-                            self.data.timestamp[channel][-1].append(self.timestampOffset + value - self.data.timestampZero[channel][-1])
-                        except IndexError:
-                            logger.error("channel: {}".format(channel))
-                            logger.error("timestampZero: {}".format(self.data.timestampZero))
-                            logger.error("timestamp: {}".format(self.data.timestamp))
-                            raise
-                    elif key==3:  # timestamp gate start
-                        channel = (token >>40) & 0xffff 
-                        value = (token & 0x000000ffffffffff) * 5
-                        if self.data.timestampZero is None:
-                            self.data.timestampZero = defaultdict(list)
-                        self.data.timestampZero[channel].append(self.timestampOffset + value)
-                        if self.data.timestamp is None:
-                            self.data.timestamp = defaultdict(list)
-                        self.data.timestamp[channel].append(list())
-                    elif key==4: # other return value
-                        channel = (token >>40) & 0xffff 
-                        value = token & 0x000000ffffffffff
-                        self.data.other.append(value)
-                    elif key==5: # ADC return
-                        channel = (token >>40) & 0xffff
-                        sumvalue = token & 0xfffffff
-                        count = (token >> 28) & 0xfff
-                        if count>0:
-                            self.data.count[channel + 32].append( sumvalue/float(count)  )
-                    elif key==6: # clock timestamp
-                        self.data.timeTick[(token>>40) & 0xff].append(self.timestampOffset + (token & 0xffffffffff) * 5)
-                    elif key==0x51:
-                        channel = (token >>48) & 0xff 
-                        value = token & 0x0000ffffffffffff
-                        if self.data.result is None:
-                            self.data.result = defaultdict(list)
-                        self.data.result[channel].append( value  )
-                    elif key==0x50:
-                        channel = (token >>48) & 0xff 
-                        value = (token & 0x000000000000ffff) << 48 | self.data.result[channel][-1]
-                        if value & 0x8000000000000000:
-                            value -= 0x10000000000000000
-                        self.data.result[channel][-1] = value
-#                  logger.debug("result key: {0} hi-low: {1} value: {2} length: {3} value: {4}".format(resultkey,channel,value&0xffff,len(self.data.result[resultkey]),self.data.result[resultkey][-1]))
-                    else:
-                        self.data.other.append(token)
+            self.decodeData(data)
             if self.data.overrun:
                 logger.info( "Overrun detected, triggered data queue" )
                 self.queueData()
@@ -389,6 +130,14 @@ class PulserHardwareServer(ServerProcess, OKBase):
         super(PulserHardwareServer, self).openBySerial(serial)
         self.syncTime()
         self.ppClearReadFifo()  # clear all read data to make sure there is no time counter wraparound
+
+    def openReplay(self, stream, wordsPerSecond=None, loop=False, hardwareId=None):
+        """replace the board by a replay of a recorded or synthetic result pipe stream, see ReplayFrontPanel"""
+        self.xem = ReplayFrontPanel(stream, wordsPerSecond, loop,
+                                    hardwareId if hardwareId is not None else self.hardwareConfigurationId())
+        self.openModule = self.getDeviceDescription(self.xem)
+        self.syncTime()
+        return True
      
     def getShutter(self):
         return self._shutter  #
@@ -833,15 +582,3 @@ class PulserHardwareServer(ServerProcess, OKBase):
                 raise PulserHardwareException("No information on configuration 0x{0:x} in configuration file '{1}'".format(hardwareId, configfile))
             return None
         return self._pulserConfiguration
-
-
-def sliceview(view, length):
-    for i in range(0, len(view) - length + 1, length):
-        yield memoryview(view)[i:i + length]
-
-
-def sliceview_remainder(view, length):
-    l = len(view)
-    full_items = l // length
-    appendix = l - length * full_items
-    return memoryview(view)[l - appendix:]
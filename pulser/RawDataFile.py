@@ -0,0 +1,140 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Binary raw data files of a scan.
+
+The file starts with the Magic marker followed by one record per point, each prefixed by its length
+(see :meth:`pulser.PulserData.Data.toRecord` for the record layout). The writer serializes the points in
+the calling thread and leaves writing and flushing to a background thread, the reader indexes the
+length prefixes and reads single points on demand. Raw data files written before the binary format
+(one json line per point) are read as well.
+"""
+import logging
+import os
+import struct
+from queue import Queue, Empty
+from threading import Thread
+from time import time
+
+from pulser.PulserData import Data
+
+Magic = b'IONRAW1\n'
+LengthPrefix = struct.Struct('<Q')
+
+
+class RawDataWriter(object):
+    def __init__(self, filename, flushInterval=1.0, flushRecords=64):
+        self.filename = filename
+        self.flushInterval = flushInterval      # seconds
+        self.flushRecords = flushRecords        # flush at least every flushRecords points
+        self.recordCount = 0
+        self.queue = Queue()
+        self.file = open(filename, 'wb')
+        self.file.write(Magic)
+        self.thread = Thread(target=self._run, name="RawDataWriter", daemon=True)
+        self.thread.start()
+
+    def record(self, data):
+        """queue the point for writing. The record is created here as the arrays of data may be views
+        into the shared ring buffer which are only valid until the point is processed"""
+        self.queue.put(data.toRecord())
+        self.recordCount += 1
+
+    def _run(self):
+        logger = logging.getLogger(__name__)
+        unflushed = 0
+        lastFlush = time()
+        running = True
+        while running:
+            try:
+                record = self.queue.get(timeout=self.flushInterval)
+                if record is None:
+                    running = False
+                else:
+                    self.file.write(LengthPrefix.pack(len(record)))
+                    self.file.write(record)
+                    unflushed += 1
+            except Empty:
+                pass
+            except Exception:
+                logger.exception("Failed to write raw data to '{0}'".format(self.filename))
+            if unflushed and (not running or unflushed >= self.flushRecords or time() - lastFlush >= self.flushInterval):
+                self.file.flush()
+                unflushed = 0
+                lastFlush = time()
+
+    def close(self):
+        """write the queued points and close the file"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            self.file.close()
+
+
+class RawDataReader(object):
+    """Random access to the points of a raw data file, len and indexing return the points as Data"""
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.binary = self.file.read(len(Magic)) == Magic
+        self.offsets = list()       # (offset, length) of the records
+        self._indexed = len(Magic) if self.binary else 0
+        self.refresh()
+
+    def refresh(self):
+        """index the points written since the last call, an incomplete last point is left for the next call"""
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        position = self._indexed
+        if self.binary:
+            while position + LengthPrefix.size <= size:
+                self.file.seek(position)
+                length, = LengthPrefix.unpack(self.file.read(LengthPrefix.size))
+                if position + LengthPrefix.size + length > size:
+                    break
+                self.offsets.append((position + LengthPrefix.size, length))
+                position += LengthPrefix.size + length
+        else:
+            self.file.seek(position)
+            for line in iter(self.file.readline, b''):
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    self.offsets.append((position, len(line)))
+                position += len(line)
+        self._indexed = position
+        return len(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        offset, length = self.offsets[index]
+        buffer = bytearray(length)
+        self.file.seek(offset)
+        self.file.readinto(buffer)
+        return Data.fromRecord(buffer) if self.binary else Data.fromJson(buffer.decode())
+
+    def __iter__(self):
+        for index in range(len(self.offsets)):
+            yield self[index]
+
+    def evaluate(self, evalList, evalAlgorithmList, ppDict=None, globalDict=None):
+        """re-evaluate the points with the evaluation definitions and algorithms of a scan,
+        yields the list of EvaluationResult of every point"""
+        for data in self:
+            yield [algo.evaluate(data, ev, ppDict=ppDict, globalDict=globalDict)
+                   for ev, algo in zip(evalList, evalAlgorithmList)]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,107 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Stand-in for the Opal Kelly FrontPanel (xem) of the pulse programmer that replays a result pipe stream.
+
+The stream is a raw dump of the result pipe (little endian 64 bit words) or an array of words. It starts
+with the pulse program start trigger and is delivered through pipe_out_available (wire out 0x25) and the
+result pipe (0xa2) at wordsPerSecond, without a rate all remaining words are available at once.
+All other wires, triggers and pipes are accepted and ignored, so :class:`PulserHardwareServer` and
+everything behind it run unchanged without a board::
+
+    pulser.openReplay('recorded.bin', wordsPerSecond=1e6)
+"""
+from time import time
+
+import numpy
+
+PipeOutMaxBytes = 8 * 2040     # largest multiple of 8 bytes pipe_out_available can report
+
+
+class ReplayFrontPanel(object):
+    def __init__(self, stream, wordsPerSecond=None, loop=False, hardwareId=0, serial='Replay'):
+        if isinstance(stream, str):
+            stream = numpy.fromfile(stream, dtype='<u8')
+        self.stream = numpy.ascontiguousarray(stream, dtype='<u8').view(numpy.uint8)
+        self.wordsPerSecond = wordsPerSecond
+        self.loop = loop
+        self.hardwareId = hardwareId
+        self.serial = serial
+        self.position = 0          # bytes delivered
+        self.running = False
+        self.startTime = None
+        self.startPosition = 0
+        self.available = 0         # bytes available at the last UpdateWireOuts
+        self.maxBacklog = 0        # largest number of bytes waiting to be read
+
+    def IsOpen(self):
+        return True
+
+    def GetSerialNumber(self):
+        return self.serial
+
+    def GetDeviceID(self):
+        return self.serial
+
+    def _available(self):
+        if not self.running:
+            return 0
+        remaining = len(self.stream) - self.position
+        if self.loop and remaining == 0 and len(self.stream):
+            self.position = self.startPosition = 0
+            self.startTime = time()
+            remaining = len(self.stream)
+        if self.wordsPerSecond is None:
+            return remaining
+        produced = 8 * int((time() - self.startTime) * self.wordsPerSecond) - (self.position - self.startPosition)
+        return max(0, min(remaining, produced))
+
+    def UpdateWireOuts(self):
+        self.available = self._available()
+        self.maxBacklog = max(self.maxBacklog, self.available)
+
+    def GetWireOutValue(self, address):
+        if address == 0x25:     # pipe_out_available in 16 bit words
+            return min(self.available, PipeOutMaxBytes) // 2
+        if address == 0x32:
+            return self.hardwareId
+        return 0
+
+    def ReadFromPipeOut(self, address, data):
+        if address != 0xa2:
+            return len(data)
+        length = min(len(data), len(self.stream) - self.position)
+        memoryview(data)[:length] = self.stream[self.position:self.position + length]
+        self.position += length
+        self.available = max(0, self.available - length)
+        return length
+
+    def ActivateTriggerIn(self, address, bit):
+        if address == 0x40 and bit == 2:     # pp_start_trig
+            self.running = True
+            self.startTime = time()
+            self.startPosition = self.position
+        elif address == 0x40 and bit == 3:   # pp_stop_trig
+            self.running = False
+        return 0
+
+    def WriteToPipeIn(self, address, data):
+        return len(data)
+
+    def SetWireInValue(self, address, value, mask=0xffffffff):
+        return 0
+
+    def UpdateWireIns(self):
+        return 0
+
+    def ConfigureFPGA(self, bitfile):
+        return 0
+
+    def __getattr__(self, name):
+        """all other FrontPanel calls succeed without effect"""
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        return lambda *args: 0
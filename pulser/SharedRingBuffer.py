@@ -0,0 +1,92 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Ring buffer of 64 bit words in a multiprocessing shared memory array.
+
+The server process (single writer) allocates contiguous spans and copies the Data arrays into them,
+the client process releases the spans in the same order once the arrays are no longer used (RingDataHolds).
+The first two words of the region hold the total number of words allocated and released.
+"""
+from collections import OrderedDict
+
+import numpy
+
+HeaderLength = 2
+
+
+class SharedRingBuffer(object):
+    def __init__(self, sharedArray, offset=0):
+        self.lock = sharedArray.get_lock()
+        words = numpy.frombuffer(sharedArray.get_obj(), dtype=numpy.int64)[offset:]
+        self.header = words[:HeaderLength]
+        self.buffer = words[HeaderLength:]
+        self.size = len(self.buffer)
+
+    def reset(self):
+        with self.lock:
+            self.header[:] = 0
+
+    @property
+    def used(self):
+        with self.lock:
+            return int(self.header[0] - self.header[1])
+
+    def allocate(self, length):
+        """reserve length contiguous words, returns (start, end) in allocation count or None if the ring is full"""
+        with self.lock:
+            allocated, released = int(self.header[0]), int(self.header[1])
+            start = allocated
+            if start % self.size + length > self.size:   # does not fit before the end, skip to the beginning
+                start += self.size - start % self.size
+            end = start + length
+            if end - released > self.size:
+                return None
+            self.header[0] = end
+            return start, end
+
+    def release(self, end):
+        with self.lock:
+            self.header[1] = max(int(self.header[1]), end)
+
+    def view(self, start, length, dtype=numpy.int64):
+        """numpy view of length elements of dtype (8 bytes wide) starting at start"""
+        position = start % self.size
+        return self.buffer[position:position + length].view(dtype)
+
+
+class RingDataHolds(object):
+    """Data with arrays in the ring buffer, in the order they were received.
+
+    Every Data is held while it is handed to the consumers, a consumer that uses the arrays later (in another thread)
+    holds it with retain until it calls release. The ring space is freed once a Data and all earlier ones are no
+    longer held, the arrays of the Data are invalid afterwards. Only used by the thread the Data are received in.
+    """
+    def __init__(self, ring):
+        self.ring = ring
+        self.pending = OrderedDict()   # id(data): [data, holds]
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, data):
+        if data.ringSpan is not None:
+            self.pending[id(data)] = [data, 1]
+
+    def retain(self, data):
+        entry = self.pending.get(id(data))
+        if entry is not None:
+            entry[1] += 1
+
+    def release(self, data):
+        entry = self.pending.get(id(data))
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+        while self.pending:
+            data, holds = next(iter(self.pending.values()))
+            if holds:
+                break
+            self.pending.popitem(last=False)
+            data.release(self.ring)
@@ -1,9 +1,68 @@
+from array import array
 from collections import defaultdict
+from functools import lru_cache
 
 import numpy
 import pygsti
 
 
+integerTypecodes = 'bhiq'   # signed integers of 1, 2, 4 and 8 bytes
+_integerLimits = [(typecode, 1 << (8*array(typecode).itemsize - 1)) for typecode in integerTypecodes]
+
+
+def compactBuffer(values=()):
+    """Return values in the smallest typed array of signed integers or of doubles, or in a list if the types are
+    mixed. Arrays are returned as they are."""
+    if isinstance(values, array):
+        return values
+    values = values if isinstance(values, list) else list(values)
+    if values and all(type(v) is float or isinstance(v, numpy.floating) for v in values):
+        return array('d', values)
+    first = values[0] if values else 0
+    for typecode, limit in _integerLimits:
+        try:
+            if typecode == 'q' or -limit <= first < limit:   # start with the first type that can hold values[0]
+                return array(typecode, values)
+        except OverflowError:
+            pass
+        except TypeError:
+            break
+    return list(values)
+
+
+@lru_cache(maxsize=16)
+def _labelTable(labels):
+    """lookup table from integer outcome to label index, the last entry is -1 for outcomes without label"""
+    numeric = [(int(label), index) for index, label in enumerate(labels) if label.isdigit()]
+    table = numpy.full(max([value for value, _ in numeric] or [-1]) + 2, -1, dtype=numpy.intp)
+    for value, index in numeric:
+        table[value] = index
+    return table
+
+
+def outcomeCodes(values, labels):
+    """index into labels of str(value) for every value, -1 for values matching no label"""
+    codes = numpy.asarray(values)
+    if codes.dtype.kind in 'iu':
+        table = _labelTable(tuple(labels))
+        if len(codes) and (codes.min() < 0 or codes.max() >= len(table)):
+            codes = numpy.clip(codes, -1, len(table) - 1)  # values out of range land on the -1 entry
+        return table[codes]
+    lookup = {label: index for index, label in enumerate(labels)}
+    return numpy.fromiter((lookup.get(str(v), -1) for v in values), dtype=numpy.intp, count=len(codes))
+
+
+def outcomeCounts(values, repeats, labels):
+    """sum of repeats for every label, values are matched to labels by str(value)"""
+    codes = outcomeCodes(values, labels)
+    repeats = numpy.asarray(repeats)
+    length = min(len(codes), len(repeats))
+    if (codes[:length] < 0).any():
+        raise ValueError("outcomes {0} are not in {1}".format(set(numpy.asarray(values)[:length][codes[:length] < 0].tolist()), labels))
+    counts = numpy.bincount(codes[:length], weights=repeats[:length], minlength=len(labels))
+    return counts if repeats.dtype.kind == 'f' else counts.round().astype(numpy.int64)
+
+
 class QubitResultContainer(dict):
     def __missing__(self, key):
         ret = self[key] = QubitResult()
@@ -15,13 +74,32 @@ class QubitResultContainer(dict):
 
 
 class QubitResult(dict):
+    """Results of one gate sequence, every key holds a compact typed buffer (see compactBuffer)"""
     def __missing__(self, key):
-        ret = self[key] = list()
+        ret = self[key] = array('b')
         return ret
 
     def update(self, other):
         for key, value in other.items():
-            self[key].extend(value)
+            self.extendBuffer(key, value)
+
+    def extendBuffer(self, key, values):
+        buffer = self.get(key)
+        values = compactBuffer(values)
+        if buffer is None or len(buffer) == 0:
+            self[key] = array(values.typecode, values) if isinstance(values, array) else list(values)
+        elif isinstance(buffer, list):
+            buffer.extend(values)
+        elif isinstance(values, array) and buffer.typecode == values.typecode:
+            buffer.extend(values)
+        elif isinstance(values, array) and values.typecode in integerTypecodes and buffer.typecode in integerTypecodes:
+            if integerTypecodes.index(values.typecode) < integerTypecodes.index(buffer.typecode):
+                buffer.extend(array(buffer.typecode, values))
+            else:   # widen the buffer to the larger integer type
+                self[key] = array(values.typecode, buffer)
+                self[key].extend(values)
+        else:
+            self[key] = list(buffer) + list(values)
 
 
 class ResultCounter(dict):
@@ -41,10 +119,17 @@ class ResultCounter(dict):
 
 
 class QubitDataSet:
+    """Qubit results of a gate sequence scan.
+
+    The counts of every spam label and gate sequence are kept in countVecMx, updated with numpy.bincount over
+    the integer codes of the outcomes. Every update increments a revision, changedSince tells consumers which gate
+    sequences got new counts since the revision they have seen. With rawShots the individual results are also kept in _rawdata, as compact
+    typed buffers, otherwise only the counts are kept and pickled.
+    """
     _fields = ['gatestring_list', 'plaquettes', 'target_gateset', '_rawdata', 'prepFiducials', 'measFiducials',
                'germs', 'maxLengths']
     def __init__(self, gatestring_list=None, plaquettes=None, target_gateset=None,
-                 prepFiducials=None, measFiducials=None, germs=None, maxLengths=None):
+                 prepFiducials=None, measFiducials=None, germs=None, maxLengths=None, rawShots=True):
         self.gatestring_list = gatestring_list
         self.gatestring_dict = {s: idx for idx, s in enumerate(gatestring_list)} if gatestring_list else None
         self.plaquettes = plaquettes
@@ -54,18 +139,28 @@ class QubitDataSet:
         self.measFiducials = measFiducials
         self.maxLengths = maxLengths
         self.germs = germs
+        self.rawShots = rawShots
         self._init_internal()
 
-    def _init_internal(self):
+    def _init_internal(self, counts=None):
         if self.is_gst:
             self.spam_labels = ['0', '1']  # self.target_gateset.get_spam_labels()
             self._countVecMx = numpy.zeros((len(self.spam_labels), len(self.gatestring_list)), 'd')
             self._totalCntVec = numpy.zeros(len(self.gatestring_list), 'd')
-            for gatestring, d in self._rawdata.items():
-                self._extend(gatestring, d['value'], d['repeats'])
+            self._revision = 0
+            self._columnRevision = numpy.zeros(len(self.gatestring_list), numpy.int64)
+            if counts is not None:
+                self._countVecMx[:] = counts
+                self._totalCntVec[:] = self._countVecMx.sum(axis=0)
+            else:
+                for gatestring, d in self._rawdata.items():
+                    if 'value' in d:
+                        self._extend(gatestring, d['value'], d['repeats'])
         else:
             self._countVecMx = None
             self._totalCntVec = None
+            self._revision = 0
+            self._columnRevision = None
             self.spam_labels = None
 
     def update(self, other):
@@ -74,50 +169,62 @@ class QubitDataSet:
         self._rawdata.update(other._rawdata)
 
     def __getstate__(self):
-        return {key: getattr(self, key) for key in self._fields}
+        state = {key: getattr(self, key) for key in self._fields}
+        if not self.rawShots:
+            state['rawShots'] = False
+            state['counts'] = self._countVecMx.tolist() if self.is_gst else None
+        return state
 
     def __setstate__(self, state):
+        state = dict(state)
+        counts = state.pop('counts', None)
         self.__dict__.update(state)
         self.__dict__.setdefault('prepFiducials', None)
         self.__dict__.setdefault('measFiducials', None)
         self.__dict__.setdefault('germs', None)
         self.__dict__.setdefault('maxLengths', None)
+        self.__dict__.setdefault('rawShots', True)
+        for point in self._rawdata.values():   # data saved as lists
+            for key, value in point.items():
+                point[key] = compactBuffer(value)
         self.gatestring_dict = {s: idx for idx, s in enumerate(self.gatestring_list)} if self.gatestring_list else None
-        self._init_internal()
+        self._init_internal(counts)
 
     def extend(self, gatestring, evaluation, add_to_color_box_plot, values, repeats, timestamps):
         """Append the measurement result for gatestring to the datastructure"""
         point = self._rawdata[gatestring]
+        values, repeats = compactBuffer(values), compactBuffer(repeats)
         if add_to_color_box_plot:
-            point['value'].extend(values)
-            point['repeats'].extend(repeats)
-            point['timestamps'].extend(timestamps)
+            if self.rawShots:
+                point.extendBuffer('value', values)
+                point.extendBuffer('repeats', repeats)
+                point.extendBuffer('timestamps', timestamps)
             self._extend(gatestring, values, repeats)
-        else:
-            point['_' + evaluation + "_value"].extend(values)
-            point['_' + evaluation + '_repeats'].extend(repeats)
-            point['_' + evaluation + '_timestamps'].extend(timestamps)
+        elif self.rawShots:
+            point.extendBuffer('_' + evaluation + "_value", values)
+            point.extendBuffer('_' + evaluation + '_repeats', repeats)
+            point.extendBuffer('_' + evaluation + '_timestamps', timestamps)
 
     def _extend(self, gatestring, values, repeats):
         """Keeps the data in the input format for pygsti log_likelyhood up to date"""
         if self.is_gst:
             gatestring_idx = self.gatestring_dict[gatestring]
-            if len(values) == 1:
-                v, r = next(iter(values)), next(iter(repeats))
-                self._countVecMx[self.spam_labels.index(str(v)), gatestring_idx] += r
-                self._totalCntVec[gatestring_idx] += r
-            else:
-                # print("len(values)", len(values))
-                eval = ResultCounter(values, repeats)
-                for label, count in eval.items():
-                    self._countVecMx[self.spam_labels.index(str(label)), gatestring_idx] += count
-                self._totalCntVec[gatestring_idx] += sum(eval.values())
+            counts = outcomeCounts(values, repeats, self.spam_labels)
+            self._countVecMx[:, gatestring_idx] += counts
+            self._totalCntVec[gatestring_idx] += counts.sum()
+            self._revision += 1
+            self._columnRevision[gatestring_idx] = self._revision
+
+    def changedSince(self, revision):
+        """Return the indices into gatestring_list of the sequences with counts added after revision and the
+        current revision. A revision of -1 returns all sequences."""
+        return numpy.flatnonzero(self._columnRevision > revision), self._revision
 
     def extendEnv(self, gatestring, name, values, timestamps):
-        if values and timestamps:
+        if len(values) > 0 and len(timestamps) > 0:
             point = self._rawdata[gatestring]
-            point['_' + name].extend(values)
-            point['_' + name + '_ts'].extend(timestamps)
+            point.extendBuffer('_' + name, values)
+            point.extendBuffer('_' + name + '_ts', timestamps)
 
     @property
     def countVecMx(self):
@@ -141,10 +248,17 @@ class QubitDataSet:
 
     @property
     def gst_dataset(self):
-        ds = pygsti.objects.DataSet(outcomeLabels=['0', '1'])
+        labels = ['0', '1']
+        ds = pygsti.objects.DataSet(outcomeLabels=labels)
         for gs, data in self.data.items():
-            rc = ResultCounter(data['value'], data['repeats'], keys=['0', '1'],
-                               force_string=True)
+            if not self.rawShots and self.is_gst:
+                counts = self._countVecMx[:, self.gatestring_dict[gs]]
+                rc = ResultCounter(labels, counts.tolist())
+            else:
+                try:
+                    rc = ResultCounter(labels, outcomeCounts(data['value'], data['repeats'], labels).tolist())
+                except ValueError:  # outcomes not in labels are passed on as their own keys
+                    rc = ResultCounter(data['value'], data['repeats'], keys=labels, force_string=True)
             ds.add_count_dict(gs, rc)
         ds.done_adding_data()
         return ds
@@ -1,3 +1,5 @@
+from array import array
+
 import yaml
 from pygsti.objects import GateString
 from pygsti.objects.gatestringstructure import GatestringPlaquette
@@ -59,6 +61,11 @@ def make_custom_mapping(cls, node_name):
     yaml.add_representer(cls, _cls_representer)
     yaml.add_constructor(node_name, _cls_loader)
 
+def _array_representer(dumper, a):
+    return dumper.represent_list(a.tolist())
+
+yaml.add_representer(array, _array_representer)
+
 make_custom_mapping(QubitResultContainer, '!QubitResultContainer')
 make_custom_mapping(QubitResult, '!QubitResult')
 make_custom_mapping(ResultCounter, '!ResultCounter')
@@ -41,13 +41,16 @@ class GSTGraphItem(GraphicsObject):
         )
         self._shape = None
         self.picture = None
-        self.setOpts(**opts)
+        self._rects = None  # one rectangle per box and its key in spatialIndex, reused until x changes
+        self._brushes = None
         self.spatialIndex = dict()
+        self.setOpts(**opts)
 
     def setOpts(self, **opts):
         self.opts.update(opts)
         self.picture = None
         self._shape = None
+        self._rects = None
         self.update()
         self.informViewBoundsChanged()
 
@@ -56,33 +59,28 @@ class GSTGraphItem(GraphicsObject):
         self.opts['y'] = y
         if labels is not None:
             self.opts['labels'] = labels
+        self._rects = None
         self.update()
         self.drawPicture()
 
-    def drawPicture(self):
-        self.picture = QtGui.QPicture()
-        self._shape = QtGui.QPainterPath()
-        p = QtGui.QPainter(self.picture)
-        self.spatialIndex.clear()
-
-        pen = self.opts['pen']
-
-        if pen is None:
-            pen = getConfigOption('foreground')
+    def setValues(self, indices, values):
+        """Set the values of the boxes at indices, only the colors and labels of these boxes are recomputed"""
+        y = self.opts['y']
+        for index, value in zip(indices, values):
+            y[index] = value
+        if self._rects is not None:
+            for index in indices:
+                self._colorBox(index)
+        self.update()
+        self.drawPicture()
 
+    def _layout(self):
         def asarray(x):
             if x is None or np.isscalar(x) or isinstance(x, np.ndarray):
                 return x
             return np.array(x)
 
         x = asarray(self.opts.get('x'))
-        y = asarray(self.opts.get('y'))
-        labels = self.opts.get('labels')
-        if labels is None:
-            labels = x
-        colorscale = self.opts.get('colorscale')
-        if colorscale is None:
-            colorscale = lambda x: (1, 0, 0)
         x_max = asarray(self.opts.get('x_max'))
         if x_max is None:
             x_max = numpy.array([z for z in x if z is not None]).max(0)
@@ -92,16 +90,44 @@ class GSTGraphItem(GraphicsObject):
             x1_max, y1_max, x2_max, y2_max = x_max
             return x1 * (x2_max + 2) + x2, y1 * (y2_max + 2) + y2
 
+        self.spatialIndex.clear()
+        self._shape = QtGui.QPainterPath()
+        self._rects = list()
+        for index in x:
+            rx, ry = plot_index(index)
+            rect = QtCore.QRectF(rx - 0.5, ry - 0.5, 1, 1)
+            self._rects.append((rect, (rx, ry)))
+            self._shape.addRect(rect)
+        self._brushes = [None] * len(self._rects)
+        for index in range(len(self._rects)):
+            self._colorBox(index)
+
+    def _colorBox(self, index):
+        value = self.opts['y'][index]
+        labels = self.opts.get('labels')
+        label = labels[index] if labels is not None else self.opts['x'][index]
+        colorscale = self.opts.get('colorscale')
+        if colorscale is None:
+            colorscale = lambda x: (1, 0, 0)
+        rect, key = self._rects[index]
+        self._brushes[index] = QtGui.QBrush(QtGui.QColor(*colorscale(value)))
+        self.spatialIndex[key] = "{}  {:.3f}".format(label, value)
+
+    def drawPicture(self):
+        if self._rects is None:
+            self._layout()
+        self.picture = QtGui.QPicture()
+        p = QtGui.QPainter(self.picture)
+
+        pen = self.opts['pen']
+
+        if pen is None:
+            pen = getConfigOption('foreground')
+
         p.setPen(fn.mkPen(pen))
-        for index, value, label in zip(x, y, labels):
-            if x is not None:
-                c = QtGui.QColor(*colorscale(value))
-                p.setBrush(QtGui.QBrush(c))
-                rx, ry = plot_index(index)
-                rect = QtCore.QRectF(rx - 0.5, ry - 0.5, 1, 1)
-                self.spatialIndex[(rx, ry)] = "{}  {:.3f}".format(label, value)
-                p.drawRect(rect)
-                self._shape.addRect(rect)
+        for (rect, _), brush in zip(self._rects, self._brushes):
+            p.setBrush(brush)
+            p.drawRect(rect)
 
         p.end()
         self.prepareGeometryChange()
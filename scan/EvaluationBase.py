@@ -35,6 +35,29 @@ class EvaluationResult(namedtuple("EvaluationResultBase", "value interval raw va
         return super(EvaluationResult, cls).__new__(cls, value, interval, raw, is_valid)
 
 
+def wilsonInterval(p, N):
+    """Wilson score interval with continuity correction (bottom, top) of the fraction p observed in N shots.
+    p and N can be numbers or arrays.
+    see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval"""
+    p = numpy.asarray(p, dtype=numpy.float64)
+    N = numpy.asarray(N, dtype=numpy.float64)
+    rootp = 3-1/N -4*p+4*N*(1-p)*p
+    top = numpy.where(rootp>=0, numpy.minimum(1, (2 + 2*N*p + numpy.sqrt(numpy.maximum(rootp, 0)))/(2*(N+1))), 1)
+    rootb = -1-1/N +4*p+4*N*(1-p)*p
+    bottom = numpy.where(rootb>=0, numpy.maximum(0, (2*N*p - numpy.sqrt(numpy.maximum(rootb, 0)))/(2*(N+1))), 0)
+    if top.ndim == 0:
+        return float(bottom), float(top)
+    return bottom, top
+
+
+def cachedArray(data, key, function):
+    """array computed by function, cached on data under key for all evaluations of the same point"""
+    array = data.arrayCache.get(key)
+    if array is None:
+        array = data.arrayCache[key] = function()
+    return array
+
+
 def sint12(a):
     return -0x800 + (int(a) & 0x7ff) if (int(a) & 0x800) else (int(a) & 0x7ff)
 
@@ -46,6 +69,7 @@ def sint32(a):
 
 class EvaluationBase(Observable, metaclass=EvaluationMeta):
     hasChannel = True
+    threadSafe = False    # True if evaluate, qubitEvaluate and histogram may run outside of the gui thread
     intConversionsLookup = {'None': lambda x: x, 'sint12': sint12, 'sint16': sint16, 'sint32': sint32}
     def __init__(self, globalDict=None, settings= None):
         Observable.__init__(self)
@@ -114,6 +138,23 @@ class EvaluationBase(Observable, metaclass=EvaluationMeta):
     def __deepcopy__(self, memo=None):
         return type(self)( self.globalDict, settings=copy.deepcopy(self.settings, memo) )
   
+    @staticmethod
+    def countArray(data, evaluation):
+        """counts of the evaluation channel as numpy array"""
+        return cachedArray(data, ('channel', evaluation.type, evaluation.channelKey),
+                           lambda: numpy.asarray(evaluation.getChannelData(data)))
+
+    @staticmethod
+    def binomialResult(x, N, expected=None):
+        """EvaluationResult of the fraction x/N with Wilson score interval"""
+        p = x/N
+        bottom, top = wilsonInterval(p, N)
+        if expected is not None:
+            p = abs(expected-p)
+            bottom = abs(expected-bottom)
+            top = abs(expected-top)
+        return EvaluationResult(p, (p-bottom, top-p), x)
+
     def histogram(self, data, evaluation, histogramBins=50 ):
         countarray = evaluation.getChannelData(data)
         y, x = numpy.histogram( countarray, range=(0, histogramBins), bins=histogramBins)
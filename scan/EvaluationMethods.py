@@ -12,21 +12,76 @@ algorithms are expected to defined the fileds as stated in MeanEvaluation
 
 """
 import math
-from collections import Counter
-from itertools import repeat
+from itertools import combinations, repeat
 
 import numpy
 
 from gui.ExpressionValue import ExpressionValue
-from modules.quantity import Q
-from scan.EvaluationBase import EvaluationBase, EvaluationException, EvaluationResult
+from modules.quantity import Q, value
+from scan.EvaluationBase import EvaluationBase, EvaluationException, EvaluationResult, cachedArray
 from uiModules.ParameterTable import Parameter
 from modules.Expression import Expression
 from modules.enum import enum
 from modules.SequenceDict import SequenceDict
 
+def discriminate(data, channel, countarray, threshold, invert):
+    """1 for more than threshold counts, 0 otherwise (inverted if invert).
+    Shared by all evaluations using the same channel and threshold."""
+    threshold = value(threshold)
+    return cachedArray(data, ('threshold', channel, threshold, invert),
+                       lambda: ((countarray > threshold) != invert).astype(numpy.int8))
+
+
+def inRange(data, channel, countarray, ranges, invert):
+    """1 for counts within any of the inclusive ranges [(min, max), ...], 0 otherwise (inverted if invert)"""
+    ranges = tuple((value(minimum), value(maximum)) for minimum, maximum in ranges)
+    def compute():
+        inside = numpy.zeros(len(countarray), dtype=bool)
+        for minimum, maximum in ranges:
+            inside |= (minimum <= countarray) & (countarray <= maximum)
+        return (inside != invert).astype(numpy.int8)
+    return cachedArray(data, ('range', channel, ranges, invert), compute)
+
+
+def counterSum(data, counterId, counters):
+    """sum of the counts of several counters, truncated to the shortest counter"""
+    keys = tuple(((counterId&0xff)<<8) | (int(counter) & 0xff) for counter in counters)
+    def compute():
+        arrays = [numpy.asarray(data.count[key]) for key in keys if key in data.count.keys()]
+        if not arrays:
+            return numpy.zeros(0)
+        length = min(len(a) for a in arrays)
+        return numpy.sum([a[:length] for a in arrays], axis=0)
+    return cachedArray(data, ('counterSum', keys), compute)
+
+
+def ionStates(data, names):
+    """index of the joint state of several ion evaluations for every shot, the first ion is the most significant bit"""
+    evaluated = list()
+    for name in names:
+        e = data.evaluated.get(name)
+        if e is None:
+            raise EvaluationException("Cannot find data '{0}'".format(name))
+        evaluated.append(numpy.asarray(e))
+    for e1, e2 in combinations(evaluated, 2):
+        if len(e1)!=len(e2):
+            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(e1),len(e2)))
+    index = numpy.zeros(len(evaluated[0]), dtype=numpy.intp)
+    for name, e in zip(names, evaluated):
+        if ((e != 0) & (e != 1)).any():
+            raise EvaluationException("Data '{0}' is not a bright/dark evaluation".format(name))
+        index = 2*index + e
+    return index
+
+
+def ionStateNames(ions, dark='-', bright='o'):
+    """settings names of the joint states in the order of the ionStates index"""
+    return [''.join(bright if state & (1 << (ions-1-ion)) else dark for ion in range(ions)) for state in range(1 << ions)]
+
+
 class MeanEvaluation(EvaluationBase):
     name = 'Mean'
+    threadSafe = True
     tooltip = "Mean of observed counts" 
     errorBarTypes = ['shotnoise','statistical','min max']
     expression = Expression()
@@ -62,7 +117,7 @@ class MeanEvaluation(EvaluationBase):
     
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None):
         countarray = evaluation.getChannelData(data)
-        if not countarray:
+        if len(countarray) == 0:
             return EvaluationResult()
         countarray = list(map(self.intConversionsLookup.get(self.settings['intConversion'], lambda x: x), countarray))
         r = self.errorBarTypeLookup[self.settings['errorBarType']](countarray)
@@ -94,11 +149,11 @@ class MeanEvaluation(EvaluationBase):
     def detailEvaluate(self, data, evaluation, ppDict=None, globalDict=None):
         countarray = evaluation.getChannelData(data)
         timestamps = data.timeTick.get(int(self.settings['timestamp_id']), None)
-        if not timestamps:
+        if timestamps is None or len(timestamps) == 0:
             timestamps = data.allTimeTick
         # we will return 3-tuple of lists: value, repeats, timestamp
         # if we do not find a timestamp we will accumulate the data, otherwise send back every event
-        if countarray:
+        if len(countarray) > 0:
             if timestamps is None or len(timestamps) != len(countarray):
                 mean, (minus, plus), raw, valid = self.errorBarTypeLookup[self.settings['errorBarType']](countarray)
                 if self.settings['transformation'] != "":
@@ -106,8 +161,8 @@ class MeanEvaluation(EvaluationBase):
                     if ppDict:
                         mydict.update(ppDict)
                     mean = float(self.expression.evaluate(self.settings['transformation'], mydict))
-                if timestamps:
-                    avg_time = sum(timestamps) // len(timestamps)
+                if len(timestamps) > 0:
+                    avg_time = sum(numpy.asarray(timestamps).tolist()) // len(timestamps)
                 else:
                     avg_time = data.creationTimeNs
                 return [mean], [avg_time]
@@ -117,16 +172,17 @@ class MeanEvaluation(EvaluationBase):
                     if ppDict:
                         mydict.update(ppDict)
                     values = list()
-                    for value in countarray:
-                        mydict['y'] = value
+                    for count in countarray:
+                        mydict['y'] = count
                         values.append(float(self.expression.evaluate(self.settings['transformation'], mydict)))
                 else:
-                    values = countarray
-                return values, timestamps
+                    values = numpy.asarray(countarray).tolist()
+                return values, numpy.asarray(timestamps).tolist()
         return [], []
 
 class NumberEvaluation(EvaluationBase):
     name = 'Number'
+    threadSafe = True
     tooltip = "Number of results" 
     sourceType = enum('Counter','Result')
     def __init__(self, globalDict=None, settings=None):
@@ -134,7 +190,7 @@ class NumberEvaluation(EvaluationBase):
         
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None):
         countarray = evaluation.getChannelData(data)
-        if not countarray:
+        if len(countarray) == 0:
             return EvaluationResult()
         return EvaluationResult(len(countarray), raw=len(countarray))
 
@@ -166,7 +222,7 @@ class FeedbackEvaluation(EvaluationBase):
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None):
         countarray = evaluation.getChannelData(data)
         globalName = self.settings['GlobalVariable']
-        if not countarray:
+        if len(countarray) == 0:
             return EvaluationResult()
         r = self.evaluateMinMax(countarray)
         if not globalDict or globalName not in globalDict:
@@ -205,6 +261,7 @@ class ThresholdEvaluation(EvaluationBase):
     dark.
     """
     name = "Threshold"
+    threadSafe = True
     tooltip = "Above threshold is bright"
     def __init__(self, globalDict=None, settings=None):
         EvaluationBase.__init__(self, globalDict, settings)
@@ -219,42 +276,32 @@ class ThresholdEvaluation(EvaluationBase):
     def _evaluate(self, data, evaluation, countarray):
         if evaluation.name in data.evaluated:
             return data.evaluated[evaluation.name]
-        if self.settings['invert']:
-            discriminated = [ 0 if count > self.settings['threshold'] else 1 for count in countarray ]
-        else:
-            discriminated = [ 1 if count > self.settings['threshold'] else 0 for count in countarray ]
+        discriminated = discriminate(data, (evaluation.type, evaluation.channelKey), countarray,
+                                     self.settings['threshold'], self.settings['invert'])
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
         return discriminated
 
 
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
-        countarray = evaluation.getChannelData(data)
-        if not countarray:
+        countarray = self.countArray(data, evaluation)
+        if len(countarray) == 0:
             return EvaluationResult()
         N = float(len(countarray))
         discriminated = self._evaluate(data, evaluation, countarray)
-        x = numpy.sum( discriminated )
-        p = x/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0            
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        return self.binomialResult(numpy.sum( discriminated ), N)
 
     def qubitEvaluate(self, data, evaluation, ppDict=None, globalDict=None):
-        countarray = evaluation.getChannelData(data)
+        countarray = self.countArray(data, evaluation)
         timestamps = data.timeTick.get(int(self.settings['timestamp_id']), None)
         # we will return 3-tuple of lists: value, repeats, timestamp
         # if we do not find a timestamp we will accumulate the data, otherwise send back every event
         discriminated = self._evaluate(data, evaluation, countarray)
         if timestamps is None or len(timestamps) != len(countarray):
-            c = Counter(discriminated)
-            return c.keys(), c.values(), repeat(data._creationTime, len(c))
+            values, counts = numpy.unique(discriminated, return_counts=True)
+            return values.tolist(), counts.tolist(), repeat(data._creationTime, len(values))
         else:
-            return discriminated, [1]*len(discriminated), timestamps
+            return numpy.asarray(discriminated).tolist(), [1]*len(discriminated), numpy.asarray(timestamps).tolist()
 
     def parameters(self):
         parameterDict = super(ThresholdEvaluation, self).parameters()
@@ -270,6 +317,7 @@ class ThresholdEvaluation(EvaluationBase):
 class RangeEvaluation(EvaluationBase):
     """Evaluate the number of counts that occur in a specified range"""
     name = "Count Range"
+    threadSafe = True
     tooltip = ""
     def __init__(self, globalDict=None, settings=None):
         EvaluationBase.__init__(self, globalDict, settings)
@@ -281,26 +329,16 @@ class RangeEvaluation(EvaluationBase):
         self.settings.setdefault('invert',False)
         
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
-        countarray = evaluation.getChannelData(data)
-        if not countarray:
+        countarray = self.countArray(data, evaluation)
+        if len(countarray) == 0:
             return EvaluationResult()
         N = float(len(countarray))
-        if self.settings['invert']:
-            discriminated = [ 0 if self.settings['min'] <= count <= self.settings['max'] else 1 for count in countarray ]
-        else:
-            discriminated = [ 1 if self.settings['min'] <= count <= self.settings['max'] else 0 for count in countarray ]
+        discriminated = inRange(data, (evaluation.type, evaluation.channelKey), countarray,
+                                [(self.settings['min'], self.settings['max'])], self.settings['invert'])
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = numpy.sum( discriminated )
-        p = float(x)/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        # caution: not applicable to this situation, needs to be fixed
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0            
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        # caution: Wilson score interval not applicable to this situation, needs to be fixed
+        return self.binomialResult(numpy.sum( discriminated ), N)
 
     def parameters(self):
         parameterDict = super(RangeEvaluation, self).parameters()
@@ -315,6 +353,7 @@ class RangeEvaluation(EvaluationBase):
 class DoubleRangeEvaluation(EvaluationBase):
     """Evaluate the number of counts that occur in two specified ranges"""
     name = "Double Count Range"
+    threadSafe = True
     tooltip = ""
     def __init__(self, globalDict=None, settings=None):
         EvaluationBase.__init__(self, globalDict, settings)
@@ -328,28 +367,17 @@ class DoubleRangeEvaluation(EvaluationBase):
         self.settings.setdefault('invert',False)
         
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
-        countarray = evaluation.getChannelData(data)
-        if not countarray:
+        countarray = self.countArray(data, evaluation)
+        if len(countarray) == 0:
             return EvaluationResult()
         N = float(len(countarray))
-        if self.settings['invert']:
-            discriminated = [ 0 if ( self.settings['min_1'] <= count <= self.settings['max_1'] ) or
-                             ( self.settings['min_2'] <= count <= self.settings['max_2'] )  else 1 for count in countarray ]
-        else:
-            discriminated = [ 1 if ( self.settings['min_1'] <= count <= self.settings['max_1'] ) or
-                             ( self.settings['min_2'] <= count <= self.settings['max_2'] )  else 0 for count in countarray ]
+        discriminated = inRange(data, (evaluation.type, evaluation.channelKey), countarray,
+                                [(self.settings['min_1'], self.settings['max_1']), (self.settings['min_2'], self.settings['max_2'])],
+                                self.settings['invert'])
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = numpy.sum( discriminated )
-        p = float(x)/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        # caution: not applicable to this situation, needs to be fixed
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0            
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        # caution: Wilson score interval not applicable to this situation, needs to be fixed
+        return self.binomialResult(numpy.sum( discriminated ), N)
 
     def parameters(self):
         parameterDict = super(DoubleRangeEvaluation, self).parameters()
@@ -371,6 +399,7 @@ class FidelityEvaluation(EvaluationBase):
     In addition it receives the expected state and calculates the fidelity
     """
     name = "Fidelity"
+    threadSafe = True
     tooltip = "Above threshold is bright"
     ExpectedLookup = { 'd': 0, 'u' : 1, '1':0.5, '-1':0.5, 'i':0.5, '-i':0.5 }
     def __init__(self, globalDict=None, settings=None):
@@ -382,30 +411,16 @@ class FidelityEvaluation(EvaluationBase):
         self.settings.setdefault('invert',False)
         
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
-        countarray = evaluation.getChannelData(data)
-        if not countarray:
+        countarray = self.countArray(data, evaluation)
+        if len(countarray) == 0:
             return EvaluationResult()
         N = float(len(countarray))
-        if self.settings['invert']:
-            discriminated = [ 0 if count > self.settings['threshold'] else 1 for count in countarray ]
-        else:
-            discriminated = [ 1 if count > self.settings['threshold'] else 0 for count in countarray ]
+        discriminated = discriminate(data, (evaluation.type, evaluation.channelKey), countarray,
+                                     self.settings['threshold'], self.settings['invert'])
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = numpy.sum( discriminated )
-        p = x/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0  
-        if expected is not None:
-            expected = self.ExpectedLookup[expected]
-            p = abs(expected-p)
-            bottom = abs(expected-bottom)
-            top = abs(expected-top)
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        return self.binomialResult(numpy.sum( discriminated ), N,
+                                   self.ExpectedLookup[expected] if expected is not None else None)
 
     def parameters(self):
         parameterDict = super(FidelityEvaluation, self).parameters()
@@ -419,6 +434,7 @@ class FidelityEvaluation(EvaluationBase):
 class ParityEvaluation(EvaluationBase):
     """Evaluates the parity, given individual ion signals ion_1 and ion_2"""
     name = "Parity"
+    threadSafe = True
     tooltip = "Two ion parity evaluation"
     hasChannel = False
     def __init__(self, globalDict=None, settings=None):
@@ -439,22 +455,10 @@ class ParityEvaluation(EvaluationBase):
         if len(eval1)!=len(eval2):
             raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval1),len(eval2)))
         N = float(len(eval1))
-        discriminated = [ 1 if e1==e2 else -1 for e1, e2 in zip(eval1, eval2) ]
+        discriminated = numpy.where(numpy.asarray(eval1) == numpy.asarray(eval2), 1, -1)
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = numpy.sum( discriminated )
-        p = x/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0  
-        if expected is not None:
-            p = abs(expected-p)
-            bottom = abs(expected-bottom)
-            top = abs(expected-top)
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        return self.binomialResult(numpy.sum( discriminated ), N, expected)
 
     def parameters(self):
         parameterDict = super(ParityEvaluation, self).parameters()
@@ -465,8 +469,10 @@ class ParityEvaluation(EvaluationBase):
 class TwoIonEvaluation(EvaluationBase):
     """Combines two individual ion evaluations using coefficients on the four possible state (dd, db, bd, and bb)"""
     name = "TwoIon"
+    threadSafe = True
     tooltip = "Two ion parity evaluation"
     hasChannel = False
+    states = ionStateNames(2, dark='d', bright='b')
     def __init__(self, globalDict=None, settings=None):
         EvaluationBase.__init__(self, globalDict, settings)
         
@@ -480,32 +486,14 @@ class TwoIonEvaluation(EvaluationBase):
         self.settings.setdefault('bb',1)
         
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
-        name1, name2 = self.settings['Ion_1'], self.settings['Ion_2']
-        eval1, eval2 = data.evaluated.get(name1), data.evaluated.get(name2) 
-        if eval1 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name1))
-        if eval2 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name2))
-        if len(eval1)!=len(eval2):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval1),len(eval2)))
-        N = float(len(eval1))
-        lookup = {(0,0): self.settings['dd'], (0,1): self.settings['db'], (1,0): self.settings['bd'], (1,1):self.settings['bb'] }
-        discriminated = [ lookup[pair] for pair in zip(eval1, eval2) ]
+        index = ionStates(data, [self.settings[name] for name in ['Ion_1', 'Ion_2']])
+        N = float(len(index))
+        lookup = numpy.array([value(self.settings[state]) for state in self.states], dtype=numpy.float64)
+        discriminated = lookup[index]
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = float(numpy.sum( discriminated )) # Float converts type "magnitude" to float so as to not break plotting (numpy.isnan fails)
-        p = x/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0  
-        if expected is not None:
-            p = abs(expected-p)
-            bottom = abs(expected-bottom)
-            top = abs(expected-top)
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        x = float(numpy.sum( discriminated ))
+        return self.binomialResult(x, N, expected)
 
     def parameters(self):
         parameterDict = super(TwoIonEvaluation, self).parameters()
@@ -523,6 +511,7 @@ class TwoIonEvaluation(EvaluationBase):
 class CounterSumMeanEvaluation(EvaluationBase):
     """Evaluate the mean of a sum of counters"""
     name = 'Counter Sum Mean'
+    threadSafe = True
     tooltip = "Mean of sum of observed counts"
     hasChannel = False
     errorBarTypes = ['shotnoise', 'statistical', 'min max']
@@ -558,14 +547,11 @@ class CounterSumMeanEvaluation(EvaluationBase):
         return EvaluationResult(mean, (mean - numpy.min(countarray), numpy.max(countarray) - mean), numpy.sum(countarray))
 
     def getCountArray(self, data):
-        counters = [((self.settings['id']&0xff)<<8) | (int(counter) & 0xff) for counter in self.settings['counters']]
-        listOfCountArrays = [data.count[counter] for counter in counters if counter in data.count.keys()]
-        countarray = [sum(sublist) for sublist in zip(*listOfCountArrays)]
-        return countarray
+        return counterSum(data, self.settings['id'], self.settings['counters'])
 
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None):
         countarray = self.getCountArray(data)
-        if not countarray:
+        if len(countarray) == 0:
             return EvaluationResult()
         r = self.errorBarTypeLookup[self.settings['errorBarType']](countarray)
         bottom, top = r.interval
@@ -607,6 +593,7 @@ class CounterSumThresholdEvaluation(EvaluationBase):
     dark. Evaluated on a sum of counters.
     """
     name = "Counter Sum Threshold"
+    threadSafe = True
     tooltip = "Above threshold is bright"
     def __init__(self, globalDict=None, settings=None):
         EvaluationBase.__init__(self, globalDict, settings)
@@ -619,31 +606,18 @@ class CounterSumThresholdEvaluation(EvaluationBase):
         self.settings.setdefault('id', 0)
 
     def getCountArray(self, data):
-        counters = [((self.settings['id']&0xff)<<8) | (int(counter) & 0xff) for counter in self.settings['counters']]
-        listOfCountArrays = [data.count[counter] for counter in counters if counter in data.count.keys()]
-        countarray = [sum(sublist) for sublist in zip(*listOfCountArrays)]
-        return countarray
+        return counterSum(data, self.settings['id'], self.settings['counters'])
 
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
         countarray = self.getCountArray(data)
-        if not countarray:
+        if len(countarray) == 0:
             return EvaluationResult()
         N = float(len(countarray))
-        if self.settings['invert']:
-            discriminated = [ 0 if count > self.settings['threshold'] else 1 for count in countarray ]
-        else:
-            discriminated = [ 1 if count > self.settings['threshold'] else 0 for count in countarray ]
+        discriminated = discriminate(data, ('counterSum', self.settings['id'], tuple(self.settings['counters'])), countarray,
+                                     self.settings['threshold'], self.settings['invert'])
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = numpy.sum( discriminated )
-        p = x/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        return self.binomialResult(numpy.sum( discriminated ), N)
 
     def parameters(self):
         parameterDict = super(CounterSumThresholdEvaluation, self).parameters()
@@ -663,8 +637,10 @@ class CounterSumThresholdEvaluation(EvaluationBase):
 class ThreeIonEvaluation(EvaluationBase):
     """Straightforward extension of two ion eval to three ions using coefficients on the nine possible states"""
     name = "ThreeIon"
+    threadSafe = True
     tooltip = "Three ion evaluation"
     hasChannel = False
+    states = ionStateNames(3)
     def __init__(self, globalDict=None, settings=None):
         EvaluationBase.__init__(self, globalDict, settings)
 
@@ -683,48 +659,14 @@ class ThreeIonEvaluation(EvaluationBase):
         self.settings.setdefault('ooo',0)
 
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
-        name1, name2, name3 = self.settings['Ion_1'], self.settings['Ion_2'], self.settings['Ion_3']
-        eval1, eval2, eval3 = data.evaluated.get(name1), data.evaluated.get(name2), data.evaluated.get(name3)
-
-        if eval1 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name1))
-        if eval2 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name2))
-        if eval3 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name3))
-
-        if len(eval1)!=len(eval2):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval1),len(eval2)))
-        if len(eval1)!=len(eval3):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval1),len(eval3)))
-        if len(eval2)!=len(eval3):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval2),len(eval3)))
-
-        N = float(len(eval1))
-        lookup = {(0,0,0): self.settings['---'],
-                  (0,0,1): self.settings['--o'],
-                  (0,1,0): self.settings['-o-'],
-                  (1,0,0): self.settings['o--'],
-                  (1,1,0): self.settings['oo-'],
-                  (1,0,1): self.settings['o-o'],
-                  (0,1,1): self.settings['-oo'],
-                  (1,1,1): self.settings['ooo'] }
-        discriminated = [ lookup[trio] for trio in zip(eval1, eval2, eval3) ]
+        index = ionStates(data, [self.settings[name] for name in ['Ion_1', 'Ion_2', 'Ion_3']])
+        N = float(len(index))
+        lookup = numpy.array([value(self.settings[state]) for state in self.states], dtype=numpy.float64)
+        discriminated = lookup[index]
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = float(numpy.sum( discriminated )) # Float converts type "magnitude" to float so as to not break plotting (numpy.isnan fails)
-        p = x/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0
-        if expected is not None:
-            p = abs(expected-p)
-            bottom = abs(expected-bottom)
-            top = abs(expected-top)
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        x = float(numpy.sum( discriminated ))
+        return self.binomialResult(x, N, expected)
 
     def parameters(self):
         parameterDict = super(ThreeIonEvaluation, self).parameters()
@@ -747,8 +689,10 @@ class ThreeIonEvaluation(EvaluationBase):
 class FourIonEvaluation(EvaluationBase):
     """Straightforward extension of two ion eval to four ions using coefficients on the sixteen possible states"""
     name = "FourIon"
+    threadSafe = True
     tooltip = "Four ion evaluation"
     hasChannel = False
+    states = ionStateNames(4)
     def __init__(self, globalDict=None, settings=None):
         EvaluationBase.__init__(self, globalDict, settings)
 
@@ -776,64 +720,14 @@ class FourIonEvaluation(EvaluationBase):
         self.settings.setdefault('oooo',1)
 
     def evaluate(self, data, evaluation, expected=None, ppDict=None, globalDict=None ):
-        name1, name2, name3, name4 = self.settings['Ion_1'], self.settings['Ion_2'], self.settings['Ion_3'], self.settings['Ion_4']
-        eval1, eval2, eval3, eval4 = data.evaluated.get(name1), data.evaluated.get(name2), data.evaluated.get(name3),data.evaluated.get(name4)
-
-        if eval1 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name1))
-        if eval2 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name2))
-        if eval3 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name3))
-        if eval4 is None:
-            raise EvaluationException("Cannot find data '{0}'".format(name4))
-
-        if len(eval1)!=len(eval2):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval1),len(eval2)))
-        if len(eval1)!=len(eval3):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval1),len(eval3)))
-        if len(eval2)!=len(eval3):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval2),len(eval3)))
-        if len(eval1)!=len(eval4):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval1),len(eval4)))
-        if len(eval2)!=len(eval4):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval2),len(eval4)))
-        if len(eval3)!=len(eval4):
-            raise EvaluationException("Evaluated arrays have different length {0}, {1}".format(len(eval3),len(eval4)))
-
-        N = float(len(eval1))
-        lookup = {(0,0,0,0): self.settings['----'],
-                  (1,0,0,0): self.settings['o---'],
-                  (0,1,0,0): self.settings['-o--'],
-                  (0,0,1,0): self.settings['--o-'],
-                  (0,0,0,1): self.settings['---o'],
-                  (1,1,0,0): self.settings['oo--'],
-                  (1,0,1,0): self.settings['o-o-'],
-                  (1,0,0,1): self.settings['o--o'],
-                  (0,1,1,0): self.settings['-oo-'],
-                  (0,1,0,1): self.settings['-o-o'],
-                  (0,0,1,1): self.settings['--oo'],
-                  (1,1,1,0): self.settings['ooo-'],
-                  (1,1,0,1): self.settings['oo-o'],
-                  (1,0,1,1): self.settings['o-oo'],
-                  (0,1,1,1): self.settings['-ooo'],
-                  (1,1,1,1): self.settings['oooo'] }
-        discriminated = [ lookup[quartet] for quartet in zip(eval1, eval2, eval3, eval4) ]
+        index = ionStates(data, [self.settings[name] for name in ['Ion_1', 'Ion_2', 'Ion_3', 'Ion_4']])
+        N = float(len(index))
+        lookup = numpy.array([value(self.settings[state]) for state in self.states], dtype=numpy.float64)
+        discriminated = lookup[index]
         if evaluation.name:
             data.evaluated[evaluation.name] = discriminated
-        x = float(numpy.sum( discriminated )) # Float converts type "magnitude" to float so as to not break plotting (numpy.isnan fails)
-        p = x/N
-        # Wilson score interval with continuity correction
-        # see http://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval
-        rootp = 3-1/N -4*p+4*N*(1-p)*p
-        top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
-        rootb = -1-1/N +4*p+4*N*(1-p)*p
-        bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0
-        if expected is not None:
-            p = abs(expected-p)
-            bottom = abs(expected-bottom)
-            top = abs(expected-top)
-        return EvaluationResult(p, (p-bottom, top-p), x)
+        x = float(numpy.sum( discriminated ))
+        return self.binomialResult(x, N, expected)
 
     def parameters(self):
         parameterDict = super(FourIonEvaluation, self).parameters()
@@ -0,0 +1,83 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Evaluation of scan points outside of the gui thread.
+
+Points are evaluated by a thread pool as they arrive, the results are delivered to the gui thread
+in the order the points were submitted. The pool uses a single worker by default: the evaluation
+algorithm instances are shared by all points of a scan and some of them keep state between calls,
+running them concurrently would reorder or corrupt that state.
+"""
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from PyQt5 import QtCore
+
+
+class EvaluationWorker(QtCore.QObject):
+    resultReady = QtCore.pyqtSignal()
+
+    def __init__(self, maxWorkers=1, parent=None):
+        super(EvaluationWorker, self).__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        self.pending = deque()   # (future, function, callback, finalize) in submission order
+        self.resultReady.connect(self.deliver, QtCore.Qt.QueuedConnection)
+
+    @staticmethod
+    def threadSafe(algorithms):
+        """True if all evaluation algorithms can be run in the worker thread"""
+        return all(getattr(algo, 'threadSafe', False) for algo in algorithms)
+
+    def submit(self, function, callback, threaded=True, finalize=None):
+        """Evaluate function() and call callback(result) in the gui thread.
+        If threaded is False, function is run in the gui thread once all earlier points are delivered.
+        finalize() is called in the gui thread once the point is delivered, failed or discarded."""
+        if threaded:
+            future = self.executor.submit(function)
+            self.pending.append((future, function, callback, finalize))
+            future.add_done_callback(lambda f: self.resultReady.emit())
+        elif self.pending:
+            self.pending.append((None, function, callback, finalize))
+        else:
+            self._call(None, function, callback, finalize)
+
+    @property
+    def busy(self):
+        return len(self.pending) > 0
+
+    def _call(self, future, function, callback, finalize):
+        try:
+            result = future.result() if future is not None else function()
+            callback(result)
+        except Exception:
+            logging.getLogger(__name__).exception("Evaluation of scan point failed")
+        finally:
+            if finalize is not None:
+                finalize()
+
+    def deliver(self):
+        """deliver all finished results that are not waiting for an earlier point"""
+        while self.pending and (self.pending[0][0] is None or self.pending[0][0].done()):
+            self._call(*self.pending.popleft())
+
+    def flush(self):
+        """wait for and deliver all outstanding results"""
+        while self.pending:
+            self._call(*self.pending.popleft())
+
+    def clear(self):
+        """discard all outstanding results, points that are being evaluated are finalized once they finished"""
+        pending, self.pending = self.pending, deque()
+        running = [future for future, _, _, _ in pending if future is not None and not future.cancel()]
+        wait(running)
+        for _, _, _, finalize in pending:
+            if finalize is not None:
+                finalize()
+
+    def shutdown(self):
+        self.clear()
+        self.executor.shutdown(wait=True)
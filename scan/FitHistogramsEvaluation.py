@@ -203,6 +203,7 @@ class FitHistogramEvaluation(EvaluationBase):
   
 class TwoIonFidelityEvaluation(EvaluationBase):
     name = "TwoIonFidelity"
+    threadSafe = True
     tooltip = "Above threshold is bright"
     modes = ['Zero', 'One', 'Two', 'All']
     ExpectedLookup = { '424': [0.25, 0.5, 0.25], '202': [0.5, 0.0, 0.5], '001': [0.0, 0.0, 1.0], '100': [1.0, 0.0, 0.0] }
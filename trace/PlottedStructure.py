@@ -1,4 +1,5 @@
 import hashlib
+from collections import OrderedDict
 import lxml.etree as ElementTree
 from math import floor, ceil, sqrt
 
@@ -84,7 +85,16 @@ class PlottedStructureProperties:
 
 
 class PlottedStructure:
-    _evaltree_cache = SQLiteLRUCache(capacity=64, filename="evaltree.db")
+    """Color box plot of the log-likelihood of the GST gate sequences.
+
+    The predicted probabilities are computed once per gate set and kept in _probs_cache. When new data arrives only
+    the log-likelihood terms and colors of the sequences with new counts are updated, everything is recomputed
+    when the gate set changes.
+    """
+    _evaltree_cache = None  # SQLiteLRUCache opened on first use, importing the module does not create the file
+    evaltreeCacheFilename = "evaltree.db"
+    _probs_cache = OrderedDict()  # hash of gate set and gate sequences -> predicted probabilities, most recent last
+    _probs_cache_depth = 16
     serializeFields = ('qubitDataKey', 'name', 'windowName', 'properties')
     xmlPropertFields = ('qubitDataKey', 'name', 'windowName')
     def __init__(self, traceCollection, qubitDataKey, plot=None, windowName=None, properties=None, tracePlotting=None, name=None):
@@ -120,6 +130,9 @@ class PlottedStructure:
     def _createIndex(self):
         d = {v:i for i,v in enumerate(self.qubitData.gatestring_list)}
         self._plot_s_idx = [d.get(s) for s in self._plot_s]
+        self._plot_positions = dict()  # index into gatestring_list -> indices of the boxes showing it
+        for position, idx in enumerate(self._plot_s_idx):
+            self._plot_positions.setdefault(idx, list()).append(position)
 
     def __getstate__(self):
         return {key: getattr(self, key) for key in PlottedStructure.serializeFields}
@@ -180,29 +193,56 @@ class PlottedStructure:
         self._gateSet = gateSet
         self._spamLabels = list(self._gateSet.povms['Mz'].keys())  # this list fixes the ordering of the spam labels
         self._spam_lbl_rows = {sl: i for (i, sl) in enumerate(self._spamLabels)}
-        self._probs = numpy.empty((len(self._spamLabels), len(self.qubitData.gatestring_list)), 'd')
+        m = hashlib.sha1()
+        m.update(str(self._gateSet).encode())
+        m.update((",".join([str(s) for s in self.qubitData.gatestring_list])).encode())
+        evaltree_dependency_hash = m.hexdigest()
+        if PlottedStructure._evaltree_cache is None:
+            PlottedStructure._evaltree_cache = SQLiteLRUCache(capacity=64, filename=PlottedStructure.evaltreeCacheFilename,
+                                                              maxBytes=256*1024*1024)
         try:
-            m = hashlib.sha1()
-            m.update(str(self._gateSet).encode())
-            m.update((",".join([str(s) for s in self.qubitData.gatestring_list])).encode())
-            evaltree_dependency_hash = m.hexdigest()
             self._evaltree = PlottedStructure._evaltree_cache[evaltree_dependency_hash]
         except KeyError:
             self._evaltree = self._gateSet.bulk_evaltree(self.qubitData.gatestring_list)
             PlottedStructure._evaltree_cache[evaltree_dependency_hash] = self._evaltree
-        evalTree, lookup, outcome_lookup = self._evaltree
-        self._gateSet.bulk_fill_probs(self._probs, evalTree, (-1e6, 1e6))
+        m.update(numpy.ascontiguousarray(self._gateSet.to_vector()).tobytes())
+        probs_hash = m.hexdigest()
+        self._probs = PlottedStructure._probs_cache.pop(probs_hash, None)
+        if self._probs is None:
+            evalTree, lookup, outcome_lookup = self._evaltree
+            self._probs = numpy.empty((len(self._spamLabels), len(self.qubitData.gatestring_list)), 'd')
+            self._gateSet.bulk_fill_probs(self._probs, evalTree, (-1e6, 1e6))
+        PlottedStructure._probs_cache[probs_hash] = self._probs
+        while len(PlottedStructure._probs_cache) > PlottedStructure._probs_cache_depth:
+            PlottedStructure._probs_cache.popitem(last=False)
+        self._log_likelihood = numpy.zeros(len(self.qubitData.gatestring_list))
+        self._revision = -1  # the log-likelihood of all sequences has to be computed
 
     def _assemble_data(self):
+        """Update the log-likelihood of the gate sequences with counts added since the last call.
+
+        Returns the indices into _y of the updated boxes, or None if all of them were computed after a change of
+        the gate set.
+        """
         evalTree, lookup, outcome_lookup = self._evaltree
-        l = logl_terms(gatestring_list=self.qubitData.gatestring_list, lookup=lookup,
-                       countVecMx=self.qubitData.countVecMx, totalCntVec=self.qubitData.totalCntVec,
-                       probs=self._probs)
-        l_max = logl_max_terms(gatestring_list=self.qubitData.gatestring_list,
-                               countVecMx=self.qubitData.countVecMx, totalCntVec=self.qubitData.totalCntVec,
-                               lookup=lookup)
-        self._log_likelihood = numpy.sum(2 * (l_max - l), axis=0)
-        self._y = [self._log_likelihood[i] for i in self._plot_s_idx]
+        recompute = self._revision < 0
+        changed, self._revision = self.qubitData.changedSince(self._revision)
+        if len(changed) > 0:
+            gatestring_list = [self.qubitData.gatestring_list[i] for i in changed]
+            countVecMx = self.qubitData.countVecMx[:, changed]
+            totalCntVec = self.qubitData.totalCntVec[changed]
+            l = logl_terms(gatestring_list=gatestring_list, lookup=lookup, countVecMx=countVecMx,
+                           totalCntVec=totalCntVec, probs=self._probs[:, changed])
+            l_max = logl_max_terms(gatestring_list=gatestring_list, countVecMx=countVecMx, totalCntVec=totalCntVec,
+                                   lookup=lookup)
+            self._log_likelihood[changed] = numpy.sum(2 * (l_max - l), axis=0)
+        if recompute:
+            self._y = [self._log_likelihood[i] for i in self._plot_s_idx]
+            return None
+        positions = [position for i in changed for position in self._plot_positions.get(i, ())]
+        for position in positions:
+            self._y[position] = self._log_likelihood[self._plot_s_idx[position]]
+        return positions
 
     def plot(self, penindex=-1, style=None):
         if self._graphicsView is not None:
@@ -216,8 +256,11 @@ class PlottedStructure:
 
     def replot(self):
         if self._gstGraphItem is not None:
-            self._assemble_data()
-            self._gstGraphItem.setData(self._x, self._y)
+            positions = self._assemble_data()
+            if positions is None:
+                self._gstGraphItem.setData(self._x, self._y)
+            elif positions:
+                self._gstGraphItem.setValues(positions, [self._y[p] for p in positions])
 
     def removePlots(self):
         if self._gstGraphItem:
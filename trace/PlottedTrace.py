@@ -20,7 +20,7 @@ from functools import partial
 from collections import deque
 
 from trace.ReducedTrace import ReducedTrace
-from trace.sortlists import sort_lists_by
+from trace.sortlists import sort_arrays_by
 from uiModules.MagnitudeParameter import MagnitudeParameter
 
 
@@ -398,10 +398,10 @@ class PlottedTrace(object):
                 if errorbars:
                     self.plotErrorBars(penindex)
                 if self.filt is None or all(self.filt):
-                    x, y = sort_lists_by((self.x, self.y), key_list=0) if len(self.x) > 0 else (self.x, self.y)
-                    self.curve = self._graphicsView.plot(numpy.array(x), numpy.array(y), pen=self.penList[penindex][0])
+                    x, y = sort_arrays_by((self.x, self.y))
+                    self.curve = self._graphicsView.plot(x, y, pen=self.penList[penindex][0])
                 else:
-                    x, y, filt = sort_lists_by((self.x, self.y, self.filt), key_list=0) if len(self.x) > 0 else (self.x, self.y, self.filt)
+                    x, y, filt = sort_arrays_by((self.x, self.y, self.filt))
                     self.curve = self._graphicsView.plot(numpy.array(x), numpy.array(y), pen=self.penList[penindex][0])
                     contiguousSlices = self.findContiguousArrays(numpy.array(filt)>0, extended=True)
                     for cslice in contiguousSlices:
@@ -434,7 +434,7 @@ class PlottedTrace(object):
                 if errorbars:
                     self.plotErrorBars(penindex)
                 if self.filt is None or all(self.filt):
-                    self.curve = self._graphicsView.plot((self.x), (self.y), pen=None, symbol=self.penList[penindex][1],
+                    self.curve = self._graphicsView.plot(numpy.asarray(self.x), numpy.asarray(self.y), pen=None, symbol=self.penList[penindex][1],
                                                         symbolPen=self.penList[penindex][2], symbolBrush=self.penList[penindex][3])
                 else:
                     self.curve = self._graphicsView.plot((numpy.array(self.x)[numpy.array(self.filt[:len(self.x)])>0]), (numpy.array(self.y)[numpy.array(self.filt[:len(self.y)])>0]), pen=None, symbol=self.penList[penindex][1],
@@ -468,11 +468,11 @@ class PlottedTrace(object):
                 if errorbars:
                     self.plotErrorBars(penindex)
                 if self.filt is None or all(self.filt):
-                    x, y = sort_lists_by( (self.x, self.y), key_list=0)
-                    self.curve = self._graphicsView.plot( numpy.array(x), numpy.array(y), pen=self.penList[penindex][0], symbol=self.penList[penindex][1],
+                    x, y = sort_arrays_by((self.x, self.y))
+                    self.curve = self._graphicsView.plot(x, y, pen=self.penList[penindex][0], symbol=self.penList[penindex][1],
                                                           symbolPen=self.penList[penindex][2], symbolBrush=self.penList[penindex][3])
                 else:
-                    x, y, filt = sort_lists_by((self.x, self.y, self.filt), key_list=0) if len(self.x) > 0 else (self.x, self.y, self.filt)
+                    x, y, filt = sort_arrays_by((self.x, self.y, self.filt))
                     self.curve = self._graphicsView.plot( numpy.array(x), numpy.array(y), pen=self.penList[penindex][0], symbol=self.penList[penindex][1],
                                                           symbolPen=self.penList[penindex][2], symbolBrush=self.penList[penindex][3])
                     contiguousSlices = self.findContiguousArrays(numpy.array(filt)>0)
@@ -501,7 +501,7 @@ class PlottedTrace(object):
         if self._graphicsView is not None:
             mycolor = list(self.penList[penindex][4])
             mycolor[3] = 80
-            self.curve = PlotCurveItem(self.x, self.y, stepMode=True, fillLevel=0 if self.fill else None, brush=mycolor if self.fill else None, pen=self.penList[penindex][0])
+            self.curve = PlotCurveItem(numpy.asarray(self.x), numpy.asarray(self.y), stepMode=True, fillLevel=0 if self.fill else None, brush=mycolor if self.fill else None, pen=self.penList[penindex][0])
             if self.xAxisLabel:
                 if self.xAxisUnit:
                     self._graphicsView.setLabel('bottom', text = "{0} ({1})".format(self.xAxisLabel, self.xAxisUnit))
@@ -566,9 +566,9 @@ class PlottedTrace(object):
         if hasattr(self, 'curve') and self.curve is not None:
             if self.type == self.Types.default:
                 x, y = self._reducedTrace.plotData
-                self.curve.setData(numpy.array(x), numpy.array(y))
+                self.curve.setData(x, y)
             else:
-                self.curve.setData(self.x, self.y)
+                self.curve.setData(numpy.asarray(self.x), numpy.asarray(self.y))
         if hasattr(self, 'errorBarItem') and self.errorBarItem is not None:
             if self.hasHeightColumn:
                 self.errorBarItem.setData(x=numpy.array(self.x), y=numpy.array(self.y), height=numpy.array(self.height))
@@ -1,10 +1,19 @@
 import numpy
-from collections import defaultdict
 
-from modules.RunningStat import RunningStat
+from trace.TraceColumn import TraceColumn
+from trace.sortlists import sort_arrays_by
 
 
 class ReducedTrace:
+    """Plot data of a trace with the points of the same x averaged (averageSameX) and/or
+    combinePoints consecutive points combined.
+
+    The reduction is updated incrementally: the averaged points are kept as sorted x values with
+    running sums and counts, and only the combined bins that contain changed points are recalculated.
+    A point with a new x is inserted by binary search; all following bins are recalculated then,
+    which for scans with ascending or repeating x is only the last one. Points changed in place
+    (TraceColumn.revision) or columns of other types are reduced from scratch.
+    """
     def __init__(self, traceCollection, averageSameX=False, combinePoints=0, averageType=None,
                  xColumn=None, yColumn=None, topColumn=None, bottomColumn=None, heightColumn=None):
         self.traceCollection = traceCollection
@@ -24,14 +33,23 @@ class ReducedTrace:
             self._averageSameX = averageSameX
             self._combinePoints = combinePoints
             self._averageType = averageType
+            self.clearCache()
             return True
         return False
 
     def clearCache(self):
         self._cachedLength = 0
+        self._cachedColumns = (None, None)
+        self._cachedRevisions = (None, None)
+        self.initCache()
 
     def initCache(self):
-        self._x_cache = defaultdict(RunningStat)
+        self._keys = TraceColumn(dtype=numpy.float64)     # sorted distinct x values
+        self._sums = TraceColumn(dtype=numpy.float64)
+        self._counts = TraceColumn(dtype=numpy.float64)
+        self._means = TraceColumn(dtype=numpy.float64)
+        self._binX = TraceColumn(dtype=numpy.float64)
+        self._binY = TraceColumn(dtype=numpy.float64)
 
     @property
     def x(self):
@@ -41,26 +59,88 @@ class ReducedTrace:
     def y(self):
         return self.traceCollection[self.yColumn]
 
+    def _newPoints(self):
+        """x, y and index of the points appended since the last call, the cache is cleared if the columns were
+        replaced or points were changed in place (TraceColumn.revision). All points are new for other columns."""
+        x, y = self.x, self.y
+        length = min(len(x), len(y))
+        revisions = (getattr(x, 'revision', None), getattr(y, 'revision', None))
+        if self._cachedColumns[0] is not x or self._cachedColumns[1] is not y or length < self._cachedLength or \
+                revisions != self._cachedRevisions or None in revisions:
+            self.clearCache()
+            self._cachedColumns = (x, y)
+            self._cachedRevisions = revisions
+        start, self._cachedLength = self._cachedLength, length
+        return (numpy.asarray(x)[start:length].astype(numpy.float64), numpy.asarray(y)[start:length].astype(numpy.float64),
+                start)
+
+    def _average(self, x, y):
+        """add points to the averages, returns the first index of the sorted averages with an inserted x
+        (or None) and the indices of averages that changed in place"""
+        keys, inverse = numpy.unique(x, return_inverse=True)
+        sums = numpy.bincount(inverse, weights=y, minlength=len(keys))
+        counts = numpy.bincount(inverse, minlength=len(keys)).astype(numpy.float64)
+        known = self._keys.array
+        positions = numpy.searchsorted(known, keys)
+        existing = positions < len(known)
+        existing[existing] = known[positions[existing]] == keys[existing]
+        updated = positions[existing]
+        self._sums.array[updated] += sums[existing]
+        self._counts.array[updated] += counts[existing]
+        self._means.array[updated] = self._sums.array[updated] / self._counts.array[updated]
+        new = ~existing
+        if not new.any():
+            return None, updated
+        insertAt = positions[new]
+        firstInserted = int(insertAt[0])
+        if firstInserted == len(known):     # all new x are larger than the known ones
+            self._keys.extend(keys[new])
+            self._sums.extend(sums[new])
+            self._counts.extend(counts[new])
+            self._means.extend(sums[new] / counts[new])
+        else:
+            self._keys = TraceColumn(numpy.insert(known, insertAt, keys[new]))
+            self._sums = TraceColumn(numpy.insert(self._sums.array, insertAt, sums[new]))
+            self._counts = TraceColumn(numpy.insert(self._counts.array, insertAt, counts[new]))
+            self._means = TraceColumn(numpy.insert(self._means.array, insertAt, sums[new] / counts[new]))
+        return firstInserted, updated[updated < firstInserted]
+
+    def _combine(self, x, y, firstChanged, changed):
+        """recalculate the bins of combinePoints points containing changed points"""
+        num_points = int(self._combinePoints)
+        start = firstChanged // num_points if firstChanged is not None else len(self._binX)
+        changedBins = numpy.unique(numpy.asarray(changed, dtype=numpy.intp) // num_points)
+        changedBins = changedBins[changedBins < start]
+        for index in changedBins.tolist():
+            self._binX.array[index] = numpy.nanmean(x[index * num_points:(index + 1) * num_points])
+            self._binY.array[index] = numpy.nanmean(y[index * num_points:(index + 1) * num_points])
+        if start * num_points < len(x):
+            tailX, tailY = x[start * num_points:], y[start * num_points:]
+            extra = len(tailX) % num_points
+            if extra > 0:
+                tailX = numpy.append(tailX, [float('NaN')] * (num_points - extra))
+                tailY = numpy.append(tailY, [float('NaN')] * (num_points - extra))
+            del self._binX[start:]
+            del self._binY[start:]
+            self._binX.extend(numpy.nanmean(tailX.reshape(-1, num_points), axis=1))
+            self._binY.extend(numpy.nanmean(tailY.reshape(-1, num_points), axis=1))
+
     @property
     def plotData(self):
         if self._averageSameX:
-            x, y = self.x, self.y
-            for thisx, thisy in zip(x[self._cachedLength:], y[self._cachedLength:]):
-                self._x_cache[thisx].add(thisy)
-            self._cachedLength = len(x)
-            pairs = [(myx, myy.mean) for myx, myy in sorted(self._x_cache.items())]
+            newX, newY, _ = self._newPoints()
+            firstChanged, changed = self._average(newX, newY) if len(newX) > 0 else (None, [])
+            x, y = self._keys.array, self._means.array
         else:
-            pairs = sorted(zip(self.x, self.y), key=lambda x: x[0]) if len(self.x) > 0 else list(zip(self.x, self.y))
+            x, y = self.x, self.y
+            firstChanged, changed = 0, []
+            if int(self._combinePoints):
+                if isinstance(x, TraceColumn) and x.isSorted:   # new points only extend the last bins
+                    _, _, firstChanged = self._newPoints()
+                else:
+                    self.clearCache()
+            x, y = sort_arrays_by((x, y))
         if int(self._combinePoints):
-            num_points = int(self._combinePoints)
-            extra = len(pairs) % num_points
-            if extra > 0:
-                pairs.extend([(float('NaN'), float('NaN'))] * (num_points - extra))
-            plotx, ploty = numpy.reshape(numpy.array(pairs).transpose(), (2, -1, num_points))
-            plotx = numpy.nanmean(plotx, axis=1)
-            ploty = numpy.nanmean(ploty, axis=1)
-            return plotx, ploty
-        else:
-            return numpy.array(pairs).transpose()
-
-
+            self._combine(x, y, firstChanged, changed)
+            return self._binX.array, self._binY.array
+        return x, y
@@ -32,6 +32,7 @@ from collections import OrderedDict
 from trace.PlottedStructure import PlottedStructure
 from trace.PlottedTrace import PlottedTrace, PlottedTraceProperties
 from trace.StructuredUnpickler import StructuredUnpickler
+from trace.TraceColumn import TraceColumn, Hdf5Column
 
 try:
     from fit import FitFunctions
@@ -162,8 +163,8 @@ class TraceCollection(keydefaultdict):
     It inherits from defaultdict and the dictionary holds the columns
 
     Attributes:
-        x (list[float]): array of x values
-        y (list[float]): array of y values for single trace
+        x (TraceColumn): array of x values
+        y (TraceColumn): array of y values for single trace
         name (str): name associated with trace collection
         description (dict): description data
         description["comment"] (str): comment to add to file
@@ -175,7 +176,15 @@ class TraceCollection(keydefaultdict):
         fileleaf (str): name only
         filepath (str): path only
         columnNames (list[str]): all column names in the saved file
+
+    In hdf5 files the columns are resizable, chunked and compressed datasets. While the trace is recorded
+    appendSave adds the new points every hdf5ChunkSize points or hdf5FlushInterval seconds, saving the
+    finished trace only appends the remaining points and writes the metadata.
     """
+    hdf5ChunkSize = 256
+    hdf5FlushInterval = 30   # seconds
+    hdf5Compression = dict(compression='gzip', compression_opts=4, shuffle=True)
+
     def __init__(self, record_timestamps=False):
         super(TraceCollection, self).__init__(self.defaultColumn)
         """Construct a trace object."""
@@ -196,6 +205,9 @@ class TraceCollection(keydefaultdict):
         self.record_timestamps = record_timestamps
         self.structuredData = keydefaultdict(self.get_structured_data)  #  Can contained structured data that can be json dumped
         self.structuredDataFormat = FormatDict()
+        self._hdf5File = None
+        self._hdf5Written = dict()   # column name: (column, revision, number of rows in the file)
+        self._hdf5FlushTime = time.time()
 
     @staticmethod
     def get_structured_data(d, key):
@@ -207,8 +219,8 @@ class TraceCollection(keydefaultdict):
     @staticmethod
     def defaultColumn(d, key):
         if key == 'indexColumn' and 'x' in d:
-            return list(range(len(d['x'])))
-        return list()
+            return TraceColumn(range(len(d['x'])))
+        return TraceColumn()
 
     def varFromXmlElement(self, element, description):
         name = element.attrib['name']
@@ -231,12 +243,11 @@ class TraceCollection(keydefaultdict):
         self['timeTickLast']
     
     def timeintervalAppend(self, timeinterval, maxPoints=0):
-        if 0 < maxPoints < len(self["timeTickFirst"]):
-            self['timeTickFirst'] = self['timeTickFirst'][-maxPoints+1:0].append(timeinterval[0])
-            self['timeTickLast'] = self['timeTickLast'][-maxPoints+1:0].append(timeinterval[1])
-        else:
-            self['timeTickFirst'].append(timeinterval[0])
-            self['timeTickLast'].append(timeinterval[1])
+        if 0 < maxPoints <= len(self["timeTickFirst"]):
+            self['timeTickFirst'] = self['timeTickFirst'][-maxPoints+1:]
+            self['timeTickLast'] = self['timeTickLast'][-maxPoints+1:]
+        self['timeTickFirst'].append(timeinterval[0])
+        self['timeTickLast'].append(timeinterval[1])
         self.description["lastDataAquired"] = datetime.now(pytz.utc)
     
     @property
@@ -326,6 +337,8 @@ class TraceCollection(keydefaultdict):
         elif fileType and fileType != self._fileType:
             self.filename = replaceExtension(self.filename, extensions[fileType])
             self._fileType = fileType
+        if self._fileType != 'hdf5':
+            self._hdf5File = None
         if self._fileType == "text":
             self.saveText(self.filename)
         elif self._fileType == 'hdf5':
@@ -382,7 +395,7 @@ class TraceCollection(keydefaultdict):
                     data.append(list(map(to_float, line.split())))
             columnspec = self.description["columnspec"]
             for colname, d in zip(columnspec, zip(*data)):
-                self[colname] = list(d)
+                self[colname] = TraceColumn(d)
             if 'fitfunction' in self.description and FitFunctionsAvailable:
                 self.fitfunction = FitFunctions.fitFunctionFactory(self.description["fitfunction"])
             if "tracePlottingList" not in self.description:
@@ -416,14 +429,48 @@ class TraceCollection(keydefaultdict):
         if hasattr(self,'fitfunction'):
             self.description["fitfunction"] = self.fitfunction
         if filename:
-            with h5py.File(filename) as of:
+            if filename != self._hdf5File:
+                self._hdf5Written = dict()
+            with h5py.File(filename, 'a') as of:
                 self.saveMetadata(of)
-                colgroup = of.require_group('columns')
-                for name, data in self.items():
-                    colgroup.pop(name, None)
-                    colgroup.create_dataset(name, data=data)
+                self.saveHdf5Columns(of)
+            self._hdf5File = filename
         self.saved = True
 
+    def saveHdf5Columns(self, f):
+        """append the rows added since the last save, columns that were replaced, modified or changed type are rewritten"""
+        colgroup = f.require_group('columns')
+        for name, column in self.items():
+            written, revision, length = self._hdf5Written.get(name, (None, None, 0))
+            dataset = colgroup.get(name)
+            appendable = written is column and revision is not None and revision == getattr(column, 'revision', None) and \
+                dataset is not None and dataset.maxshape == (None,) and length <= len(column)
+            if appendable and length == len(column):
+                continue
+            data = numpy.asarray(column)
+            if appendable and dataset.dtype == data.dtype:
+                dataset.resize((len(data),))
+                dataset[length:] = data[length:]
+            else:
+                colgroup.pop(name, None)
+                colgroup.create_dataset(name, data=data, maxshape=(None,), chunks=(self.hdf5ChunkSize,), **self.hdf5Compression)
+            self._hdf5Written[name] = (column, getattr(column, 'revision', None), len(data))
+        f.flush()
+        self._hdf5FlushTime = time.time()
+
+    def appendSave(self, force=False):
+        """append the new points to the hdf5 file of a saved trace, done every hdf5ChunkSize points or
+        after hdf5FlushInterval seconds, so a crash loses at most the last chunk"""
+        if self._hdf5File is None:
+            return
+        newRows = max((len(column) - self._hdf5Written.get(name, (None, None, 0))[2] for name, column in self.items()), default=0)
+        if force or newRows >= self.hdf5ChunkSize or (newRows > 0 and time.time() - self._hdf5FlushTime > self.hdf5FlushInterval):
+            try:
+                with h5py.File(self._hdf5File, 'a') as of:
+                    self.saveHdf5Columns(of)
+            except Exception as e:
+                logging.getLogger(__name__).warning("Failed to append to hdf5 file '{}' error '{}'".format(self._hdf5File, e))
+
     def plot(self,penindex):
         """ plot the data, penindex >= 0 gives requests the style with this number,
         penindex = -1 uses the first available style, penindex = -2 uses the previous style
@@ -513,9 +560,11 @@ class TraceCollection(keydefaultdict):
 
     def loadTraceHdf5(self, filename):
         self.filename = filename
-        with h5py.File(self.filename) as f:
+        with h5py.File(self.filename, 'r') as f:
             for colname, dataset in f['columns'].items():
-                self[colname] = list(dataset)
+                self[colname] = Hdf5Column(filename, dataset.name, len(dataset))
+                self._hdf5Written[colname] = (self[colname], 0, len(dataset))
+            self._hdf5File = filename
             tpelement = f.get("/variables/TracePlottingList")
             self.description["tracePlottingList"] = PlottingList.fromHdf5(tpelement) if tpelement is not None else None
             # for element in root.findall("/variables/Element"):
@@ -545,9 +594,9 @@ class TraceCollection(keydefaultdict):
         columnspec = ColumnSpec.fromXmlElement(root.find("./Variables/ColumnSpec"))
         for colname, d in zip(columnspec, zip(*data)):
             if math.isnan(d[-1]):
-                a = list(d[0:-1])
+                a = TraceColumn(d[0:-1])
             else:
-                a = list(d)
+                a = TraceColumn(d)
             self[colname] = a
         tpelement = root.find("./Variables/TracePlottingList")
         self.description["tracePlottingList"] = PlottingList.fromXmlElement(tpelement, self) if tpelement is not None else None
@@ -573,7 +622,7 @@ class TraceCollection(keydefaultdict):
                 data.append(list(map(to_float, line.split())))
         columnspec =  self.description["columnspec"].split(',')
         for colname, d in zip( columnspec, zip(*data) ):
-            self[colname] = list(d)
+            self[colname] = TraceColumn(d)
         if 'fitfunction' in self.description and FitFunctionsAvailable:
             self.fitfunction = FitFunctions.fitFunctionFactory(self.description["fitfunction"])
         self.description["tracePlottingList"] = PlottingList(
@@ -0,0 +1,230 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Growable column of a TraceCollection.
+
+The values are kept in a numpy buffer that doubles its capacity when full, appending is amortized O(1)
+and the valid part is available as a numpy view without copying. Whether the values were appended in
+ascending order is checked incrementally (isSorted), a sorted column never builds a permutation. Otherwise
+the column keeps the permutation that sorts it; the points appended since it was last requested are
+merged in when it is requested, which copies the permutation and the sorted values, O(n) per request.
+The list operations used by the fit, analysis and editing code (append, extend, len, indexing, slicing,
+del, iteration) behave as for a list.
+"""
+from numbers import Number
+
+import h5py
+import numpy
+
+InitialCapacity = 64
+
+
+def _isNumeric(value):
+    return value is None or isinstance(value, (Number, numpy.number, numpy.bool_))
+
+
+class TraceColumn(object):
+    __slots__ = ('_buffer', '_length', '_order', '_sortedValues', '_sortedLength', '_monotonic', '_checkedLength',
+                 'revision')
+
+    def __init__(self, values=None, dtype=numpy.float64):
+        self._buffer = numpy.empty(InitialCapacity, dtype=dtype)
+        self._length = 0
+        self.revision = 0   # incremented when existing values are changed or removed
+        self.invalidateOrder()
+        if values is not None:
+            self.extend(values)
+
+    def invalidateOrder(self):
+        self._order = numpy.empty(0, dtype=numpy.intp)
+        self._sortedValues = numpy.empty(0, dtype=self._buffer.dtype)
+        self._sortedLength = 0     # values covered by _order and _sortedValues, 0 while they are not built
+        self._monotonic = True
+        self._checkedLength = 0    # values covered by _monotonic
+
+    @property
+    def array(self):
+        """numpy view of the values, it is only valid until the column grows"""
+        return self._buffer[:self._length]
+
+    @property
+    def dtype(self):
+        return self._buffer.dtype
+
+    def __array__(self, dtype=None, copy=None):
+        view = self._buffer[:self._length]
+        if dtype is not None and dtype != view.dtype:
+            return view.astype(dtype)
+        return view.copy() if copy else view
+
+    def _promote(self, dtype):
+        if dtype != self._buffer.dtype:
+            buffer = numpy.empty(len(self._buffer), dtype=dtype)
+            buffer[:self._length] = self._buffer[:self._length]
+            self._buffer = buffer
+            self.invalidateOrder()
+
+    def _dtypeFor(self, value):
+        if not _isNumeric(value):
+            return numpy.dtype(object)
+        if value is None:
+            value = numpy.nan
+        dtype = numpy.asarray(value).dtype
+        if self._length == 0 and self._buffer.dtype.kind != 'O':
+            return numpy.result_type(dtype, numpy.int64)
+        return numpy.result_type(self._buffer.dtype, dtype)
+
+    def _reserve(self, length):
+        if length > len(self._buffer):
+            capacity = max(length, 2 * len(self._buffer))
+            buffer = numpy.empty(capacity, dtype=self._buffer.dtype)
+            buffer[:self._length] = self._buffer[:self._length]
+            self._buffer = buffer
+
+    def append(self, value):
+        self._promote(self._dtypeFor(value))
+        self._reserve(self._length + 1)
+        self._buffer[self._length] = numpy.nan if value is None else value
+        self._length += 1
+
+    def extend(self, values):
+        if isinstance(values, TraceColumn):
+            values = values.array
+        elif not isinstance(values, numpy.ndarray):
+            values = [numpy.nan if v is None else v for v in values]
+            if all(_isNumeric(v) for v in values):
+                values = numpy.asarray(values)
+            else:
+                objects = numpy.empty(len(values), dtype=object)
+                for index, value in enumerate(values):
+                    objects[index] = value
+                values = objects
+        if len(values) == 0:
+            return
+        dtype = values.dtype if values.dtype.kind in 'biuf' else numpy.dtype(object)
+        if self._length == 0 and self._buffer.dtype.kind != 'O':
+            self._promote(numpy.result_type(dtype, numpy.int64))
+        else:
+            self._promote(numpy.result_type(self._buffer.dtype, dtype))
+        self._reserve(self._length + len(values))
+        self._buffer[self._length:self._length + len(values)] = values
+        self._length += len(values)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TraceColumn(self.array[index], dtype=self._buffer.dtype)
+        value = self.array[index]
+        return value.item() if isinstance(value, numpy.generic) else value
+
+    def __setitem__(self, index, value):
+        values = numpy.asarray(value)
+        self._promote(numpy.result_type(self._buffer.dtype, values.dtype if values.dtype.kind in 'biuf' else object))
+        self.array[index] = value
+        self.invalidateOrder()
+        self.revision += 1
+
+    def __delitem__(self, index):
+        start, stop, step = index.indices(self._length) if isinstance(index, slice) else (None, None, None)
+        if step == 1 and stop == self._length:     # truncation keeps the buffer
+            self._length = min(start, self._length)
+            if self._sortedLength > self._length or self._checkedLength > self._length:
+                self.invalidateOrder()
+        else:
+            values = numpy.delete(self.array, index)
+            self._length = 0
+            self.invalidateOrder()
+            self.extend(values)
+        self.revision += 1
+
+    def __iter__(self):
+        return iter(self.array.tolist())
+
+    def tolist(self):
+        return self.array.tolist()
+
+    def copy(self):
+        return TraceColumn(self.array, dtype=self._buffer.dtype)
+
+    def __reduce__(self):
+        return TraceColumn, (self.array.copy(), self._buffer.dtype)
+
+    def __repr__(self):
+        return "TraceColumn({0})".format(self.tolist())
+
+    def sortOrder(self):
+        """permutation that sorts the column (stable). It is the identity while the column is sorted, otherwise
+        it is built on the first request and the points appended since the last request are merged in, which
+        copies the permutation and the sorted values once per request rather than once per point"""
+        if self.isSorted:
+            if len(self._order) < self._length:
+                self._order = numpy.arange(max(self._length, 2 * len(self._order)))
+            return self._order[:self._length]
+        if self._sortedLength == 0:
+            self._order = numpy.argsort(self.array, kind='stable')
+            self._sortedValues = self.array[self._order]
+        elif self._sortedLength < self._length:
+            new = numpy.arange(self._sortedLength, self._length)
+            newValues = self._buffer[self._sortedLength:self._length]
+            newOrder = numpy.argsort(newValues, kind='stable')
+            newOrder, newValues = new[newOrder], newValues[newOrder]
+            positions = numpy.searchsorted(self._sortedValues, newValues, side='right')
+            self._order = numpy.insert(self._order, positions, newOrder)
+            self._sortedValues = numpy.insert(self._sortedValues, positions, newValues)
+        self._sortedLength = self._length
+        return self._order
+
+    @property
+    def isSorted(self):
+        """True if the values were appended in ascending order, only the points appended since the last call are checked"""
+        if self._monotonic and self._checkedLength < self._length:
+            values = self._buffer[max(self._checkedLength - 1, 0):self._length]
+            self._monotonic = bool(numpy.all(values[1:] >= values[:-1]))
+        self._checkedLength = self._length
+        return self._monotonic
+
+
+class Hdf5Column(TraceColumn):
+    """TraceColumn of a dataset in an hdf5 file. The values are read when they are first used as a whole,
+    len, indexing and slicing read only the requested part from the file."""
+    __slots__ = ('filename', 'path')
+
+    def __init__(self, filename, path, length):
+        self.filename = filename
+        self.path = path
+        self._length = length
+        self.revision = 0
+
+    @property
+    def loaded(self):
+        try:
+            object.__getattribute__(self, '_buffer')
+            return True
+        except AttributeError:
+            return False
+
+    def _read(self, index=()):
+        with h5py.File(self.filename, 'r') as f:
+            return f[self.path][index]
+
+    def __getattr__(self, name):
+        if name in TraceColumn.__slots__:    # first use of the values
+            self._buffer = self._read()
+            self.invalidateOrder()
+            return object.__getattribute__(self, name)
+        raise AttributeError(name)
+
+    def __getitem__(self, index):
+        if self.loaded or not isinstance(index, (Number, slice)):
+            return super(Hdf5Column, self).__getitem__(index)
+        if isinstance(index, slice):
+            return TraceColumn(self._read(slice(*index.indices(self._length))))
+        if not -self._length <= index < self._length:
+            raise IndexError("column index out of range")
+        value = self._read(index % self._length)
+        return value.item() if isinstance(value, numpy.generic) else value
@@ -1,3 +1,25 @@
+import numpy
+
+from trace.TraceColumn import TraceColumn
+
+
 def sort_lists_by(lists, key_list=0, desc=False):
     return list(zip(*sorted(zip(*lists), reverse=desc,
                  key=lambda x: x[key_list])))
+
+
+def sort_arrays_by(columns, key_column=0):
+    """numpy arrays of the columns sorted by one of them, a TraceColumn key provides its
+    incrementally maintained sort order and the arrays are not copied if it is already sorted"""
+    key = columns[key_column]
+    length = min(len(column) for column in columns)
+    arrays = [numpy.asarray(column)[:length] for column in columns]
+    if isinstance(key, TraceColumn):
+        if key.isSorted:
+            return arrays
+        order = key.sortOrder()
+        if length < len(key):
+            order = order[order < length]
+    else:
+        order = numpy.argsort(arrays[key_column], kind='stable')
+    return [array[order] for array in arrays]
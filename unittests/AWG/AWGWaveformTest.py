@@ -0,0 +1,106 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+from collections import OrderedDict
+
+import numpy
+import pytest
+import sympy
+from sympy.parsing.sympy_parser import parse_expr
+
+from AWG.AWGDevices import DummyAWG
+from AWG.AWGSegmentModel import AWGSegment, AWGSegmentSet, nodeTypes
+from AWG.AWGWaveform import AWGWaveform
+from modules.MagnitudeParser import isIdentifier
+from modules.quantity import Q
+
+
+class Settings(object):
+    def __init__(self, cacheDepth=-1, maxSamples=None):
+        self.deviceProperties = dict(DummyAWG.deviceProperties, sampleRate=Q(1, 'GHz'))
+        if maxSamples is not None:
+            self.deviceProperties['maxSamples'] = maxSamples
+        self.deviceSettings = {}
+        self.root = AWGSegmentSet(None)
+        self.channelSettingsList = [{'segmentDataRoot': self.root}]
+        self.cacheDepth = cacheDepth
+        self.varDict = {'a': {'value': Q(1, 'MHz'), 'text': None},
+                        'n': {'value': Q(7), 'text': None},
+                        'T': {'value': Q(300, 'ns'), 'text': None}}
+
+
+def segments(settings, repetitions='n'):
+    """a waveform with nested repetitions, constant, clipped and nan samples and disabled or empty segments"""
+    root = settings.root
+    root.children.append(AWGSegment(root, equation='2047+2000*sin(a*t)', duration='1 us'))
+    outer = AWGSegmentSet(root, repetitions=repetitions)
+    root.children.append(outer)
+    outer.children.append(AWGSegment(outer, equation='5000*cos(3*a*t)', duration='T'))
+    outer.children.append(AWGSegment(outer, equation='3', duration='17 ns'))
+    inner = AWGSegmentSet(outer, repetitions='3')
+    outer.children.append(inner)
+    inner.children.append(AWGSegment(inner, equation='80*sqrt(1000*a*t-1400)', duration='50 ns'))
+    inner.children.append(AWGSegment(inner, equation='a', duration='5 ns'))
+    inner.children.append(AWGSegment(inner, equation='t', duration='0 ns'))
+    outer.children.append(AWGSegment(outer, equation='100', duration='20 ns', enabled=False))
+    root.children.append(AWGSegment(root, equation='1000', duration='1 us'))
+    return settings
+
+
+def referenceSegments(waveform, nodeList, startStep=0):
+    """the samples as computed sample by sample before the waveform engine was vectorized"""
+    settings = waveform.settings
+    sampleList = numpy.array([])
+    for node in nodeList:
+        if not node.enabled:
+            continue
+        if node.nodeType == nodeTypes.segment:
+            duration = settings.varDict[node.duration]['value'] if isIdentifier(node.duration) else waveform.expression.evaluateAsMagnitude(node.duration)
+            numSamples = int(round((duration*waveform.sampleRate).to_base_units())) if duration else 0
+            numSamples = max(0, min(numSamples, waveform.maxSamples-startStep))
+            if waveform.parseEquation(node) is None:
+                continue
+            varValueDict = {name: value['value'].to_base_units().magnitude for name, value in settings.varDict.items()}
+            varValueDict['t'] = sympy.Symbol('t')
+            func = sympy.lambdify(varValueDict['t'], parse_expr(node.equation, varValueDict), "numpy")
+            clippedFunc = lambda t: max(waveform.minAmplitude, min(waveform.maxAmplitude, func(t)))
+            if numSamples > 0:
+                newSamples = numpy.vectorize(clippedFunc, otypes=[numpy.float64])((numpy.arange(numSamples)+startStep)*waveform.stepsize.m_as('s'))
+                sampleList = numpy.append(sampleList, newSamples)
+            startStep += numSamples
+        else:
+            repMag = settings.varDict[node.repetitions]['value'] if isIdentifier(node.repetitions) else waveform.expression.evaluateAsMagnitude(node.repetitions)
+            for _ in range(int(repMag.to_base_units().magnitude)):
+                startStep, newSamples = referenceSegments(waveform, node.children, startStep)
+                sampleList = numpy.append(sampleList, newSamples)
+    return startStep, sampleList
+
+
+@pytest.mark.parametrize("cacheDepth", [0, -1, 2])
+@pytest.mark.parametrize("maxSamples", [None, 3000, 1234])
+def test_evaluate(cacheDepth, maxSamples):
+    waveform = AWGWaveform(0, segments(Settings(cacheDepth, maxSamples)), OrderedDict())
+    _, reference = referenceSegments(waveform, waveform.segmentDataRoot.children)
+    reference = waveform.compliantSampleList(reference)
+    assert not numpy.isnan(reference).any()
+    assert maxSamples is not None or (reference == waveform.maxAmplitude).any()
+    for _ in range(2):  # the second evaluation uses the cached samples and functions
+        samples = waveform.evaluate()
+        assert samples.tobytes() == reference.tobytes()
+
+
+def test_repetitions():
+    waveform = AWGWaveform(0, segments(Settings(), repetitions='0'), OrderedDict())
+    samples = waveform.evaluate()
+    assert len(samples) == 2000
+    numpy.testing.assert_array_equal(samples[1000:], 1000)
+    assert waveform.evaluateSegments([])[1].shape == (0,)
+
+
+def test_compiledFunction():
+    t = sympy.Symbol('t')
+    first = AWGWaveform.compiledFunction(parse_expr('3*t', {'t': t}), t)
+    assert AWGWaveform.compiledFunction(parse_expr('t*3', {'t': t}), t) is first
+    assert AWGWaveform.compiledFunction(parse_expr('4*t', {'t': t}), t) is not first
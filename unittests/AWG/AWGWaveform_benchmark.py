@@ -0,0 +1,61 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Benchmark of the AWG waveform evaluation.
+
+Usage:
+    python -m unittests.AWG.AWGWaveform_benchmark [--repetitions N] [--segments N] [--reference]
+
+Long waveforms for the DummyAWG with a repeated set of segments are evaluated, with and without the waveform cache.
+The first evaluation includes compiling the equations, the second uses the compiled functions and cached samples.
+With --reference the sample by sample evaluation used before the engine was vectorized is timed as well.
+"""
+import argparse
+from collections import OrderedDict
+from timeit import default_timer
+
+from AWG.AWGSegmentModel import AWGSegment, AWGSegmentSet
+from AWG.AWGWaveform import AWGWaveform
+from modules.quantity import Q
+from unittests.AWG.AWGWaveformTest import Settings, referenceSegments
+
+
+def waveform(cacheDepth, repetitions, segments):
+    settings = Settings(cacheDepth)
+    settings.varDict['n']['value'] = Q(repetitions)
+    root = settings.root
+    root.children.append(AWGSegment(root, equation='2047+2000*sin(a*t)', duration='10 us'))
+    repeated = AWGSegmentSet(root, repetitions='n')
+    root.children.append(repeated)
+    for index in range(segments):
+        repeated.children.append(AWGSegment(repeated, equation='2047+{0}*cos({1}*a*t)'.format(100*(index+1), index+1), duration='T'))
+    return AWGWaveform(0, settings, OrderedDict())
+
+
+def run(name, cacheDepth, repetitions, segments, reference):
+    AWGWaveform.compiledFunctions.clear()
+    wave = waveform(cacheDepth, repetitions, segments)
+    times = list()
+    for _ in range(2):
+        start = default_timer()
+        samples = wave.evaluate()
+        times.append(default_timer() - start)
+    line = "{0:30s} {1:9d} samples  first {2:9.2f} ms  second {3:9.2f} ms".format(name, len(samples), 1e3*times[0], 1e3*times[1])
+    if reference:
+        start = default_timer()
+        wave.compliantSampleList(referenceSegments(wave, wave.segmentDataRoot.children)[1])
+        line += "  reference {0:9.2f} ms".format(1e3*(default_timer() - start))
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the AWG waveform evaluation")
+    parser.add_argument('--repetitions', type=int, default=1000, help="repetitions of the segment set")
+    parser.add_argument('--segments', type=int, default=10, help="segments in the repeated set")
+    parser.add_argument('--reference', action='store_true', help="also time the sample by sample evaluation")
+    args = parser.parse_args()
+    for cacheDepth in (0, -1):
+        run("cache depth {0}".format(cacheDepth), cacheDepth, args.repetitions, args.segments, args.reference)
@@ -0,0 +1,67 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Benchmark of the scalar and the vectorized digital lock stream and scope decoders.
+
+Usage:
+    python -m unittests.digitalLock.LockDataDecoder_benchmark [recorded.bin ...]
+
+Recorded streams are raw dumps of the stream pipe (64 byte records). Without arguments synthetic record streams,
+with and without misaligned records, and synthetic scope traces are used. The controller time includes pickling the
+decoded data for the data queue, the client time is the time to unpickle it.
+"""
+import pickle
+import sys
+from timeit import default_timer
+
+from unittests.digitalLock.LockDataDecoder_test import Decoder, syntheticRecords, scopeWords
+
+StreamBufferSize = 2 * 0x0ffe   # the stream pipe delivers at most 0x0ffe*2 bytes per read
+ScopeBufferSize = 2 * 0x4000    # whole scope words
+
+
+def run(buffer, vectorized, scope=False):
+    decoder = Decoder()
+    if scope:
+        decode = decoder.decodeScopeData if vectorized else decoder.decodeScopeDataScalar
+        bufferSize = ScopeBufferSize
+    else:
+        decode = decoder.decodeStreamData if vectorized else decoder.decodeStreamDataScalar
+        bufferSize = StreamBufferSize
+    start = default_timer()
+    pickled = list()
+    for position in range(0, len(buffer), bufferSize):
+        decode(buffer[position:position + bufferSize])
+        pickled.extend(pickle.dumps(data, pickle.HIGHEST_PROTOCOL) for data in decoder.dataQueue)
+        del decoder.dataQueue[:]
+    controller = default_timer() - start
+    start = default_timer()
+    for data in pickled:
+        pickle.loads(data)
+    return controller, default_timer() - start
+
+
+def benchmark(name, buffer, repeat=3, scope=False):
+    size = len(buffer) / 1e6
+    scalar = min(run(buffer, False, scope) for _ in range(repeat))
+    vectorized = min(run(buffer, True, scope) for _ in range(repeat))
+    print("{0:36s} {1:6.2f} MB  controller scalar {2:7.1f} ms vectorized {3:7.1f} ms ({4:7.2f} MB/s) speedup {5:5.1f}"
+          "  client scalar {6:7.1f} ms vectorized {7:7.1f} ms".format(
+              name, size, scalar[0] * 1e3, vectorized[0] * 1e3, size / vectorized[0], scalar[0] / vectorized[0],
+              scalar[1] * 1e3, vectorized[1] * 1e3))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for filename in sys.argv[1:]:
+            with open(filename, 'rb') as f:
+                benchmark(filename, bytearray(f.read()))
+    else:
+        for records, misaligned in [(1000, 0), (100000, 0), (100000, 20)]:
+            benchmark("stream {0} records {1} misaligned".format(records, misaligned),
+                      syntheticRecords(records, misaligned=misaligned))
+        for traces, samples in [(10, 1000), (2, 100000)]:
+            benchmark("scope {0} traces {1} samples".format(traces, samples), scopeWords(traces, samples), scope=True)
@@ -0,0 +1,134 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import pickle
+import random
+import struct
+import unittest
+
+from digitalLock.controller.LockDataDecoder import LockDataDecoder, ScopeData, StreamData
+
+
+class ListQueue(list):
+    def put(self, item):
+        self.append(item)
+
+
+class Decoder(LockDataDecoder):
+    """decoder without the hardware, data is pushed into a list"""
+    def __init__(self):
+        self.scopeData = ScopeData()
+        self.scopeEnabled = True
+        self.streamData = StreamData()
+        self.streamBuffer = bytearray()
+        self.dataQueue = ListQueue()
+
+
+def syntheticRecords(records=1000, seed=0, misaligned=0):
+    """Generate stream records with signed sums, records without samples and 2 or 4 spurious bytes"""
+    rand = random.Random(seed)
+    spurious = set(random.Random(-seed).sample(range(records), misaligned))
+    buffer = bytearray()
+    for record in range(records):
+        samples = rand.choice((0, rand.randint(1, 100000)))
+        freqSum = rand.randint(-(1 << 71), (1 << 71) - 1) if rand.random() < 0.05 else rand.randint(-(1 << 50), 1 << 50)
+        freqSum &= (1 << 72) - 1
+        buffer.extend(struct.pack('QhhIQQQQHHIQ',
+                                  0xfefe000000000000 | rand.getrandbits(48), rand.randint(-32768, 32767),
+                                  rand.randint(-32768, 32767), samples, freqSum >> 8,
+                                  (freqSum & 0xff) << 56 | rand.getrandbits(48), 0xefef000000000000 | rand.getrandbits(48),
+                                  rand.getrandbits(64), rand.getrandbits(16), rand.getrandbits(16), rand.getrandbits(32),
+                                  rand.getrandbits(48)))
+        if record in spurious:
+            buffer.extend(b'\x00\x01' if record % 2 else b'\xfe\xfe\xef\xef')
+    return buffer
+
+
+def scopeWords(traces=2, samples=1000, seed=0):
+    """Generate scope words with end of trace markers"""
+    rand = random.Random(seed)
+    words = list()
+    for trace in range(traces):
+        words.extend(rand.getrandbits(16) << 48 | rand.getrandbits(47) for _ in range(samples))
+        words.append(0xffffffffffffffff)
+    words.extend(rand.getrandbits(64) & 0xfffeffffffffffff for _ in range(samples // 10))
+    return bytearray(struct.pack('{0}Q'.format(len(words)), *words))
+
+
+def decode(buffer, chunks, vectorized, scope=False):
+    decoder = Decoder()
+    if scope:
+        decode = decoder.decodeScopeData if vectorized else decoder.decodeScopeDataScalar
+    else:
+        decode = decoder.decodeStreamData if vectorized else decoder.decodeStreamDataScalar
+    for start, end in zip(chunks[:-1], chunks[1:]):
+        decode(buffer[start:end])
+    return decoder
+
+
+def content(decoder):
+    """the decoded data as received by the client process"""
+    received = [pickle.loads(pickle.dumps(data)) for data in decoder.dataQueue + [decoder.streamData]]
+    queue = [[vars(item) for item in data] if isinstance(data, StreamData) else vars(data) for data in received]
+    return queue[:-1], queue[-1], vars(decoder.scopeData), bytes(decoder.streamBuffer)
+
+
+class LockDataDecoderTest(unittest.TestCase):
+    def compare(self, buffer, chunks, scope=False):
+        scalar = content(decode(buffer, chunks, False, scope))
+        vectorized = content(decode(buffer, chunks, True, scope))
+        self.assertEqual(scalar, vectorized)
+        return scalar
+
+    def test_stream(self):
+        buffer = syntheticRecords()
+        queue, _, _, remainder = self.compare(buffer, [0, len(buffer)])
+        self.assertEqual(len(queue), 1)
+        self.assertTrue(500 < len(queue[0]) < 1000)
+        self.assertTrue(any(item['freqSum'] >= 1 << 63 for item in queue[0]))
+        self.assertEqual(remainder, b'')
+
+    def test_streamSplitBuffers(self):
+        buffer = syntheticRecords(seed=1)
+        rand = random.Random(2)
+        chunks = sorted({0, len(buffer)} | {2 * rand.randint(1, len(buffer) // 2 - 1) for _ in range(40)})
+        queue, _, _, _ = self.compare(buffer, chunks)
+        single = content(decode(buffer, [0, len(buffer)], True))[0]
+        self.assertEqual([item for data in queue for item in data], single[0])
+
+    def test_streamMisaligned(self):
+        buffer = syntheticRecords(seed=3, misaligned=5)
+        rand = random.Random(4)
+        chunks = sorted({0, len(buffer)} | {2 * rand.randint(1, len(buffer) // 2 - 1) for _ in range(10)})
+        queue, _, _, _ = self.compare(buffer, chunks)
+        aligned = syntheticRecords(seed=3)
+        single = content(decode(aligned, [0, len(aligned)], True))[0]
+        self.assertEqual([item for data in queue for item in data], single[0])   # decoding resumes after the spurious bytes
+
+    def test_recordsPickled(self):
+        buffer = syntheticRecords(100)
+        streamData = decode(buffer, [0, len(buffer)], True).dataQueue[0]
+        self.assertEqual(len(streamData), 0)
+        self.assertLess(len(pickle.dumps(streamData)), len(buffer) + 1000)
+        received = pickle.loads(pickle.dumps(streamData))
+        self.assertIsNone(received.records)
+        self.assertEqual(len(received), len(streamData.records))
+
+    def test_scope(self):
+        buffer = scopeWords()
+        queue, _, scopeData, _ = self.compare(buffer, [0, len(buffer)], scope=True)
+        self.assertEqual([len(trace['errorSig']) for trace in queue], [1000, 1000])
+        self.assertEqual(len(scopeData['frequency']), 100)
+        self.assertTrue(min(queue[0]['errorSig']) < 0 < max(queue[0]['errorSig']))
+
+    def test_scopeSplitBuffers(self):
+        buffer = scopeWords(traces=3, seed=1)
+        rand = random.Random(5)
+        chunks = sorted({0, len(buffer)} | {4 * rand.randint(1, len(buffer) // 4 - 1) for _ in range(20)})
+        self.compare(buffer, chunks, scope=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,49 @@
+import os
+import random
 import unittest
+from itertools import zip_longest
+
+from gateSequence.GateDefinition import GateDefinition
 from gateSequence.GateSequenceCompiler import GateSequenceCompiler
+from pulseProgram.PulseProgram import PulseProgram
+
+
+def referencePack(data, width):
+    """packing one value after the other as done before the compiler was vectorized"""
+    if width == 0 or width == 64:
+        return data
+    packed_data = list()
+    for chunk in zip_longest(*[iter(data)] * (64 // width), fillvalue=0):
+        p = 0
+        for i, value in enumerate(chunk):
+            p |= value << (i * width)
+        packed_data.append(p)
+    return packed_data
+
+
+def referenceCompile(compiledGates, pulseListLength, sequenceList, width):
+    addresses, data = list(), list()
+    for sequence in sequenceList:
+        sequenceData = [value for gate in sequence for value in compiledGates[gate]]
+        addresses.append(8 * len(data))
+        data.extend([len(sequenceData) // pulseListLength] + referencePack(sequenceData, width))
+    return addresses, data
+
+
+class GateSequences(object):
+    def __init__(self, gateDefinition, sequenceList):
+        self.gateDefinition = gateDefinition
+        self.sequenceList = sequenceList
+
 
 class GateSequenceCompilerTest(unittest.TestCase):
+    def setUp(self):
+        self.gateDefinition = GateDefinition.from_file(os.path.join(os.path.dirname(__file__), 'GateDefinitionIndex.xml'))
+        self.compiler = GateSequenceCompiler(PulseProgram())
+        rng = random.Random(17)
+        self.sequences = GateSequences(self.gateDefinition, [tuple(rng.choice(['Gi', 'Gx', 'Gy', 'Gw']) for _ in range(rng.randint(0, 40)))
+                                                             for _ in range(500)])
+
     def test_pack(self):
         data = list(range(12))
         packed = GateSequenceCompiler.packData(data, 4)
@@ -9,6 +51,28 @@ class GateSequenceCompilerTest(unittest.TestCase):
         data = list(range(16))*2 + [4, 2]
         packed = GateSequenceCompiler.packData(data, 4)
         self.assertEqual(packed, [0xfedcba9876543210, 0xfedcba9876543210, 0x24])
+        data = [(1 << 32) - 1, 5, 7]
+        self.assertEqual(GateSequenceCompiler.packData(data, 32), referencePack(data, 32))
+        self.assertEqual(GateSequenceCompiler.packData([], 8), [])
+
+    def test_compile(self):
+        for width in [0, 4, 8, 16, 32, 64]:
+            addresses, data = self.compiler.gateSequencesCompile(self.sequences, width)
+            self.assertEqual((addresses, data), referenceCompile(self.compiler.compiledGates, 1, self.sequences.sequenceList, width))
+            self.assertEqual(self.compiler.gateSequenceCompile(self.sequences.sequenceList[3], width),
+                             referenceCompile(self.compiler.compiledGates, 1, self.sequences.sequenceList[3:4], width)[1])
+
+    def test_memo(self):
+        first = self.compiler.gateSequencesCompile(self.sequences, 8)
+        memo = self.compiler._memo
+        self.assertEqual(self.compiler.gateSequencesCompile(self.sequences, 8), first)
+        self.assertIs(self.compiler._memo, memo)
+        self.gateDefinition.Gates['Gw'].pulsedict = [('index', '6')]     # changed gate definition
+        addresses, data = self.compiler.gateSequencesCompile(self.sequences, 8)
+        self.assertIsNot(self.compiler._memo, memo)
+        self.assertEqual(addresses, first[0])
+        self.assertEqual((addresses, data), referenceCompile(self.compiler.compiledGates, 1, self.sequences.sequenceList, 8))
+
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,102 @@
+import time
+import unittest
+from types import SimpleNamespace
+
+from PyQt5.QtCore import QCoreApplication
+
+from gui.ScanExperiment import ScanExperiment, ScanExperimentContext, PointEvaluation
+from gui.ScanMethods import InternalScanMethod
+from scan.EvaluationWorker import EvaluationWorker
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+class Generator(object):
+    def xValue(self, index, data):
+        return 10 * index
+
+    def xKey(self, index):
+        return ('Gx',) * index
+
+    def dataNextCode(self, scanMethod):
+        return None
+
+
+class Recorder(object):
+    """records the calls of all methods"""
+    def __init__(self):
+        self.calls = list()
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name,) + args)
+
+
+class PulserHardware(object):
+    def __init__(self):
+        self.holds = dict()
+
+    def retainData(self, data):
+        self.holds[data.value] = self.holds.get(data.value, 0) + 1
+
+    def releaseData(self, data):
+        self.holds[data.value] -= 1
+
+
+class Experiment(object):
+    """stand-in for the ScanExperiment widget with the parts used by the data path"""
+    processData = ScanExperiment.processData
+    dataMiddlePart = ScanExperiment.dataMiddlePart
+    dataEvaluatedPart = ScanExperiment.dataEvaluatedPart
+
+    def __init__(self):
+        self.context = ScanExperimentContext()
+        self.context.generator = Generator()
+        self.context.scanMethod = InternalScanMethod(self)
+        self.context.qubitData = Recorder()
+        self.evaluation = SimpleNamespace(name='qubit', settings={'color_box_plot': True})
+        algorithm = SimpleNamespace(threadSafe=True)
+        self.context.evaluation = SimpleNamespace(evalList=[self.evaluation], evalAlgorithmList=[algorithm])
+        self.context.scan = SimpleNamespace(xUnit='')
+        self.evaluationWorker = EvaluationWorker()
+        self.pulserHardware = PulserHardware()
+        self.pulseProgramUi = SimpleNamespace(currentContext=SimpleNamespace(parameters=SimpleNamespace(valueView={})))
+        self.progressUi = Recorder()
+        self.displayUi = Recorder()
+        self.evaluatedDataSignal = Recorder()
+        self.points = list()
+
+    def evaluatePoint(self, data, evaluation, replacementDict):
+        time.sleep(0.005)
+        return PointEvaluation([SimpleNamespace(value=data.value)], [(self.evaluation, ([data.value], [1], [0]))],
+                               [], [], None)
+
+    def updateMainGraph(self, x, evaluated, timeinterval, queue_size):
+        self.points.append((x, evaluated[0].value))
+
+    def showHistogram(self, *args, **kwargs):
+        pass
+
+
+class ScanExperimentTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = Experiment()
+
+    def tearDown(self):
+        self.experiment.evaluationWorker.shutdown()
+
+    def test_pointsInFlight(self):
+        for value in range(5):
+            self.experiment.processData(SimpleNamespace(value=value, other=None, final=False, timeinterval=None), 0)
+        self.assertEqual(self.experiment.context.currentIndex, 0)   # nothing delivered yet
+        self.assertEqual(self.experiment.context.submitIndex, 5)
+        self.assertEqual(self.experiment.pulserHardware.holds, {value: 1 for value in range(5)})
+        self.experiment.evaluationWorker.flush()
+        self.assertEqual(self.experiment.context.currentIndex, 5)
+        self.assertEqual(self.experiment.points, [(10 * value, value) for value in range(5)])
+        self.assertEqual([(key, values) for _, key, _, _, values, _, _ in self.experiment.context.qubitData.calls],
+                         [(('Gx',) * value, [value]) for value in range(5)])
+        self.assertEqual(self.experiment.pulserHardware.holds, {value: 0 for value in range(5)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import unittest
+
+from modules.DependencyGraph import DependencyGraph, CyclicDependencyException
+
+
+class DependencyGraphTest(unittest.TestCase):
+    def assertOrdered(self, graph):
+        for first, second in graph.edges():
+            self.assertLess(graph.order[first], graph.order[second])
+
+    def test_reorder(self):
+        graph = DependencyGraph()
+        for first, second in [('c', 'd'), ('a', 'b'), ('b', 'c'), ('e', 'a')]:
+            graph.add_edge(first, second)
+            self.assertOrdered(graph)
+        self.assertEqual(graph.topologicalOrder(), ['e', 'a', 'b', 'c', 'd'])
+        self.assertEqual(graph.descendants(['b', 'e']), ['a', 'b', 'c', 'd'])
+
+    def test_cycle(self):
+        graph = DependencyGraph()
+        graph.add_edge('a', 'b')
+        graph.add_edge('b', 'c')
+        with self.assertRaises(CyclicDependencyException) as context:
+            graph.add_edge('c', 'a')
+        self.assertEqual(context.exception.args[0], ['a', 'b', 'c'])
+        with self.assertRaises(CyclicDependencyException):
+            graph.add_edge('a', 'a')
+        self.assertEqual(sorted(graph.edges()), [('a', 'b'), ('b', 'c')])
+
+    def test_setDependencies(self):
+        graph = DependencyGraph()
+        graph.setDependencies('c', ['a', 'b'])
+        graph.setDependencies('a', ['x'])
+        with self.assertRaises(CyclicDependencyException):
+            graph.setDependencies('a', ['y', 'c'])
+        self.assertEqual(sorted(graph.edges()), [('a', 'c'), ('b', 'c'), ('x', 'a')])
+        graph.setDependencies('c', ['b'])
+        graph.setDependencies('a', ['c'])
+        self.assertOrdered(graph)
+        self.assertEqual(graph.descendants(['b']), ['c', 'a'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,7 @@
 # in the file "license.txt" in the top-level IonControl directory
 # *****************************************************************
 import unittest
-from modules.Expression import Expression
+from modules.Expression import Expression, ExpressionError
 import math
 from modules.quantity import Q
 ExprEval = Expression()
@@ -78,3 +78,32 @@ class TestExpression(unittest.TestCase):
                            {'x0': Q(0), 's': 1, 'A': Q(20), 'O': Q(0)}),
                          math.sqrt(20 / 12 - 1))
         self.assertEqual(e("sqrt(sin(round(pi)^2/17)^2+1)*1 MHz"),math.sqrt(math.sin(round(math.pi)**2/17)**2+1)*Q(1,'MHz'))
+
+
+class TestCompiledExpression(unittest.TestCase):
+    def test_cache(self):
+        compiled = ExprEval.compile("(2*(alpha+beta)+gamma)*1 MHz")
+        self.assertIs(ExprEval.compile("(2*(alpha+beta)+gamma)*1 MHz"), compiled)
+        self.assertIsNot(ExprEval.compile("(2*(alpha+beta)+gamma)*1 MHz", useFloat=True), compiled)
+        self.assertEqual(compiled.variables, {'alpha', 'beta', 'gamma'})
+        self.assertEqual(compiled.evaluate({'alpha': 5, 'beta': 2, 'gamma': 0}), Q(14, 'MHz'))
+        value, dependencies = compiled.evaluate({'alpha': 1, 'beta': 1, 'gamma': Q(1)}, listDependencies=True)
+        self.assertEqual((value, dependencies), (Q(5, 'MHz'), {'alpha', 'beta', 'gamma'}))
+        self.assertEqual(ExprEval.evaluate("(2*(alpha+beta)+gamma)*1 MHz", {'alpha': 0, 'beta': 0, 'gamma': 1}), Q(1, 'MHz'))
+
+    def test_dependencies(self):
+        value, dependencies = ExprEval.evaluate("pi*x", {'x': 2}, listDependencies=True)
+        self.assertEqual((value, dependencies), (2 * math.pi, {'x'}))
+        self.assertEqual(ExprEval.evaluateAsMagnitude("x>1", {'x': 2}), Q(1))
+
+    def test_fresh_results(self):
+        first = e("[1, x, {'a': x}]", {'x': 2})
+        first[2]['a'] = 5
+        first.append(3)
+        self.assertEqual(e("[1, x, {'a': x}]", {'x': 2}), [1, 2, {'a': 2}])
+
+    def test_syntax_error(self):
+        with self.assertRaises(ExpressionError):
+            e("2 * * 3")
+        with self.assertRaises(ExpressionError):
+            e("2 * * 3")
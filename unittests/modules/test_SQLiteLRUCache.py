@@ -0,0 +1,110 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import weakref
+
+from modules.SQLiteLRUCache import SQLiteLRUCache
+
+
+class SQLiteLRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        cache = SQLiteLRUCache(8, self.filename)
+        cache['a'] = {'x': [1, 2, 3]}
+        self.assertEqual(cache['a'], {'x': [1, 2, 3]})
+        self.assertIn('a', cache)
+        with self.assertRaises(KeyError):
+            cache['b']
+        del cache['a']
+        self.assertNotIn('a', cache)
+        with self.assertRaises(KeyError):
+            del cache['a']
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+    def test_evictCount(self):
+        cache = SQLiteLRUCache(4, self.filename, recencyBatch=100)
+        for key in 'abcd':
+            cache[key] = key
+        cache['a'], cache['b']   # recency only pending in memory
+        cache['e'] = 'e'
+        cache['f'] = 'f'
+        self.assertEqual(len(cache), 4)
+        self.assertEqual(list(cache), ['a', 'b', 'e', 'f'])
+        cache['e']
+        cache.close()
+        cache = SQLiteLRUCache(4, self.filename)   # recency was written on close
+        cache['g'] = 'g'
+        self.assertEqual(list(cache), ['b', 'f', 'e', 'g'])
+        cache.close()
+
+    def test_evictBytes(self):
+        cache = SQLiteLRUCache(100, self.filename, maxBytes=10000)
+        for i in range(20):
+            cache[str(i)] = bytes(3000)
+        self.assertEqual(list(cache), ['17', '18', '19'])
+        cache['large'] = bytes(50000)   # the newest entry is kept even if it exceeds maxBytes
+        self.assertEqual(list(cache), ['large'])
+        cache.close()
+
+    def test_boundedFile(self):
+        cache = SQLiteLRUCache(4, self.filename, memoryCapacity=0)
+        for i in range(200):
+            cache[str(i)] = os.urandom(20000)
+        cache.close()
+        self.assertLess(os.path.getsize(self.filename), 20 * 20000)
+
+    def test_memory(self):
+        cache = SQLiteLRUCache(8, self.filename, memoryCapacity=2)
+        value = [1, 2]
+        cache['a'] = value
+        self.assertIs(cache['a'], value)
+        cache['b'], cache['c'] = 'b', 'c'
+        self.assertIsNot(cache['a'], value)
+        self.assertEqual(cache['a'], value)
+        cache.close()
+        uncached = SQLiteLRUCache(8, self.filename, memoryCapacity=0)
+        self.assertIsNot(uncached['a'], uncached['a'])
+        uncached.close()
+
+    def test_oldDatabase(self):
+        connection = sqlite3.connect(self.filename)
+        connection.execute("create table Store (key text, value bytes)")
+        connection.execute("insert into Store (key, value) values (?, ?)", ('old', pickle.dumps(42)))
+        connection.commit()
+        connection.close()
+        cache = SQLiteLRUCache(2, self.filename)
+        self.assertEqual(cache['old'], 42)
+        cache['new'] = 1
+        cache['newer'] = 2
+        self.assertEqual(list(cache), ['new', 'newer'])
+        cache.close()
+
+    def test_releasedWhenUnreferenced(self):
+        cache = SQLiteLRUCache(8, self.filename, recencyBatch=100)
+        cache['a'] = 1
+        cache['a']
+        ref = weakref.ref(cache)
+        del cache           # flushed and closed when collected, the exit handler does not keep it alive
+        self.assertIsNone(ref())
+        connection = sqlite3.connect(self.filename)
+        self.assertEqual(connection.execute("select used from Store where key='a'").fetchone()[0], 2)
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import inspect
+
+from persist.MeasurementLog import MeasurementContainer, Measurement, Result, Parameter, ScanNameSummary
+
+
+class SQLiteConnection(object):
+    def __init__(self, filename):
+        self.connectionString = 'sqlite:///' + filename
+        self.echo = False
+
+
+class MeasurementContainerTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.start = datetime(2017, 1, 1, 12)
+        self.container = MeasurementContainer(SQLiteConnection(self.filename))
+        self.container.pageSize = 10
+        self.container.open()
+        for index in range(25):
+            measurement = Measurement(scanType='Scan', scanName='scan{0}'.format(index % 2), evaluation='mean',
+                                      startDate=self.start + timedelta(days=index))
+            measurement.results.append(Result(name='result', value=index))
+            measurement.parameters.append(Parameter(name='param', value=2 * index, space=self.container.getSpace('Global')))
+            self.container.addMeasurement(measurement)
+
+    def tearDown(self):
+        self.container.close()
+        self.container.engine.dispose()
+        os.remove(self.filename)
+
+    def reopen(self):
+        self.container.close()
+        self.container = MeasurementContainer(SQLiteConnection(self.filename))
+        self.container.pageSize = 10
+        self.container.open()
+
+    def test_pages(self):
+        self.reopen()
+        inserted = list()
+        self.container.beginInsertMeasurement.subscribe(lambda event: inserted.append((event.first, event.last)))
+        self.container.query(self.start, self.start + timedelta(days=30))
+        self.assertEqual(len(self.container.measurements), 10)
+        self.assertTrue(self.container.canFetchMore())
+        self.assertEqual(self.container.fetchMore(), 10)
+        self.container.fetchAll()
+        self.assertFalse(self.container.canFetchMore())
+        self.assertEqual(inserted, [(10, 19), (20, 24)])
+        self.assertEqual([m.resultByName('result').value.m for m in self.container.measurements], list(range(24, -1, -1)))
+        measurement = self.container.measurements[-1]
+        self.assertFalse({'results', 'parameters', 'study'} & inspect(measurement).unloaded)
+        self.assertEqual(measurement.parameterByName('Global', 'param').value.m, 0)
+
+    def test_filter(self):
+        self.reopen()
+        self.container.query(self.start, self.start + timedelta(days=9, hours=1), ['scan1'])
+        self.assertEqual([m.startDate.day for m in self.container.measurements], [10, 8, 6, 4, 2])
+        self.assertFalse(self.container.canFetchMore())
+        self.assertEqual(list(self.container.scanNames.items()), [('scan0', False), ('scan1', True)])
+
+    def test_summary(self):
+        self.assertEqual(self.container.scanNamesInRange(self.start + timedelta(days=30), self.start + timedelta(days=40)), [])
+        self.assertEqual(self.container.scanNamesInRange(self.start + timedelta(days=24), self.start + timedelta(days=40)), ['scan0'])
+        session = self.container.session
+        session.query(ScanNameSummary).delete()
+        session.commit()
+        self.reopen()       # rebuilt from the measurements
+        counts = self.container.session.query(ScanNameSummary.count).all()
+        self.assertEqual((len(counts), sum(count for count, in counts)), (25, 25))
+
+    def test_summaryExactBounds(self):
+        day = self.start + timedelta(days=24)
+        self.assertEqual(self.container.scanNamesInRange(day - timedelta(hours=1), day + timedelta(days=2)), ['scan0'])
+        self.assertEqual(self.container.scanNamesInRange(day + timedelta(hours=1), day + timedelta(days=2)), [])
+        self.assertEqual(self.container.scanNamesInRange(self.start - timedelta(days=1), self.start - timedelta(hours=1)), [])
+        self.assertEqual(self.container.scanNamesInRange(self.start - timedelta(days=1), self.start + timedelta(days=2)),
+                         ['scan0', 'scan1'])
+
+    def test_summaryFollowsMeasurements(self):
+        session = self.container.Session()
+        session.delete(session.query(Measurement).filter_by(startDate=self.start + timedelta(days=24)).one())
+        session.commit()
+        self.assertEqual(self.container.scanNamesInRange(self.start + timedelta(days=23, hours=13), self.start + timedelta(days=40)), [])
+        session.execute(Measurement.__table__.insert().values(scanType='Scan', scanName='other', evaluation='mean',
+                                                              startDate=self.start + timedelta(days=30)))
+        session.commit()    # written without the summary, like an older client does
+        self.reopen()
+        self.assertEqual(self.container.scanNamesInRange(self.start + timedelta(days=23, hours=13), self.start + timedelta(days=40)), ['other'])
+
+    def setLocalTimezone(self, zone):
+        previous = os.environ.get('TZ')
+        os.environ['TZ'] = zone
+        time.tzset()
+
+        def restore():
+            if previous is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = previous
+            time.tzset()
+        self.addCleanup(restore)
+
+    def test_summaryLocalDay(self):
+        self.setLocalTimezone('America/New_York')
+        day = datetime(2017, 2, 28)
+        measurement = Measurement(scanType='Scan', scanName='late', evaluation='mean',
+                                  startDate=datetime(2017, 3, 1, 4, 30, tzinfo=pytz.utc))  # 23:30 local on the 28th
+        self.container.addMeasurement(measurement)
+        self.assertEqual(self.container.session.query(ScanNameSummary.day).filter_by(scanName='late').all(), [(day.date(), )])
+        self.assertEqual(self.container.scanNamesInRange(day, day + timedelta(days=1)), ['late'])
+        session = self.container.session
+        session.query(ScanNameSummary).delete()
+        session.commit()
+        self.reopen()       # rebuilt with the same days
+        self.assertEqual(self.container.session.query(ScanNameSummary.day).filter_by(scanName='late').all(), [(day.date(), )])
+        self.assertEqual(self.container.scanNamesInRange(day, day + timedelta(days=1)), ['late'])
+
+
+if __name__ == "__main__":
+    unittest.main()
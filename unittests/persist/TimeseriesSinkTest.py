@@ -0,0 +1,88 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from persist.TimeseriesSink import TimeseriesSink, FileTimeseriesClient, lineProtocol
+
+
+def point(index):
+    return {"measurement": "dedicated", "tags": {"project": "my project"},
+            "fields": {"count0": float(index), "unit": None}, "time": 1500000000000000000 + index}
+
+
+class LineProtocolTest(unittest.TestCase):
+    def test_line(self):
+        self.assertEqual(lineProtocol({"measurement": "volt,age", "tags": {"space": "a=b", "project": ""},
+                                       "fields": {"valuef": 1.5, "n": 3, "unit": 'k"V', "minvalf": None},
+                                       "time": 17}),
+                         'volt\\,age,space=a\\=b n=3i,unit="k\\"V",valuef=1.5 17')
+        self.assertIsNone(lineProtocol({"measurement": "m", "fields": {"valuef": None}}))
+
+
+class TimeseriesSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = os.path.join(self.directory, 'journal')
+        self.client = FileTimeseriesClient(os.path.join(self.directory, 'database'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batches(self):
+        sink = TimeseriesSink(self.client, self.journal, batchSize=100, flushInterval=10)
+        for index in range(250):
+            sink.write(point(index))
+        sink.close()
+        self.assertEqual((sink.written, sink.writes, sink.queueDepth), (250, 3, 0))
+        self.assertEqual(self.client.lines(), [lineProtocol(point(index)) for index in range(250)])
+
+    def test_flushInterval(self):
+        sink = TimeseriesSink(self.client, self.journal, flushInterval=0.05)
+        sink.write(point(0))
+        for _ in range(100):
+            if sink.written:
+                break
+            time.sleep(0.01)
+        self.assertEqual(sink.written, 1)
+        sink.close()
+
+    def test_outage(self):
+        sink = TimeseriesSink(self.client, self.journal, batchSize=10, flushInterval=10, retryDelay=0.05)
+        self.client.available = False
+        for index in range(25):
+            sink.write(point(index))
+        sink.flush()
+        self.assertEqual((sink.written, sink.journaled), (0, 25))
+        self.assertGreater(sink.failures, 0)
+        self.client.available = True
+        for _ in range(200):           # the journal is retried without new points
+            if not sink.journaled:
+                break
+            time.sleep(0.01)
+        sink.write(point(25))
+        sink.close()
+        self.assertFalse(os.path.exists(self.journal))
+        self.assertEqual(self.client.lines(), [lineProtocol(point(index)) for index in range(26)])
+
+    def test_restart(self):
+        self.client.available = False
+        sink = TimeseriesSink(self.client, self.journal, flushInterval=10)
+        sink.write(point(0))
+        sink.close()
+        self.assertEqual(sink.journaled, 1)
+        self.client.available = True
+        sink = TimeseriesSink(self.client, self.journal, flushInterval=10)    # sends the journal at start
+        sink.write(point(1))
+        sink.close()
+        self.assertEqual(self.client.lines(), [lineProtocol(point(0)), lineProtocol(point(1))])
+
+
+if __name__ == "__main__":
+    unittest.main()
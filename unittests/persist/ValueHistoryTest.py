@@ -0,0 +1,83 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from modules.quantity import Q
+from persist.ValueHistory import ValueHistoryStore
+
+
+class SQLiteConnection(object):
+    def __init__(self, filename):
+        self.connectionString = 'sqlite:///' + filename
+        self.echo = False
+
+
+class ValueHistoryWriterTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.store = ValueHistoryStore(SQLiteConnection(self.filename), writeBehind=True)
+        self.store.open_session()
+        self.start = datetime(2017, 1, 1)
+
+    def tearDown(self):
+        self.store.close_session()
+        os.remove(self.filename)
+
+    def history(self, source):
+        return self.store.getHistory('test', source, self.start - timedelta(seconds=1), None)
+
+    def test_batches(self):
+        writer = self.store.writer
+        writer.batchSize = 1000
+        for index in range(2500):
+            self.store.add('test', 'source{0}'.format(index % 3), Q(index, 'mm'), None, self.start + timedelta(seconds=index))
+        writer.flush()
+        self.assertEqual(writer.queueDepth, 0)
+        self.assertEqual(writer.written, 2500)
+        self.assertEqual(writer.batches, 3)
+        entries = self.history('source1')
+        self.assertEqual(len(entries), 833)
+        self.assertEqual((entries[0].value, entries[0].unit), (1, 'mm'))
+        self.assertEqual(set(self.store.sourceDict), {('test', 'source0'), ('test', 'source1'), ('test', 'source2')})
+
+    def test_flushInterval(self):
+        writer = self.store.writer
+        writer.flushInterval = 0.05
+        self.store.add('test', 'source', 1.5, 'V', self.start, bottom=1, top=2)
+        time.sleep(0.01)
+        self.assertEqual(writer.written, 0)
+        for _ in range(100):
+            if writer.written:
+                break
+            time.sleep(0.01)
+        self.assertEqual(writer.written, 1)
+        entry = self.history('source')[0]
+        self.assertEqual((entry.value, entry.bottom, entry.top), (1.5, 1, 2))
+
+    def test_queriesSeeQueued(self):
+        self.store.writer.flushInterval = 60
+        for index in range(5):
+            self.store.add('test', 'source', index, 'V', self.start + timedelta(seconds=index))
+        self.assertEqual([entry.value for entry in self.history('source')], [0, 1, 2, 3, 4])
+        self.store.add('test', 'source', 5, 'V', self.start + timedelta(seconds=5))
+        self.assertEqual(self.store.get('test', 'source').count(), 6)
+
+    def test_duplicate(self):
+        writer = self.store.writer
+        for index in (0, 1, 1, 2):
+            self.store.add('test', 'source', index, 'V', self.start + timedelta(seconds=index))
+        writer.flush()
+        self.assertEqual((writer.written, writer.failed), (3, 1))
+        self.assertEqual([entry.value for entry in self.history('source')], [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,17 +3,125 @@
 # This Software is released under the GPL license detailed
 # in the file "license.txt" in the top-level IonControl directory
 # *****************************************************************
-from persist.configshelve import configshelve
+from persist.configshelve import configshelve, Base, DatabaseVersion, PgShelveEntry
+import os
+import tempfile
 import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 
 from persist.DatabaseConnectionSettings import DatabaseConnectionSettings
 
 
+class SQLiteConnection(object):
+    def __init__(self, filename):
+        self.connectionString = 'sqlite:///' + filename + '?check_same_thread=false'     # committed on the worker
+        self.echo = False
+
+
+class Unpicklable(object):
+    def __getstate__(self):
+        raise TypeError("cannot pickle")
+
+
 class ConfigshelveTest(unittest.TestCase):
     def testLoadSQLite(self):
         dbConnection = DatabaseConnectionSettings(user='python', password='yb171', database='unittests', host='localhost')
         with configshelve(dbConnection, filename='ExperimentUi.config.db') as d:
             pass
 
+
+class DirtyTrackingTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.connection = SQLiteConnection(self.filename)
+        engine = create_engine(self.connection.connectionString)
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        session = self.Session()
+        session.add(DatabaseVersion(configshelve.version))
+        session.commit()
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def storedKeys(self):
+        return sorted(entry.key for entry in self.Session().query(PgShelveEntry).all())
+
+    def testIncrementalCommit(self):
+        with configshelve(self.connection) as d:
+            d['settings'] = {'x': 1}
+            d['list'] = [1, 2]
+            d['other'] = 'text'
+        self.assertEqual(self.storedKeys(), ['list', 'other', 'settings'])
+        with configshelve(self.connection) as d:
+            self.assertEqual(d['list'], [1, 2])
+            d['settings']['x'] = 2       # changed in place
+            d['other'] = 'text'          # written without change
+            d.commitToDatabase()
+            d.commit_ready.result()
+            self.assertEqual(d.dirty, set())
+        self.assertEqual(self.storedKeys(), ['list', 'other', 'settings', 'settings'])
+        with configshelve(self.connection) as d:
+            self.assertEqual(d['settings'], {'x': 2})
+        self.assertEqual(len(self.storedKeys()), 4)
+
+    def testHandedOutChangedAfterCommit(self):
+        with configshelve(self.connection) as d:
+            d['settings'] = {'x': 1}
+            d['settings']['x'] = 2
+            d.commitToDatabase()
+            d.commit_ready.result()
+            self.assertEqual(d.handedOut, set())
+            d.get('settings')['x'] = 3   # handed out again after the commit
+        with configshelve(self.connection) as d:
+            self.assertEqual(d['settings'], {'x': 3})
+        self.assertEqual(self.storedKeys(), ['settings', 'settings'])
+
+    def testHandedOutPickledOnce(self):
+        with configshelve(self.connection) as d:
+            d['settings'] = {'x': 1}
+            d['settings']
+            d.commitToDatabase()
+            d.commit_ready.result()
+            with mock.patch.object(d, '_pickleKeys', wraps=d._pickleKeys) as pickleKeys:
+                d.commitToDatabase()
+                d.commit_ready.result()
+            pickleKeys.assert_called_once_with(set())
+
+    def testExitClosesAfterFailedCommit(self):
+        d = configshelve(self.connection)
+        d.__enter__()
+        d['key'] = 1
+        with mock.patch.object(d.session, 'bulk_insert_mappings', side_effect=RuntimeError("database gone")):
+            with self.assertLogs('persist.configshelve', 'ERROR'), self.assertRaises(RuntimeError):
+                d.__exit__(None, None, None)
+        with self.assertRaises(RuntimeError):     # the commit worker was shut down
+            d.commitExecutor.submit(lambda: None)
+
+    def testFailedKeysStayDirty(self):
+        with configshelve(self.connection) as d:
+            d['good'] = 1
+            d['bad'] = Unpicklable()
+            with self.assertLogs('persist.configshelve', 'ERROR'):
+                d.commitToDatabase()
+                d.commit_ready.result()
+            self.assertEqual(d.dirty, {'bad'})
+            self.assertEqual(self.storedKeys(), ['good'])
+            d['bad'] = 2
+            d['good'] = 3
+            with mock.patch.object(d.session, 'bulk_insert_mappings', side_effect=RuntimeError("database gone")):
+                with self.assertLogs('persist.configshelve', 'ERROR') as logs:
+                    d.commitToDatabase()
+                    self.assertIsInstance(d.commit_ready.exception(), RuntimeError)
+                    d.commitExecutor.submit(lambda: None).result()   # the done callback has run on the worker
+            self.assertIn("Commit of the configuration failed", logs.output[0])
+            self.assertEqual(d.dirty, {'bad', 'good'})
+        self.assertEqual(self.storedKeys(), ['bad', 'good', 'good'])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
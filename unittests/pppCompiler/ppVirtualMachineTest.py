@@ -0,0 +1,36 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import pytest
+
+from pppCompiler.ppVirtualMachine import ppVirtualMachine, SKIP
+from unittests.pppCompiler.ppVirtualMachine_benchmark import scanLoop
+
+
+def test_timing():
+    vm = ppVirtualMachine(scanLoop.format(loops=3))
+    assert vm.runCode() == set()
+    # two iterations of 15 instructions, the DDS write left after WAITDDSWRITEDONE and UPDATE, and END
+    assert (vm.timer, vm.totalsteps, vm.DDSwrites) == (2 * (15 + 63 + 100) + 1, 38, 2)
+    assert vm.DDSs[2]['freq'] == vm.varDict['frequency'] == 0x1236
+    assert (vm.varDict['remaining'], vm.varDict['counts'], vm.varDict['total']) == (1, 18, 22)
+
+
+def test_skippedLines():
+    code = "var a 1\nJMP target\n# comment\n\n  # comment\ntarget: LDWR a\nSTWR a\nEND"
+    vm = ppVirtualMachine(code)
+    assert [instruction[0] for instruction in vm.program[2:5]] == [SKIP] * 3
+    assert vm.runCode() == {(7, "STWR a")}
+    assert (vm.timer, vm.totalsteps) == (4, 5)
+
+
+def test_errors():
+    vm = ppVirtualMachine("var a 1\nLDWR b\nEND")
+    with pytest.raises(KeyError):
+        vm.runCode()
+    vm = ppVirtualMachine("JMPNZ nowhere\nEND\nFOO")  # unknown labels and instructions only fail when executed
+    assert vm.runCode() == set()
+    with pytest.raises(KeyError):
+        ppVirtualMachine("var a 0\nLDWR a\nJMPZ nowhere").runCode()
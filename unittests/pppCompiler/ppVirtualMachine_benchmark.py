@@ -0,0 +1,78 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Benchmark of the pulse program virtual machine.
+
+Usage:
+    python -m unittests.pppCompiler.ppVirtualMachine_benchmark [program.ppc ...] [--loops N]
+
+Every program is assembled and run, the time for assembling and running, the simulated clock cycles and the executed
+steps per second are printed. Without arguments the compiled test programs and a synthetic scan loop with DDS
+writes and counter reads are used.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+from timeit import default_timer
+
+from pppCompiler.ppVirtualMachine import ppVirtualMachine
+
+scanLoop = """# synthetic scan loop
+const one 1
+const channel 2
+const updateTime 100
+var counts 0
+var total 0
+var remaining {loops}
+var frequency 0x1234
+loop: LDWR frequency
+  ADDW one
+  STWR frequency
+  DDSFRQ channel, frequency
+  WAITDDSWRITEDONE
+  UPDATE updateTime
+  LDCOUNT channel
+  STWR counts
+  LDWR total
+  ADDW counts
+  STWR total
+  DEC remaining
+  STWR remaining
+  CMPEQUAL one
+  JMPNCMP loop
+  END
+"""
+
+
+def run(name, code, repeat=3):
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = default_timer()
+            vm = ppVirtualMachine(code)
+            assembled = default_timer()
+            vm.runCodeMain()
+            finished = default_timer()
+        if best is None or finished - start < best[0] + best[1]:
+            best = (assembled - start, finished - assembled)
+    assemble, execute = best
+    print("{0:40s} assemble {1:8.2f} ms  run {2:9.2f} ms  {3:10d} cycles  {4:9d} steps  ({5:6.3f} Msteps/s)  DDS writes {6}".format(
+        name, 1e3 * assemble, 1e3 * execute, vm.timer, vm.totalsteps, vm.totalsteps / execute / 1e6, vm.DDSwrites))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the pulse program virtual machine")
+    parser.add_argument('programs', nargs='*', help="assembled pulse programs")
+    parser.add_argument('--loops', type=int, default=100000, help="iterations of the synthetic scan loop")
+    args = parser.parse_args()
+    programs = args.programs or sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'test', '*.ppc.reference')))
+    for filename in programs:
+        with open(filename) as f:
+            run(os.path.basename(filename), f.read())
+    if not args.programs:
+        run("scan loop ({0} iterations)".format(args.loops), scanLoop.format(loops=args.loops))
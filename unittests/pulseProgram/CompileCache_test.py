@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from pulseProgram.CompileCache import CompileCache
+from pulseProgram.PulseProgram import PulseProgram
+
+mainSource = """var coolingFreq 250, parameter, MHz, AD9912_FRQ
+var coolingTime 100, parameter, ms
+insert timing.pp
+loop: DDSFRQ 0, coolingFreq
+  UPDATE coolingTime
+  UPDATE extraTime
+  JMP loop
+  END
+"""
+
+pppSource = """var counts = 0
+var total = 0
+total = total + counts
+"""
+
+
+@pytest.fixture
+def directory():
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'main.pp'), 'w') as f:
+        f.write(mainSource)
+    with open(os.path.join(directory, 'timing.pp'), 'w') as f:
+        f.write("var extraTime 5, parameter, us\n")
+    yield directory
+    shutil.rmtree(directory)
+
+
+def load(directory, cache):
+    pp = PulseProgram()
+    pp.compileCache = cache
+    pp.loadSource(os.path.join(directory, 'main.pp'))
+    return pp
+
+
+def test_pulseProgram(directory):
+    cache = CompileCache(os.path.join(directory, 'cache.db'))
+    compiled = load(directory, cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cached = load(directory, CompileCache(os.path.join(directory, 'cache.db')))   # as after a restart
+    for name in PulseProgram.compiledAttributes:
+        assert getattr(cached, name) == getattr(compiled, name)
+    assert cached.toBinary() == compiled.toBinary()
+    assert cached.variabledict['extraTime'].value == compiled.variabledict['extraTime'].value
+    with open(os.path.join(directory, 'timing.pp'), 'w') as f:   # a changed inserted file is compiled again
+        f.write("var extraTime 7, parameter, us\n")
+    changed = load(directory, cache)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert changed.dataBytecode != compiled.dataBytecode
+
+
+def test_ppp(directory):
+    cache = CompileCache(os.path.join(directory, 'cache.db'))
+    code, lookup = cache.compilePpp(pppSource)
+    assert cache.compilePpp(pppSource) == (code, lookup)
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.compilePpp(pppSource + "counts = 1\n")
+    assert cache.misses == 2
@@ -8,3 +8,52 @@ def test_pickle_variabledictionary():
     s = pickle.dumps(d)
     dd = pickle.loads(s)
     print(id(dd.dependencyGraph))
+
+
+class Variable(object):
+    def __init__(self, name, strvalue):
+        self.name = name
+        self.strvalue = strvalue
+        self.value = 0
+        self.type = 'parameter'
+        self.enabled = True
+
+
+def variableDictionary():
+    d = VariableDictionary([('L1', Variable('L1', 'G1*23+G2')), ('L2', Variable('L2', '2*L1')),
+                            ('L3', Variable('L3', '3*L2+L1')), ('L4', Variable('L4', 'L3+L2'))])
+    d.setGlobaldict({'G1': 1, 'G2': 8})
+    return d
+
+
+def values(d):
+    return [var.value for var in d.values()]
+
+
+def test_recalculate_dependent():
+    d = variableDictionary()
+    assert values(d) == [31, 62, 217, 279]
+    assert d.setStrValue('L1', '2') == ['L2', 'L3', 'L4']
+    assert values(d) == [2, 4, 14, 18]
+    assert d.recalculateDependent('G1') == []
+    d.globaldict['G2'] = 0
+    d.setStrValue('L1', 'G2+1')
+    assert d.recalculateDependent('G2') == ['L1', 'L2', 'L3', 'L4']
+
+
+def test_cycle():
+    d = variableDictionary()
+    d.setStrValue('L1', 'L4')
+    assert d['L1'].strerror is not None
+    assert d['L1'].strvalue == 'G1*23+G2'
+    assert d.setStrValue('L1', '1') == ['L2', 'L3', 'L4']
+    assert values(d) == [1, 2, 7, 9]
+
+
+def test_batch():
+    d = variableDictionary()
+    with d.batchUpdate() as updated:
+        assert d.setStrValue('L2', 'L1*10') == []
+        d.setStrValue('L1', '1')
+    assert updated == ['L2', 'L3', 'L4']
+    assert values(d) == [1, 10, 31, 41]
@@ -0,0 +1,55 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Benchmark of the scalar and the vectorized result pipe and logic analyzer decoders.
+
+Usage:
+    python -m unittests.pulser.DataFifoDecoder_benchmark [recorded.bin ...]
+
+Recorded streams are raw dumps of the result pipe (little endian 64 bit words). Without arguments
+synthetic streams with different numbers of shots and timestamps and synthetic logic analyzer
+captures are used.
+"""
+import sys
+from timeit import default_timer
+
+from unittests.pulser.DataFifoDecoder_test import syntheticStream, logicAnalyzerStream, toBytes, Decoder
+
+PipeBufferSize = 8 * 2048   # the result pipe delivers at most 0x1ffe*2 bytes per read
+
+
+def run(buffer, vectorized, logicAnalyzer=False):
+    decoder = Decoder()
+    if logicAnalyzer:
+        decode = decoder.decodeLogicAnalyzer if vectorized else decoder.decodeLogicAnalyzerScalar
+    else:
+        decode = decoder.decodeData if vectorized else decoder.decodeDataScalar
+    start = default_timer()
+    for position in range(0, len(buffer), PipeBufferSize):
+        decode(buffer[position:position + PipeBufferSize])
+    return default_timer() - start
+
+
+def benchmark(name, buffer, repeat=3, logicAnalyzer=False):
+    words = len(buffer) // 8
+    scalar = min(run(buffer, False, logicAnalyzer) for _ in range(repeat))
+    vectorized = min(run(buffer, True, logicAnalyzer) for _ in range(repeat))
+    print("{0:40s} {1:9d} words  scalar {2:8.1f} ms ({3:6.2f} Mwords/s)  vectorized {4:8.1f} ms ({5:6.2f} Mwords/s)  speedup {6:5.1f}".format(
+        name, words, scalar * 1e3, words / scalar * 1e-6, vectorized * 1e3, words / vectorized * 1e-6, scalar / vectorized))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for filename in sys.argv[1:]:
+            with open(filename, 'rb') as f:
+                benchmark(filename, bytearray(f.read()))
+    else:
+        for points, shots, channels in [(10, 100, (0,)), (10, 1000, (0, 1)), (10, 5000, (0, 1, 2, 3))]:
+            benchmark("synthetic {0} points {1} shots {2} channels".format(points, shots, len(channels)),
+                      toBytes(syntheticStream(points, shots, channels)))
+        for captures, records in [(10, 1000), (2, 200000)]:
+            benchmark("logic analyzer {0} captures {1} records".format(captures, records),
+                      toBytes(logicAnalyzerStream(captures, records)), logicAnalyzer=True)
@@ -0,0 +1,251 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import json
+import pickle
+import random
+import struct
+import unittest
+from ctypes import c_longlong
+from multiprocessing.sharedctypes import Array
+from time import time
+
+import numpy
+
+from pulser.DataFifoDecoder import DataFifoDecoder
+from pulser.PulserData import Data, DedicatedData, LogicAnalyzerData
+from pulser.SharedRingBuffer import SharedRingBuffer, RingDataHolds
+
+
+timestampOffset = int(time() * 1e9)
+
+
+class ListQueue(list):
+    def put(self, item):
+        self.append(item)
+
+
+class Decoder(DataFifoDecoder):
+    """decoder without the hardware, data is pushed into a list"""
+    dedicatedDataClass = DedicatedData
+
+    def __init__(self):
+        self.state = self.analyzingState.normal
+        self.data = Data()
+        self.dedicatedData = self.dedicatedDataClass()
+        self.timestampOffset = timestampOffset
+        self.dataQueue = ListQueue()
+        self.logicAnalyzerData = LogicAnalyzerData()
+        self.logicAnalyzerBuffer = bytearray()
+        self.logicAnalyzerReadStatus = 0
+
+
+def syntheticStream(points=5, shots=100, channels=(0, 1), seed=0):
+    """Generate the word stream of a scan with counts, timestamps, ADC, clock ticks, results and dedicated data"""
+    rand = random.Random(seed)
+    words = list()
+    time = 0
+    for point in range(points):
+        words.extend([0xfffc000000000000, point * 1000])
+        if point % 2:
+            words.extend([0xfffc000000008000, point])
+        for shot in range(shots):
+            time += rand.randint(1000, 100000)
+            words.append(0x0600000000000000 | (time & 0xffffffffff))
+            for channel in channels:
+                words.append(0x0300000000000000 | channel << 40 | (time & 0xffffffffff))
+                stamps = sorted(rand.randint(1, 5000) for _ in range(rand.randint(0, 5)))
+                words.extend(0x0200000000000000 | channel << 40 | ((time + s) & 0xffffffffff) for s in stamps)
+                words.append(0x0100000000000000 | channel << 40 | len(stamps))
+            words.append(0x0500000000000000 | 2 << 40 | rand.randint(0, 20) << 28 | rand.randint(0, 50000))
+            result = rand.randint(-1000, 1000)
+            words.append(0x5100000000000000 | 3 << 48 | (result & 0xffffffffffff))
+            if result < 0:
+                words.append(0x5000000000000000 | 3 << 48 | ((result >> 48) & 0xffff))
+            if rand.random() < 0.05:
+                words.append(0x0400000000000000 | rand.randint(0, 0xffffffffff))
+            if rand.random() < 0.002:
+                words.append(0xfffb000000000000 | rand.randint(0, 0xffff))
+            if rand.random() < 0.01:
+                words.extend(0xee00000000000000 | channel << 48 | rand.randint(0, 1000) for channel in (0, 1, 32, 33))
+            if rand.random() < 0.002:
+                words.append(0xfffd000000000000)
+    words.append(0xffffffffffffffff)
+    return words
+
+
+def logicAnalyzerStream(captures=3, records=2000, seed=0):
+    """Generate logic analyzer words with all record types, counter overruns and end markers"""
+    rand = random.Random(seed)
+    words = list()
+    for capture in range(captures):
+        counter = 0
+        for record in range(records):
+            counter += rand.randint(1, 200000)
+            while counter >= 0x1000000:
+                counter -= 0x1000000
+                words.append(0x0200000000000000)
+            header = rand.choice((3, 3, 3, 4, 5, 6))
+            words.append(header << 56 | counter)
+            # patterns that look like headers make the pairing ambiguous for a local decoder
+            words.append(rand.choice((rand.getrandbits(64), rand.randint(1, 6) << 56 | rand.getrandbits(24))))
+        words.append(0x0100000000000000 | counter)
+    return words
+
+
+def toBytes(words):
+    return bytearray(struct.pack('{0}Q'.format(len(words)), *words))
+
+
+def decode(words, chunks, vectorized):
+    decoder = Decoder()
+    buffer = toBytes(words)
+    for start, end in zip(chunks[:-1], chunks[1:]):
+        if vectorized:
+            decoder.decodeData(buffer[start:end])
+        else:
+            decoder.decodeDataScalar(buffer[start:end])
+    return decoder.dataQueue
+
+
+def dataContent(item):
+    if isinstance(item, Data):
+        content = json.loads(item.dataString())
+        del content[11]     # creation time
+        return item.__class__.__name__, content, item.timingViolations
+    content = dict(vars(item))
+    if isinstance(item, LogicAnalyzerData):
+        for name in item.recordTypes:
+            content[name] = content[name].tolist()
+        content.pop('_chunks')
+        content.pop('_records')
+    for key in ('_creationTime', '_timestamp', 'post_time'):
+        content.pop(key, None)
+    return item.__class__.__name__, content
+
+
+class DataFifoDecoderTest(unittest.TestCase):
+    def compare(self, words, chunks):
+        scalar = decode(words, chunks, False)
+        vectorized = decode(words, chunks, True)
+        self.assertEqual(len(scalar), len(vectorized))
+        for expected, actual in zip(scalar, vectorized):
+            self.assertEqual(dataContent(expected), dataContent(actual))
+        return scalar
+
+    def test_singleBuffer(self):
+        words = syntheticStream()
+        queue = self.compare(words, [0, 8 * len(words)])
+        self.assertEqual(len([d for d in queue if isinstance(d, Data)]), 5)
+
+    def test_splitBuffers(self):
+        words = syntheticStream(seed=1)
+        rand = random.Random(2)
+        chunks = sorted({0, 8 * len(words)} | {8 * rand.randint(1, len(words) - 1) for _ in range(40)})
+        self.compare(words, chunks)
+
+    def test_scanValueAtBufferBoundary(self):
+        words = syntheticStream(points=2, shots=3)
+        self.compare(words, [0, 8, 16, 8 * len(words)])
+
+    def test_highResultInNextBuffer(self):
+        words = [0x5100000000000000 | 1 << 48 | 5, 0x5000000000000000 | 1 << 48 | 0xffff,
+                 0x5100000000000000 | 1 << 48 | 7, 0xffffffffffffffff]
+        queue = self.compare(words, [0, 8, 8 * len(words)])
+        self.assertEqual(list(queue[0].result[1]), [-(1 << 64) + (0xffff << 48 | 5), 7])
+
+    def test_countsAndAdcSameChannel(self):
+        words = [0x0100000000000000 | 34 << 40 | 3, 0x0500000000000000 | 2 << 40 | 2 << 28 | 9,
+                 0x0100000000000000 | 34 << 40 | 4, 0xffffffffffffffff]
+        queue = self.compare(words, [0, 8 * len(words)])
+        self.assertEqual(list(queue[0].count[34]), [3, 4.5, 4])
+
+    def decodeLogicAnalyzer(self, words, chunks):
+        result = list()
+        for vectorized in (False, True):
+            decoder = Decoder()
+            buffer = toBytes(words)
+            for start, end in zip(chunks[:-1], chunks[1:]):
+                if vectorized:
+                    decoder.decodeLogicAnalyzer(buffer[start:end])
+                else:
+                    decoder.decodeLogicAnalyzerScalar(buffer[start:end])
+            result.append([dataContent(item) for item in decoder.dataQueue])
+        self.assertEqual(result[0], result[1])
+        return result[0]
+
+    def test_logicAnalyzerSingleBuffer(self):
+        words = logicAnalyzerStream()
+        captures = self.decodeLogicAnalyzer(words, [0, 8 * len(words)])
+        self.assertEqual(len(captures), 3)
+        self.assertEqual(sum(len(content[name]) for _, content in captures for name in LogicAnalyzerData.recordTypes), 6000)
+
+    def test_logicAnalyzerSplitBuffers(self):
+        words = logicAnalyzerStream(seed=1)
+        rand = random.Random(3)
+        chunks = sorted({0, 8 * len(words)} | {rand.randint(1, 8 * len(words) - 1) for _ in range(60)})
+        self.decodeLogicAnalyzer(words, chunks)
+
+
+class SharedRingBufferTest(unittest.TestCase):
+    def transfer(self, data, ring):
+        data.toShared(ring)
+        received = pickle.loads(pickle.dumps(data))
+        received.attach(ring)
+        return received
+
+    def test_roundTrip(self):
+        ring = SharedRingBuffer(Array(c_longlong, 64 * 1024, lock=True), 1024)
+        for expected in decode(syntheticStream(seed=3), [0, 8 * len(syntheticStream(seed=3))], True):
+            if not isinstance(expected, Data):
+                continue
+            content = dataContent(expected)
+            received = self.transfer(expected, ring)
+            self.assertIsNotNone(expected.ringSpan)
+            self.assertIsInstance(received.count[0], numpy.ndarray)
+            self.assertEqual(dataContent(received), content)
+            received.detach(ring)
+            self.assertEqual(dataContent(received), content)
+        self.assertEqual(ring.used, 0)
+
+    def test_fullRing(self):
+        ring = SharedRingBuffer(Array(c_longlong, 64, lock=True))
+        data = Data()
+        data.count[0].extend(range(100))
+        received = self.transfer(data, ring)
+        self.assertIsNone(received.ringSpan)
+        self.assertEqual(received.count[0].tolist(), list(range(100)))
+
+    def test_wrapAround(self):
+        ring = SharedRingBuffer(Array(c_longlong, 42, lock=True))
+        for value in range(10):
+            data = Data()
+            data.count[1].extend([value] * 15)
+            received = self.transfer(data, ring)
+            self.assertIsNotNone(received.ringSpan)
+            self.assertEqual(received.count[1].tolist(), [value] * 15)
+            received.detach(ring)
+
+    def test_holds(self):
+        ring = SharedRingBuffer(Array(c_longlong, 64 * 1024, lock=True))
+        holds = RingDataHolds(ring)
+        received = list()
+        for value in range(3):
+            data = Data()
+            data.count[0].extend([value] * 10)
+            received.append(self.transfer(data, ring))
+            holds.add(received[-1])
+        holds.retain(received[0])
+        for data in received:
+            holds.release(data)      # handed to the consumers
+        self.assertEqual(ring.used, 30)   # the later spans wait for the retained first one
+        self.assertEqual(received[2].count[0].tolist(), [2] * 10)
+        holds.release(received[0])
+        self.assertEqual((ring.used, len(holds)), (0, 0))
+        self.assertIsNone(received[1].ringSpan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Benchmark of the path from the result pipe to the plot without pulse programmer hardware.
+
+Usage:
+    python -m unittests.pulser.PulserPipeline_benchmark [--rate WORDS_PER_SECOND] [recorded.bin ...]
+
+Recorded streams are raw dumps of the result pipe (little endian 64 bit words), without arguments
+synthetic scans are used. The stream is replayed by a ReplayFrontPanel in a PulserHardwareServer process,
+this process takes the place of the QueueReader and the ScanExperiment: it attaches the Data to the shared
+ring buffer, evaluates the counters and appends the results to a trace which is replotted.
+Reported are the latency percentiles per point of the stages
+
+    decode       reading and decoding the result pipe (in process, without transport)
+    transport    from queueing in the server process until received by the client
+    evaluation   evaluation of all counters
+    replot       appending to the trace, reducing the plot data and updating the curve
+
+and the depth of the data queue when a point is received. The slowest stage limits the point rate.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+from ctypes import c_longlong
+from multiprocessing.sharedctypes import Array
+from queue import Empty
+from time import time
+from timeit import default_timer
+
+import numpy
+import pyqtgraph
+from PyQt5 import QtWidgets
+
+from pulser.PulserData import Data
+from pulser.PulserHardwareServer import PulserHardwareServer
+from pulser.ReplayFrontPanel import ReplayFrontPanel
+from pulser.SharedRingBuffer import SharedRingBuffer
+from scan.EvaluationMethods import MeanEvaluation, ThresholdEvaluation
+from trace.PlottedTrace import PlottedTrace
+from trace.TraceCollection import TraceCollection
+from unittests.pulser.DataFifoDecoder_test import Decoder, syntheticStream, toBytes
+from unittests.pulser.ReplayFrontPanel_test import readPipe
+from unittests.scan.EvaluationMethods_test import Evaluation
+
+
+class TimedDecoder(Decoder):
+    """decoder recording the decoding time spent on every point"""
+    def __init__(self):
+        super(TimedDecoder, self).__init__()
+        self.elapsed = 0
+        self.pointTimes = list()
+
+    def queueData(self):
+        super(TimedDecoder, self).queueData()
+        self.pointTimes.append(self.elapsed)
+        self.elapsed = 0
+
+
+def decodeLatency(filename):
+    xem = ReplayFrontPanel(filename)
+    decoder = TimedDecoder()
+    xem.ActivateTriggerIn(0x40, 2)
+    while xem.position < len(xem.stream):
+        start = default_timer()
+        readPipe(xem, decoder)
+        decoder.elapsed += default_timer() - start
+    return decoder.pointTimes, sum(1 for item in decoder.dataQueue if isinstance(item, Data))
+
+
+def command(pipe, name, *args):
+    pipe.send((name, args, {}))
+    result = pipe.recv()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def pipeline(filename, points, wordsPerSecond=None):
+    """replay the stream in a server process and evaluate and plot the points, returns the latencies"""
+    dataQueue = multiprocessing.Queue()
+    clientPipe, serverPipe = multiprocessing.Pipe()
+    loggingQueue = multiprocessing.Queue()
+    sharedMemoryArray = Array(c_longlong, PulserHardwareServer.sharedMemorySize + PulserHardwareServer.dataRingSize, lock=True)
+    dataRing = SharedRingBuffer(sharedMemoryArray, PulserHardwareServer.sharedMemorySize)
+    server = PulserHardwareServer(dataQueue, serverPipe, loggingQueue, sharedMemoryArray)
+    server.start()
+
+    evalList = [Evaluation('threshold', 0), Evaluation('mean', 1)]
+    algorithms = [ThresholdEvaluation(settings={'threshold': 2}), MeanEvaluation()]
+    trace = TraceCollection()
+    plottedTraces = list()
+    for evaluation in evalList:
+        plotted = PlottedTrace(trace, xColumn='x', yColumn=evaluation.name, name=evaluation.name)
+        plotted.curve = pyqtgraph.PlotDataItem()
+        plottedTraces.append(plotted)
+
+    latency = dict((name, list()) for name in ('transport', 'evaluation', 'replot', 'queue depth'))
+    command(clientPipe, 'openReplay', filename, wordsPerSecond)
+    start = default_timer()
+    command(clientPipe, 'ppStart')
+    received = 0
+    while received < points:
+        try:
+            data = dataQueue.get(timeout=10)
+        except Empty:
+            print("timeout after {0} of {1} points".format(received, points))
+            break
+        if not isinstance(data, Data):
+            continue
+        received += 1
+        latency['transport'].append(time() - data.post_time)
+        try:
+            latency['queue depth'].append(dataQueue.qsize())
+        except NotImplementedError:
+            pass
+        data.attach(dataRing)
+        tick = default_timer()
+        results = [algo.evaluate(data, ev) for ev, algo in zip(evalList, algorithms)]
+        latency['evaluation'].append(default_timer() - tick)
+        data.detach(dataRing)
+        tick = default_timer()
+        trace['x'].append(data.scanvalue)
+        for evaluation, result in zip(evalList, results):
+            trace[evaluation.name].append(result.value)
+        for plotted in plottedTraces:
+            plotted._replot()
+        latency['replot'].append(default_timer() - tick)
+    elapsed = default_timer() - start
+    command(clientPipe, 'finish')
+    while not isinstance(dataQueue.get(timeout=10), Exception):
+        pass
+    while loggingQueue.get(timeout=10) is not None:    # the server puts None after its last message
+        pass
+    server.join()
+    return latency, received, elapsed
+
+
+def report(name, values, unit=1e3, unitName='ms'):
+    if values:
+        p50, p90, p99 = numpy.percentile(values, [50, 90, 99])
+        print("    {0:12s} p50 {1:9.3f}  p90 {2:9.3f}  p99 {3:9.3f}  max {4:9.3f} {5}".format(
+            name, p50 * unit, p90 * unit, p99 * unit, max(values) * unit, unitName))
+
+
+def benchmark(name, filename, wordsPerSecond=None):
+    words = os.path.getsize(filename) // 8
+    decodeTimes, points = decodeLatency(filename)
+    latency, received, elapsed = pipeline(filename, points, wordsPerSecond)
+    print("{0}: {1} words, {2} points, {3:.1f} points/s end to end".format(name, words, received, received / elapsed))
+    report('decode', decodeTimes)
+    for stage in ('transport', 'evaluation', 'replot'):
+        report(stage, latency[stage])
+    report('queue depth', latency['queue depth'], 1, 'points')
+
+
+if __name__ == "__main__":
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    arguments = sys.argv[1:]
+    rate = None
+    if len(arguments) > 1 and arguments[0] == '--rate':
+        rate = float(arguments[1])
+        arguments = arguments[2:]
+    if arguments:
+        for filename in arguments:
+            benchmark(filename, filename, rate)
+    else:
+        directory = tempfile.mkdtemp()
+        for points, shots, channels in [(100, 100, (0, 1)), (100, 1000, (0, 1)), (20, 10000, (0, 1, 2, 3))]:
+            filename = os.path.join(directory, "synthetic_{0}_{1}.bin".format(points, shots))
+            with open(filename, 'wb') as f:
+                f.write(toBytes(syntheticStream(points, shots, channels)))
+            benchmark("synthetic {0} points {1} shots {2} channels".format(points, shots, len(channels)), filename, rate)
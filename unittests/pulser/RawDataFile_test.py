@@ -0,0 +1,97 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from pulser.PulserData import Data, GatedTimestamps
+from pulser.RawDataFile import RawDataWriter, RawDataReader
+from scan.EvaluationMethods import ThresholdEvaluation, MeanEvaluation
+from unittests.scan.EvaluationMethods_test import Evaluation
+
+
+def randomData(index, rand):
+    data = Data()
+    data.scanvalue = index * 0.5
+    data.final = index == 9
+    data.other = [index, 2 ** 60]
+    for channel in range(3):
+        data.count[channel].extend(rand.randint(0, 12) for _ in range(rand.randint(0, 200)))
+    data.analogCount(0x100).extend(rand.random() for _ in range(5))
+    data.timeTick[0].extend(range(1000 * index, 1000 * index + 3))
+    data.result = {2: numpy.array([index, -1], dtype=numpy.int64)}
+    data.timestampZero = {1: numpy.array([7, 9], dtype=numpy.int64)}
+    stamps = GatedTimestamps()
+    for gate in range(2):
+        stamps.newGate()
+        stamps.values.extend(rand.sample(range(1000), 4))
+    data.timestamp = {1: stamps}
+    return data
+
+
+def content(data):
+    arrays = sorted((name, channel, part, numpy.asarray(values).tolist()) for name, channel, part, values in data._recordArrays())
+    return (data.scanvalue, data.final, data.other, data.overrun, data.exitcode, data.dependentValues,
+            data.externalStatus, arrays, [getattr(data, name) is None for name in Data.channelContainers])
+
+
+class RawDataFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "raw.bin")
+        rand = random.Random(0)
+        self.points = [randomData(index, rand) for index in range(10)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, **kwargs):
+        writer = RawDataWriter(self.filename, **kwargs)
+        for data in self.points:
+            writer.record(data)
+        writer.close()
+
+    def test_roundTrip(self):
+        self.write(flushRecords=3)
+        with RawDataReader(self.filename) as reader:
+            self.assertEqual(len(reader), len(self.points))
+            for index in (7, 0, -1, 3):
+                self.assertEqual(content(reader[index]), content(self.points[index]))
+            data = reader[4]
+            self.assertEqual(data.timestamp[1][1].tolist(), list(self.points[4].timestamp[1][1]))
+            self.assertEqual(data.count[0x100].dtype, numpy.float64)
+
+    def test_incompleteRecord(self):
+        self.write()
+        with open(self.filename, 'rb+') as f:
+            f.truncate(os.path.getsize(self.filename) - 5)
+        with RawDataReader(self.filename) as reader:
+            self.assertEqual(len(reader), len(self.points) - 1)
+
+    def test_jsonLines(self):
+        with open(self.filename, 'w') as f:
+            for data in self.points:
+                f.write(data.dataString())
+                f.write('\n')
+        with RawDataReader(self.filename) as reader:
+            self.assertFalse(reader.binary)
+            self.assertEqual(len(reader), len(self.points))
+            data = reader[5]
+            self.assertEqual(data.count[1].tolist(), list(self.points[5].count[1]))
+            self.assertEqual(data.timestamp[1][0].tolist(), list(self.points[5].timestamp[1][0]))
+            self.assertEqual(data.result[2].tolist(), [5, -1])
+
+    def test_evaluate(self):
+        self.write()
+        evalList = [Evaluation('threshold', 0), Evaluation('mean', 2)]
+        algorithms = [ThresholdEvaluation(settings={'threshold': 4}), MeanEvaluation()]
+        with RawDataReader(self.filename) as reader:
+            for data, results in zip(self.points, reader.evaluate(evalList, algorithms)):
+                expected = [algo.evaluate(data, ev) for ev, algo in zip(evalList, algorithms)]
+                self.assertEqual([result.value for result in results], [result.value for result in expected])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import time
+import unittest
+
+import numpy
+
+from pulser.ReplayFrontPanel import ReplayFrontPanel, PipeOutMaxBytes
+from unittests.pulser.DataFifoDecoder_test import Decoder, syntheticStream, dataContent, decode
+
+
+def readPipe(xem, decoder):
+    """one readDataFifo cycle of the PulserHardwareServer, returns the number of bytes read"""
+    xem.UpdateWireOuts()
+    byteswaiting = (xem.GetWireOutValue(0x25) & 0x1ffe) * 2
+    if byteswaiting:
+        data = bytearray(byteswaiting)
+        xem.ReadFromPipeOut(0xa2, data)
+        decoder.decodeData(data)
+    return byteswaiting
+
+
+class ReplayFrontPanelTest(unittest.TestCase):
+    def test_replay(self):
+        words = syntheticStream(points=5, shots=2000, channels=(0, 1))
+        xem = ReplayFrontPanel(numpy.array(words, dtype=numpy.uint64))
+        decoder = Decoder()
+        self.assertEqual(readPipe(xem, decoder), 0)     # nothing before the start trigger
+        xem.ActivateTriggerIn(0x40, 2)
+        reads = list()
+        while xem.position < 8 * len(words):
+            reads.append(readPipe(xem, decoder))
+        self.assertEqual(max(reads), PipeOutMaxBytes)
+        expected = decode(words, [0, 8 * len(words)], True)
+        self.assertEqual([dataContent(item) for item in decoder.dataQueue], [dataContent(item) for item in expected])
+
+    def test_rate(self):
+        words = syntheticStream(points=2, shots=500)
+        xem = ReplayFrontPanel(numpy.array(words, dtype=numpy.uint64), wordsPerSecond=20000)
+        decoder = Decoder()
+        xem.ActivateTriggerIn(0x40, 2)
+        time.sleep(0.02)
+        xem.UpdateWireOuts()
+        self.assertLess(xem.available, 8 * len(words))
+        start = time.time()
+        while xem.position < 8 * len(words) and time.time() - start < 5:
+            readPipe(xem, decoder)
+        self.assertGreater(time.time() - start, 0.5 * len(words) / 20000 - 0.03)
+        self.assertEqual(len(decoder.dataQueue), len(decode(words, [0, 8 * len(words)], True)))
+
+    def test_loop(self):
+        words = syntheticStream(points=1, shots=10)
+        xem = ReplayFrontPanel(numpy.array(words, dtype=numpy.uint64), loop=True)
+        decoder = Decoder()
+        xem.ActivateTriggerIn(0x40, 2)
+        for _ in range(3):
+            readPipe(xem, decoder)
+        self.assertEqual(len(decoder.dataQueue), 3 * len(decode(words, [0, 8 * len(words)], True)))
+
+
+if __name__ == "__main__":
+    unittest.main()
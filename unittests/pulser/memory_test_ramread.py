@@ -9,7 +9,8 @@ import logging
 import struct
 import sys
 
-from pulser.PulserHardwareServer import PulserHardwareServer, sliceview
+from pulser.DataFifoDecoder import sliceview
+from pulser.PulserHardwareServer import PulserHardwareServer
 from pppCompiler.pppCompiler import pppCompileString
 from pulseProgram.PulseProgram import PulseProgram
 from pulser.bitfileHeader import BitfileInfo
@@ -0,0 +1,114 @@
+import pickle
+import random
+import unittest
+from array import array
+
+import numpy
+
+from pygsti_addons.QubitDataSet import QubitDataSet, QubitResult, ResultCounter, compactBuffer, outcomeCounts
+
+
+class TestQubitDataSet(unittest.TestCase):
+    def setUp(self):
+        self.gatestrings = [('Gx',) * n for n in range(1, 21)]
+        rng = random.Random(0)
+        self.points = list()
+        for _ in range(400):
+            gatestring = rng.choice(self.gatestrings)
+            if rng.random() < 0.5:   # every shot with a hardware timestamp
+                shots = rng.randint(1, 30)
+                self.points.append((gatestring, [rng.randint(0, 1) for _ in range(shots)], [1] * shots,
+                                    [rng.randint(0, 2**40) for _ in range(shots)]))
+            else:                    # accumulated counts with the time of the point
+                self.points.append((gatestring, [0, 1], [rng.randint(0, 50), rng.randint(0, 50)], [1.5e9, 1.5e9]))
+
+    def dataSet(self, **kwargs):
+        data = QubitDataSet(gatestring_list=self.gatestrings, plaquettes={}, target_gateset='target', **kwargs)
+        for gatestring, values, repeats, timestamps in self.points:
+            data.extend(gatestring, 'threshold', True, values, repeats, timestamps)
+        return data
+
+    def referenceCounts(self):
+        counts = numpy.zeros((2, len(self.gatestrings)))
+        for gatestring, values, repeats, _ in self.points:
+            for label, count in ResultCounter(values, repeats, force_string=True).items():
+                counts[int(label), self.gatestrings.index(gatestring)] += count
+        return counts
+
+    def test_counts(self):
+        data = self.dataSet()
+        numpy.testing.assert_array_equal(data.countVecMx, self.referenceCounts())
+        numpy.testing.assert_array_equal(data.totalCntVec, self.referenceCounts().sum(axis=0))
+        with self.assertRaises(ValueError):
+            data.extend(self.gatestrings[0], 'threshold', True, [2], [1], [0])
+        numpy.testing.assert_array_equal(data.countVecMx, self.referenceCounts())
+
+    def test_changedSince(self):
+        data = self.dataSet()
+        changed, revision = data.changedSince(-1)
+        self.assertEqual(changed.tolist(), list(range(len(self.gatestrings))))
+        self.assertEqual(data.changedSince(revision)[0].tolist(), [])
+        data.extend(self.gatestrings[5], 'threshold', True, [1], [1], [0])
+        data.extend(self.gatestrings[2], 'threshold', False, [1], [1], [0])
+        data.extend(self.gatestrings[7], 'threshold', True, [0], [1], [0])
+        changed, current = data.changedSince(revision)
+        self.assertEqual((changed.tolist(), current), ([5, 7], revision + 2))
+
+    def test_buffers(self):
+        data = self.dataSet()
+        point = data.data[self.points[0][0]]
+        self.assertEqual(point['value'].typecode, 'b')
+        self.assertEqual(list(point['value']), [v for g, values, _, _ in self.points if g == self.points[0][0] for v in values])
+        self.assertIsInstance(point['timestamps'], list)   # hardware and computer timestamps are kept apart by type
+        self.assertEqual(compactBuffer([1.5, 2.0]).typecode, 'd')
+        self.assertEqual(compactBuffer([300, 1]).typecode, 'h')
+        self.assertEqual(compactBuffer([1, 2**40]).typecode, 'q')
+        self.assertEqual(compactBuffer([1, 2.5]), [1, 2.5])
+        result = QubitResult()
+        result.extendBuffer('value', [1, 2])
+        result.extendBuffer('value', [70000])
+        result.extendBuffer('value', [3])
+        self.assertEqual(result['value'], array('i', [1, 2, 70000, 3]))
+
+    def test_pickle(self):
+        data = self.dataSet()
+        state = pickle.dumps(data)
+        restored = pickle.loads(state)
+        self.assertEqual(restored, data)
+        numpy.testing.assert_array_equal(restored.countVecMx, data.countVecMx)
+        listState = data.__getstate__()
+        listState['_rawdata'] = {g: {k: list(v) for k, v in p.items()} for g, p in data.data.items()}
+        self.assertLess(len(state), len(pickle.dumps(listState)))
+        fromLists = QubitDataSet()
+        fromLists.__setstate__(listState)   # data saved with lists
+        self.assertEqual(fromLists.data[self.points[0][0]]['value'].typecode, 'b')
+        numpy.testing.assert_array_equal(fromLists.countVecMx, data.countVecMx)
+
+    def test_countsOnly(self):
+        data = self.dataSet(rawShots=False)
+        numpy.testing.assert_array_equal(data.countVecMx, self.referenceCounts())
+        self.assertEqual(len(data.data[self.points[0][0]]), 0)
+        restored = pickle.loads(pickle.dumps(data))
+        numpy.testing.assert_array_equal(restored.countVecMx, self.referenceCounts())
+        self.assertFalse(restored.rawShots)
+
+    def test_gst_dataset(self):
+        reference = self.referenceCounts()
+        for data in (self.dataSet(), self.dataSet(rawShots=False)):
+            ds = data.gst_dataset
+            for index, gatestring in enumerate(self.gatestrings):
+                if gatestring in data.data:
+                    self.assertEqual([ds[gatestring]['0'], ds[gatestring]['1']], reference[:, index].tolist())
+
+    def test_outcomeCounts(self):
+        self.assertEqual(outcomeCounts([0, 1, 1], [2, 3, 4], ['0', '1']).tolist(), [2, 7])
+        self.assertEqual(outcomeCounts(['1', '0'], [2, 3], ['0', '1']).tolist(), [3, 2])
+        self.assertEqual(outcomeCounts(numpy.array([1, 1]), [0.5, 0.25], ['0', '1']).tolist(), [0, 0.75])
+        with self.assertRaises(ValueError):
+            outcomeCounts([0, -1], [1, 1], ['0', '1'])
+        with self.assertRaises(ValueError):
+            outcomeCounts([1.0], [1], ['0', '1'])
+
+
+if __name__ == "__main__":
+    unittest.main()
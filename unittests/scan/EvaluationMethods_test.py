@@ -0,0 +1,127 @@
+import math
+import random
+import unittest
+
+from pulser.PulserData import Data
+from scan.EvaluationMethods import ThresholdEvaluation, RangeEvaluation, DoubleRangeEvaluation, FidelityEvaluation, \
+    ParityEvaluation, TwoIonEvaluation, ThreeIonEvaluation, FourIonEvaluation, CounterSumThresholdEvaluation
+
+
+class Evaluation(object):
+    """counter evaluation definition as used by the scan"""
+    def __init__(self, name, counter):
+        self.name = name
+        self.type = 'Counter'
+        self.counter = counter
+        self.counterId = 0
+
+    @property
+    def channelKey(self):
+        return ((self.counterId & 0xff) << 8) | (self.counter & 0xff)
+
+    def getChannelData(self, data):
+        return data.count[self.channelKey]
+
+
+def wilson(x, N, expected=None):
+    """reference implementation of the Wilson score interval"""
+    p = x/N
+    rootp = 3-1/N -4*p+4*N*(1-p)*p
+    top = min( 1, (2 + 2*N*p + math.sqrt(rootp))/(2*(N+1)) ) if rootp>=0 else 1
+    rootb = -1-1/N +4*p+4*N*(1-p)*p
+    bottom = max( 0, (2*N*p - math.sqrt(rootb))/(2*(N+1)) ) if rootb>=0 else 0
+    if expected is not None:
+        p = abs(expected-p)
+        bottom = abs(expected-bottom)
+        top = abs(expected-top)
+    return p, (p-bottom, top-p), x
+
+
+def randomData(shots=1000, channels=4, seed=0):
+    rand = random.Random(seed)
+    data = Data()
+    for channel in range(channels):
+        data.count[channel].extend(rand.randint(0, 12) for _ in range(shots))
+    return data
+
+
+class EvaluationMethodsTest(unittest.TestCase):
+    def assertResult(self, result, expected):
+        value, (low, high), raw = expected
+        self.assertAlmostEqual(result.value, value)
+        self.assertAlmostEqual(result.interval[0], low)
+        self.assertAlmostEqual(result.interval[1], high)
+        self.assertEqual(result.raw, raw)
+
+    def threshold(self, data, name, counter, threshold=4):
+        algorithm = ThresholdEvaluation(settings={'threshold': threshold})
+        result = algorithm.evaluate(data, Evaluation(name, counter))
+        reference = [1 if count > threshold else 0 for count in data.count[counter]]
+        self.assertResult(result, wilson(sum(reference), float(len(reference))))
+        self.assertEqual(list(data.evaluated[name]), reference)
+        return reference
+
+    def test_threshold(self):
+        data = randomData()
+        for counter in range(4):
+            self.threshold(data, 'ion{0}'.format(counter), counter)
+
+    def test_sharedDiscrimination(self):
+        data = randomData()
+        self.threshold(data, 'a', 0)
+        self.threshold(data, 'b', 0)
+        self.assertIs(data.evaluated['a'], data.evaluated['b'])
+        self.threshold(data, 'c', 0, threshold=5)
+        self.assertIsNot(data.evaluated['a'], data.evaluated['c'])
+
+    def test_invertAndFidelity(self):
+        data = randomData()
+        counts = list(data.count[1])
+        result = ThresholdEvaluation(settings={'threshold': 3, 'invert': True}).evaluate(data, Evaluation('t', 1))
+        reference = [0 if count > 3 else 1 for count in counts]
+        self.assertResult(result, wilson(sum(reference), float(len(counts))))
+        result = FidelityEvaluation(settings={'threshold': 3}).evaluate(data, Evaluation('f', 1), expected='u')
+        reference = [1 if count > 3 else 0 for count in counts]
+        self.assertResult(result, wilson(sum(reference), float(len(counts)), expected=1))
+
+    def test_ranges(self):
+        data = randomData()
+        counts = list(data.count[2])
+        result = RangeEvaluation(settings={'min': 2, 'max': 5}).evaluate(data, Evaluation('r', 2))
+        self.assertResult(result, wilson(sum(1 for c in counts if 2 <= c <= 5), float(len(counts))))
+        result = DoubleRangeEvaluation(settings={'min_1': 0, 'max_1': 1, 'min_2': 8, 'max_2': 9, 'invert': True}).evaluate(data, Evaluation('d', 2))
+        self.assertResult(result, wilson(sum(0 if 0 <= c <= 1 or 8 <= c <= 9 else 1 for c in counts), float(len(counts))))
+
+    def test_multiIon(self):
+        data = randomData()
+        ions = [self.threshold(data, 'ion{0}'.format(counter), counter) for counter in range(4)]
+        N = float(len(ions[0]))
+        result = ParityEvaluation(settings={'Ion_1': 'ion0', 'Ion_2': 'ion1'}).evaluate(data, Evaluation('parity', 0))
+        self.assertResult(result, wilson(sum(1 if a == b else -1 for a, b in zip(ions[0], ions[1])), N))
+        coefficients = {'dd': 1, 'db': -1, 'bd': 0.5, 'bb': 2}
+        settings = dict(coefficients, Ion_1='ion0', Ion_2='ion1')
+        result = TwoIonEvaluation(settings=settings).evaluate(data, Evaluation('two', 0))
+        lookup = {(0, 0): 1, (0, 1): -1, (1, 0): 0.5, (1, 1): 2}
+        self.assertResult(result, wilson(float(sum(lookup[pair] for pair in zip(ions[0], ions[1]))), N))
+        settings = {'Ion_1': 'ion0', 'Ion_2': 'ion1', 'Ion_3': 'ion2', '---': 1, '--o': 2, '-o-': 3, 'o--': 4,
+                    'oo-': 5, 'o-o': 6, '-oo': 7, 'ooo': 8}
+        result = ThreeIonEvaluation(settings=settings).evaluate(data, Evaluation('three', 0))
+        key = lambda trio: ''.join('o' if ion else '-' for ion in trio)
+        self.assertResult(result, wilson(float(sum(settings[key(trio)] for trio in zip(*ions[:3]))), N))
+        algorithm = FourIonEvaluation(settings={'Ion_1': 'ion0', 'Ion_2': 'ion1', 'Ion_3': 'ion2', 'Ion_4': 'ion3'})
+        for index, state in enumerate(sorted(algorithm.states)):
+            algorithm.settings[state] = index
+        result = algorithm.evaluate(data, Evaluation('four', 0))
+        self.assertResult(result, wilson(float(sum(algorithm.settings[key(quartet)] for quartet in zip(*ions))), N))
+
+    def test_counterSum(self):
+        data = randomData()
+        data.count[3].pop()
+        algorithm = CounterSumThresholdEvaluation(settings={'threshold': 10, 'counters': ['1', '3']})
+        result = algorithm.evaluate(data, Evaluation('sum', 0))
+        sums = [a + b for a, b in zip(data.count[1], data.count[3])]
+        self.assertResult(result, wilson(sum(1 if s > 10 else 0 for s in sums), float(len(sums))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+import unittest
+
+from PyQt5.QtCore import QCoreApplication
+
+from scan.EvaluationWorker import EvaluationWorker
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def slowSquare(value, delay):
+    time.sleep(delay)
+    return value * value
+
+
+class EvaluationWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.worker = EvaluationWorker(maxWorkers=4)
+        self.delivered = list()
+
+    def tearDown(self):
+        self.worker.shutdown()
+
+    def submit(self, value, delay=0, threaded=True):
+        self.worker.submit(lambda: slowSquare(value, delay), lambda result: self.delivered.append((value, result)),
+                           threaded=threaded)
+
+    def processEvents(self, timeout=5):
+        start = time.time()
+        while self.worker.busy and time.time() - start < timeout:
+            app.processEvents()
+            time.sleep(0.001)
+
+    def test_order(self):
+        rand = random.Random(0)
+        for value in range(20):
+            self.submit(value, rand.uniform(0, 0.01))
+        self.processEvents()
+        self.assertEqual(self.delivered, [(value, value * value) for value in range(20)])
+
+    def test_unthreadedWaitsForEarlierPoints(self):
+        self.submit(1, 0.02)
+        self.submit(2, threaded=False)
+        self.assertEqual(self.delivered, [])
+        self.processEvents()
+        self.assertEqual(self.delivered, [(1, 1), (2, 4)])
+        self.submit(3, threaded=False)
+        self.assertEqual(self.delivered[-1], (3, 9))
+
+    def test_flush(self):
+        for value in range(5):
+            self.submit(value, 0.005)
+        self.worker.flush()
+        self.assertFalse(self.worker.busy)
+        self.assertEqual([value for value, _ in self.delivered], list(range(5)))
+
+    def test_failedPointIsSkipped(self):
+        self.worker.submit(lambda: 1 / 0, self.delivered.append)
+        self.submit(2)
+        self.worker.flush()
+        self.assertEqual(self.delivered, [(2, 4)])
+
+    def test_failedUnthreadedPointIsSkipped(self):
+        finalized = list()
+        self.worker.submit(lambda: 1 / 0, self.delivered.append, threaded=False, finalize=lambda: finalized.append(1))
+        self.assertEqual((self.delivered, finalized), ([], [1]))
+
+    def test_finalize(self):
+        finalized = list()
+        self.worker.submit(lambda: 1 / 0, self.delivered.append, finalize=lambda: finalized.append(1))
+        self.worker.submit(lambda: 2, self.delivered.append, finalize=lambda: finalized.append(2))
+        self.worker.submit(lambda: 3, self.delivered.append, threaded=False, finalize=lambda: finalized.append(3))
+        self.worker.flush()
+        self.worker.submit(lambda: slowSquare(4, 0.01), self.delivered.append, finalize=lambda: finalized.append(4))
+        self.worker.clear()
+        self.assertEqual(self.delivered, [2, 3])
+        self.assertEqual(finalized, [1, 2, 3, 4])
+
+    def test_clearFinalizesRunningPointWhenDone(self):
+        events = list()
+        started = threading.Event()
+
+        def evaluate():
+            started.set()
+            time.sleep(0.02)
+            events.append('evaluated')
+
+        self.worker.submit(evaluate, self.delivered.append, finalize=lambda: events.append('finalized'))
+        started.wait()
+        self.worker.clear()
+        self.assertEqual(events, ['evaluated', 'finalized'])
+        self.assertEqual(self.delivered, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
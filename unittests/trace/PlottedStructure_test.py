@@ -0,0 +1,119 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy
+
+from gateSequence.loglikelyhood import logl_terms, logl_max_terms
+from modules.SQLiteLRUCache import SQLiteLRUCache
+from pygsti_addons.QubitDataSet import QubitDataSet
+from trace.PlottedStructure import PlottedStructure
+
+
+class GateSet(dict):
+    """stand-in for a pygsti gate set predicting fixed probabilities that depend on the depolarization"""
+    fills = 0
+
+    def __init__(self, gate_noise=0.):
+        super().__init__()
+        self.gate_noise = gate_noise
+
+    @property
+    def povms(self):
+        return self
+
+    def depolarize(self, gate_noise):
+        return GateSet(gate_noise)
+
+    def bulk_evaltree(self, gatestring_list):
+        return list(range(len(gatestring_list))), None, None
+
+    def bulk_fill_probs(self, probs, evalTree, clipTo):
+        GateSet.fills += 1
+        p = numpy.array([0.5 + 0.4 * numpy.cos(len(s) * (1 + self.gate_noise)) for s in self.gatestrings])
+        probs[:] = [p, 1 - p]
+
+    def to_vector(self):
+        return numpy.array([self.gate_noise])
+
+    def __str__(self):
+        return "GateSet"
+
+
+class TraceCollection(object):
+    def __init__(self, qubitData):
+        self.structuredData = {'qubitData': qubitData}
+
+    def addPlotting(self, plotting):
+        pass
+
+
+class PlottedStructureTest(unittest.TestCase):
+    def setUp(self):
+        povm = mock.patch('trace.PlottedStructure.POVM', dict)   # the spam labels do not depend on the pygsti build
+        povm.start()
+        self.addCleanup(povm.stop)
+        self.directory = tempfile.mkdtemp()
+        self.evaltree_cache = PlottedStructure._evaltree_cache
+        PlottedStructure._evaltree_cache = SQLiteLRUCache(64, os.path.join(self.directory, 'evaltree.db'))
+        PlottedStructure._probs_cache.clear()
+        self.gatestrings = [('Gx',) * n + ('Gy',) * m for n in range(5) for m in range(4)]
+        GateSet.gatestrings = self.gatestrings
+        plaquettes = {(length, 'Gx'): [(row, column, self.gatestrings[4 * length + row * 2 + column])
+                                        for row in range(2) for column in range(2)] for length in range(5)}
+        self.qubitData = QubitDataSet(gatestring_list=self.gatestrings, plaquettes=plaquettes, target_gateset=GateSet())
+        self.rng = random.Random(0)
+        self.addData(30)
+
+    def tearDown(self):
+        PlottedStructure._evaltree_cache.close()
+        PlottedStructure._evaltree_cache = self.evaltree_cache
+        shutil.rmtree(self.directory)
+
+    def addData(self, points):
+        for _ in range(points):
+            gatestring = self.rng.choice(self.gatestrings)
+            self.qubitData.extend(gatestring, 'threshold', True, [0, 1], [self.rng.randint(0, 20), self.rng.randint(0, 20)], [0, 0])
+
+    def reference(self, plotted):
+        l = logl_terms(gatestring_list=self.gatestrings, lookup=None, countVecMx=self.qubitData.countVecMx,
+                       totalCntVec=self.qubitData.totalCntVec, probs=plotted._probs)
+        l_max = logl_max_terms(gatestring_list=self.gatestrings, countVecMx=self.qubitData.countVecMx,
+                               totalCntVec=self.qubitData.totalCntVec, lookup=None)
+        return numpy.sum(2 * (l_max - l), axis=0)
+
+    def test_incremental(self):
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            plotted = PlottedStructure(TraceCollection(self.qubitData), 'qubitData')
+            self.assertIsNone(plotted._assemble_data())
+            numpy.testing.assert_array_equal(plotted._log_likelihood, self.reference(plotted))
+            self.assertEqual(plotted._assemble_data(), [])
+            gatestring = plotted._plot_s[3]
+            self.qubitData.extend(gatestring, 'threshold', True, [1], [5], [0])
+            self.assertEqual(plotted._assemble_data(), [3])
+            self.addData(10)
+            plotted._assemble_data()
+            numpy.testing.assert_array_equal(plotted._log_likelihood, self.reference(plotted))
+            self.assertEqual(plotted._y, [plotted._log_likelihood[i] for i in plotted._plot_s_idx])
+
+    def test_gateSetChange(self):
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            plotted = PlottedStructure(TraceCollection(self.qubitData), 'qubitData')
+            plotted._assemble_data()
+            fills = GateSet.fills
+            plotted.properties.gate_noise = 0.1
+            plotted.updateGateSet()
+            self.assertIsNone(plotted._assemble_data())
+            numpy.testing.assert_array_equal(plotted._log_likelihood, self.reference(plotted))
+            plotted.properties.gate_noise = 0.
+            plotted.updateGateSet()   # the probabilities of this gate set are cached
+            self.assertIsNone(plotted._assemble_data())
+            numpy.testing.assert_array_equal(plotted._log_likelihood, self.reference(plotted))
+            self.assertEqual(GateSet.fills, fills + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
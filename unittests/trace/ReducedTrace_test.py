@@ -0,0 +1,92 @@
+import random
+import unittest
+from collections import defaultdict
+
+import numpy
+
+from trace.ReducedTrace import ReducedTrace
+from trace.TraceColumn import TraceColumn
+
+
+def reducedReference(x, y, averageSameX, combinePoints):
+    """plot data as calculated from scratch"""
+    if averageSameX:
+        values = defaultdict(list)
+        for thisx, thisy in zip(x, y):
+            values[thisx].append(thisy)
+        pairs = [(thisx, numpy.mean(thisy)) for thisx, thisy in sorted(values.items())]
+    else:
+        pairs = sorted(zip(x, y), key=lambda pair: pair[0])
+    if combinePoints:
+        extra = len(pairs) % combinePoints
+        if extra > 0:
+            pairs.extend([(float('NaN'), float('NaN'))] * (combinePoints - extra))
+        plotx, ploty = numpy.reshape(numpy.array(pairs).transpose(), (2, -1, combinePoints))
+        return numpy.nanmean(plotx, axis=1), numpy.nanmean(ploty, axis=1)
+    return numpy.array(pairs).transpose()
+
+
+class ReducedTraceTest(unittest.TestCase):
+    def test_reducedTrace(self):
+        rand = random.Random(2)
+        trace = {'x': TraceColumn(), 'y': TraceColumn()}
+        reduced = ReducedTrace(trace, xColumn='x', yColumn='y')
+        x, y = reduced.plotData
+        self.assertEqual(len(x), 0)
+        for _ in range(100):
+            trace['x'].append(rand.randint(0, 30))
+            trace['y'].append(rand.random())
+            x, y = reduced.plotData
+        expected = sorted(zip(trace['x'], trace['y']), key=lambda pair: pair[0])
+        self.assertEqual(list(zip(x.tolist(), y.tolist())), expected)
+        reduced.update(combinePoints=3)
+        x, y = reduced.plotData
+        self.assertEqual(len(x), 34)
+        self.assertAlmostEqual(y[0], numpy.mean([pair[1] for pair in expected[:3]]))
+        self.assertAlmostEqual(y[-1], expected[-1][1])
+
+    def test_incrementalReduction(self):
+        rand = random.Random(3)
+        xValues = {'ascending': lambda i: i, 'random': lambda i: rand.randint(0, 40), 'repeating': lambda i: i % 11}
+        for averageSameX in (False, True):
+            for combinePoints in (0, 1, 4):
+                for name, xValue in xValues.items():
+                    trace = {'x': TraceColumn(), 'y': TraceColumn()}
+                    reduced = ReducedTrace(trace, averageSameX, combinePoints, xColumn='x', yColumn='y')
+                    for index in range(120):
+                        for _ in range(rand.choice((1, 1, 3))):
+                            trace['x'].append(xValue(index))
+                            trace['y'].append(rand.random())
+                        x, y = reduced.plotData
+                        if index % 10 == 9:
+                            expectedX, expectedY = reducedReference(trace['x'], trace['y'], averageSameX, combinePoints)
+                            numpy.testing.assert_allclose(x, expectedX, err_msg=name)
+                            numpy.testing.assert_allclose(y, expectedY, err_msg=name)
+
+    def test_replacedColumns(self):
+        trace = {'x': TraceColumn(range(10)), 'y': TraceColumn(range(10))}
+        reduced = ReducedTrace(trace, True, 3, xColumn='x', yColumn='y')
+        reduced.plotData
+        trace['x'], trace['y'] = trace['x'][-4:], trace['y'][-4:]
+        trace['x'].append(3)
+        trace['y'].append(5)
+        x, y = reduced.plotData
+        numpy.testing.assert_allclose(x, [16 / 3, 8.5])
+        numpy.testing.assert_allclose(y, [6, 8.5])
+
+
+    def test_editedInPlace(self):
+        for averageSameX, combinePoints in ((True, 0), (False, 2), (True, 2)):
+            trace = {'x': TraceColumn(range(6)), 'y': TraceColumn(range(6))}
+            reduced = ReducedTrace(trace, averageSameX, combinePoints, xColumn='x', yColumn='y')
+            reduced.plotData
+            trace['y'][1] = 10
+            trace['x'][4] = 0
+            x, y = reduced.plotData
+            expectedX, expectedY = reducedReference(trace['x'], trace['y'], averageSameX, combinePoints)
+            numpy.testing.assert_allclose(x, expectedX)
+            numpy.testing.assert_allclose(y, expectedY)
+
+
+if __name__ == "__main__":
+    unittest.main()
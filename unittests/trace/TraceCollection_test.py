@@ -1,6 +1,13 @@
+import os
+import shutil
+import tempfile
 import unittest
 
+import h5py
+import numpy
+
 from trace.TraceCollection import TraceCollection
+from trace.TraceColumn import Hdf5Column
 
 
 class TraceCollection_test(unittest.TestCase):
@@ -12,6 +19,54 @@ class TraceCollection_test(unittest.TestCase):
         tc.save('text')
 
 
+class Hdf5Test(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'trace.hdf5')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fileColumns(self):
+        with h5py.File(self.filename, 'r') as f:
+            return {name: dataset[()].tolist() for name, dataset in f['columns'].items()}
+
+    def test_appendSave(self):
+        tc = TraceCollection()
+        tc.hdf5ChunkSize = 4
+        tc.saveHdf5(self.filename)
+        for index in range(10):
+            tc.x.append(index)
+            tc.y.append(index * 0.5)
+            tc.appendSave()
+        self.assertEqual(self.fileColumns(), {'x': list(range(8)), 'y': [i * 0.5 for i in range(8)]})
+        with h5py.File(self.filename, 'r') as f:
+            self.assertEqual(f['columns/x'].chunks, (4,))
+            self.assertEqual(f['columns/x'].maxshape, (None,))
+        tc.y[0] = 7
+        tc.x = tc.x[2:]
+        tc.saveHdf5(self.filename)
+        self.assertEqual(self.fileColumns(), {'x': list(range(2, 10)), 'y': [7] + [i * 0.5 for i in range(1, 10)]})
+
+    def test_lazyLoad(self):
+        tc = TraceCollection()
+        tc.x.extend(range(1000))
+        tc.y.extend(numpy.arange(1000) ** 2)
+        tc.saveHdf5(self.filename)
+        loaded = TraceCollection()
+        loaded.loadTraceHdf5(self.filename)
+        self.assertIsInstance(loaded.x, Hdf5Column)
+        self.assertEqual(len(loaded.y), 1000)
+        self.assertEqual(loaded.y[10], 100)
+        self.assertEqual(loaded.y[-1], 999 ** 2)
+        self.assertEqual(loaded.x[5:8].tolist(), [5, 6, 7])
+        self.assertFalse(loaded.x.loaded)
+        numpy.testing.assert_array_equal(numpy.asarray(loaded.y), numpy.arange(1000) ** 2)
+        self.assertTrue(loaded.y.loaded)
+        loaded.x.append(1000)
+        loaded.y.append(1000 ** 2)
+        loaded.saveHdf5(self.filename)
+        self.assertEqual(self.fileColumns()['x'], list(range(1001)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+import copy
+import pickle
+import random
+import unittest
+
+import numpy
+
+from trace.TraceColumn import TraceColumn
+from trace.sortlists import sort_arrays_by, sort_lists_by
+
+
+class TraceColumnTest(unittest.TestCase):
+    def test_listInterface(self):
+        column = TraceColumn()
+        reference = list()
+        for value in [3, 1.5, None, 7, -2]:
+            column.append(value)
+            reference.append(float('nan') if value is None else value)
+        column.extend([4, 5])
+        reference.extend([4, 5])
+        self.assertEqual(len(column), 7)
+        numpy.testing.assert_array_equal(numpy.asarray(column), reference)
+        self.assertEqual(column[0], 3.0)
+        self.assertEqual(column[-1], 5.0)
+        self.assertEqual(column[3:5].tolist(), [7, -2])
+        column[1] = 10
+        self.assertEqual(list(column)[:2], [3, 10])
+        self.assertEqual(pickle.loads(pickle.dumps(column)).tolist()[3:], column.tolist()[3:])
+        self.assertEqual(copy.deepcopy(column)[6], 5)
+
+    def test_dtype(self):
+        column = TraceColumn(range(5))
+        self.assertEqual(column.dtype, numpy.int64)
+        column.append(0.5)
+        self.assertEqual(column.dtype, numpy.float64)
+        column.append('text')
+        self.assertEqual(column[-1], 'text')
+        self.assertEqual(column[0], 0)
+
+    def test_growth(self):
+        column = TraceColumn()
+        for value in range(10000):
+            column.append(value)
+        self.assertTrue(numpy.array_equal(column.array, numpy.arange(10000)))
+        self.assertTrue(column.isSorted)
+
+    def test_sortOrder(self):
+        rand = random.Random(0)
+        column = TraceColumn()
+        values = list()
+        for index in range(2000):
+            value = rand.choice([rand.random(), rand.randint(0, 20) / 2])
+            column.append(value)
+            values.append(value)
+            if index % 17 == 0:
+                self.assertEqual([values[i] for i in column.sortOrder()], sorted(values))
+        self.assertFalse(column.isSorted)
+        column[0] = 100
+        values[0] = 100
+        self.assertEqual([values[i] for i in column.sortOrder()], sorted(values))
+
+    def test_isSortedDoesNotMerge(self):
+        column = TraceColumn([1, 3, 2])
+        self.assertFalse(column.isSorted)
+        column.append(5)
+        self.assertFalse(column.isSorted)
+        self.assertEqual(column._sortedLength, 0)     # the order is only built when it is requested
+        self.assertEqual(column.sortOrder().tolist(), [0, 2, 1, 3])
+        del column[2:]
+        column.extend([4, 0])
+        self.assertFalse(column.isSorted)
+        self.assertEqual(column.sortOrder().tolist(), [3, 0, 1, 2])
+        del column[1:]
+        column.extend([2, 2])
+        self.assertTrue(column.isSorted)
+        self.assertEqual(column.sortOrder().tolist(), [0, 1, 2])
+
+    def test_sortArraysBy(self):
+        rand = random.Random(1)
+        x = [rand.randint(0, 50) for _ in range(300)]
+        y = list(range(300))
+        expected = [list(column) for column in sort_lists_by((x, y), key_list=0)]
+        for key in (x, TraceColumn(x)):
+            sortedX, sortedY = sort_arrays_by((key, y))
+            self.assertEqual(sortedX.tolist(), expected[0])
+            self.assertEqual(sortedY.tolist(), expected[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
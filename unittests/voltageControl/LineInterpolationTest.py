@@ -0,0 +1,65 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+import math
+import unittest
+
+import numpy
+
+from voltageControl.LineInterpolation import stackLines, interpolate, evaluate, adjustOffsets, adjustOffset
+from voltageControl.ShuttlingDefinition import ShuttleEdge
+
+
+def blendLine(lines, lineno):
+    left = int(math.floor(lineno))
+    right = int(math.ceil(lineno))
+    convexc = lineno-left
+    return lines[left]*(1-convexc) + lines[right]*convexc
+
+
+class LineInterpolationTest(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.RandomState(0)
+        self.lines = [rng.uniform(-10, 10, 24) for _ in range(21)]
+        self.adjustLines = [rng.uniform(-1, 1, 24) for _ in range(3)]
+        self.funcs = [lambda lineno: 0.5, lambda lineno: lineno/20.0, lambda lineno: math.sin(lineno)]
+
+    def testInterpolate(self):
+        linenos = list(numpy.linspace(0.15, 19.15, 58)) + [19.5, 20.0]
+        result = interpolate(stackLines(self.lines), linenos)
+        self.assertEqual(result.shape, (len(linenos), 24))
+        for row, lineno in zip(result, linenos):
+            numpy.testing.assert_array_equal(row, blendLine(self.lines, lineno))
+
+    def testInverseEdge(self):
+        edge = ShuttleEdge(startLine=20, stopLine=0)
+        edge.steps = 1
+        linenos = list(edge.iLines())
+        numpy.testing.assert_array_equal(interpolate(stackLines(self.lines), linenos), numpy.array(self.lines[::-1]))
+
+    def testAdjustOffsets(self):
+        linenos = numpy.linspace(0, 20, 57)
+        values = evaluate(self.funcs, linenos)
+        offsets = adjustOffsets(stackLines(self.adjustLines), values)
+        for row, lineno in zip(offsets, linenos):
+            expected = sum(line*float(func(lineno)) for line, func in zip(self.adjustLines, self.funcs))
+            numpy.testing.assert_allclose(row, expected, rtol=1e-12, atol=1e-12)
+
+    def testEmpty(self):
+        self.assertEqual(stackLines([], 24).shape, (0, 24))
+        numpy.testing.assert_array_equal(adjustOffsets(stackLines([], 24), evaluate([], [0.5])), numpy.zeros((1, 24)))
+
+    def testAdjustOffsetWithoutAdjusts(self):
+        # before a global adjust file is loaded the adjust lines are stacked without any channels
+        lineData = [0.5] * 24
+        offset = adjustOffset(stackLines([])[numpy.array([], dtype=int)], [], len(lineData))
+        numpy.testing.assert_array_equal(lineData + offset, numpy.full(24, 0.5))
+        adjustLines = stackLines(self.adjustLines)
+        numpy.testing.assert_array_equal(adjustOffset(adjustLines[[1, 0]], [2.0, 3.0], len(self.adjustLines[0])),
+                                         2.0 * numpy.array(self.adjustLines[1]) + 3.0 * numpy.array(self.adjustLines[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
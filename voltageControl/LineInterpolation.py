@@ -0,0 +1,50 @@
+# *****************************************************************
+# IonControl:  Copyright 2016 Sandia Corporation
+# This Software is released under the GPL license detailed
+# in the file "license.txt" in the top-level IonControl directory
+# *****************************************************************
+"""
+Interpolation of voltage solutions for many line numbers at once.
+
+A solution is a 2d array with one row of electrode voltages per line. A fractional line number is the convex
+combination of the two neighbouring rows. All line numbers of a shuttling edge are interpolated with one gather,
+the global adjusts are added as one matrix product of the per line adjust values with the adjust lines.
+"""
+import numpy
+
+
+def stackLines(lines, channelCount=0):
+    """stack a list of lines into a 2d array, an empty list gives an array without rows"""
+    if len(lines) == 0:
+        return numpy.zeros((0, channelCount))
+    return numpy.array(lines, dtype=float)
+
+
+def interpolate(lines, linenos):
+    """rows of lines interpolated at the fractional line numbers linenos"""
+    linenos = numpy.asarray(linenos, dtype=float)
+    left = numpy.floor(linenos).astype(int)
+    right = numpy.ceil(linenos).astype(int)
+    convexc = (linenos - left)[:, numpy.newaxis]
+    return lines[left]*(1-convexc) + lines[right]*convexc
+
+
+def evaluate(funcs, linenos):
+    """matrix of the values of each function (columns) at every line number (rows)"""
+    linenos = [float(lineno) for lineno in linenos]
+    values = numpy.zeros((len(linenos), len(funcs)))
+    for column, func in enumerate(funcs):
+        values[:, column] = [float(func(lineno)) for lineno in linenos]
+    return values
+
+
+def adjustOffsets(adjustLines, values):
+    """sum of the adjust lines weighted with values, one row of values per output line"""
+    return numpy.dot(values, adjustLines)
+
+
+def adjustOffset(adjustLines, values, channelCount):
+    """sum of the adjust lines weighted with values for a single line of channelCount voltages, zeros without adjusts"""
+    if len(values) == 0:
+        return numpy.zeros(channelCount)
+    return adjustOffsets(adjustLines, values)
@@ -17,6 +17,7 @@ from modules.SequenceDict import SequenceDict
 from modules.doProfile import doprofile
 from modules.quantity import value
 from .AdjustValue import AdjustValue
+from .LineInterpolation import stackLines, interpolate, evaluate, adjustOffsets, adjustOffset
 from ProjectConfig.Project import getProject
 from uiModules.ImportErrorPopup import importErrorPopup
 from Chassis.itfParser import itfParser
@@ -168,8 +169,10 @@ class VoltageBlender(QtCore.QObject):
 
         self.itf = itfParser()
         self.lines = list()  # a list of lines with numpy arrays
+        self.lineArray = stackLines(self.lines)  # the same lines stacked in a 2d array
         self.adjustDict = SequenceDict()  # names of the lines presented as possible adjusts
         self.adjustLines = []
+        self.adjustArray = stackLines(self.adjustLines)
         self.lineGain = 1.0
         self.globalGain = 1.0
         self.lineno = 0
@@ -204,6 +207,7 @@ class VoltageBlender(QtCore.QObject):
                 if math.isnan(value): line[index]=0
             line = numpy.append( line, [0.0]*max(0, channelCount-len(line)))
             self.lines.append( line )
+        self.lineArray = stackLines(self.lines, channelCount)
         self.tableHeader = self.itf.tableHeader
         self.itf.close()
         self.dataChanged.emit(0, 0, len(self.electrodes)-1, 3)
@@ -221,6 +225,7 @@ class VoltageBlender(QtCore.QObject):
                 if math.isnan(value): line[index]=0
             line = numpy.append( line, [0.0]*max(0, channelCount-len(line)))
             self.adjustLines.append( line )
+        self.adjustArray = stackLines(self.adjustLines, channelCount)
         for name, value in itf.meta.items():
             try:
                 if int(value)<len(self.adjustLines):
@@ -281,16 +286,22 @@ class VoltageBlender(QtCore.QObject):
             self.lineno = lineno
             
     def calculateLine(self, lineno, lineGain, globalGain):
-        line = self.blendLines(lineno, lineGain)
-        localadjustline = self.blendLocalAdjustLines(lineno)
+        return self.calculateLines([lineno], lineGain, globalGain)[0]
+
+    def calculateLines(self, linenos, lineGain, globalGain):
+        """return the adjusted voltages of all lines linenos as rows of a 2d array"""
         self.lineGain = lineGain
         self.globalGain = globalGain
-        #self.lineno = lineno
-        line = self.adjustLine(line, lineno)
-        if len(localadjustline) > 0:
-            line = numpy.add( line, localadjustline )
-        line *= self.globalGain
-        return line
+        lines = interpolate(self.lineArray, linenos)*lineGain
+        adjusts = list(self.adjustDict.values())
+        if adjusts:
+            values = evaluate([adjust.func for adjust in adjusts], linenos)
+            lines += adjustOffsets(self.adjustArray[[adjust.line for adjust in adjusts]], values)*self.adjustGain
+        localadjustlines = self.blendLocalAdjustLines(linenos)
+        if localadjustlines is not None:
+            lines += localadjustlines
+        lines *= self.globalGain
+        return lines
             
     def shuttle(self, definition, cont):
         logger = logging.getLogger(__name__)
@@ -314,32 +325,23 @@ class VoltageBlender(QtCore.QObject):
                 self.dataChanged.emit(0, 1, len(self.electrodes)-1, 1)
                         
     def adjustLine(self, lineData, lineno=None):
-        offset = numpy.zeros(len(lineData))
-        for adjust in self.adjustDict.values():
-            if lineno is None:
-                offset += self.adjustLines[adjust.line] * float(adjust.floatValue)
-            else:
-                offset += self.adjustLines[adjust.line] * float(adjust.func(lineno))
-        offset *= self.adjustGain
-        return (lineData + offset)
+        adjusts = list(self.adjustDict.values())
+        values = [float(adjust.floatValue) if lineno is None else float(adjust.func(lineno)) for adjust in adjusts]
+        offset = adjustOffset(self.adjustArray[numpy.array([adjust.line for adjust in adjusts], dtype=int)], values, len(lineData))
+        return lineData + offset*self.adjustGain
             
     def blendLines(self, lineno, lineGain):
         if self.lines:
-            left = int(math.floor(lineno))
-            right = int(math.ceil(lineno))
-            convexc = lineno-left
-            return (self.lines[left]*(1-convexc) + self.lines[right]*convexc)*lineGain
+            return interpolate(self.lineArray, [lineno])[0]*lineGain
         return None
     
-    def blendLocalAdjustLines(self, lineno):
-        channelCount = self.hardware.channelCount if self.hardware else 0
-        left = int(math.floor(lineno))
-        right = int(math.ceil(lineno))
-        convexc = lineno-left
-        result = numpy.zeros(channelCount)
+    def blendLocalAdjustLines(self, linenos):
+        """sum of the local adjust solutions interpolated at linenos and scaled with their gains, None if there are none"""
+        result = None
         for record in self.localAdjustVoltages:
             if record.solution:
-                result = numpy.add(result, (record.solution[left]*(1-convexc) + record.solution[right]*convexc)*float(record.gain.func(lineno)))
+                blended = interpolate(record.solutionArray, linenos)*evaluate([record.gain.func], linenos)
+                result = blended if result is None else result + blended
         return result
             
     def close(self):
@@ -357,7 +359,7 @@ class VoltageBlender(QtCore.QObject):
         globalGain = float(self.globalGain)
         if shuttlingGraph:
             for edge in shuttlingGraph:
-                towrite.extend( [self.calculateLine(lineno, lineGain, globalGain ) for lineno in edge.iLines() ] )
+                towrite.extend( self.calculateLines(list(edge.iLines()), lineGain, globalGain) )
                 edge.interpolStartLine = currentline
                 currentline = startline+len(towrite)
                 edge.interpolStopLine = currentline
@@ -41,6 +41,7 @@ class LocalAdjustRecord(object):
         self.gain = gain if isinstance(gain, ExpressionValue) else ExpressionValue(name, globalDict, gain)
         self._updateGainValue()
         self._solution = None
+        self.solutionArray = None
         self.solutionPath = None
         self.solutionHash = hash(None)
         self.gain.valueChanged.connect(self._updateGainValue)
@@ -84,6 +85,7 @@ class LocalAdjustRecord(object):
     @solution.setter
     def solution(self, sol):
         self._solution = sol
+        self.solutionArray = numpy.array(sol, dtype=float) if sol else None
         if self._solution:
             hash( tuple( (hashlib.sha256(a.view(numpy.uint8)).hexdigest() for a in self._solution) ) )
         else: